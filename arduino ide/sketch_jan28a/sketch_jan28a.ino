@@ -16,10 +16,34 @@ const int THRESHOLD_CM = 10;
 const int OPEN_ANGLE   = 90;
 const int CLOSE_ANGLE  = 0;
 
+// Serial link, must match BAUD / SERIAL_PROTOCOL in the Python gateway
+const long BAUD = 115200;
+// true  -> 9-byte binary status frames (serial_frame.py)
+// false -> "DIST,12,PIR,1,..." text lines (readable in the Serial Monitor)
+const bool BINARY_PROTOCOL = true;
+const unsigned long STATUS_PERIOD_MS = 150;
+
+// binary frame: SYNC LEN VERSION TYPE payload CRC8 (see serial_frame.py)
+const byte FRAME_SYNC    = 0xA5;
+const byte FRAME_VERSION = 1;
+const byte TYPE_STATUS   = 0x01;
+const byte TYPE_COMMAND  = 0x02;
+const byte TYPE_READY    = 0x03;
+
 bool ownerDetected = false;   // from Python (O1/O0)
 bool sessionActive = false;   // from Python (S1/S0)
 bool gateOpen      = false;
 
+long lastDistance = 999;
+bool lastPir = false;
+unsigned long lastStatusMs = 0;
+byte statusSeq = 0;
+
+// command parser state (never waits for bytes that are not there yet)
+char pendingText = 0;         // 'O' / 'S' seen, waiting for '0' / '1'
+byte frameBuf[8];
+byte frameLen = 0;            // bytes of the current binary frame so far
+
 long readDistanceCM() {
   digitalWrite(TRIG_PIN, LOW); delayMicroseconds(2);
   digitalWrite(TRIG_PIN, HIGH); delayMicroseconds(10);
@@ -43,8 +67,86 @@ void setGate(bool open) {
   }
 }
 
+byte crc8(const byte *data, byte len) {
+  byte crc = 0;
+  for (byte i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (byte b = 0; b < 8; b++) {
+      crc = (crc & 0x80) ? (byte)((crc << 1) ^ 0x07) : (byte)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void applyCommand(char c, bool value) {
+  if (c == 'O') ownerDetected = value;
+  else if (c == 'S') sessionActive = value;
+}
+
+void updateGate() {
+  // Gate logic: session + owner + distance
+  setGate(sessionActive && ownerDetected && lastDistance < THRESHOLD_CM);
+}
+
+// Binary command frames and the old O1/S0 text commands are both accepted.
+void handleByte(byte c) {
+  if (frameLen > 0 || c == FRAME_SYNC) {
+    frameBuf[frameLen++] = c;
+    if (frameLen == 2 && (frameBuf[1] < 2 || frameBuf[1] + 3 > sizeof(frameBuf))) {
+      frameLen = 0;                          // impossible length -> resync
+    } else if (frameLen >= 2 && frameLen == frameBuf[1] + 3) {
+      byte n = frameBuf[1];
+      if (crc8(frameBuf + 1, n + 1) == frameBuf[n + 2] &&
+          frameBuf[2] == FRAME_VERSION && frameBuf[3] == TYPE_COMMAND && n == 4) {
+        applyCommand((char)frameBuf[4], frameBuf[5] != 0);
+      }
+      frameLen = 0;
+    }
+    return;
+  }
+  if (c == 'O' || c == 'S') {
+    pendingText = c;
+  } else if (pendingText && (c == '0' || c == '1')) {
+    applyCommand(pendingText, c == '1');
+    pendingText = 0;
+  } else {
+    pendingText = 0;
+  }
+}
+
+// Once at the end of setup(): the gateway waits for this instead of
+// sleeping a fixed 2 s after opening the port (which resets the board)
+void sendReady() {
+  if (BINARY_PROTOCOL) {
+    byte frame[5] = {FRAME_SYNC, 2, FRAME_VERSION, TYPE_READY, 0};
+    frame[4] = crc8(frame + 1, 3);
+    Serial.write(frame, sizeof(frame));
+    return;
+  }
+  Serial.println("READY");
+}
+
+void sendStatus() {
+  if (BINARY_PROTOCOL) {
+    unsigned int dist = lastDistance > 65535 ? 65535 : (unsigned int)lastDistance;
+    byte flags = (lastPir ? 1 : 0) | (sessionActive ? 2 : 0) |
+                 (ownerDetected ? 4 : 0) | (gateOpen ? 8 : 0);
+    byte frame[9] = {FRAME_SYNC, 6, FRAME_VERSION, TYPE_STATUS,
+                     (byte)(dist & 0xFF), (byte)(dist >> 8), flags, statusSeq++, 0};
+    frame[8] = crc8(frame + 1, 7);
+    Serial.write(frame, sizeof(frame));
+    return;
+  }
+  // DIST,12,PIR,1,SESSION,1,OWNER,1,GATE,1
+  Serial.print("DIST,"); Serial.print(lastDistance);
+  Serial.print(",PIR,"); Serial.print(lastPir ? 1 : 0);
+  Serial.print(",SESSION,"); Serial.print(sessionActive ? 1 : 0);
+  Serial.print(",OWNER,"); Serial.print(ownerDetected ? 1 : 0);
+  Serial.print(",GATE,"); Serial.println(gateOpen ? 1 : 0);
+}
+
 void setup() {
-  Serial.begin(9600);
+  Serial.begin(BAUD);
 
   pinMode(TRIG_PIN, OUTPUT);
   pinMode(ECHO_PIN, INPUT);
@@ -56,42 +158,29 @@ void setup() {
 
   gateServo.attach(SERVO_PIN);
   setGate(false);
+
+  sendReady();
 }
 
 void loop() {
-  // Read commands from Python: O1/O0 and S1/S0
+  // Commands from Python are handled as soon as they arrive, not once per
+  // status period, and a half-received command never blocks the loop
+  bool changed = false;
   while (Serial.available() > 0) {
-    char c = Serial.read();
-
-    if (c == 'O') {               // Owner command
-      while (!Serial.available()) {}
-      char v = Serial.read();
-      ownerDetected = (v == '1');
-    }
-    else if (c == 'S') {          // Session command
-      while (!Serial.available()) {}
-      char v = Serial.read();
-      sessionActive = (v == '1');
-    }
+    bool owner = ownerDetected, session = sessionActive;
+    handleByte(Serial.read());
+    changed |= (owner != ownerDetected) || (session != sessionActive);
   }
+  if (changed) updateGate();
 
-  long distance = readDistanceCM();
-  bool pirMotion = (digitalRead(PIR_PIN) == HIGH);
+  unsigned long now = millis();
+  if (now - lastStatusMs < STATUS_PERIOD_MS) return;
+  lastStatusMs = now;
 
-  // Gate logic: session + owner + distance
-  if (sessionActive && ownerDetected && distance < THRESHOLD_CM) {
-    setGate(true);
-  } else {
-    setGate(false);
-  }
+  lastDistance = readDistanceCM();
+  lastPir = (digitalRead(PIR_PIN) == HIGH);
+  updateGate();
 
   // Send status to Python
-  // DIST,12,PIR,1,SESSION,1,OWNER,1,GATE,1
-  Serial.print("DIST,"); Serial.print(distance);
-  Serial.print(",PIR,"); Serial.print(pirMotion ? 1 : 0);
-  Serial.print(",SESSION,"); Serial.print(sessionActive ? 1 : 0);
-  Serial.print(",OWNER,"); Serial.print(ownerDetected ? 1 : 0);
-  Serial.print(",GATE,"); Serial.println(gateOpen ? 1 : 0);
-
-  delay(150);
+  sendStatus();
 }
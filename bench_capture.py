@@ -0,0 +1,145 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import capture_dataset
+import face_engine
+import train_model
+from bench_common import Timer, percentile
+from bench_index import make_resident
+from fake_camera import load_faces, make_frames
+
+# Enrollment (capture_dataset.py) and what training gets out of it.
+#
+#   python bench_capture.py --frames 300 --residents 5 --images 200
+#
+# capture: --frames of fake_camera with a face, a third of them "standing
+# still" (the same frame repeated), some blurred and some too dark
+#   old    every detected face written raw with cv2.imwrite in the loop
+#   sync   normalize + quality + dedup, cv2.imwrite in the loop
+#   async  normalize + quality + dedup, DatasetWriter threads
+# loop ms = detect + filter + write per frame, write ms = imwrite or the
+# handoff to the writer threads per kept face.
+#
+# train: cold train_model.train() (empty feature cache) on --residents
+# synthetic residents of --images photos, as JPEG folders and as
+# faces.npy packs (capture_dataset.pack_folder).
+
+
+def capture_frames(count, seed=0):
+    frames, _ = make_frames(count, face_prob=1.0, seed=seed)
+    out = []
+    for i, frame in enumerate(frames):
+        if i % 3 == 0 and out:
+            frame = out[-1]                           # standing still
+        elif i % 10 == 1:
+            frame = cv2.GaussianBlur(frame, (0, 0), 2.5)
+        elif i % 10 == 2:
+            frame = (frame * 0.15).astype(np.uint8)   # too dark
+        out.append(frame)
+    return out
+
+
+def run_capture(mode, frames, folder, cascade):
+    writer = capture_dataset.DatasetWriter(folder) if mode == "async" else None
+    dedup = capture_dataset.Dedup()
+    params = [cv2.IMWRITE_JPEG_QUALITY, capture_dataset.JPEG_QUALITY]
+    loop, writes, kept, rejected, n = [], [], 0, {}, 0
+    for frame in frames:
+        t0 = time.perf_counter()
+        gray = face_engine.to_gray(frame)
+        for (x, y, w, h) in face_engine.detect_faces(cascade, gray):
+            if mode == "old":
+                n += 1
+                w0 = time.perf_counter()
+                cv2.imwrite(os.path.join(folder, f"{n}.jpg"), gray[y:y+h, x:x+w])
+                writes.append(time.perf_counter() - w0)
+                kept += 1
+                continue
+            face = face_engine.crop_face(gray, (x, y, w, h))
+            reason = capture_dataset.quality(face) or ("duplicate" if dedup.seen(face) else None)
+            if reason:
+                rejected[reason] = rejected.get(reason, 0) + 1
+            else:
+                w0 = time.perf_counter()
+                if writer is not None:
+                    writer.put(face)
+                else:
+                    n += 1
+                    cv2.imwrite(os.path.join(folder, f"{n}.jpg"), face, params)
+                writes.append(time.perf_counter() - w0)
+                kept += 1
+        loop.append(time.perf_counter() - t0)
+    with Timer() as t:
+        if writer is not None:
+            writer.close()
+    return loop, writes, kept, rejected, t.elapsed
+
+
+def train_cold(dataset, work, name):
+    with Timer() as t:
+        stats = train_model.train(dataset, os.path.join(work, f"{name}.yml"),
+                                  os.path.join(work, f"models_{name}"),
+                                  os.path.join(work, f"{name}_cache.npz"))
+    return t.elapsed, stats
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--residents", type=int, default=5)
+    ap.add_argument("--images", type=int, default=200)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_capture_")
+    try:
+        cascade = face_engine.load_cascade()
+        frames = capture_frames(args.frames)
+        print(f"capture: {len(frames)} frames")
+        print(f"{'mode':<6} {'loop p50 ms':>11} {'p99 ms':>7} {'write p50 ms':>12} "
+              f"{'kept':>5} {'close ms':>8}  rejected")
+        for mode in ("old", "sync", "async"):
+            folder = os.path.join(work, "capture", mode)
+            os.makedirs(folder)
+            loop, writes, kept, rejected, close = run_capture(mode, frames, folder, cascade)
+            print(f"{mode:<6} {1000 * percentile(loop, 50):11.2f} "
+                  f"{1000 * percentile(loop, 99):7.2f} {1000 * percentile(writes, 50):12.3f} "
+                  f"{kept:>5} {1000 * close:8.1f}  {rejected or '-'}")
+
+        base = [cv2.resize(f, face_engine.FACE_SIZE) for f in load_faces()]
+        jpg_set = os.path.join(work, "dataset_jpg")
+        for seed in range(1, args.residents + 1):
+            folder = os.path.join(jpg_set, f"resident{seed}")
+            os.makedirs(folder)
+            for i, img in enumerate(make_resident(base, seed, args.images), start=1):
+                cv2.imwrite(os.path.join(folder, f"{i}.jpg"), img)
+        npy_set = os.path.join(work, "dataset_npy")
+        shutil.copytree(jpg_set, npy_set)
+        for folder in os.listdir(npy_set):
+            capture_dataset.pack_folder(os.path.join(npy_set, folder))
+
+        print()
+        print(f"train (cold): {args.residents} residents x {args.images} photos, "
+              f"workers={train_model.WORKERS}")
+        for name, dataset in (("jpg", jpg_set), ("npy", npy_set)):
+            with Timer() as t:
+                residents, images = train_model.scan_dataset(dataset, {})
+                for _, _, _, data in images:
+                    if not isinstance(data, np.ndarray):
+                        cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+            seconds, stats = train_cold(dataset, work, name)
+            size = sum(os.path.getsize(os.path.join(d, f))
+                       for d, _, files in os.walk(dataset) for f in files)
+            print(f"{name:<6} load+decode {1000 * t.elapsed:7.1f} ms   train {seconds:6.2f} s   "
+                  f"{stats['images']} images   {size / 2**20:.1f} MB")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
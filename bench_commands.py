@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import paho.mqtt.client as mqtt
+
+import remote_commands
+import replay
+import serial_frame
+import serial_link
+import vision_pipeline
+from bench_common import percentile
+from bench_replay import make_recording, run_script
+from fake_broker import FakeBroker
+
+# Remote commands (remote_commands.py) end to end, against fake_broker:
+# smart_home_gateway_modelb.py runs on a replayed recording (bench_replay.py
+# --offline, nothing published for real, no Arduino needed) while a second
+# MQTT client sends commands to MQTT_BASE/cmd/... and listens on
+# MQTT_BASE/ack.
+#
+#   python bench_commands.py --rounds 4 --gap 1.5
+#
+# Plan: --rounds x (threshold, open 0.5) with the gateway idle (no session:
+# the loop sleeps until the next Arduino sample), then "session" and the
+# same again while a session runs (camera + vision pipeline busy).
+#   ack      sender: publish -> ack received (broker both ways)
+#   applied  gateway: received -> applied (latency_ms in the ack)
+#   serial   sender: publish -> O1 written to the serial port ("open" only)
+#   fps      frames the vision pipeline took during the session
+# "no wake" runs the same with SerialLink.wake() / VisionPipeline.wake()
+# disabled: a command then waits until the loop comes round anyway (next
+# Arduino sample when idle, next frame result in a session).
+
+GATEWAY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "smart_home_gateway_modelb.py")
+BASE = "aiu/gate/aria"
+# no files, no metrics port (two runs in one process), commands on
+CONFIG = {"METRICS_PORT": None, "TELEMETRY_DIR": None, "FIREBASE_SPOOL": ":memory:",
+          "REMOTE_COMMANDS": True}
+SECRET = "bench-secret"         # $GATE_COMMAND_SECRET of the gateway run
+
+
+class Sender:
+    # the remote side: publishes the plan, collects acks
+    def __init__(self, port, plan, gap):
+        self.plan = plan
+        self.gap = gap
+        self.sent = []                  # (wall, phase, name, id)
+        self.acks = {}                  # id -> (wall, ack)
+        self.online = threading.Event()
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+        self.client.connect("127.0.0.1", port, 60)
+        self.client.loop_start()
+
+    def _on_connect(self, client, userdata, flags, rc, props=None):
+        client.subscribe([(f"{BASE}/ack", 1), (f"{BASE}/online", 1)])
+
+    def _on_message(self, client, userdata, msg):
+        if msg.topic == f"{BASE}/online":
+            if msg.payload == b"1":
+                self.online.set()
+            return
+        ack = json.loads(msg.payload)
+        self.acks[ack["id"]] = (time.time(), ack)
+
+    def run(self):
+        if not self.online.wait(60):
+            return
+        time.sleep(1.0)                 # gateway loop running
+        for phase, name, value in self.plan:
+            cmd_id = uuid.uuid4().hex[:8]
+            sent = time.time()
+            self.sent.append((sent, phase, name, cmd_id))
+            self.client.publish(f"{BASE}/cmd/{name}",
+                                remote_commands.sign(SECRET, name, value, cmd_id, sent), qos=1)
+            time.sleep(self.gap)
+        time.sleep(1.0)
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+def make_plan(rounds):
+    plan = []
+    for phase in ("idle", "session"):
+        if phase == "session":
+            plan.append((phase, "session", 600))
+        for _ in range(rounds):
+            plan.append((phase, "threshold", 70))
+            plan.append((phase, "open", 0.5))
+    return plan
+
+
+def serial_commands(stats):
+    # -> [(wall, b"O1")] written by the gateway
+    out = []
+    for wall, _, data in stats["writes"]:
+        for ftype, cmd in serial_frame.FrameDecoder().feed(data):
+            if ftype == serial_frame.TYPE_COMMAND:
+                out.append((wall, cmd))
+    return out
+
+
+def run(rec_dir, broker, plan, gap, wake, quiet):
+    replay._replays.pop(rec_dir, None)
+    saved = serial_link.SerialLink.wake, vision_pipeline.VisionPipeline.wake
+    if not wake:
+        serial_link.SerialLink.wake = lambda self: None
+        vision_pipeline.VisionPipeline.wake = lambda self: None
+    sender = Sender(broker.port, plan, gap)
+    thread = threading.Thread(target=sender.run, daemon=True)
+    thread.start()
+    try:
+        with contextlib.ExitStack() as stack:
+            if quiet is not None:
+                # stays open: the gateway's log handler keeps the stream
+                stack.enter_context(contextlib.redirect_stdout(quiet))
+                stack.enter_context(contextlib.redirect_stderr(quiet))
+            rep, _, _ = run_script(GATEWAY, rec_dir, "realtime", False, True, 600, 1.0,
+                                   config=CONFIG, broker=broker)
+    finally:
+        serial_link.SerialLink.wake, vision_pipeline.VisionPipeline.wake = saved
+        thread.join(5)
+        sender.close()
+    return sender, rep.stats()
+
+
+def summarize(label, sender, stats, gap):
+    writes = serial_commands(stats)
+    rows = {}
+    for sent, phase, name, cmd_id in sender.sent:
+        row = rows.setdefault((phase, name), {"ack": [], "applied": [], "serial": [], "lost": 0})
+        if cmd_id not in sender.acks:
+            row["lost"] += 1
+            continue
+        t, ack = sender.acks[cmd_id]
+        if not ack["ok"]:
+            row["lost"] += 1
+            continue
+        row["ack"].append(1000 * (t - sent))
+        row["applied"].append(ack["latency_ms"])
+        if name == "open":
+            o1 = [w for w, cmd in writes if cmd == b"O1" and w >= sent]
+            if o1 and o1[0] - sent < gap:
+                row["serial"].append(1000 * (o1[0] - sent))
+
+    def cell(values):
+        if not values:
+            return f"{'-':>15}"
+        return f"{percentile(values, 50):6.1f} / {max(values):6.1f}"
+
+    served = stats["served"]
+    span = served[-1][0] - served[0][0] if len(served) > 1 else 0.0
+    fps = (len(served) - 1) / span if span > 0 else 0.0
+    for (phase, name), row in rows.items():
+        if name == "session":
+            continue
+        print(f"{label:<8} {phase:<8} {name:<10} {cell(row['ack'])}  {cell(row['applied'])}  "
+              f"{cell(row['serial'])}  {row['lost']:>4}")
+    print(f"{label:<8} session  vision     {fps:5.1f} fps, {len(served)} frames")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=4)
+    ap.add_argument("--gap", type=float, default=1.5, help="s between commands")
+    ap.add_argument("--verbose", action="store_true", help="gateway output")
+    args = ap.parse_args()
+
+    plan = make_plan(args.rounds)
+    os.environ[remote_commands.SECRET_ENV] = SECRET
+    seconds = 10 + len(plan) * args.gap + 5
+    quiet = None if args.verbose else open(os.devnull, "w")
+    work = tempfile.mkdtemp(prefix="bench_commands_")
+    try:
+        rec_dir = os.path.join(work, "recording")
+        with contextlib.redirect_stdout(quiet or sys.stdout):
+            # hallway without anyone: sessions only from the "session" command
+            make_recording(rec_dir, seconds, line_format="modelb-binary",
+                           every=1e9, arrival=1.0)
+        print(f"{len(plan)} commands, {args.gap} s apart, ms p50 / max")
+        print(f"{'run':<8} {'gateway':<8} {'command':<10} {'ack':>15}  {'applied':>15}  "
+              f"{'serial':>15}  lost")
+        with FakeBroker() as broker:
+            for label, wake in (("wake", True), ("no wake", False)):
+                sender, stats = run(rec_dir, broker, plan, args.gap, wake, quiet)
+                summarize(label, sender, stats, args.gap)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import time
+
+# Small helpers shared by the bench_*.py scripts.
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    data = sorted(samples)
+    k = (len(data) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(data) - 1)
+    return data[lo] + (data[hi] - data[lo]) * (k - lo)
+
+
+def summary_ms(samples_s):
+    ms = [s * 1000.0 for s in samples_s]
+    return {
+        "n": len(ms),
+        "mean": sum(ms) / len(ms) if ms else 0.0,
+        "p50": percentile(ms, 50),
+        "p95": percentile(ms, 95),
+        "p99": percentile(ms, 99),
+        "max": max(ms) if ms else 0.0,
+    }
+
+
+def report(name, samples_s):
+    s = summary_ms(samples_s)
+    print(f"{name:<28} n={s['n']:<6} mean={s['mean']:8.2f} ms  "
+          f"p50={s['p50']:8.2f}  p95={s['p95']:8.2f}  "
+          f"p99={s['p99']:8.2f}  max={s['max']:8.2f}")
+    return s
+
+
+def pss_kb(pid):
+    # proportional set size (Linux): shared pages split between the mappers
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def cpu_seconds(pid):
+    # user + sys seconds of a process (Linux), all threads
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except FileNotFoundError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+class Timer:
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.t0
+
+
+def bench_recognizer(model_path="face_model.yml", face_dir="dataset/aria"):
+    # trained model if there is one, otherwise a quick in-memory training
+    # on the dataset so the benchmarks run on a fresh checkout
+    import os
+    import cv2
+    import numpy as np
+    from fake_camera import load_faces
+
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    if os.path.exists(model_path):
+        recognizer.read(model_path)
+        return recognizer
+    faces = load_faces(face_dir)
+    recognizer.train(faces, np.ones(len(faces), dtype=np.int32))
+    return recognizer
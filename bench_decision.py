@@ -0,0 +1,199 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+import face_engine
+import replay
+from bench_common import bench_recognizer, percentile
+from bench_reccache import CONF_THRESHOLD, FPS, make_scene
+from detect_scheduler import DetectScheduler
+from owner_decision import HOLD_S, OPEN_S, OwnerDecision
+
+# Owner decision over time (owner_decision.py) against the old
+# ON_FRAMES / OFF_FRAMES frame-count debounce, on the scene of
+# bench_reccache.py (owner, look-alike, owner -> look-alike swap).
+#
+#   python bench_decision.py --cycles 4
+#
+# The recording is detected + recognized once at 15 fps (every frame) and
+# the per-frame margins are kept; every policy then decides on the same
+# margins, at 15 fps and at 5 fps (every 3rd frame, what multi_gate.py
+# reads per gate), optionally with jitter (+-30 ms stamps, 10% frames lost).
+#
+#   open p50/max    owner arrival -> owner decided (scene time)
+#   close p50       owner gone -> decision back to no owner
+#   false opens/min transitions to owner while the owner is not in the
+#                   picture (the close after the owner leaves not counted)
+#   false time      % of non-owner time decided owner, GRACE seconds after
+#                   the owner left not counted
+#
+# Then the single-dropout check: owner clearly in view for 2 s, one frame
+# in the middle without a resident face (blink, motion blur). An open
+# decision must stay open through it at every fps; exit 1 if not.
+
+ON_FRAMES = 3
+OFF_FRAMES = 6
+GRACE = 0.5
+
+
+def record_margins(path, truth, recognizer, cascade):
+    # every frame: near-gate detection -> recognize_faces -> margin (NaN = none)
+    rep = replay.Replay(path, "fast")
+    cam = replay.ReplayCamera(rep)
+    labels = face_engine.load_labels("face_model.yml")
+    scheduler = DetectScheduler(cascade, 5, 0.5, face_engine.make_detector(cascade, "near-gate"))
+    margins = np.full(len(truth), np.nan)
+    for i in range(len(truth)):
+        ok, frame = cam.read()
+        if not ok:
+            break
+        gray = face_engine.to_gray(frame)
+        faces = scheduler.detect(gray)
+        r = face_engine.recognize_faces(recognizer, gray, faces, CONF_THRESHOLD, labels)
+        if r.margin is not None:
+            margins[i] = r.margin
+    return margins
+
+
+class FrameDebounce:
+    # the gateways' previous logic, same interface as OwnerDecision
+    def __init__(self, on_frames=ON_FRAMES, off_frames=OFF_FRAMES):
+        self.on_frames, self.off_frames = on_frames, off_frames
+        self.owner, self.on, self.off = False, 0, 0
+
+    def update(self, margin, now=None):
+        if margin is not None and margin > 0:
+            self.on, self.off = self.on + 1, 0
+        else:
+            self.on, self.off = 0, self.off + 1
+        if not self.owner and self.on >= self.on_frames:
+            self.owner = True
+        if self.owner and self.off >= self.off_frames:
+            self.owner = False
+        return self.owner
+
+
+def sample(n, step, jitter, seed=0):
+    # -> frame indices and their capture stamps
+    rng = random.Random(seed)
+    idx = [i for i in range(0, n, step) if not (jitter and rng.random() < 0.1)]
+    stamps = [i / FPS + (rng.uniform(-0.03, 0.03) if jitter else 0.0) for i in idx]
+    return idx, stamps
+
+
+def evaluate(policy, margins, truth, idx, stamps):
+    owner = [who == "owner" for who in truth]
+    opens, closes, false_opens = [], [], 0
+    false_time, non_owner_time = 0.0, 0.0
+    arrived = left = None
+    was, prev_i, t_update, states = False, None, 0.0, {}
+    for i, now in zip(idx, stamps):
+        # ground truth since the previous processed frame
+        for j in range(0 if prev_i is None else prev_i + 1, i + 1):
+            if owner[j] and (j == 0 or not owner[j - 1]):
+                arrived, left = j / FPS, None
+            if not owner[j] and j and owner[j - 1]:
+                left, arrived = j / FPS, None
+        prev_i = i
+
+        m = margins[i]
+        t0 = time.perf_counter()
+        state = policy.update(None if np.isnan(m) else float(m), now)
+        t_update += time.perf_counter() - t0
+        states[i] = state
+
+        t = i / FPS
+        if state and not was:
+            if arrived is not None:
+                opens.append(t - arrived)
+                arrived = None
+            elif not owner[i]:
+                false_opens += 1
+        if was and not state and left is not None:
+            closes.append(t - left)
+            left = None
+        was = state
+    # time share on the full 15 fps grid: decision held until the next frame
+    current, left_t = False, -1e9
+    for j in range(len(truth)):
+        current = states.get(j, current)
+        if not owner[j]:
+            if j and owner[j - 1]:
+                left_t = j / FPS
+            if j / FPS - left_t >= GRACE:
+                non_owner_time += 1 / FPS
+                false_time += current / FPS
+    minutes = sum(not o for o in owner) / FPS / 60
+    return {"opens": opens, "closes": closes, "false_opens": false_opens / minutes,
+            "false_time": false_time / max(1e-9, non_owner_time),
+            "update_us": 1e6 * t_update / max(1, len(idx))}
+
+
+def single_dropout(policy, fps, seconds=2.0, margin=15.0, start=1000.0):
+    # -> decisions per frame; frame fps * seconds / 2 has no resident face
+    n = int(seconds * fps)
+    return [policy.update(None if k == n // 2 else margin, start + k / fps)
+            for k in range(n)]
+
+
+def flickers(states):
+    # owner -> no owner -> owner again
+    opened = states.index(True) if True in states else len(states)
+    return False in states[opened:]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cycles", type=int, default=4)
+    ap.add_argument("--open", type=float, default=OPEN_S)
+    ap.add_argument("--hold", type=float, default=HOLD_S)
+    args = ap.parse_args()
+
+    recognizer = bench_recognizer()
+    cascade = face_engine.load_cascade()
+    path = os.path.join(tempfile.mkdtemp(prefix="decision_"), "scene")
+    truth = make_scene(path, args.cycles)
+    margins = record_margins(path, truth, recognizer, cascade)
+    seen = ~np.isnan(margins)
+    print(f"{len(truth)} frames ({len(truth) / FPS:.0f} s), resident face on "
+          f"{100 * seen.mean():.0f}% of frames, raw owner flag on "
+          f"{100 * (margins[seen] > 0).mean():.0f}% of those")
+    print()
+    print(f"{'policy':<18} {'fps':<10} {'open p50/max ms':>16} {'close p50 ms':>12} "
+          f"{'false opens/min':>15} {'false time':>10} {'update us':>9}")
+
+    policies = [
+        (f"frames {ON_FRAMES}/{OFF_FRAMES}", FrameDebounce, (ON_FRAMES, OFF_FRAMES)),
+        (f"time {args.open:g}/{args.hold:g}s", OwnerDecision, (args.open, args.hold)),
+    ]
+    rates = [("15", 1, False), ("5", 3, False), ("5 jitter", 3, True)]
+    for name, cls, params in policies:
+        for fps_name, step, jitter in rates:
+            idx, stamps = sample(len(truth), step, jitter)
+            r = evaluate(cls(*params), margins, truth, idx, stamps)
+            opens = (f"{1000 * percentile(r['opens'], 50):.0f} / {1000 * max(r['opens']):.0f}"
+                     if r["opens"] else "-")
+            close = f"{1000 * percentile(r['closes'], 50):.0f}" if r["closes"] else "-"
+            print(f"{name:<18} {fps_name:<10} {opens:>16} {close:>12} "
+                  f"{r['false_opens']:15.2f} {100 * r['false_time']:9.2f}% "
+                  f"{r['update_us']:9.1f}")
+
+    print()
+    failed = False
+    for name, cls, params in policies:
+        for fps in (30, 15, 5):
+            states = single_dropout(cls(*params), fps)
+            bad = flickers(states)
+            failed = failed or bad
+            trace = "".join("1" if s else "0" for s in states)
+            print(f"{name:<18} {fps:<10} single dropout {'FLICKER' if bad else 'ok':<8} {trace}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import time
+
+import cv2
+
+import face_engine
+from detect_scheduler import DetectScheduler
+from fake_camera import make_frames
+
+# Full-frame Haar on every frame vs DetectScheduler (keyframes + ROI).
+# Reports detections/s and miss rate against the full-frame baseline
+# (a miss = baseline found a face, the scheduler found none).
+#
+#   python bench_detect.py --video session.mp4 --interval 5 --margin 0.5
+#   python bench_detect.py                      # synthetic frames
+
+
+def load_video(path, limit):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run(grays, detect):
+    found = []
+    t0 = time.perf_counter()
+    for gray in grays:
+        found.append(len(detect(gray)) > 0)
+    return found, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--video", help="recorded video file (default: synthetic)")
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--interval", type=int, default=5, help="keyframe interval")
+    ap.add_argument("--margin", type=float, default=0.5, help="ROI margin")
+    args = ap.parse_args()
+
+    if args.video:
+        frames = load_video(args.video, args.frames)
+    else:
+        frames, _ = make_frames(args.frames, face_prob=0.9)
+    grays = [face_engine.to_gray(f) for f in frames]
+
+    cascade = face_engine.load_cascade()
+    base, t_base = run(grays, lambda g: face_engine.detect_faces(cascade, g))
+
+    sched = DetectScheduler(cascade, args.interval, args.margin)
+    roi, t_roi = run(grays, sched.detect)
+
+    with_face = sum(base)
+    missed = sum(1 for b, r in zip(base, roi) if b and not r)
+    extra = sum(1 for b, r in zip(base, roi) if r and not b)
+
+    n = len(grays)
+    print(f"frames={n}  baseline frames with face={with_face}")
+    print(f"full-frame  : {n / t_base:7.1f} detections/s  "
+          f"{1000 * t_base / n:6.2f} ms/frame")
+    print(f"scheduler   : {n / t_roi:7.1f} detections/s  "
+          f"{1000 * t_roi / n:6.2f} ms/frame  "
+          f"(interval={args.interval}, margin={args.margin})")
+    print(f"miss rate   : {missed / max(1, with_face):.3%}  "
+          f"({missed} missed, {extra} extra)")
+    print(f"runs        : {sched.counters()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import cv2
+
+import camera_discovery
+from bench_common import report
+from fake_camera import ProbeDevices
+
+# Camera discovery (camera_discovery.py) against fake capture backends.
+#
+#   python bench_discovery.py --open-delay 0.3 --fail-delay 1.0 --runs 5
+#
+# fake_camera.ProbeDevices: a 640x480/1280x720 camera on index 0 that only
+# MSMF opens, a 640x480 one on index 2 (DSHOW and ANY), nothing on 1 and 3;
+# a missing device blocks --fail-delay in the open, like MSMF / DSHOW do.
+#   serial     the old scan_camera.py: every backend x index one after
+#              another, each working device asked for every size
+#   cold       discover() + cache write (resolve() with no cache file)
+#   warm       resolve() with the cache: identity check, no device opened
+#   changed    cache present but another camera on the cached index
+#              -> identity mismatch -> discovery again
+
+BACKENDS = (("MSMF", cv2.CAP_MSMF), ("DSHOW", cv2.CAP_DSHOW), ("ANY", cv2.CAP_ANY))
+
+
+def fake_devices(args):
+    modes_hd = [(640, 480, 30.0), (1280, 720, 30.0)]
+    modes_vga = [(640, 480, 30.0)]
+    return ProbeDevices({(0, cv2.CAP_MSMF): modes_hd,
+                         (2, cv2.CAP_DSHOW): modes_vga, (2, cv2.CAP_ANY): modes_vga},
+                        names={0: "USB2.0 HD UVC WebCam", 2: "Logitech C270"},
+                        open_delay=args.open_delay, fail_delay=args.fail_delay)
+
+
+def serial_scan(opener):
+    found = 0
+    for _, backend in BACKENDS:
+        for index in camera_discovery.INDICES:
+            found += camera_discovery.probe(opener, index, backend) is not None
+    return found
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--open-delay", type=float, default=0.3)
+    ap.add_argument("--fail-delay", type=float, default=1.0)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--warm-runs", type=int, default=1000)
+    args = ap.parse_args()
+    camera_discovery.BACKENDS = BACKENDS
+
+    work = tempfile.mkdtemp(prefix="bench_discovery_")
+    try:
+        cache = os.path.join(work, "camera_cache.json")
+        timeout = args.fail_delay + 2.0
+
+        costs, opens = [], 0
+        for _ in range(args.runs):
+            opener = fake_devices(args)
+            t0 = time.perf_counter()
+            serial_scan(opener)
+            costs.append(time.perf_counter() - t0)
+            opens += opener.opens
+        report(f"serial ({opens // args.runs} opens)", costs)
+
+        costs, opens = [], 0
+        for _ in range(args.runs):
+            opener = fake_devices(args)
+            if os.path.exists(cache):
+                os.remove(cache)
+            t0 = time.perf_counter()
+            choice = camera_discovery.resolve(cache_path=cache, opener=opener,
+                                              identify=opener.identity, timeout=timeout)
+            costs.append(time.perf_counter() - t0)
+            opens += opener.opens
+        report(f"cold ({opens // args.runs} opens)", costs)
+        print(f"  -> {choice['identity']} {choice['backend_name']} "
+              f"{choice['width']}x{choice['height']}@{choice['fps']:g}")
+
+        opener = fake_devices(args)
+        costs = []
+        for _ in range(args.warm_runs):
+            t0 = time.perf_counter()
+            choice = camera_discovery.resolve(cache_path=cache, opener=opener,
+                                              identify=opener.identity, timeout=timeout)
+            costs.append(time.perf_counter() - t0)
+        report(f"warm ({opener.opens} opens, {choice['source']})", costs)
+
+        costs = []
+        for _ in range(args.runs):
+            opener = fake_devices(args)
+            opener.names[0] = "Other Camera"
+            t0 = time.perf_counter()
+            choice = camera_discovery.resolve(cache_path=cache, opener=opener,
+                                              identify=opener.identity, timeout=timeout)
+            costs.append(time.perf_counter() - t0)
+            opener.names[0] = "USB2.0 HD UVC WebCam"
+            camera_discovery.resolve(cache_path=cache, opener=opener, identify=opener.identity,
+                                     refresh=True, timeout=timeout)
+        report(f"changed ({choice['source']})", costs)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import threading
+import time
+import urllib.request
+
+import cv2
+
+import display
+import face_engine
+from bench_common import bench_recognizer, report
+from fake_camera import make_frames
+
+# Loop latency (read -> detect -> recognize -> overlay/show -> quit check)
+# with the display on vs off, see display.py.
+#
+#   python bench_display.py --frames 150
+#
+#   none            headless, no overlays, no waitKey
+#   overlays        overlays drawn every frame but not shown (their cost)
+#   stream idle     stream mode without a client (nothing drawn or encoded)
+#   stream client   stream mode with one client connected (overlays at
+#                   STREAM_FPS, JPEG encoding on the client's thread)
+#   window          cv2.imshow + cv2.waitKey(1) every frame (needs an
+#                   OpenCV build with a GUI and a desktop)
+
+CONF_THRESHOLD = 70
+
+
+def draw(frame, faces, rec):
+    cv2.putText(frame, f"OWNER: {'YES' if rec.owner else 'NO'}",
+                (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 255, 255), 2)
+    for (x, y, w, h) in faces:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 255), 2)
+    if rec.best_box is not None:
+        x, y, w, h = rec.best_box
+        cv2.putText(frame, rec.best_text, (x, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+
+def run_loop(view, frames, cascade, recognizer, rounds):
+    times, shown = [], 0
+    for _ in range(rounds):
+        for src in frames:
+            t0 = time.perf_counter()
+            frame = src.copy()          # what cam.read() hands over
+            gray = face_engine.to_gray(frame)
+            faces = face_engine.detect_faces(cascade, gray)
+            rec = face_engine.recognize_faces(recognizer, gray, faces, CONF_THRESHOLD)
+            if view.wants_frame():
+                draw(frame, faces, rec)
+                view.show(frame)
+                shown += 1
+            view.should_quit()
+            times.append(time.perf_counter() - t0)
+    return times, shown
+
+
+class DrawOnly(display.View):
+    def wants_frame(self):
+        return True
+
+
+def watch(port, stop):
+    # a viewer: reads the MJPEG stream until stopped
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/") as resp:
+        while not stop.is_set():
+            if not resp.read1(65536):
+                break
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=100)
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    cascade = face_engine.load_cascade()
+    recognizer = bench_recognizer()
+    frames, _ = make_frames(args.frames, face_prob=0.7)
+
+    idle = display.MjpegStream(0).start()
+    watched = display.MjpegStream(0).start()
+    stop = threading.Event()
+    threading.Thread(target=watch, args=(watched.port, stop), daemon=True).start()
+    while watched.clients == 0:
+        time.sleep(0.01)
+
+    views = {
+        "none": display.View("bench", "none"),
+        "overlays": DrawOnly("bench", "none"),
+        "stream idle": display.View("bench", "stream", idle),
+        "stream client": display.View("bench", "stream", watched),
+        "window": display.View("bench", "window"),
+    }
+    try:
+        views["window"].show(frames[0])
+        views["window"].should_quit()
+    except cv2.error:
+        print("window: not available (OpenCV without GUI or no desktop)")
+        del views["window"]
+
+    # modes interleaved round by round, so CPU clock drift hits all of them
+    results = {name: ([], 0) for name in views}
+    for _ in range(args.rounds):
+        for name, view in views.items():
+            times, shown = run_loop(view, frames, cascade, recognizer, 1)
+            results[name] = (results[name][0] + times, results[name][1] + shown)
+    stop.set()
+    idle.close()
+    watched.close()
+    if "window" in views:
+        views["window"].close()
+
+    print()
+    base = sum(results["none"][0]) / len(results["none"][0])
+    for name, (times, shown) in results.items():
+        s = report(f"loop {name}", times)
+        print(f"{'':<28} shown={shown} ({100 * (s['mean'] / 1000 / base - 1):+.1f}% vs none)")
+    print(f"{'':<28} stream jpeg encoded={watched.encoded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from bench_common import cpu_seconds, percentile, pss_kb
+
+# Frame bus (frame_bus.py) vs every consumer decoding its own stream.
+#
+#   python bench_framebus.py --consumers 3 --fps 30 --seconds 15
+#
+# The "camera" is an MJPEG stream (JPEG frames of fake_camera at --fps,
+# what a USB webcam sends): a frame is due at t0 + k / fps and has to be
+# decoded before anyone can use it.
+#
+#   own   N consumer processes, each decodes every frame itself (as if each
+#         could open the device / an IP camera stream)
+#   bus   one producer decodes and writes into the bus, N consumers read
+#         NumPy views from it
+#
+# Every consumer does the same work per frame (cvtColor to gray + mean).
+# latency = frame due -> consumer holds the decoded frame. pss / cpu are
+# summed over all processes of the mode (producer included).
+
+BUS_NAME = "bench_bus"
+
+
+def make_stream(count, quality=80):
+    from fake_camera import make_frames
+    frames, _ = make_frames(count, face_prob=0.7)
+    return [cv2.imencode(".jpg", f, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+            for f in frames]
+
+
+class MjpegSource:
+    # frame k due at t0 + k / fps; read() sleeps until due, then decodes
+    def __init__(self, jpegs, fps, t0):
+        self.jpegs = jpegs
+        self.period = 1.0 / fps
+        self.t0 = t0
+        self.k = 0
+
+    def read(self):
+        due = self.t0 + self.k * self.period
+        now = time.time()
+        if now < due:
+            time.sleep(due - now)
+        else:
+            # late: skip to the newest due frame, like a camera would
+            self.k = max(self.k, int((now - self.t0) / self.period))
+            due = self.t0 + self.k * self.period
+        frame = cv2.imdecode(np.frombuffer(self.jpegs[self.k % len(self.jpegs)], np.uint8),
+                             cv2.IMREAD_COLOR)
+        self.k += 1
+        return due, frame
+
+
+def work(frame):
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY).mean()
+
+
+# ================= child roles =================
+def run_role(args):
+    import frame_bus
+
+    cv2.setNumThreads(1)
+    start, end = args.start + args.warmup, args.start + args.warmup + args.seconds
+    lat, frames, skipped = [], 0, 0
+    cpu0 = None
+
+    def measuring():
+        nonlocal cpu0
+        if cpu0 is None and time.time() >= start:
+            cpu0 = cpu_seconds(os.getpid())
+        return cpu0 is not None
+
+    if args.role == "producer":
+        src = MjpegSource(make_stream(60), args.fps, args.start)
+        due, frame = src.read()
+        bus = frame_bus.FrameBus(frame.shape, BUS_NAME, fps=args.fps)
+        while time.time() < end:
+            due, frame = src.read()
+            bus.write(frame, due)
+            frames += measuring()
+        # consumers finish first, then the segment goes away
+        time.sleep(1.0)
+        bus.close()
+    elif args.role == "own":
+        src = MjpegSource(make_stream(60), args.fps, args.start)
+        seen = None
+        while time.time() < end:
+            due, frame = src.read()
+            got = time.time()
+            work(frame)
+            if measuring():
+                lat.append(got - due)
+                frames += 1
+                if seen is not None:
+                    skipped += src.k - 1 - seen - 1
+            seen = src.k - 1
+    else:
+        cam = frame_bus.BusCamera(BUS_NAME)
+        while not cam.isOpened():
+            time.sleep(0.05)
+            cam = frame_bus.BusCamera(BUS_NAME)
+        while time.time() < end:
+            skipped0 = cam.skipped
+            ok, frame = cam.read()
+            if not ok:
+                break
+            got = time.time()
+            work(frame)
+            if measuring():
+                lat.append(got - cam.stamp)
+                frames += 1
+                skipped += cam.skipped - skipped0
+        cam.release()
+
+    result = {"role": args.role, "frames": frames, "skipped": skipped,
+              "cpu": cpu_seconds(os.getpid()) - (cpu0 or 0), "pss_kb": pss_kb(os.getpid()),
+              "p50": percentile(lat, 50), "p99": percentile(lat, 99)}
+    print("RESULT " + json.dumps(result), flush=True)
+
+
+# ================= parent =================
+def run_mode(mode, args):
+    start = time.time() + 2.0           # all children imported by then
+    base = [sys.executable, __file__, "--start", str(start), "--fps", str(args.fps),
+            "--seconds", str(args.seconds), "--warmup", str(args.warmup)]
+    roles = ["producer"] + ["bus"] * args.consumers if mode == "bus" else ["own"] * args.consumers
+    procs = [subprocess.Popen(base + ["--role", r], stdout=subprocess.PIPE, text=True)
+             for r in roles]
+    # pss while all of them are running (the producer exits last)
+    time.sleep(start + args.warmup + args.seconds / 2 - time.time())
+    pss = sum(pss_kb(p.pid) for p in procs)
+    results = []
+    for p in procs:
+        out, _ = p.communicate()
+        line = [l for l in out.splitlines() if l.startswith("RESULT ")]
+        if p.returncode or not line:
+            raise SystemExit(f"{mode}: child failed")
+        results.append(json.loads(line[0][7:]))
+    return pss, results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--consumers", type=int, default=3)
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=15.0)
+    ap.add_argument("--warmup", type=float, default=3.0)
+    ap.add_argument("--role", help=argparse.SUPPRESS)
+    ap.add_argument("--start", type=float, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.role:
+        run_role(args)
+        return
+
+    print(f"{args.consumers} consumers, {args.fps:.0f} fps, {args.seconds:.0f} s")
+    print(f"{'mode':<6} {'process':<10} {'frames':>7} {'skipped':>7} {'p50 ms':>7} "
+          f"{'p99 ms':>7} {'cpu s':>6} {'pss MB':>7}")
+    for mode in ("own", "bus"):
+        pss, results = run_mode(mode, args)
+        for r in results:
+            print(f"{mode:<6} {r['role']:<10} {r['frames']:>7} {r['skipped']:>7} "
+                  f"{1000 * r['p50']:7.2f} {1000 * r['p99']:7.2f} {r['cpu']:6.2f} "
+                  f"{r['pss_kb'] / 1024:7.1f}")
+        cpu = sum(r["cpu"] for r in results)
+        print(f"{mode:<6} {'total':<10} {'':>7} {'':>7} {'':>7} {'':>7} {cpu:6.2f} "
+              f"{pss / 1024:7.1f}   ({100 * cpu / args.seconds:.0f}% of a core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import argparse
+import contextlib
+import os
+import random
+import shutil
+import tempfile
+
+import replay
+from bench_common import percentile
+from bench_replay import LINE_FORMATS, run_script
+from fake_camera import make_frames
+
+# camera_gate.py: one camera vs fusion (camera_fusion.py) of two cameras,
+# replayed in realtime.
+#
+#   python bench_fusion.py --seconds 60 --occlusion 0.35
+#
+# Synthetic two-camera recording (replay.py streams 0 and 1), 15 fps each,
+# camera 1 capturing half a frame later than camera 0 (not synchronized).
+# Frames are --size (default 320x240) so that two Haar threads keep up on
+# a small machine; at 640x480 a single core gets ~6 fps per camera.
+# Every --every s someone walks up and stays --arrival s; in that time each
+# camera sees the face except for frames occluded (shoulder, hand, door
+# frame) with probability --occlusion, independently per camera. Serial
+# lines in the Arduino format camera_gate.py reads.
+#
+# Runs camera_gate.py with CAMERAS = [0], [1] and [0, 1] and reports:
+#   fps        frames each camera reader got through (replay streams)
+#   latency    arrival -> owner YES written to the Arduino, per arrival
+#   missed     arrivals without YES before they left
+#   toggles    YES / NO written (more than one YES per arrival = flicker)
+
+GATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_gate.py")
+SCENARIOS = (("front only", [0]), ("side only", [1]), ("fused", [0, 1]))
+
+
+def make_recording(out, seconds, fps, every, arrival, occlusion, size=(320, 240),
+                   line_period=0.15, seed=0):
+    # -> recording times of the arrivals [(start, end)]
+    rec = replay.Recorder(out)
+    t0 = rec.started
+    rec.meta["synthetic"] = {"seconds": seconds, "fps": fps, "every": every,
+                             "arrival": arrival, "occlusion": occlusion, "cameras": 2}
+    streams = [rec.stream_for(0), rec.stream_for(1)]
+    face_px = (size[1] * 140 // 480, size[1] * 260 // 480)
+    empty, _ = make_frames(30, size, face_prob=0.0, seed=seed + 10)
+    fmt = LINE_FORMATS["camera_gate"]
+
+    def scene(t):
+        k = (t % every) - (every - arrival)
+        if k < 0 or t - k + arrival > seconds:
+            return None                     # nobody there / cut off by the end
+        return k                            # seconds into the arrival
+
+    events = []
+    for stream in streams:
+        faces, _ = make_frames(30, size, face_prob=1.0, face_px=face_px, seed=seed + stream)
+        occluded = random.Random(seed + 100 + stream)
+        offset = stream * 0.5 / fps
+        for i in range(int(seconds * fps)):
+            t = i / fps + offset
+            seen = scene(t) is not None and occluded.random() >= occlusion
+            pool = faces if seen else empty
+            events.append((t, "frame", stream, pool[i % len(pool)]))
+    for i in range(int(seconds / line_period)):
+        events.append((i * line_period, "line", None, None))
+    for t, kind, stream, frame in sorted(events, key=lambda e: (e[0], e[1])):
+        if kind == "frame":
+            rec.frame(t0 + t, frame, stream)
+            continue
+        k = scene(t)
+        dist = max(6, int(150 - 25 * k)) if k is not None else 150
+        line = fmt.format(dist=dist, owner_text="YES" if dist <= 10 else "NO")
+        rec.serial(t0 + t, b"r", line.encode() + b"\r\n")
+    rec.close()
+    first = every - arrival
+    return [(t0 + s, t0 + s + arrival) for s in
+            [first + n * every for n in range(int(seconds // every) + 1)]
+            if s + arrival <= seconds]
+
+
+def run_gate(rec_dir, cameras, verbose):
+    replay._replays.pop(rec_dir, None)     # fresh replay per run
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        rep, _, _ = run_script(GATE, rec_dir, "realtime", False, False, 600, 1.0,
+                               config={"CAMERAS": cameras})
+    return rep.stats()
+
+
+def summarize(name, cameras, stats, arrivals):
+    fps = []
+    for cam in cameras:
+        served = stats["streams"][cam]["served"]
+        span = served[-1][0] - served[0][0] if len(served) > 1 else 0.0
+        fps.append(f"cam{cam} {(len(served) - 1) / span if span > 0 else 0.0:4.1f}")
+
+    writes = [(t, data) for _, t, data in stats["writes"]]
+    latencies, missed = [], 0
+    for start, end in arrivals:
+        yes = [t for t, data in writes if data == b"1" and start <= t <= end]
+        if yes:
+            latencies.append(1000 * (yes[0] - start))
+        else:
+            missed += 1
+    opens = sum(data == b"1" for _, data in writes)
+    closes = sum(data == b"0" for _, data in writes)
+    each = " ".join(f"{ms:5.0f}" for ms in latencies)
+    p50 = f"{percentile(latencies, 50):6.0f}" if latencies else f"{'-':>6}"
+    worst = f"{max(latencies):6.0f}" if latencies else f"{'-':>6}"
+    print(f"{name:<11} {', '.join(fps):<21} {p50} {worst} {missed:>6} {opens:>3}/{closes:<3}  {each}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=60)
+    ap.add_argument("--fps", type=float, default=15)
+    ap.add_argument("--size", default="320x240")
+    ap.add_argument("--every", type=float, default=7, help="an arrival every N s")
+    ap.add_argument("--arrival", type=float, default=4, help="s the person stays")
+    ap.add_argument("--occlusion", type=float, default=0.35)
+    ap.add_argument("--verbose", action="store_true", help="camera_gate.py output")
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_fusion_")
+    try:
+        rec_dir = os.path.join(work, "recording")
+        size = tuple(int(v) for v in args.size.split("x"))
+        arrivals = make_recording(rec_dir, args.seconds, args.fps, args.every,
+                                  args.arrival, args.occlusion, size)
+        print(f"{len(arrivals)} arrivals, {args.fps:.0f} fps per camera, "
+              f"occlusion {args.occlusion:.0%} per camera")
+        print(f"{'cameras':<11} {'fps':<21} {'p50 ms':>6} {'max ms':>6} {'missed':>6} "
+              f"{'YES/NO':<7}  latency per arrival ms")
+        for name, cameras in SCENARIOS:
+            summarize(name, cameras, run_gate(rec_dir, cameras, args.verbose), arrivals)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import lbph_engine
+from face_index import FaceIndex
+from fake_camera import load_faces
+from lbph_engine import LBPHEngine
+
+# Identity lookup time vs household size:
+#   opencv  -> cv2.face.LBPH predict (linear scan)
+#   scan    -> LBPHEngine exact scan with lower-bound pruning
+#   index   -> LBPHEngine + FaceIndex (PQ flat index, exact rerank)
+# Residents are synthesized from the dataset crops: every resident gets a
+# fixed warp + tone curve + texture, every photo a small random jitter.
+# "agree" = same label as the exact scan.
+#
+#   python bench_index.py --residents 1,5,10,20 --images 200
+
+
+def make_resident(faces, seed, count):
+    rng = np.random.default_rng(seed)
+    src = np.float32([[0, 0], [199, 0], [0, 199], [199, 199]])
+    dst = src + rng.uniform(-18, 18, src.shape).astype(np.float32)
+    warp = cv2.getPerspectiveTransform(src, dst)
+    gamma = rng.uniform(0.6, 1.6)
+    curve = np.clip(255 * (np.arange(256) / 255.0) ** gamma, 0, 255).astype(np.uint8)
+    texture = cv2.GaussianBlur(rng.normal(0, 25, (200, 200)), (0, 0), 3)
+
+    photos = []
+    for i in range(count):
+        face = faces[(i * 7 + seed) % len(faces)]
+        out = cv2.warpPerspective(face, warp, (200, 200),
+                                  borderMode=cv2.BORDER_REFLECT)
+        out = cv2.LUT(out, curve).astype(np.float32) + texture
+        shift = np.float32([[1, 0, rng.integers(-4, 5)], [0, 1, rng.integers(-4, 5)]])
+        out = cv2.warpAffine(out, shift, (200, 200), borderMode=cv2.BORDER_REFLECT)
+        out += rng.normal(0, 4, out.shape)
+        photos.append(np.clip(out, 0, 255).astype(np.uint8))
+    return photos
+
+
+def timed(fn, queries):
+    t0 = time.perf_counter()
+    out = [fn(q) for q in queries]
+    return out, 1000.0 * (time.perf_counter() - t0) / len(queries)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--residents", default="1,5,10,20")
+    ap.add_argument("--images", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=20)
+    args = ap.parse_args()
+
+    base = [cv2.resize(f, (200, 200)) for f in load_faces()]
+    counts = [int(n) for n in args.residents.split(",")]
+    people = [make_resident(base, seed, args.images + args.queries)
+              for seed in range(max(counts))]
+
+    print(f"{'residents':>9} {'samples':>8} {'opencv ms':>10} {'scan ms':>8} "
+          f"{'index ms':>9} {'agree':>6} {'build s':>8}")
+    for n in counts:
+        train, labels, queries = [], [], []
+        for label, photos in enumerate(people[:n], start=1):
+            train += photos[:args.images]
+            labels += [label] * args.images
+            queries += photos[args.images:]
+        queries = queries[::max(1, len(queries) // args.queries)][:args.queries]
+
+        cv_rec = cv2.face.LBPHFaceRecognizer_create()
+        cv_rec.train(train, np.array(labels, dtype=np.int32))
+        engine = LBPHEngine.from_recognizer(cv_rec)
+
+        t0 = time.perf_counter()
+        index = FaceIndex.build(engine.hist, engine.grid_x * engine.grid_y)
+        build = time.perf_counter() - t0
+
+        _, t_cv = timed(cv_rec.predict, queries)
+        exact, t_scan = timed(engine.predict, queries)
+        engine.index = index
+        approx, t_index = timed(engine.predict, queries)
+        agree = sum(a[0] == e[0] for a, e in zip(approx, exact)) / len(queries)
+
+        print(f"{n:>9} {len(train):>8} {t_cv:10.2f} {t_scan:8.2f} "
+              f"{t_index:9.2f} {agree:6.0%} {build:8.1f}")
+
+    print(f"(\"numpy-index\" engine: index used from {lbph_engine.INDEX_MIN_SAMPLES} samples)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from fake_camera import load_faces
+from lbph_engine import LBPHEngine
+
+# OpenCV LBPH predict vs lbph_engine.LBPHEngine.
+#   1) decisions on the dataset must be identical (label, conf < threshold)
+#   2) per-face latency as the training set grows (jittered copies of the
+#      dataset crops stand in for more enrolled photos)
+#
+#   python bench_lbph.py --sizes 100,200,500,1000 --batch 3
+
+CONF_THRESHOLD = 70
+
+
+def jitter(face, rng):
+    # small shift + brightness change, like another photo of the same person
+    shift = np.float32([[1, 0, rng.integers(-6, 7)], [0, 1, rng.integers(-6, 7)]])
+    out = cv2.warpAffine(face, shift, (200, 200), borderMode=cv2.BORDER_REFLECT)
+    return np.clip(out.astype(np.int16) + rng.integers(-20, 20), 0, 255).astype(np.uint8)
+
+
+def check_identical(faces):
+    # train on even crops, query odd crops + mirrored/noisy "strangers"
+    rng = np.random.default_rng(0)
+    train, test = faces[0::2], faces[1::2]
+    test = test + [cv2.flip(f, 0) for f in test[:20]]
+    test += [rng.integers(0, 256, (200, 200), dtype=np.uint8) for _ in range(10)]
+
+    cv_rec = cv2.face.LBPHFaceRecognizer_create()
+    cv_rec.train(train, np.ones(len(train), dtype=np.int32))
+    engine = LBPHEngine.from_recognizer(cv_rec)
+
+    ours = engine.predict_batch(test)
+    mismatch = 0
+    max_diff = 0.0
+    for face, (label, conf) in zip(test, ours):
+        cv_label, cv_conf = cv_rec.predict(face)
+        max_diff = max(max_diff, abs(cv_conf - conf))
+        if (cv_label, cv_conf < CONF_THRESHOLD) != (label, conf < CONF_THRESHOLD):
+            mismatch += 1
+    print(f"decisions: {len(test)} faces, {mismatch} different, "
+          f"max |conf diff| = {max_diff:.2e}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100,200,500,1000")
+    ap.add_argument("--batch", type=int, default=3, help="faces per frame")
+    ap.add_argument("--rounds", type=int, default=10)
+    args = ap.parse_args()
+
+    faces = [cv2.resize(f, (200, 200)) for f in load_faces()]
+    check_identical(faces)
+
+    rng = np.random.default_rng(1)
+    queries = [jitter(faces[i % len(faces)], rng) for i in range(args.batch)]
+    print(f"{'train size':>10} {'opencv ms/face':>15} {'numpy ms/face':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        train = [jitter(faces[i % len(faces)], rng) for i in range(size)]
+        cv_rec = cv2.face.LBPHFaceRecognizer_create()
+        cv_rec.train(train, np.ones(size, dtype=np.int32))
+        engine = LBPHEngine.from_recognizer(cv_rec)
+
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            for q in queries:
+                cv_rec.predict(q)
+        t_cv = (time.perf_counter() - t0) / (args.rounds * len(queries))
+
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            engine.predict_batch(queries)
+        t_np = (time.perf_counter() - t0) / (args.rounds * len(queries))
+
+        print(f"{size:>10} {1000 * t_cv:15.2f} {1000 * t_np:14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import contextlib
+import os
+import time
+import urllib.request
+
+import face_engine
+import metrics
+from bench_common import bench_recognizer, report
+from fake_camera import make_frames
+
+# Cost of the metrics/logging instrumentation compared to the frame time.
+#
+#   python bench_metrics.py --frames 300
+#
+# 1. per call: Histogram.observe(), Histogram.time(), Counter.inc(),
+#    EventLog.info() (rate limited) vs the old print("[DATA]", event)
+# 2. per frame: cvtColor + detect + predict on synthetic frames, bare and
+#    with the same observe() calls vision_pipeline.py makes per frame
+#    (interleaved, so CPU clock changes hit both the same)
+# 3. one scrape of /metrics (render + HTTP) with the registry filled
+
+CONF_THRESHOLD = 70
+EVENT = {"timestamp": 1700000000, "distance_cm": 42, "pir_motion": True,
+         "session_active": True, "owner": False, "gate_open": False, "lamp_on": False}
+
+
+def per_call(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def bench_calls(n):
+    reg = metrics.Registry()
+    hist = reg.histogram("bench_seconds")
+    count = reg.counter("bench_total")
+    log = metrics.EventLog("bench", every=1.0)
+
+    def timed():
+        with hist.time():
+            pass
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        costs = {
+            "observe": per_call(lambda: hist.observe(0.004), n),
+            "time() context": per_call(timed, n),
+            "counter inc": per_call(count.inc, n),
+            "perf_counter": per_call(time.perf_counter, n),
+            "log.info (limited)": per_call(lambda: log.info("data", **EVENT), n),
+            "print [DATA] (devnull)": per_call(lambda: print("[DATA]", EVENT), n // 10),
+        }
+    for name, sec in costs.items():
+        print(f"{name:<28} {1e6 * sec:8.3f} us/call")
+    return costs
+
+
+def bench_frames(frames, recognizer, cascade, rounds):
+    hists = [metrics.Histogram(f"h{i}") for i in range(4)]
+
+    def bare(frame):
+        gray = face_engine.to_gray(frame)
+        faces = face_engine.detect_faces(cascade, gray)
+        face_engine.recognize_faces(recognizer, gray, faces, CONF_THRESHOLD)
+
+    def instrumented(frame):
+        # what VisionPipeline does per frame: capture/cvtcolor/detect/predict
+        t0 = time.perf_counter()
+        hists[0].observe(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        gray = face_engine.to_gray(frame)
+        t1 = time.perf_counter()
+        faces = face_engine.detect_faces(cascade, gray)
+        t2 = time.perf_counter()
+        hists[1].observe(t1 - t0)
+        hists[2].observe(t2 - t1)
+        t0 = time.perf_counter()
+        face_engine.recognize_faces(recognizer, gray, faces, CONF_THRESHOLD)
+        hists[3].observe(time.perf_counter() - t0)
+
+    times = {"bare": [], "instrumented": []}
+    for _ in range(rounds):
+        for name, fn in (("bare", bare), ("instrumented", instrumented)):
+            for frame in frames:
+                t0 = time.perf_counter()
+                fn(frame)
+                times[name].append(time.perf_counter() - t0)
+    for name, samples in times.items():
+        report(f"frame {name}", samples)
+    return times
+
+
+def bench_scrape():
+    server = metrics.serve(0)
+    port = server.server_address[1]
+    t0 = time.perf_counter()
+    body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics").read()
+    took = time.perf_counter() - t0
+    server.shutdown()
+    lines = body.decode().splitlines()
+    print(f"{'scrape /metrics':<28} {1000 * took:8.2f} ms  "
+          f"{len(lines)} lines, {len(body)} bytes")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=120)
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--calls", type=int, default=200000)
+    args = ap.parse_args()
+
+    costs = bench_calls(args.calls)
+    print()
+
+    import vision_pipeline      # noqa: F401  registers the gate_* metrics
+    cascade = face_engine.load_cascade()
+    recognizer = bench_recognizer()
+    frames, _ = make_frames(args.frames, face_prob=0.7)
+    times = bench_frames(frames, recognizer, cascade, args.rounds)
+
+    frame_s = sum(times["bare"]) / len(times["bare"])
+    measured = sum(times["instrumented"]) / len(times["instrumented"]) - frame_s
+    # 4 observe() + 6 perf_counter() per frame
+    per_frame = 4 * costs["observe"] + 6 * costs["perf_counter"]
+    print(f"{'overhead (from call cost)':<28} {1e6 * per_frame:8.2f} us/frame "
+          f"= {100 * per_frame / frame_s:.3f}% of {1000 * frame_s:.1f} ms")
+    print(f"{'overhead (measured, noisy)':<28} {1e6 * measured:8.2f} us/frame "
+          f"= {100 * measured / frame_s:+.3f}%")
+    print()
+
+    # fill the real registry a bit, then scrape it like Prometheus would
+    for h in (vision_pipeline.DETECT_SECONDS, vision_pipeline.PREDICT_SECONDS):
+        for s in times["bare"]:
+            h.observe(s)
+    bench_scrape()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import face_engine
+import lbph_engine
+from bench_common import pss_kb, report
+from lbph_engine import LBPHEngine
+
+# face_model.yml (OpenCV YAML) vs <model>.lbph (lbph_engine binary, mmap).
+#
+#   python bench_modelfile.py --sizes 0,500,2000 --runs 5 --procs 4
+#
+#   verify  face_model.yml -> .lbph -> LBPHEngine.from_binary: histograms
+#           and labels bit-identical, predictions on dataset faces (and
+#           their mirror images) compared with OpenCV's predict
+#   load    per model size (0 = face_model.yml as it is, else that many
+#           samples tiled from it): cv2 LBPHFaceRecognizer.read(),
+#           LBPHEngine.from_file() from the YAML, from_binary(), and the
+#           first predict after from_binary (pages faulted in)
+#   memory  --procs processes load the biggest model and wait; PSS of all
+#           of them minus the same processes with nothing loaded
+
+HOLD = """
+import sys, time
+import cv2, numpy
+from lbph_engine import LBPHEngine
+mode, path = sys.argv[1], sys.argv[2]
+if mode == "yaml":
+    engine = LBPHEngine.from_file(path, use_index=False, use_binary=False)
+elif mode == "binary":
+    engine = LBPHEngine.from_binary(path)
+    engine.hist.sum()            # touch every page, like predicting does
+print("ready", flush=True)
+time.sleep(60)
+"""
+
+
+def timed(fn, runs):
+    costs, result = [], None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        result = fn()
+        costs.append(time.perf_counter() - t0)
+    return costs, result
+
+
+def verify(model, faces):
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(model)
+    ref = LBPHEngine.from_recognizer(recognizer)
+    path = lbph_engine.binary_path(model)
+    ref.save_binary(path, face_engine.load_labels(model), lbph_engine.source_stamp(model))
+    loaded = LBPHEngine.from_binary(path, source=model)
+    same = (np.array_equal(ref.hist, loaded.hist) and np.array_equal(ref.labels, loaded.labels)
+            and all(np.array_equal(a[2], b[2]) for a, b in zip(ref.levels, loaded.levels)))
+    result = lbph_engine.compare(recognizer, loaded, faces)
+    print(f"verify: arrays identical={same}  {result}")
+
+
+def make_model(base, samples, work):
+    # `samples` histograms tiled from the real model, YAML + .lbph
+    rows = np.resize(np.arange(len(base.labels)), samples)
+    hist, labels = base.hist[rows], base.labels[rows]
+    model = os.path.join(work, f"model_{samples}.yml")
+    lbph_engine.write_model(model, hist, labels)
+    LBPHEngine(hist, labels).save_binary(lbph_engine.binary_path(model), {},
+                                         lbph_engine.source_stamp(model))
+    return model
+
+
+def hold_pss(mode, path, procs):
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(lbph_engine.__file__)))
+    children = [subprocess.Popen([sys.executable, "-c", HOLD, mode, path], env=env,
+                                 stdout=subprocess.PIPE, text=True) for _ in range(procs)]
+    try:
+        for p in children:
+            p.stdout.readline()
+        return sum(pss_kb(p.pid) for p in children)
+    finally:
+        for p in children:
+            p.kill()
+            p.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="face_model.yml")
+    ap.add_argument("--sizes", default="0,500,2000")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--verify", type=int, default=200)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_modelfile_")
+    try:
+        model = os.path.join(work, "face_model.yml")
+        shutil.copyfile(args.model, model)
+        verify(model, lbph_engine.dataset_faces(count=args.verify))
+        base = LBPHEngine.from_binary(lbph_engine.binary_path(model))
+        face = lbph_engine.dataset_faces(count=1)[0]
+
+        for size in [int(s) for s in args.sizes.split(",")]:
+            path = model if size == 0 else make_model(base, size, work)
+            mb_yaml = os.path.getsize(path) / 2**20
+            mb_bin = os.path.getsize(lbph_engine.binary_path(path)) / 2**20
+            print()
+            print(f"{len(LBPHEngine.from_binary(lbph_engine.binary_path(path)).labels)} samples: "
+                  f"YAML {mb_yaml:.1f} MB, .lbph {mb_bin:.1f} MB")
+
+            def cv_read():
+                rec = cv2.face.LBPHFaceRecognizer_create()
+                rec.read(path)
+                return rec
+            report("cv2 read (YAML)", timed(cv_read, args.runs)[0])
+            report("from_file (YAML)", timed(lambda: LBPHEngine.from_file(
+                path, use_index=False, use_binary=False), args.runs)[0])
+            report("from_binary", timed(lambda: LBPHEngine.from_binary(
+                lbph_engine.binary_path(path), source=path), args.runs)[0])
+            first = []
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                LBPHEngine.from_binary(lbph_engine.binary_path(path)).predict(face)
+                first.append(time.perf_counter() - t0)
+            report("from_binary + 1st predict", first)
+            last = path
+
+        if args.procs:
+            idle = hold_pss("none", last, args.procs)
+            yaml_kb = hold_pss("yaml", last, args.procs) - idle
+            bin_kb = hold_pss("binary", lbph_engine.binary_path(last), args.procs) - idle
+            print()
+            print(f"memory, {args.procs} processes with the last model: "
+                  f"YAML {yaml_kb / 1024:.1f} MB, .lbph {bin_kb / 1024:.1f} MB (PSS, summed)")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
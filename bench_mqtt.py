@@ -0,0 +1,125 @@
+import argparse
+import json
+import random
+import time
+
+import paho.mqtt.client as mqtt
+
+from bench_common import report
+from fake_broker import FakeBroker
+from state_publisher import StatePublisher, set_will
+
+# MQTT traffic of smart_home_gateway_modelb.py over a simulated day of
+# sensor samples, sent through paho to a local broker stand-in:
+#   legacy    -> 7 mqtt_pub() calls every MQTT_INTERVAL (old gateway)
+#   changed   -> StatePublisher: changed legacy topics + packed state + event
+#   packed    -> StatePublisher with the packed state topic only
+# Simulated clock, so --minutes of traffic are pushed as fast as possible
+# (also gives messages/sec through paho + TCP).
+#
+#   python bench_mqtt.py --minutes 60 --interval 0.5
+
+BASE = "aiu/gate/aria"
+NUMBERS = ("distance_cm",)
+FLAGS = ("pir_motion", "session_active", "owner", "gate_open", "lamp_on")
+
+
+def simulate(ticks, interval, seed=0):
+    # idle hallway with ultrasonic noise, an arrival about every 2 minutes
+    rng = random.Random(seed)
+    out, arrival = [], None
+    for i in range(ticks):
+        now = i * interval
+        if arrival is None and rng.random() < interval / 120.0:
+            arrival = now
+        t = now - arrival if arrival is not None else None
+        if t is not None and t > 25:
+            arrival = t = None
+        state = {"distance_cm": 150 + rng.choice((-1, 0, 0, 1)),
+                 "pir_motion": False, "session_active": False,
+                 "owner": False, "gate_open": False}
+        if t is not None:
+            state.update(pir_motion=t < 8, session_active=True,
+                         distance_cm=max(6, int(150 - 30 * t)) if t < 12 else 8,
+                         owner=t > 4, gate_open=4 < t < 20)
+        state["lamp_on"] = state["gate_open"]
+        out.append((now, state))
+    return out
+
+
+def legacy_publish(client, now, state):
+    event = dict(state, timestamp=int(now))
+    for name in NUMBERS + FLAGS:
+        client.publish(f"{BASE}/{name}", str(int(state[name])))
+    client.publish(f"{BASE}/event", json.dumps(event))
+
+
+def run(name, broker, samples, make_publish, interval):
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    set_will(client, BASE)
+    client.connect("127.0.0.1", broker.port, 60)
+    client.loop_start()
+    publish = make_publish(client)
+    time.sleep(0.2)
+    broker.reset_counters()
+
+    costs = []
+    t0 = time.perf_counter()
+    for now, state in samples:
+        t = time.perf_counter()
+        publish(now, state)
+        costs.append(time.perf_counter() - t)
+    # until the broker saw everything
+    seen = -1
+    while seen != len(broker.published):
+        seen = len(broker.published)
+        elapsed = time.perf_counter() - t0
+        time.sleep(0.2)
+    client.loop_stop()
+    client.disconnect()
+
+    msgs = len(broker.published)
+    minutes = len(samples) * interval / 60.0
+    report(f"{name} publish()", costs)
+    print(f"{'':<28} msgs={msgs:<6} ({msgs / minutes:6.1f}/min)  "
+          f"wire={broker.publish_bytes / 1024:8.1f} KiB "
+          f"({broker.publish_bytes / minutes / 1024:5.1f} KiB/min)  "
+          f"throughput={msgs / max(elapsed, 1e-6):8.0f} msg/s")
+    return msgs, broker.publish_bytes
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--minutes", type=float, default=60)
+    ap.add_argument("--interval", type=float, default=0.5, help="MQTT_INTERVAL")
+    ap.add_argument("--heartbeat", type=float, default=10.0)
+    ap.add_argument("--deadband", type=int, default=1)
+    args = ap.parse_args()
+
+    samples = simulate(int(args.minutes * 60 / args.interval), args.interval)
+
+    def legacy(client):
+        return lambda now, state: legacy_publish(client, now, state)
+
+    def publisher(**kwargs):
+        def make(client):
+            pub = StatePublisher(client, BASE, NUMBERS, FLAGS, heartbeat=args.heartbeat,
+                                 deadband=args.deadband, **kwargs)
+            pub.announce()
+            return lambda now, state: pub.update(
+                state, dict(state, timestamp=int(now)), now)
+        return make
+
+    with FakeBroker() as broker:
+        base = run("legacy", broker, samples, legacy, args.interval)
+        rows = [("changed", run("changed", broker, samples, publisher(), args.interval)),
+                ("packed", run("packed", broker, samples,
+                               publisher(legacy=False), args.interval))]
+    print()
+    for name, (msgs, size) in rows:
+        print(f"{name:<8} {msgs / base[0]:6.1%} of legacy messages, "
+              f"{size / base[1]:6.1%} of legacy bytes")
+
+
+if __name__ == "__main__":
+    main()
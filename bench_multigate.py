@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import cpu_seconds, pss_kb
+
+# Memory / CPU of the multi-gate gateway (multi_gate.py) for 1, 4 and 8
+# gates, each gate replaying its own synthetic modelb-binary recording
+# (bench_replay.make_recording, an arrival every 10 s so sessions keep
+# running). Every gate count runs in a fresh child process; MQTT goes to a
+# FakeBroker in this process, Firebase to fake_firebase.FakeDatabase.
+#
+#   python bench_multigate.py --gates 1 4 8 --seconds 30
+#
+# Needs face_model.yml (+ dataset/) in the working directory.
+#
+#   pss       proportional set size (/proc/<pid>/smaps_rollup), gateway
+#             process + vision workers; pages shared between them (numpy,
+#             OpenCV, the model loaded before fork) are split, not doubled
+#   cpu       user+sys seconds / wall seconds over the measured window,
+#             gateway + workers (1.0 = one core busy)
+#   replay    JPEG bytes of the recordings held in memory by the replay
+#             (a real camera has no such cost), included in pss
+#
+# "N x 1 gate" is what N copies of the single gate process would take,
+# "MB/extra gate" the pss growth per added gate without the replay data.
+
+
+# ================= child: one gateway =================
+def run_child(args):
+    import paho.mqtt.client as mqtt
+
+    import multi_gate
+    from event_sink import EventSink
+    from fake_firebase import FakeDatabase
+
+    gates = [{"id": f"gate{i}", "replay": os.path.join(args.rec_dir, f"gate{i}"),
+              "protocol": "binary"} for i in range(args.child)]
+    gates = [dict(multi_gate.GATE_DEFAULTS, **g) for g in gates]
+
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.connect("127.0.0.1", args.broker_port, 60)
+    client.loop_start()
+    sink = EventSink(FakeDatabase(latency=0.02, jitter=0.01, seed=0).reference("gate_logs"),
+                     os.path.join(args.rec_dir, f"spool{args.child}.db")).start()
+    gw = multi_gate.MultiGateway(gates, client, "bench/multi", sink,
+                                 workers=args.workers, fps=args.fps)
+    gw.start_pools()
+    gw.announce()
+    workers = [p.pid for p in gw.vision_pool._processes.values()]
+    pids = [os.getpid()] + workers
+
+    async def measure():
+        stop = asyncio.Event()
+        task = asyncio.create_task(gw.run(stop))
+        await asyncio.sleep(args.warmup)
+        cpu0, t0 = sum(cpu_seconds(p) for p in pids), time.monotonic()
+        frames0 = sum(g.frames for g in gw.gates)
+        await asyncio.sleep(args.seconds)
+        wall = time.monotonic() - t0
+        result = {
+            "gates": args.child,
+            "workers": len(workers),
+            "pss_kb": sum(pss_kb(p) for p in pids),
+            "gateway_pss_kb": pss_kb(os.getpid()),
+            "cpu": (sum(cpu_seconds(p) for p in pids) - cpu0) / wall,
+            "fps": (sum(g.frames for g in gw.gates) - frames0) / wall / args.child,
+            "replay_kb": sum(len(j) for r in gw._replays.values()
+                             for _, j in r.frames) // 1024,
+            "samples": sum(g.serial.samples for g in gw.gates),
+            "threads": len(os.listdir("/proc/self/task")),
+        }
+        stop.set()
+        await task
+        return result
+
+    try:
+        result = asyncio.run(measure())
+    finally:
+        gw.close()
+        sink.close()
+        client.loop_stop()
+        client.disconnect()
+    print("RESULT " + json.dumps(result), flush=True)
+
+
+# ================= parent =================
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--gates", type=int, nargs="+", default=[1, 4, 8])
+    ap.add_argument("--seconds", type=float, default=30.0, help="measured window")
+    ap.add_argument("--warmup", type=float, default=5.0)
+    ap.add_argument("--fps", type=float, default=5.0, help="frames/s per gate")
+    ap.add_argument("--workers", type=int, default=None, help="vision processes")
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--rec-dir", help=argparse.SUPPRESS)
+    ap.add_argument("--broker-port", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    from bench_replay import make_recording
+    from fake_broker import FakeBroker
+
+    tmp = tempfile.mkdtemp(prefix="multigate_")
+    length = args.warmup + args.seconds + 5
+    for i in range(max(args.gates)):
+        make_recording(os.path.join(tmp, f"gate{i}"), seconds=length, fps=args.fps,
+                       line_format="modelb-binary", every=10.0, arrival=8.0, seed=i)
+
+    results = {}
+    with FakeBroker() as broker:
+        for n in args.gates:
+            cmd = [sys.executable, __file__, "--child", str(n), "--rec-dir", tmp,
+                   "--broker-port", str(broker.port), "--seconds", str(args.seconds),
+                   "--warmup", str(args.warmup), "--fps", str(args.fps)]
+            if args.workers:
+                cmd += ["--workers", str(args.workers)]
+            out = subprocess.run(cmd, capture_output=True, text=True)
+            line = [l for l in out.stdout.splitlines() if l.startswith("RESULT ")]
+            if out.returncode or not line:
+                print(out.stdout[-2000:], out.stderr[-2000:])
+                raise SystemExit(f"{n} gates: child failed")
+            results[n] = json.loads(line[0][7:])
+        published = len(broker.published)
+
+    print()
+    print(f"{'gates':>5} {'workers':>7} {'pss MB':>8} {'gateway':>8} {'replay':>7} "
+          f"{'cpu':>6} {'fps/gate':>8} {'threads':>7} {'N x 1 gate':>16} {'MB/extra gate':>13}")
+    one = results.get(1)
+    for n, r in results.items():
+        alone = extra = ""
+        if one:
+            alone = f"{n * one['pss_kb'] / 1024:6.0f} MB {n * one['cpu']:5.2f}"
+            if n > 1:
+                # without the replay's JPEGs (a camera does not hold those)
+                grow = (r["pss_kb"] - r["replay_kb"]) - (one["pss_kb"] - one["replay_kb"])
+                extra = f"{grow / 1024 / (n - 1):.1f}"
+        print(f"{n:>5} {r['workers']:>7} {r['pss_kb'] / 1024:8.1f} "
+              f"{r['gateway_pss_kb'] / 1024:8.1f} {r['replay_kb'] / 1024:7.1f} "
+              f"{r['cpu']:6.2f} {r['fps']:8.2f} {r['threads']:>7} {alone:>16} {extra:>13}")
+    print(f"MQTT messages published: {published}")
+
+
+if __name__ == "__main__":
+    main()
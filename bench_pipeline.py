@@ -0,0 +1,77 @@
+import argparse
+import time
+
+import face_engine
+from bench_common import bench_recognizer, report
+from fake_camera import SyntheticCamera
+from vision_pipeline import VisionPipeline
+
+# Frames evaluated per second and decision latency (capture -> recognition
+# result) for the old single-thread loop vs VisionPipeline.
+#
+#   python bench_pipeline.py --seconds 10 --workers 3
+
+CONF_THRESHOLD = 70
+
+
+def run_serial(cam, cascade, recognizer, seconds):
+    latencies = []
+    t_end = time.time() + seconds
+    while time.time() < t_end:
+        ret, frame = cam.read()
+        stamp = time.time()
+        if not ret:
+            break
+        gray = face_engine.to_gray(frame)
+        faces = face_engine.detect_faces(cascade, gray)
+        face_engine.recognize_faces(recognizer, gray, faces, CONF_THRESHOLD)
+        latencies.append(time.time() - stamp)
+    return latencies, None
+
+
+def run_pipeline(cam, cascade, recognizer, seconds, workers):
+    pipe = VisionPipeline(cam, cascade, recognizer, CONF_THRESHOLD,
+                          detect_workers=workers).start()
+    latencies = []
+    last_seq = 0
+    t_end = time.time() + seconds
+    try:
+        while time.time() < t_end:
+            r = pipe.wait_result(last_seq, timeout=0.5)
+            if r is None:
+                continue
+            last_seq = r.seq
+            latencies.append(r.done - r.stamp)
+    finally:
+        pipe.stop()
+    return latencies, pipe.counters()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--fps", type=float, default=30.0, help="camera fps")
+    ap.add_argument("--workers", type=int, default=3)
+    args = ap.parse_args()
+
+    cascade = face_engine.load_cascade()
+    recognizer = bench_recognizer()
+
+    cam = SyntheticCamera(fps=args.fps)
+    lat, _ = run_serial(cam, cascade, recognizer, args.seconds)
+    report("serial loop latency", lat)
+    print(f"{'':<28} frames evaluated/s={len(lat) / args.seconds:6.1f}")
+
+    cam = SyntheticCamera(fps=args.fps)
+    lat, c = run_pipeline(cam, cascade, recognizer, args.seconds, args.workers)
+    report(f"pipeline x{args.workers} latency", lat)
+    print(f"{'':<28} frames evaluated/s={len(lat) / args.seconds:6.1f}")
+    for stage in ("capture", "detect", "recognize"):
+        print(f"{'':<28} {stage:<10} {c[stage + '_fps']:6.1f}/s  "
+              f"{c[stage + '_ms']:6.2f} ms/item")
+    print(f"{'':<28} dropped det_q={c['det_q_dropped']} "
+          f"rec_q={c['rec_q_dropped']} late={c['late_dropped']}")
+
+
+if __name__ == "__main__":
+    main()
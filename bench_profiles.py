@@ -0,0 +1,83 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+import face_engine
+from fake_camera import load_faces, make_frames
+
+# ms/frame, detection rate and recognition accuracy per detection profile.
+# Dataset faces are composited into synthetic backgrounds at the face sizes
+# of each scene. The LBPH model is trained on the even-numbered crops and
+# evaluated on frames built from the odd ones.
+#
+#   python bench_profiles.py --frames 200
+
+CONF_THRESHOLD = 70
+
+# scene -> face size range in pixels (640x480 frame)
+SCENES = {
+    "near-gate": (150, 320),
+    "hallway": (60, 140),
+}
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def evaluate(frames, truth, cascade, recognizer, profile):
+    detect = face_engine.make_detector(cascade, profile)
+    with_face = found = owner_ok = 0
+    t0 = time.perf_counter()
+    for frame, box in zip(frames, truth):
+        gray = face_engine.to_gray(frame)
+        faces = detect(gray)
+        rec = face_engine.recognize_faces(recognizer, gray, faces,
+                                          CONF_THRESHOLD)
+        if box is None:
+            continue
+        with_face += 1
+        if any(iou(box, f) > 0.4 for f in faces):
+            found += 1
+        if rec.owner:
+            owner_ok += 1
+    elapsed = time.perf_counter() - t0
+    return {
+        "ms": 1000.0 * elapsed / len(frames),
+        "det": found / max(1, with_face),
+        "acc": owner_ok / max(1, with_face),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", type=int, default=120)
+    args = ap.parse_args()
+
+    faces = load_faces()
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    train = faces[0::2]
+    recognizer.train(train, np.ones(len(train), dtype=np.int32))
+    test = faces[1::2]
+
+    cascade = face_engine.load_cascade()
+    print(f"{'scene':<10} {'profile':<10} {'ms/frame':>9} "
+          f"{'detected':>9} {'owner ok':>9}")
+    for scene, face_px in SCENES.items():
+        frames, truth = make_frames(args.frames, face_px=face_px,
+                                    face_prob=1.0, faces=test, seed=3)
+        for profile in face_engine.DETECT_PROFILES:
+            r = evaluate(frames, truth, cascade, recognizer, profile)
+            print(f"{scene:<10} {profile:<10} {r['ms']:9.2f} "
+                  f"{r['det']:9.1%} {r['acc']:9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import random
+import re
+import time
+
+import serial
+
+import serial_frame
+from bench_common import percentile, report
+from fake_arduino import BINARY, FORMAT_MODELB, FakeArduino
+from serial_link import SerialLink, parse_line
+
+# CSV lines + regex vs binary frames (serial_frame.py) on the Arduino link.
+#
+#   python bench_protocol.py --samples 20000 --seconds 5
+#
+# 1. parse: the same status samples as CSV lines and as frames, fed in
+#    random chunk sizes (like ser.read(in_waiting)); samples/s of the
+#    SerialLink line splitting + regex vs FrameDecoder
+# 2. corruption: random byte flips; how many samples each path delivers
+#    and how many of those carry values that were never sent
+# 3. pty loopback: FakeArduino + SerialLink, CSV at 9600 baud vs binary at
+#    115200 (UART time simulated by the fake); latency from link.send()
+#    to the command being applied on the "Arduino"
+
+csv_pat = re.compile(
+    r"^DIST,(\d+),PIR,([01]),SESSION,([01]),OWNER,([01]),GATE,([01])$"
+)
+NAMES = ("distance", "pir", "session", "owner", "gate")
+
+
+def make_samples(n, seed=0):
+    rng = random.Random(seed)
+    return [{"distance": rng.randrange(0, 1000), "pir": rng.random() < 0.3,
+             "session": rng.random() < 0.5, "owner": rng.random() < 0.3,
+             "gate": rng.random() < 0.1} for _ in range(n)]
+
+
+def as_csv(samples):
+    return b"".join(FORMAT_MODELB.format(
+        dist=s["distance"], pir=int(s["pir"]), session=int(s["session"]),
+        owner=int(s["owner"]), gate=int(s["gate"])).encode() + b"\r\n" for s in samples)
+
+
+def as_frames(samples):
+    return b"".join(serial_frame.encode_status(s, i) for i, s in enumerate(samples))
+
+
+def chunks(data, seed=1, max_chunk=64):
+    rng = random.Random(seed)
+    i = 0
+    out = []
+    while i < len(data):
+        n = rng.randint(1, max_chunk)
+        out.append(data[i:i + n])
+        i += n
+    return out
+
+
+def parse_csv(parts):
+    # same splitting as SerialLink._read_loop
+    out = []
+    buf = bytearray()
+    for chunk in parts:
+        buf += chunk
+        while True:
+            nl = buf.find(b"\n")
+            if nl < 0:
+                break
+            raw = bytes(buf[:nl])
+            del buf[:nl + 1]
+            fields = parse_line(csv_pat, NAMES, raw.decode(errors="ignore").strip())
+            if fields is not None:
+                out.append(fields)
+        if len(buf) > 256:
+            buf.clear()
+    return out
+
+
+def parse_frames(parts):
+    dec = serial_frame.FrameDecoder()
+    out = []
+    for chunk in parts:
+        out.extend(fields for _, fields in dec.feed(chunk))
+    return out, dec
+
+
+def corrupt(data, rate, seed=2):
+    rng = random.Random(seed)
+    buf = bytearray(data)
+    flips = 0
+    for i in range(len(buf)):
+        if rng.random() < rate:
+            buf[i] ^= 1 << rng.randrange(8)
+            flips += 1
+    return bytes(buf), flips
+
+
+def key(fields):
+    return tuple(int(fields[n]) for n in NAMES)
+
+
+def bench_parse(samples):
+    csv, frames = as_csv(samples), as_frames(samples)
+    print(f"bytes/sample: csv={len(csv) / len(samples):.1f} "
+          f"binary={len(frames) / len(samples):.1f}")
+    csv_parts, frame_parts = chunks(csv), chunks(frames)
+    for name, fn, parts in (("csv + regex", parse_csv, csv_parts),
+                            ("binary frames", lambda p: parse_frames(p)[0], frame_parts)):
+        best = None
+        for _ in range(3):
+            t0 = time.perf_counter()
+            got = fn(parts)
+            took = time.perf_counter() - t0
+            best = took if best is None else min(best, took)
+        assert [key(g) for g in got] == [key(s) for s in samples], name
+        print(f"{'parse ' + name:<28} {len(samples) / best:10.0f} samples/s  "
+              f"{1e6 * best / len(samples):6.2f} us/sample")
+
+
+def bench_corruption(samples, rate):
+    sent = {key(s) for s in samples}
+    csv, flips = corrupt(as_csv(samples), rate)
+    got = parse_csv(chunks(csv))
+    wrong = sum(key(g) not in sent for g in got)
+    print(f"{'corrupt csv':<28} flips={flips:<5} delivered={len(got)}/{len(samples)} "
+          f"wrong values={wrong}")
+    frames, flips = corrupt(as_frames(samples), rate)
+    got, dec = parse_frames(chunks(frames))
+    wrong = sum(key(g) not in sent for g in got)
+    print(f"{'corrupt binary':<28} flips={flips:<5} delivered={len(got)}/{len(samples)} "
+          f"wrong values={wrong} crc_errors={dec.crc_errors} lost={dec.lost}")
+
+
+def bench_loopback(protocol, baud, seconds, interval=0.05):
+    fmt = BINARY if protocol == "binary" else FORMAT_MODELB
+    fake = FakeArduino(fmt, baud=baud, seed=1).start()
+    ser = serial.Serial(fake.port, baud, timeout=1)
+    if protocol == "binary":
+        link = SerialLink(ser, decoder=serial_frame.FrameDecoder(),
+                          encode=serial_frame.encode_command).start()
+    else:
+        link = SerialLink(ser, csv_pat, NAMES).start()
+    sent = []
+    try:
+        t_end = time.time() + seconds
+        owner = False
+        while time.time() < t_end:
+            owner = not owner
+            cmd = b"O1" if owner else b"O0"
+            sent.append((time.time(), cmd))
+            link.send(cmd)
+            time.sleep(interval)
+        time.sleep(0.3)
+    finally:
+        link.close()
+        ser.close()
+        fake.stop()
+    lat = [r[0] - s[0] for s, r in zip(sent, fake.received) if s[1] == r[1]]
+    report(f"command {protocol} @{baud}", lat)
+    print(f"{'':<28} commands={len(sent)} applied={len(fake.received)} "
+          f"status samples={link.lines_ok} bad={link.lines_bad}")
+    return lat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--samples", type=int, default=20000)
+    ap.add_argument("--corrupt", type=float, default=1e-3, help="byte flip probability")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--csv-baud", type=int, default=9600)
+    ap.add_argument("--baud", type=int, default=115200)
+    args = ap.parse_args()
+
+    samples = make_samples(args.samples)
+    bench_parse(samples)
+    print()
+    bench_corruption(samples, args.corrupt)
+    print()
+    csv = bench_loopback("csv", args.csv_baud, args.seconds)
+    binary = bench_loopback("binary", args.baud, args.seconds)
+    if csv and binary:
+        print(f"command p50: csv {1000 * percentile(csv, 50):.2f} ms -> "
+              f"binary {1000 * percentile(binary, 50):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+
+import face_engine
+import replay
+from bench_common import bench_recognizer, percentile
+from detect_scheduler import DetectScheduler
+from fake_camera import load_faces, make_frames
+from recognition_cache import HASH_MAX_BITS, RecognitionCache
+
+# Recognition cache (recognition_cache.py) on a replayed scene with known
+# ground truth, against predicting every face every frame.
+#
+#   python bench_reccache.py --cycles 4 --ttl 1.0 3.0
+#
+# The recording (fast replay, every frame processed) repeats:
+#   empty 1 s | owner 4 s | empty 1 s | look-alike 4 s | empty 1 s |
+#   owner 2 s -> look-alike 3 s in the same spot (swap)
+# The look-alike is the owner's face flipped, stretched and contrast
+# changed: LBPH puts it just above the threshold (median ~72) and about one
+# frame in four below it.
+#
+# Every frame: near-gate detection (DetectScheduler) -> recognize_faces ->
+# a 3-frames-on / 6-frames-off debounce (ON_FRAMES / OFF_FRAMES).
+#
+#   predicts/s      LBPH predictions per second of recording
+#   decision        owner arrival -> debounced owner (recording time)
+#   false accept    frames with the debounced owner on while the owner is
+#                   not in the picture, the OFF_FRAMES hold after the
+#                   owner leaves not counted; "raw" = single-frame owner
+#                   flag on look-alike frames
+
+FPS = 15.0
+CONF_THRESHOLD = 70
+ON_FRAMES = 3
+OFF_FRAMES = 6
+SCENE = [(1.0, None), (4.0, "owner"), (1.0, None), (4.0, "lookalike"), (1.0, None),
+         (2.0, "owner"), (3.0, "lookalike")]
+
+
+def lookalike(face):
+    w = face.shape[1]
+    other = cv2.flip(cv2.resize(face[:, w // 6: -(w // 6)], face.shape[::-1]), 1)
+    return cv2.addWeighted(other, 0.3, cv2.equalizeHist(other), 0.7, 0)
+
+
+def make_scene(out, cycles, seed=0):
+    owner = load_faces()
+    other = [lookalike(f) for f in owner]
+    rec = replay.Recorder(out)
+    t0 = rec.started
+    truth = []                       # per frame: None / "owner" / "lookalike"
+    k = 0
+    for c in range(cycles):
+        # segments with a face are rendered in runs, so the swap keeps the box drifting
+        runs, run = [], []
+        for seconds, who in SCENE:
+            n = int(seconds * FPS)
+            if who is None:
+                if run:
+                    runs.append(run)
+                    run = []
+                runs.append([None] * n)
+            else:
+                run += [who] * n
+        if run:
+            runs.append(run)
+        for r, run in enumerate(runs):
+            seed_r = seed + 100 * c + r
+            if run[0] is None:
+                frames, _ = make_frames(len(run), face_prob=0.0, seed=seed_r, faces=owner)
+            else:
+                faces = [(owner if who == "owner" else other)[(k + i) % len(owner)]
+                         for i, who in enumerate(run)]
+                frames, _ = make_frames(len(run), face_prob=1.0, seed=seed_r, faces=faces)
+            for frame, who in zip(frames, run):
+                rec.frame(t0 + k / FPS, frame)
+                truth.append(who)
+                k += 1
+    rec.close()
+    return truth
+
+
+def run(path, truth, recognizer, cascade, cache):
+    rep = replay.Replay(path, "fast")
+    cam = replay.ReplayCamera(rep)
+    labels = face_engine.load_labels("face_model.yml")
+    scheduler = DetectScheduler(cascade, 5, 0.5, face_engine.make_detector(cascade, "near-gate"))
+    stable, true_count, false_count = False, 0, 0
+    predicts, rec_time = 0, 0.0
+    owner_seen_at, latencies, misses = None, [], 0
+    false_frames, raw_accepts, lookalike_frames, hold = 0, 0, 0, 0
+    prev = None
+    for i, who in enumerate(truth):
+        ok, frame = cam.read()
+        if not ok:
+            break
+        now = i / FPS
+        gray = face_engine.to_gray(frame)
+        faces = scheduler.detect(gray)
+        t0 = time.perf_counter()
+        r = face_engine.recognize_faces(recognizer, gray, faces, CONF_THRESHOLD, labels,
+                                        cache, now)
+        rec_time += time.perf_counter() - t0
+        if cache is None:
+            predicts += len(faces)
+
+        if r.owner:
+            true_count, false_count = true_count + 1, 0
+        else:
+            false_count, true_count = false_count + 1, 0
+        if not stable and true_count >= ON_FRAMES:
+            stable = True
+        if stable and false_count >= OFF_FRAMES:
+            stable = False
+
+        # ground truth bookkeeping
+        if who == "owner" and prev != "owner":
+            if owner_seen_at is not None:
+                misses += 1
+            owner_seen_at = now
+        if who != "owner" and prev == "owner":
+            if owner_seen_at is not None:
+                misses += 1
+                owner_seen_at = None
+            hold = OFF_FRAMES
+        if owner_seen_at is not None and stable:
+            latencies.append(now - owner_seen_at)
+            owner_seen_at = None
+        if who != "owner":
+            if hold:
+                hold -= 1
+            elif stable:
+                false_frames += 1
+        if who == "lookalike":
+            lookalike_frames += 1
+            raw_accepts += r.owner
+        prev = who
+
+    if cache is not None:
+        predicts = cache.predicts
+    seconds = len(truth) / FPS
+    return {"predicts_s": predicts / seconds, "rec_ms": 1000 * rec_time / len(truth),
+            "latencies": latencies, "misses": misses, "false_frames": false_frames,
+            "raw": raw_accepts / max(1, lookalike_frames),
+            "hit_rate": cache.counters()["hit_rate"] if cache else 0.0,
+            "cache": cache.counters() if cache else None}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cycles", type=int, default=4)
+    ap.add_argument("--ttl", type=float, nargs="+", default=[1.0, 3.0])
+    ap.add_argument("--hash-max", type=int, default=HASH_MAX_BITS)
+    args = ap.parse_args()
+
+    recognizer = bench_recognizer()
+    cascade = face_engine.load_cascade()
+    path = os.path.join(tempfile.mkdtemp(prefix="reccache_"), "scene")
+    truth = make_scene(path, args.cycles)
+    arrivals = sum(1 for a, b in zip([None] + truth, truth) if b == "owner" and a != "owner")
+    non_owner = sum(who != "owner" for who in truth)
+    print(f"{len(truth)} frames ({len(truth) / FPS:.0f} s), {arrivals} owner arrivals, "
+          f"{sum(w == 'lookalike' for w in truth)} look-alike frames")
+    print()
+    print(f"{'config':<14} {'predicts/s':>10} {'hit rate':>8} {'rec ms':>7} "
+          f"{'decision p50/max ms':>20} {'missed':>6} {'false accept':>12} {'raw':>6}")
+    configs = [("no cache", None)] + [(f"cache ttl {t:g}s", RecognitionCache(t, hash_max=args.hash_max))
+                                     for t in args.ttl]
+    for name, cache in configs:
+        r = run(path, truth, recognizer, cascade, cache)
+        lat = r["latencies"]
+        decision = (f"{1000 * percentile(lat, 50):.0f} / {1000 * max(lat):.0f}"
+                    if lat else "-")
+        print(f"{name:<14} {r['predicts_s']:10.1f} {100 * r['hit_rate']:7.0f}% "
+              f"{r['rec_ms']:7.2f} {decision:>20} {r['misses']:>6} "
+              f"{100 * r['false_frames'] / max(1, non_owner):11.2f}% "
+              f"{100 * r['raw']:5.1f}%")
+        if r["cache"]:
+            misses = {k[5:]: v for k, v in r["cache"].items() if k.startswith("miss_")}
+            print(f"{'':<14} misses: {misses}")
+
+
+if __name__ == "__main__":
+    main()
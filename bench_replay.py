@@ -0,0 +1,281 @@
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+import _thread
+
+import display
+import replay
+from bench_common import percentile, report
+import serial_frame
+from fake_arduino import BINARY, FORMAT_GATE, FORMAT_MODELB
+
+# Runs a gate script on a recording (replay.py) and reports fps, stage
+# latency percentiles and when it made its decisions.
+#
+#   record on the real hardware (any script, e.g. the gateway):
+#     GATE_RECORD=recordings/evening python smart_home_gateway_modelb.py
+#   or make a synthetic one (arrivals with a face + matching serial lines):
+#     python bench_replay.py make --out recordings/synthetic --format modelb
+#   (--format modelb-binary for smart_home_gateway_modelb.py with
+#   SERIAL_PROTOCOL = "binary")
+#   then:
+#     python bench_replay.py run recordings/synthetic run_recognation.py --mode fast
+#     python bench_replay.py run recordings/synthetic smart_home_gateway_modelb.py --offline
+#
+# The script runs in this process until the recording is over (then it
+# gets a SIGINT, like Ctrl+C), headless (display.py) unless --display.
+# --offline points MQTT at a local fake_broker and Firebase at
+# fake_firebase, so nothing is published for real.
+#
+# run_script(..., config={"CAMERAS": [0, 1]}) replaces CONFIG constants
+# (top-level `NAME = ...` lines) before the script runs.
+#
+# Decisions = commands the script wrote to the Arduino, with their time in
+# the recording; if the recording has the commands of the original run,
+# the difference to those is shown too.
+#
+#   python bench_replay.py check recordings/synthetic smart_gate_gateway.py --offline
+# runs the script realtime and then fast and fails (exit 1) if fast mode
+# served fewer frames than realtime: fast hands out every frame the script
+# reads, so it can only serve more, unless its clock ran away.
+
+LINE_FORMATS = {
+    "modelb": FORMAT_MODELB,
+    "modelb-binary": BINARY,
+    "gate": FORMAT_GATE,
+    "camera_gate": "Distance: {dist} cm | Owner: {owner_text}",
+}
+
+
+# ================= make =================
+def make_recording(out, seconds=40.0, fps=15.0, line_period=0.15,
+                   line_format="modelb", every=20.0, arrival=8.0, seed=0):
+    # idle hallway, an arrival every `every` seconds: PIR, person walks up,
+    # face in the frames for `arrival` seconds
+    from fake_camera import make_frames
+
+    faces, _ = make_frames(30, face_prob=1.0, seed=seed)
+    empty, _ = make_frames(30, face_prob=0.0, seed=seed + 1)
+    fmt = LINE_FORMATS[line_format]
+
+    def scene(t):
+        k = (t % every) - (every - arrival)
+        return k if k >= 0 else None       # seconds into the arrival
+
+    rec = replay.Recorder(out)
+    t0 = rec.started
+    rec.meta["synthetic"] = {"seconds": seconds, "fps": fps, "format": line_format,
+                             "every": every, "arrival": arrival}
+    events = [(i / fps, "frame") for i in range(int(seconds * fps))]
+    events += [(i * line_period, "line") for i in range(int(seconds / line_period))]
+    lines = 0
+    for t, kind in sorted(events):
+        k = scene(t)
+        if kind == "frame":
+            pool = faces if k is not None else empty
+            rec.frame(t0 + t, pool[int(t * fps) % len(pool)])
+        else:
+            dist = max(6, int(150 - 25 * k)) if k is not None else 150
+            near = k is not None and dist <= 10
+            fields = {"distance": dist, "pir": int(k is not None and k < 3),
+                      "session": int(k is not None), "owner": int(near), "gate": int(near)}
+            if fmt == BINARY:
+                data = serial_frame.encode_status(fields, lines)
+            else:
+                data = fmt.format(dist=dist, owner_text="YES" if near else "NO",
+                                  **{n: v for n, v in fields.items() if n != "distance"}
+                                  ).encode() + b"\r\n"
+            rec.serial(t0 + t, b"r", data)
+            lines += 1
+    rec.close()
+    print(f"recording {out}: {int(seconds * fps)} frames, "
+          f"{int(seconds / line_period)} serial lines, {seconds:.0f} s")
+
+
+# ================= run =================
+def offline_services(broker):
+    # MQTT -> local broker, Firebase -> in-memory fake (only if installed)
+    import paho.mqtt.client as mqtt
+    connect = mqtt.Client.connect
+    connect_async = mqtt.Client.connect_async
+
+    def local_connect(self, host, port=1883, *args, **kwargs):
+        return connect(self, "127.0.0.1", broker.port, *args, **kwargs)
+
+    def local_connect_async(self, host, port=1883, *args, **kwargs):
+        return connect_async(self, "127.0.0.1", broker.port, *args, **kwargs)
+    mqtt.Client.connect = local_connect
+    mqtt.Client.connect_async = local_connect_async
+
+    try:
+        import firebase_admin
+        from firebase_admin import credentials, db
+    except ImportError:
+        return
+    from fake_firebase import FakeDatabase
+    fake = FakeDatabase(latency=0.15, jitter=0.1)
+    credentials.Certificate = lambda path: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    db.reference = fake.reference
+
+
+def watchdog(rep, grace, timeout, started):
+    # Ctrl+C the script once the recording is over
+    done_at = None
+    while time.time() - started < timeout:
+        time.sleep(0.1)
+        if rep.started_wall is None or not rep.finished():
+            done_at = None
+            continue
+        done_at = done_at or time.time()
+        if time.time() - done_at >= grace:
+            break
+    _thread.interrupt_main()
+
+
+def apply_config(source, config):
+    for name, value in (config or {}).items():
+        source, n = re.subn(rf"^{name}\s*=.*$", f"{name} = {value!r}", source,
+                            count=1, flags=re.M)
+        if not n:
+            raise KeyError(f"no top-level {name} = ... to replace")
+    return source
+
+
+def run_script(path, rec_dir, mode, display_on, offline, timeout, grace, config=None,
+               broker=None):
+    os.environ[replay.REPLAY_ENV] = rec_dir
+    os.environ[replay.MODE_ENV] = mode
+    rep = replay.active_replay()
+
+    os.environ[display.DISPLAY_ENV] = "window" if display_on else "none"
+
+    # offline: MQTT goes to `broker` (a started FakeBroker) or a new one
+    own_broker = offline and broker is None
+    if own_broker:
+        from fake_broker import FakeBroker
+        broker = FakeBroker().start()
+    if offline:
+        offline_services(broker)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    scope = {"__name__": "__main__", "__file__": path}
+    with open(path, encoding="utf-8") as f:
+        code = compile(apply_config(f.read(), config), path, "exec")
+
+    started = time.time()
+    threading.Thread(target=watchdog, args=(rep, grace, timeout, started),
+                     daemon=True).start()
+    try:
+        exec(code, scope)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    wall = time.time() - started
+    if own_broker:
+        broker.close()
+    return rep, scope, wall
+
+
+# two runs in one process: no metrics port, no files (where the script has them)
+CHECK_CONFIG = {"METRICS_PORT": None, "TELEMETRY_DIR": None, "FIREBASE_SPOOL": ":memory:"}
+
+
+def check_modes(path, rec_dir, offline, timeout, grace):
+    # -> True if fast mode served at least as many frames as realtime
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    config = {name: value for name, value in CHECK_CONFIG.items()
+              if re.search(rf"^{name}\s*=", source, flags=re.M)}
+    served = {}
+    for mode in ("realtime", "fast"):
+        replay._replays.pop(rec_dir, None)     # fresh replay per run
+        rep, _, wall = run_script(path, rec_dir, mode, False, offline, timeout, grace,
+                                  config=config)
+        served[mode] = len(rep.stats()["served"])
+        print(f"{mode:<8} wall={wall:5.1f}s frames={len(rep.frames)} served={served[mode]}")
+    ok = served["fast"] >= served["realtime"]
+    print("ok" if ok else "FAIL: fast mode served fewer frames than realtime")
+    return ok
+
+
+def print_report(rep, scope, wall):
+    st = rep.stats()
+    served = st["served"]
+    print()
+    print(f"mode={st['mode']} wall={wall:.1f}s frames={st['frames']} "
+          f"served={len(served)} skipped={st['skipped']}")
+    if len(served) > 1:
+        span = served[-1][0] - served[0][0]
+        frames = rep.frames
+        rec_fps = (len(frames) - 1) / max(1e-6, frames[-1][0] - frames[0][0])
+        print(f"fps={(len(served) - 1) / span:.1f} (recorded {rec_fps:.1f})")
+        gaps = [b[0] - a[0] for a, b in zip(served, served[1:])]
+        report("frame interval", gaps)
+
+    pipe = scope.get("pipe")
+    if pipe is not None and hasattr(pipe, "stats"):
+        for name, stage in pipe.stats.items():
+            if stage.samples:
+                report(f"stage {name}", list(stage.samples))
+
+    t0 = st["t0"]
+    writes = st["writes"]
+    recorded = st["recorded_writes"]
+    print(f"decisions: {len(writes)} commands written"
+          + (f" (original run: {len(recorded)})" if recorded else ""))
+    for i, (_, t, data) in enumerate(writes[:20]):
+        line = f"  t={t - t0:7.2f}s  {data!r}"
+        if i < len(recorded) and recorded[i][1] == data:
+            line += f"  ({1000 * (t - recorded[i][0]):+.0f} ms vs original)"
+        print(line)
+    if len(writes) > 20:
+        print(f"  ... {len(writes) - 20} more")
+    deltas = [1000 * (t - r[0]) for (_, t, d), r in zip(writes, recorded) if d == r[1]]
+    if deltas:
+        print(f"vs original: p50={percentile(deltas, 50):+.0f} ms "
+              f"max={max(deltas, key=abs):+.0f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    mk = sub.add_parser("make", help="synthetic recording")
+    mk.add_argument("--out", default="recordings/synthetic")
+    mk.add_argument("--seconds", type=float, default=40)
+    mk.add_argument("--fps", type=float, default=15)
+    mk.add_argument("--format", choices=sorted(LINE_FORMATS), default="modelb")
+
+    rn = sub.add_parser("run", help="run a script on a recording")
+    rn.add_argument("recording")
+    rn.add_argument("script")
+    rn.add_argument("--mode", choices=("realtime", "fast"), default="realtime")
+    rn.add_argument("--display", action="store_true")
+    rn.add_argument("--offline", action="store_true")
+    rn.add_argument("--timeout", type=float, default=600)
+    rn.add_argument("--grace", type=float, default=1.0,
+                    help="seconds to keep running after the recording ends")
+
+    ck = sub.add_parser("check", help="served frames fast >= realtime")
+    ck.add_argument("recording")
+    ck.add_argument("script")
+    ck.add_argument("--offline", action="store_true")
+    ck.add_argument("--timeout", type=float, default=600)
+    ck.add_argument("--grace", type=float, default=1.0)
+    args = ap.parse_args()
+
+    if args.cmd == "make":
+        make_recording(args.out, args.seconds, args.fps, line_format=args.format)
+    elif args.cmd == "check":
+        if not check_modes(args.script, args.recording, args.offline, args.timeout, args.grace):
+            sys.exit(1)
+    else:
+        print_report(*run_script(args.script, args.recording, args.mode,
+                                 args.display, args.offline, args.timeout, args.grace))
+
+
+if __name__ == "__main__":
+    main()
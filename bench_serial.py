@@ -0,0 +1,98 @@
+import argparse
+import re
+import time
+
+import serial
+
+from bench_common import report
+from fake_arduino import FakeArduino, FORMAT_MODELB
+from serial_link import SerialLink, parse_line
+
+# Per-iteration latency of the gateway loop with the serial read inline
+# (ser.readline() like the old smart_gate_gateway.py) vs SerialLink.
+# Uses a pty fake Arduino, so it runs without hardware (Linux/macOS).
+#
+#   python bench_serial.py --seconds 10 --split 0.2
+
+csv_pat = re.compile(
+    r"^DIST,(\d+),PIR,([01]),SESSION,([01]),OWNER,([01]),GATE,([01])$"
+)
+NAMES = ("distance", "pir", "session", "owner", "gate")
+
+
+def fake_vision(ms):
+    # stands in for cvtColor + detectMultiScale + predict
+    time.sleep(ms / 1000.0)
+
+
+def run_inline(port, seconds, vision_ms):
+    ser = serial.Serial(port, 9600, timeout=1)
+    samples = []
+    got = 0
+    owner = False
+    t_end = time.time() + seconds
+    try:
+        while time.time() < t_end:
+            t0 = time.perf_counter()
+            fake_vision(vision_ms)
+            owner = not owner
+            ser.write(b"O1" if owner else b"O0")
+            line = ser.readline().decode(errors="ignore").strip()
+            if line and parse_line(csv_pat, NAMES, line):
+                got += 1
+            samples.append(time.perf_counter() - t0)
+    finally:
+        ser.close()
+    return samples, got
+
+
+def run_threaded(port, seconds, vision_ms):
+    ser = serial.Serial(port, 9600, timeout=1)
+    link = SerialLink(ser, csv_pat, NAMES).start()
+    samples = []
+    last_seq = 0
+    got = 0
+    owner = False
+    t_end = time.time() + seconds
+    try:
+        while time.time() < t_end:
+            t0 = time.perf_counter()
+            fake_vision(vision_ms)
+            owner = not owner
+            link.send(b"O1" if owner else b"O0")
+            state = link.snapshot()
+            if state.seq != last_seq:
+                last_seq = state.seq
+                got += 1
+            samples.append(time.perf_counter() - t0)
+    finally:
+        link.close()
+        ser.close()
+    return samples, got
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--vision-ms", type=float, default=20.0)
+    ap.add_argument("--jitter", type=float, default=0.1,
+                    help="max extra delay before each Arduino line (s)")
+    ap.add_argument("--split", type=float, default=0.1,
+                    help="probability of a partial line")
+    args = ap.parse_args()
+
+    for name, fn in (("inline readline", run_inline),
+                     ("SerialLink thread", run_threaded)):
+        fake = FakeArduino(FORMAT_MODELB, jitter=args.jitter,
+                           split_prob=args.split, seed=1).start()
+        try:
+            samples, got = fn(fake.port, args.seconds, args.vision_ms)
+        finally:
+            fake.stop()
+        report(name, samples)
+        print(f"{'':<28} loop fps={len(samples) / args.seconds:6.1f}  "
+              f"arduino samples={got}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import os
+import tempfile
+import time
+
+from bench_common import report
+from event_sink import EventSink
+from fake_firebase import FakeDatabase
+
+# Cost of a gate_logs write on the gateway loop and end-to-end lag,
+# against a fake db.reference with HTTPS-like latency:
+#   direct  -> db_ref.push(event) inline (old gateways)
+#   sink    -> EventSink.push(event), update() batches on the worker
+#   outage  -> backend down for --outage seconds, then back; every event
+#              must arrive (spool replay) and the push() cost must not move
+#   restart -> gateway stopped while offline, a new sink replays the spool
+#
+#   python bench_sink.py --events 200 --rate 20 --latency 0.15
+
+
+def make_event(i):
+    return {"timestamp": int(time.time()), "distance_cm": 10 + i % 40,
+            "owner": i % 3 == 0, "pir_motion": True, "gate_open": i % 3 == 0}
+
+
+def emit(push, events, rate):
+    # events at `rate` per second, returns the push() call times
+    costs = []
+    period = 1.0 / rate
+    for i in range(events):
+        t0 = time.perf_counter()
+        push(make_event(i))
+        costs.append(time.perf_counter() - t0)
+        time.sleep(max(0.0, period - costs[-1]))
+    return costs
+
+
+def wait_sent(sink, count, timeout):
+    t_end = time.time() + timeout
+    while sink.sent < count and time.time() < t_end:
+        time.sleep(0.05)
+
+
+def stored(db):
+    return len(db.node("gate_logs") or {})
+
+
+def print_sink(sink, db):
+    c = sink.counters()
+    print(f"{'':<28} sent={c['sent']}/{c['pushed']} batches={c['batches']} "
+          f"failed={c['failed']} stored={stored(db)} "
+          f"lag p50={c['lag_p50_ms']:.0f} ms max={c['lag_max_ms']:.0f} ms "
+          f"calls={db.calls}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=100)
+    ap.add_argument("--rate", type=float, default=20.0, help="events per second")
+    ap.add_argument("--latency", type=float, default=0.15)
+    ap.add_argument("--jitter", type=float, default=0.1)
+    ap.add_argument("--outage", type=float, default=3.0)
+    args = ap.parse_args()
+
+    spool_dir = tempfile.mkdtemp(prefix="bench_sink_")
+    spool = os.path.join(spool_dir, "gate_logs.spool.db")
+
+    # direct push on the loop
+    db = FakeDatabase(args.latency, args.jitter, seed=1)
+    ref = db.reference("gate_logs")
+    report("direct db_ref.push", emit(ref.push, args.events, args.rate))
+    print(f"{'':<28} stored={stored(db)} calls={db.calls}")
+
+    # background sink
+    db = FakeDatabase(args.latency, args.jitter, seed=1)
+    sink = EventSink(db.reference("gate_logs"), spool).start()
+    report("sink.push", emit(sink.push, args.events, args.rate))
+    wait_sent(sink, args.events, 10)
+    print_sink(sink, db)
+    sink.close()
+
+    # outage in the middle of the run
+    db = FakeDatabase(args.latency, args.jitter, seed=1)
+    sink = EventSink(db.reference("gate_logs"), spool).start()
+    costs = emit(sink.push, args.events // 2, args.rate)
+    db.online = False
+    t_down = time.time()
+    while time.time() - t_down < args.outage:
+        costs += emit(sink.push, 1, args.rate)
+    print(f"{'':<28} spooled during outage={sink.pending}")
+    db.online = True
+    costs += emit(sink.push, args.events // 2, args.rate)
+    report("sink.push (outage)", costs)
+    wait_sent(sink, sink.pushed, 40)
+    print_sink(sink, db)
+    sink.close()
+
+    # restart while offline: spool survives the process
+    db = FakeDatabase(args.latency, args.jitter, seed=1)
+    db.online = False
+    sink = EventSink(db.reference("gate_logs"), spool).start()
+    emit(sink.push, args.events, args.rate)
+    sink.close(timeout=2)
+    db.online = True
+    sink = EventSink(db.reference("gate_logs"), spool).start()
+    wait_sent(sink, args.events, 10)
+    print(f"{'restart replay':<28} replayed={sink.sent}/{args.events} "
+          f"stored={stored(db)}")
+    sink.close()
+
+    for name in os.listdir(spool_dir):
+        os.remove(os.path.join(spool_dir, name))
+    os.rmdir(spool_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import socket
+import time
+
+import paho.mqtt.client as mqtt
+import serial
+
+import face_engine
+import serial_frame
+from event_sink import EventSink
+from fake_arduino import BINARY, FakeArduino
+from fake_broker import FakeBroker
+from fake_camera import DeviceCamera, make_frames
+from fake_firebase import FakeDatabase
+from serial_link import SerialLink
+from startup import Startup
+
+# Gateway startup: time from start to the first decision the Arduino gets.
+#
+#   python bench_startup.py --boot 0.8 --camera-open 1.0 --runs 3
+#
+# Same steps as smart_home_gateway_modelb.py, with fakes:
+#   firebase  initialize_app + db.reference, --firebase-init s (FakeDatabase)
+#   mqtt      DNS + TCP to the broker, --mqtt-connect s (fake_broker)
+#   serial    FakeArduino on a pty: silent for --boot s after the port is
+#             opened (bootloader after the reset), then READY
+#   model     face_model.yml + labels + Haar cascade (real)
+#   camera    fake_camera.DeviceCamera, --camera-open s to open
+# first decision = first camera frame detected + recognized, O0/O1 sent,
+# received by the fake Arduino.
+#
+#   sequential    the old gateway: every step in order, time.sleep(2) after
+#                 opening the serial port, blocking client.connect()
+#   orchestrated  startup.Startup: serial (READY handshake), model and camera
+#                 at the same time, Firebase / MQTT in the background
+# "cloud down": Firebase raises and the broker refuses for --outage s.
+# The old gateway dies on the first of them that fails; the new one
+# decides as usual and the cloud comes online when it is back.
+
+SLEEP_AFTER_OPEN = 2.0      # the old fixed sleep
+
+
+class Cloud:
+    # fake Firebase + broker, both unreachable until `until`
+    def __init__(self, args, until=0.0):
+        self.args = args
+        self.until = until
+        self.db = FakeDatabase(latency=0.01, jitter=0.0)
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.broker = FakeBroker(port=self.port).start() if until <= time.time() else None
+
+    def tick(self):
+        if self.broker is None and time.time() >= self.until:
+            self.broker = FakeBroker(port=self.port).start()
+
+    def connect_firebase(self):
+        time.sleep(self.args.firebase_init)
+        if time.time() < self.until:
+            raise ConnectionError("firebase unreachable")
+        return self.db.reference("gate_logs")
+
+    def close(self):
+        if self.broker is not None:
+            self.broker.close()
+
+
+def slow_connections(delay):
+    # DNS + TCP handshake of a remote broker, for paho's connects
+    create = socket.create_connection
+
+    def create_connection(*args, **kwargs):
+        time.sleep(delay)
+        return create(*args, **kwargs)
+    mqtt.socket.create_connection = create_connection
+
+
+def open_arduino(arduino, handshake, timeout=5.0):
+    arduino.start()                 # the port open resets the board
+    ser = serial.Serial(arduino.port, 115200, timeout=0.1)
+    link = SerialLink(ser, decoder=serial_frame.FrameDecoder(),
+                      encode=serial_frame.encode_command).start()
+    if handshake:
+        link.wait_ready(timeout)
+    else:
+        time.sleep(SLEEP_AFTER_OPEN)
+    return ser, link
+
+
+def load_model():
+    recognizer = face_engine.load_recognizer("face_model.yml", "numpy")
+    return recognizer, face_engine.load_labels("face_model.yml"), face_engine.load_cascade()
+
+
+def first_decision(cam, link, model, arduino, t0):
+    recognizer, labels, cascade = model
+    while True:
+        ok, frame = cam.read()
+        gray = face_engine.to_gray(frame)
+        if ok and gray.mean() >= 10:        # warm-up frames are black
+            break
+    faces = face_engine.detect_faces(cascade, gray)
+    owner = face_engine.recognize_faces(recognizer, gray, faces, 70, labels)[1]
+    link.send(b"O1" if owner else b"O0")
+    while not arduino.received:
+        time.sleep(0.001)
+    return arduino.received[0][0] - t0
+
+
+def sequential(args, frames, cloud):
+    t0 = time.time()
+    arduino = FakeArduino(BINARY, boot_delay=args.boot)
+    cam = ser = link = None
+    try:
+        sink = EventSink(cloud.connect_firebase(), ":memory:").start()
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        client.connect("127.0.0.1", cloud.port, 60)
+        client.loop_start()
+        ser, link = open_arduino(arduino, handshake=False)
+        model = load_model()
+        cam = DeviceCamera(frames, open_delay=args.camera_open)
+        decided = first_decision(cam, link, model, arduino, t0)
+        client.loop_stop()
+        client.disconnect()
+        sink.close()
+        return decided, None
+    except Exception as e:
+        return None, repr(e)
+    finally:
+        if cam is not None:
+            cam.release()
+        if link is not None:
+            link.close()
+            ser.close()
+        arduino.stop()
+
+
+def orchestrated(args, frames, cloud):
+    t0 = time.time()
+    boot = Startup()
+    arduino = FakeArduino(BINARY, boot_delay=args.boot)
+    sink = EventSink(None, ":memory:").start()
+    boot.background("firebase", cloud.connect_firebase, on_ready=sink.attach,
+                    retry_min=0.2, retry_max=1.0)
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = lambda c, u, f, rc, p=None: boot.mark("mqtt")
+    client.reconnect_delay_set(1, 2)
+    client.connect_async("127.0.0.1", cloud.port, 60)
+    client.loop_start()
+    boot.run("serial", open_arduino, arduino, True)
+    boot.run("model", load_model)
+    boot.run("camera", DeviceCamera, frames, 30.0, 4, args.camera_open)
+    ser, link = boot.get("serial")
+    model = boot.get("model")
+    cam = boot.get("camera")
+    decided = first_decision(cam, link, model, arduino, t0)
+
+    online = {}
+    deadline = time.time() + args.outage + 5.0
+    while time.time() < deadline and len(online) < 2:
+        cloud.tick()
+        for name in ("firebase", "mqtt"):
+            step = boot.steps.get(name)
+            if name not in online and step is not None and step[1] is not None:
+                online[name] = step[1]
+        time.sleep(0.02)
+    boot.stop()
+    client.loop_stop()
+    client.disconnect()
+    sink.close()
+    cam.release()
+    link.close()
+    ser.close()
+    arduino.stop()
+    return decided, online
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--boot", type=float, default=0.8, help="Arduino reset -> READY, s")
+    ap.add_argument("--camera-open", type=float, default=1.0)
+    ap.add_argument("--firebase-init", type=float, default=0.4)
+    ap.add_argument("--mqtt-connect", type=float, default=0.3)
+    ap.add_argument("--outage", type=float, default=3.0)
+    ap.add_argument("--runs", type=int, default=3)
+    args = ap.parse_args()
+
+    frames, _ = make_frames(10, face_prob=1.0)
+    slow_connections(args.mqtt_connect)
+    print(f"{'scenario':<12} {'startup':<13} {'first decision s':>16}  cloud online")
+    for scenario in ("online", "cloud down"):
+        outage = args.outage if scenario == "cloud down" else 0.0
+        for name, fn in (("sequential", sequential), ("orchestrated", orchestrated)):
+            times, notes = [], None
+            for _ in range(args.runs):
+                cloud = Cloud(args, time.time() + outage)
+                try:
+                    decided, notes = fn(args, frames, cloud)
+                finally:
+                    cloud.close()
+                if decided is not None:
+                    times.append(decided)
+            if times:
+                times.sort()
+                result = f"{times[len(times) // 2]:16.2f}"
+            else:
+                result = f"{'failed':>16}"
+            if isinstance(notes, dict):
+                notes = ", ".join(f"{k} {v:.1f} s" for k, v in sorted(notes.items()))
+            print(f"{scenario:<12} {name:<13} {result}  {notes or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+from bench_common import report
+from telemetry_store import COLUMNS, DAY, TelemetryStore
+
+# Local telemetry store (telemetry_store.py): months of 150 ms samples.
+#
+#   python bench_telemetry.py --days 30 --queries 200
+#
+#   fill      --days of synthetic samples (bulk extend(), not timed per row)
+#   append    single append() of a gateway event, on an empty store and on
+#             the full one (must not grow with the history)
+#   range     random 1 min / 1 h / 1 day windows -> column arrays, from a
+#             reader opened like `python telemetry_store.py` does
+#   aggregate 1 h in 10 s bins, 1 day in 5 min bins, everything in 1 h bins
+#   sqlite    the same range queries on --sqlite-days in one indexed table
+#             (like the gate_logs spool), rows -> the same arrays
+
+PERIOD = 0.15
+
+
+def synthetic(t0, count, seed=0):
+    rng = np.random.default_rng(seed)
+    ts = t0 + PERIOD * np.arange(count) + rng.uniform(0, 0.01, count)
+    walk = np.cumsum(rng.integers(-2, 3, count))
+    dist = (np.abs(walk) % 300 + 5).astype(np.uint16)
+    dist[rng.random(count) < 0.02] = 999
+    pir = (rng.random(count) < 0.1).astype(np.uint8)
+    return {"timestamp": ts, "distance_cm": dist, "pir_motion": pir,
+            "session_active": pir, "owner": (pir & (rng.random(count) < 0.5)).astype(np.uint8),
+            "gate_open": np.zeros(count, np.uint8)}
+
+
+def time_appends(store, t0, count):
+    costs = []
+    for i in range(count):
+        event = {"timestamp": int(t0), "distance_cm": 10 + i % 40, "pir_motion": i % 5 == 0,
+                 "session_active": True, "owner": i % 3 == 0, "gate_open": False,
+                 "lamp_on": False}
+        q0 = time.perf_counter()
+        store.append(event, t0 + i * PERIOD)
+        costs.append(time.perf_counter() - q0)
+    return costs
+
+
+def windows(t_first, t_last, span, count, seed=1):
+    rng = random.Random(seed)
+    return [(t, t + span) for t in (rng.uniform(t_first, t_last - span) for _ in range(count))]
+
+
+def time_queries(query, wins):
+    costs, rows = [], 0
+    for a, b in wins:
+        q0 = time.perf_counter()
+        rows += len(query(a, b))
+        costs.append(time.perf_counter() - q0)
+    return costs, rows / len(wins)
+
+
+def sqlite_store(path, data):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE telemetry (timestamp REAL, distance_cm INTEGER, "
+                 "pir_motion INTEGER, session_active INTEGER, owner INTEGER, gate_open INTEGER)")
+    conn.execute("CREATE INDEX telemetry_ts ON telemetry (timestamp)")
+    rows = zip(*(data[name].tolist() for name, _ in COLUMNS))
+    conn.executemany("INSERT INTO telemetry VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    return conn
+
+
+def sqlite_range(conn, a, b):
+    rows = conn.execute("SELECT * FROM telemetry WHERE timestamp >= ? AND timestamp < ? "
+                        "ORDER BY timestamp", (a, b)).fetchall()
+    cols = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+    out = {name: np.array(col, dtype) for (name, dtype), col in zip(COLUMNS, cols)}
+    return out["timestamp"]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--appends", type=int, default=20000)
+    ap.add_argument("--sqlite-days", type=float, default=1.0)
+    args = ap.parse_args()
+
+    root = tempfile.mkdtemp(prefix="telemetry_")
+    try:
+        per_day = int(DAY / PERIOD)
+        t_first = (time.time() // DAY - args.days) * DAY
+
+        empty = TelemetryStore(os.path.join(root, "empty"))
+        report("append (empty store)", time_appends(empty, t_first, args.appends))
+        empty.close()
+
+        store = TelemetryStore(os.path.join(root, "store"))
+        q0 = time.perf_counter()
+        for day in range(args.days):
+            store.extend(synthetic(t_first + day * DAY, per_day, seed=day))
+        fill = time.perf_counter() - q0
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(store.root)
+                   for f in files)
+        print(f"fill: {args.days * per_day} rows ({args.days} days) in {fill:.1f} s, "
+              f"{size / 2**20:.0f} MB on disk")
+        t_last = store.last
+        report("append (full store)", time_appends(store, t_last + PERIOD, args.appends))
+        store.close()
+
+        reader = TelemetryStore(os.path.join(root, "store"), writable=False)
+        print()
+        for name, span in (("1 min", 60), ("1 h", 3600), ("1 day", DAY)):
+            wins = windows(t_first, t_last, span, args.queries)
+            costs, rows = time_queries(lambda a, b: reader.range(a, b)["timestamp"], wins)
+            report(f"range {name} ({rows:.0f} rows)", costs)
+        print()
+        for name, span, step in (("1 h / 10 s", 3600, 10), ("1 day / 5 min", DAY, 300)):
+            wins = windows(t_first, t_last, span, max(1, args.queries // 4))
+            costs, rows = time_queries(lambda a, b: reader.aggregate(a, b, step)["start"], wins)
+            report(f"aggregate {name} ({rows:.0f} bins)", costs)
+        q0 = time.perf_counter()
+        bins = reader.aggregate(t_first, t_last, 3600)["start"]
+        report(f"aggregate all / 1 h ({len(bins)} bins)", [time.perf_counter() - q0])
+
+        count = int(args.sqlite_days * per_day)
+        data = synthetic(t_first, count)
+        q0 = time.perf_counter()
+        conn = sqlite_store(os.path.join(root, "telemetry.db"), data)
+        print()
+        print(f"sqlite: {count} rows loaded in {time.perf_counter() - q0:.1f} s")
+        t_end = t_first + count * PERIOD
+        for name, span in (("1 min", 60), ("1 h", 3600)):
+            wins = windows(t_first, t_end, span, args.queries)
+            costs, rows = time_queries(lambda a, b: sqlite_range(conn, a, b), wins)
+            report(f"sqlite range {name} ({rows:.0f} rows)", costs)
+        conn.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import os
+import shutil
+import tempfile
+
+import cv2
+import numpy as np
+
+import train_model
+from bench_common import Timer
+from bench_index import make_resident
+from fake_camera import load_faces
+
+# train_model.py timings on a throw-away copy of the dataset:
+#   baseline -> the old script: serial imread + recognizer.train + save
+#   cold     -> empty feature cache, every photo goes through the pool
+#   warm     -> nothing changed, only hashing + manifest check
+#   +N       -> N new photos of one resident, only those are computed
+# Extra synthetic residents (bench_index.make_resident) make the dataset
+# big enough for the pool to matter.
+#
+#   python bench_train.py --residents 5 --images 200 --add 20
+
+
+def baseline(dataset_dir, model_path):
+    faces, labels = [], []
+    for label, folder in enumerate(sorted(os.listdir(dataset_dir)), start=1):
+        path = os.path.join(dataset_dir, folder)
+        for filename in sorted(os.listdir(path)):
+            img = cv2.imread(os.path.join(path, filename), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                faces.append(img)
+                labels.append(label)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, np.array(labels))
+    recognizer.save(model_path)
+
+
+def write_photos(folder, photos, start=0):
+    os.makedirs(folder, exist_ok=True)
+    for i, img in enumerate(photos, start=start):
+        cv2.imwrite(os.path.join(folder, f"{i:04d}.jpg"), img)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--residents", type=int, default=5,
+                    help="synthetic residents added next to dataset/aria")
+    ap.add_argument("--images", type=int, default=200)
+    ap.add_argument("--add", type=int, default=20)
+    ap.add_argument("--workers", type=int, default=train_model.WORKERS)
+    args = ap.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench_train_")
+    try:
+        dataset = os.path.join(work, "dataset")
+        shutil.copytree(train_model.DATASET_DIR, dataset)
+        base = [cv2.resize(f, (200, 200)) for f in load_faces()]
+        people = [make_resident(base, seed, args.images + args.add)
+                  for seed in range(1, args.residents + 1)]
+        for seed, photos in enumerate(people, start=1):
+            write_photos(os.path.join(dataset, f"resident{seed}"), photos[:args.images])
+
+        paths = {
+            "dataset_dir": dataset,
+            "model_path": os.path.join(work, "face_model.yml"),
+            "models_dir": os.path.join(work, "models"),
+            "cache_path": os.path.join(work, "face_cache.npz"),
+            "workers": args.workers,
+        }
+        rows = []
+        with Timer() as t:
+            baseline(dataset, os.path.join(work, "baseline.yml"))
+        rows.append(("baseline (imread+train)", t.elapsed, None))
+
+        for name in ("cold", "warm"):
+            with Timer() as t:
+                stats = train_model.train(**paths)
+            rows.append((name, t.elapsed, stats))
+
+        if people:
+            write_photos(os.path.join(dataset, "resident1"),
+                         people[0][args.images:], start=args.images)
+        with Timer() as t:
+            stats = train_model.train(**paths)
+        rows.append((f"+{args.add} photos", t.elapsed, stats))
+
+        print()
+        print(f"workers={args.workers}")
+        print(f"{'run':<24} {'seconds':>8} {'images':>7} {'computed':>9} {'version':>8}")
+        for name, seconds, stats in rows:
+            if stats is None:
+                print(f"{name:<24} {seconds:8.2f}")
+            else:
+                print(f"{name:<24} {seconds:8.2f} {stats['images']:>7} "
+                      f"{stats['new']:>9} {stats['version']:>8}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
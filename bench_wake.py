@@ -0,0 +1,135 @@
+import argparse
+import time
+from collections import OrderedDict
+
+import face_engine
+from bench_common import bench_recognizer, percentile
+from camera_session import CameraSession
+from fake_camera import DeviceCamera, make_frames
+from vision_pipeline import VisionPipeline
+
+# Idle CPU and PIR-wake latency of the session camera handling
+# (smart_home_gateway_modelb.py), with a simulated webcam (DeviceCamera:
+# slow open, driver buffer, dark warm-up frames, MJPEG decode):
+#   always-open -> old gateway: camera open all the time, pipeline paused
+#   release     -> CameraSession(release_after=0): device off between sessions
+#   keep-warm   -> CameraSession(release_after=60): device stays open, but
+#                  stale buffered frames are flushed on wake
+# Per wake: first decision (ms after PIR, and how old its frame was) and
+# first decision on a frame captured after the PIR edge. Idle CPU is the
+# whole process between sessions (the driver thread decodes frames while
+# the device is open).
+#
+#   python bench_wake.py --wakes 5 --idle 3 --open-delay 0.8
+
+
+class StampedCamera:
+    # remembers the driver capture time of every frame it hands out
+    def __init__(self, cam, device):
+        self.cam = cam
+        self.device = device            # () -> DeviceCamera currently in use
+        self.stamps = OrderedDict()
+
+    def read(self):
+        ret, frame = self.cam.read()
+        if ret:
+            dev = self.device()
+            self.stamps[id(frame)] = (frame, dev.stamp if dev else None)
+            while len(self.stamps) > 64:
+                self.stamps.popitem(last=False)
+        return ret, frame
+
+    def stamp_of(self, frame):
+        # not `stamp`: VisionPipeline would take that as the capture time
+        return self.stamps.get(id(frame), (None, None))[1]
+
+    def isOpened(self):
+        return True
+
+
+def run(name, frames, args, session_kwargs=None):
+    recognizer = bench_recognizer()
+    cascade = face_engine.load_cascade()
+
+    def open_device():
+        return DeviceCamera(frames, fps=args.fps, open_delay=args.open_delay)
+
+    if session_kwargs is None:
+        device = open_device()
+        cam = StampedCamera(device, lambda: device)
+        session = None
+    else:
+        session = CameraSession(open_device, **session_kwargs).start()
+        cam = StampedCamera(session, lambda: session.cam)
+
+    pipe = VisionPipeline(cam, cascade, recognizer, 70, detect_workers=1)
+    pipe.pause()
+    pipe.start()
+
+    first, age, fresh, idle_cpu = [], [], [], []
+    last_seq = 0
+    for _ in range(args.wakes):
+        # ---- idle (no session), after the last in-flight frames are done ----
+        time.sleep(0.5)
+        c0, t0 = time.process_time(), time.perf_counter()
+        time.sleep(args.idle)
+        idle_cpu.append((time.process_time() - c0) / (time.perf_counter() - t0))
+
+        # ---- PIR edge ----
+        pir = time.time()
+        if session:
+            session.wake()
+        pipe.resume()
+        got_first = False
+        while True:
+            r = pipe.wait_result(last_seq, timeout=5)
+            if r is None:
+                break
+            last_seq = r.seq
+            if r.stamp < pir:           # read before the pause, still in flight
+                continue
+            stamp = cam.stamp_of(r.frame)
+            if not got_first:
+                first.append(1000.0 * (r.done - pir))
+                age.append(1000.0 * (pir - stamp) if stamp else 0.0)   # < 0: fresh
+                got_first = True
+            if stamp and stamp >= pir:
+                fresh.append(1000.0 * (r.done - pir))
+                break
+        time.sleep(args.session)
+        pipe.pause()
+        if session:
+            session.sleep()
+
+    pipe.stop()
+    (session or cam.cam).release()
+
+    print(f"{name:<12} idle cpu={100 * sum(idle_cpu) / len(idle_cpu):5.1f}%  "
+          f"first decision p50={percentile(first, 50):7.0f} ms "
+          f"(stale by {max(0.0, percentile(age, 50)):4.0f} ms)  "
+          f"fresh decision p50={percentile(fresh, 50):6.0f} ms "
+          f"max={max(fresh, default=0):6.0f} ms")
+    if session:
+        c = session.counters()
+        print(f"{'':<12} opens={c['opens']} flushed={c['flushed']} "
+              f"dark={c['dark_dropped']} first frame p50="
+              f"{percentile(session.wake_history, 50):.0f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--wakes", type=int, default=5)
+    ap.add_argument("--idle", type=float, default=3.0)
+    ap.add_argument("--session", type=float, default=0.5)
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--open-delay", type=float, default=0.8)
+    args = ap.parse_args()
+
+    frames, _ = make_frames(30)
+    run("always-open", frames, args)
+    run("release", frames, args, {"release_after": 0})
+    run("keep-warm", frames, args, {"release_after": 60})
+
+
+if __name__ == "__main__":
+    main()
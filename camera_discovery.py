@@ -0,0 +1,221 @@
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+
+import frame_bus
+import replay
+
+# Which camera, which backend, which resolution - found once, then cached.
+#
+# discover() probes every index at the same time (one thread each; opening
+# a missing device blocks inside OpenCV with the GIL released). Per index
+# the backends are tried one after another, in BACKENDS order, until one
+# delivers frames: two backends opening the same device at once can make
+# each other fail. Every probe gets PROBE_TIMEOUT seconds; a probe still
+# stuck in VideoCapture() after that is left behind (it releases the
+# device itself when it returns) and counts as failed.
+#
+# A working device is asked for every size in SIZES; the sizes it really
+# delivers (frame shape after set()) are recorded with the fps it reports.
+#
+# resolve() picks a device + mode and caches it in CACHE_PATH, keyed by
+# the device identity (index + name from /sys/class/video4linux on Linux;
+# only the index where the OS gives no name). The next start checks the
+# identity (a file read, no open) and reuses the cached choice instantly;
+# if the camera at that index changed, or the cached choice does not open
+# any more (open_camera()), it discovers again.
+#
+#   python scan_camera.py       # discover, print every device, refresh cache
+
+CACHE_PATH = "camera_cache.json"
+INDICES = range(4)
+if sys.platform.startswith("win"):
+    BACKENDS = (("MSMF", cv2.CAP_MSMF), ("DSHOW", cv2.CAP_DSHOW), ("ANY", cv2.CAP_ANY))
+else:
+    BACKENDS = (("V4L2", cv2.CAP_V4L2), ("ANY", cv2.CAP_ANY))
+SIZES = ((640, 480), (1280, 720), (1920, 1080), (320, 240))
+FRAME_SIZE = (640, 480)
+PROBE_TIMEOUT = 3.0
+
+
+def device_identity(index):
+    # stable name of the camera at `index` where the OS has one
+    try:
+        with open(f"/sys/class/video4linux/video{index}/name") as f:
+            name = f.read().strip()
+    except OSError:
+        name = None
+    return f"{index}:{name}" if name else str(index)
+
+
+def probe(opener, index, backend, sizes=SIZES):
+    # -> device dict, or None if nothing came out of it
+    t0 = time.perf_counter()
+    cap = opener(index, backend)
+    try:
+        if not cap.isOpened():
+            return None
+        ok, frame = cap.read()
+        if not ok or frame is None:
+            return None
+        open_ms = 1000 * (time.perf_counter() - t0)
+        modes = []
+        for w, h in sizes:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, w)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, h)
+            ok, frame = cap.read()
+            if ok and frame is not None and frame.shape[1] == w and frame.shape[0] == h:
+                modes.append([w, h, float(cap.get(cv2.CAP_PROP_FPS) or 0.0)])
+        if not modes:
+            # sizes not settable: whatever it delivers
+            modes.append([frame.shape[1], frame.shape[0], float(cap.get(cv2.CAP_PROP_FPS) or 0.0)])
+        return {"index": index, "backend": backend, "modes": modes,
+                "open_ms": round(open_ms, 1), "probe_ms": round(1000 * (time.perf_counter() - t0), 1)}
+    finally:
+        cap.release()
+
+
+def _probe_with_timeout(opener, index, backend, sizes, timeout):
+    result = {}
+
+    def run():
+        try:
+            result["device"] = probe(opener, index, backend, sizes)
+        except Exception as e:          # a broken driver is just "no camera"
+            result["error"] = repr(e)
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    t.join(timeout)
+    if t.is_alive():
+        return None, "timeout"
+    if "error" in result:
+        return None, result["error"]
+    return result["device"], "ok" if result["device"] else "fail"
+
+
+def discover(indices=INDICES, backends=BACKENDS, opener=cv2.VideoCapture, sizes=SIZES,
+             timeout=PROBE_TIMEOUT, identify=device_identity):
+    # -> (devices, log): working devices by index, [(index, backend name, status, ms)]
+    devices, log = {}, []
+    lock = threading.Lock()
+
+    def scan(index):
+        for name, backend in backends:
+            t0 = time.perf_counter()
+            device, status = _probe_with_timeout(opener, index, backend, sizes, timeout)
+            with lock:
+                log.append((index, name, status, 1000 * (time.perf_counter() - t0)))
+            if device is not None:
+                device["backend_name"] = name
+                device["identity"] = identify(index)
+                with lock:
+                    devices[index] = device
+                return
+
+    threads = [threading.Thread(target=scan, args=(i,), daemon=True) for i in indices]
+    for t in threads:
+        t.start()
+    deadline = time.perf_counter() + timeout * len(backends) + 1.0
+    for t in threads:
+        t.join(max(0.0, deadline - time.perf_counter()))
+    with lock:
+        return dict(sorted(devices.items())), sorted(log)
+
+
+def pick_mode(device, size=FRAME_SIZE):
+    # the wanted size if the device has it, else the closest one
+    return min(device["modes"], key=lambda m: (abs(m[0] * m[1] - size[0] * size[1]),
+                                               m[0] != size[0] or m[1] != size[1]))
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"devices": {}, "choice": None}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _choice(device, size, source):
+    w, h, fps = pick_mode(device, size)
+    return {"index": device["index"], "backend": device["backend"],
+            "backend_name": device.get("backend_name"), "identity": device["identity"],
+            "width": w, "height": h, "fps": fps, "source": source}
+
+
+def resolve(index=None, backend=None, size=FRAME_SIZE, cache_path=CACHE_PATH,
+            opener=cv2.VideoCapture, refresh=False, identify=device_identity,
+            devices=None, **discover_kw):
+    # -> choice {index, backend, width, height, fps, identity, source} or None
+    # index / backend None = any; both given = used as configured
+    # devices: result of a discover() the caller already ran (scan_camera.py),
+    # taken as a fresh discovery instead of probing again
+    if index is not None and backend is not None:
+        return {"index": index, "backend": backend, "backend_name": None,
+                "identity": identify(index), "width": size[0], "height": size[1],
+                "fps": 0.0, "source": "config"}
+
+    cache = load_cache(cache_path)
+    if not refresh and devices is None:
+        for identity, device in cache["devices"].items():
+            if index is not None and device["index"] != index:
+                continue
+            if backend is not None and device["backend"] != backend:
+                continue
+            if identity == cache.get("choice") or index is not None:
+                if identify(device["index"]) == identity:
+                    return _choice(device, size, "cache")
+
+    names = {b: name for name, b in BACKENDS}
+    backends = BACKENDS if backend is None else [(names.get(backend, str(backend)), backend)]
+    indices = INDICES if index is None else [index]
+    if devices is None:
+        devices, _ = discover(indices, backends, opener, identify=identify, **discover_kw)
+    else:
+        devices = {i: d for i, d in devices.items()
+                   if i in indices and (backend is None or d["backend"] == backend)}
+    if not devices:
+        return None
+    for device in devices.values():
+        cache["devices"][device["identity"]] = device
+    # lowest working index = what cv2.VideoCapture(0) would have meant
+    best = devices[min(devices)]
+    cache["choice"] = best["identity"]
+    cache["updated"] = int(time.time())
+    save_cache(cache, cache_path)
+    return _choice(best, size, "discovery")
+
+
+def open_camera(index=None, backend=None, size=FRAME_SIZE, cache_path=CACHE_PATH):
+    # replay.open_camera() with the device / backend / size from resolve();
+    # replays and the frame bus go straight through
+    if replay.active_replay() is not None or os.environ.get(frame_bus.BUS_ENV):
+        return replay.open_camera(index or 0, backend)
+    for refresh in (False, True):
+        choice = resolve(index, backend, size, cache_path, refresh=refresh)
+        if choice is None:
+            break
+        cap = replay.open_camera(choice["index"], choice["backend"])
+        if cap.isOpened():
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, choice["width"])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, choice["height"])
+            print(f"📷 camera {choice['index']} ({choice['backend_name'] or choice['backend']}) "
+                  f"{choice['width']}x{choice['height']} from {choice['source']}")
+            return cap
+        cap.release()
+        if choice["source"] != "cache":
+            break
+    # nothing found: what the scripts did before, the caller checks isOpened()
+    return replay.open_camera(index or 0, backend)
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+
+import face_engine
+
+# Several cameras on one gate -> one owner state (camera_gate.py fusion).
+#
+# Every camera gets a CameraReader thread: read -> gray -> Haar -> the
+# observation (camera, capture time, face yes/no) goes to OwnerFusion.
+# cv2 read() and detectMultiScale() release the GIL, so the cameras really
+# run side by side. Capture time is the replay / fake camera `stamp` when
+# the camera has one, else the clock right after read() returned.
+#
+# OwnerFusion aligns the observations by capture time into frame sets:
+# the oldest waiting observation plus the next one of every other camera
+# captured within ALIGN_S of it (cameras are not synchronized, so their
+# frames of the same moment are up to a frame period apart). A set is
+# fused as "face" if ANY camera in it saw one, or a camera not in it (it
+# dropped that frame) saw one in its last frame within HOLD_S: a view
+# blocked by a shoulder or a door frame does not reset the count as long
+# as another camera sees the face. A set waits for a camera that has not
+# delivered yet at most ALIGN_WAIT_S; a camera without frames for STALE_S
+# (unplugged, frozen) is not waited for at all. Every set is one step of
+# the same smoothing as the single-camera loop: FACE_ON_FRAMES sets with
+# a face in a row -> owner YES, FACE_OFF_FRAMES without -> NO. With one
+# camera every frame is a set, so it counts exactly like the old loop.
+
+ALIGN_S = 1 / 15         # frames this close together = the same moment
+ALIGN_WAIT_S = 0.1       # wait this long for a late camera's frame
+HOLD_S = 0.2             # a camera's last frame still counts this long
+STALE_S = 1.0            # a camera silent this long is left out
+
+
+class OwnerFusion:
+    def __init__(self, cameras, on_frames=5, off_frames=10, align=ALIGN_S,
+                 wait=ALIGN_WAIT_S, hold=HOLD_S, stale=STALE_S):
+        self.cameras = list(cameras)
+        self.on_frames = on_frames
+        self.off_frames = off_frames
+        self.align = align
+        self.wait_s = wait
+        self.hold = hold
+        self.stale = stale
+
+        # smoothing state, as in camera_gate.py
+        self.face_on_count = 0
+        self.face_off_count = 0
+        self.owner = False
+
+        self.pending = {cam: deque() for cam in self.cameras}   # (stamp, face) not fused yet
+        self.last = {}                  # camera -> (stamp, face) of its last fused frame
+        self.delivered = {}             # camera -> stamp of its newest frame
+        self.fused_until = None         # stamp of the last set
+        self.sets = 0
+        self.late = 0                   # frames older than the last set
+        self._cond = threading.Condition()
+
+    def add(self, cam, stamp, face):
+        with self._cond:
+            self.delivered[cam] = max(stamp, self.delivered.get(cam, stamp))
+            if self.fused_until is not None and stamp <= self.fused_until:
+                # too late for its set: only good as the camera's last view
+                self.late += 1
+                if stamp > self.last.get(cam, (-1.0, False))[0]:
+                    self.last[cam] = (stamp, face)
+            else:
+                self.pending[cam].append((stamp, face))
+            self._cond.notify_all()
+
+    def wait(self, timeout):
+        # until a new observation arrived (or timeout)
+        with self._cond:
+            self._cond.wait(timeout)
+
+    def _next_set(self, now):
+        # -> (stamp, face) of the next complete set, or None
+        heads = {cam: q[0] for cam, q in self.pending.items() if q}
+        if not heads:
+            return None
+        start = min(stamp for stamp, _ in heads.values())
+        end = start + self.align
+        members = [cam for cam, (stamp, _) in heads.items() if stamp <= end]
+        if now < end + self.wait_s:
+            for cam in self.cameras:
+                if cam in heads or now - self.delivered.get(cam, -1e18) > self.stale:
+                    continue
+                if self.delivered.get(cam, -1.0) < end:
+                    return None         # its frame of this moment may still come
+        face = False
+        for cam in members:
+            self.last[cam] = self.pending[cam].popleft()
+            face = face or self.last[cam][1]
+        for cam in self.cameras:
+            if cam not in members and cam in self.last:
+                stamp, seen = self.last[cam]
+                face = face or (seen and start - stamp <= self.hold)
+        stamp = max(self.last[cam][0] for cam in members)
+        self.fused_until = stamp if self.fused_until is None else max(self.fused_until, stamp)
+        return stamp, face
+
+    def update(self, now):
+        # -> [(stamp, owner)] for every owner change in the sets that are
+        # complete at `now`
+        changes = []
+        with self._cond:
+            while True:
+                step = self._next_set(now)
+                if step is None:
+                    break
+                stamp, face = step
+                self.sets += 1
+                if face:
+                    self.face_on_count += 1
+                    self.face_off_count = 0
+                else:
+                    self.face_off_count += 1
+                    self.face_on_count = 0
+                if not self.owner and self.face_on_count >= self.on_frames:
+                    self.owner = True
+                    changes.append((stamp, True))
+                if self.owner and self.face_off_count >= self.off_frames:
+                    self.owner = False
+                    changes.append((stamp, False))
+        return changes
+
+
+class CameraReader:
+    # capture + detect thread of one camera, feeding an OwnerFusion
+    def __init__(self, name, cam, fusion, clock=time.time):
+        self.name = name
+        self.cam = cam
+        self.fusion = fusion
+        self.clock = clock
+        self.cascade = face_engine.load_cascade()   # one per thread
+        self.latest = None              # (frame, faces) for the display
+        self.frames = 0
+        self.started = None
+        self.failed = False             # read() failed: camera gone / replay over
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = self.clock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def fps(self):
+        if not self.started:
+            return 0.0
+        return self.frames / max(1e-6, self.clock() - self.started)
+
+    def _run(self):
+        while not self._stop.is_set():
+            ret, frame = self.cam.read()
+            if not ret:
+                self.failed = True
+                break
+            stamp = getattr(self.cam, "stamp", None) or self.clock()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            faces = face_engine.detect_faces(self.cascade, gray)
+            self.frames += 1
+            self.latest = (frame, faces)
+            self.fusion.add(self.name, stamp, len(faces) > 0)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.cam.release()
@@ -1,16 +1,22 @@
 import cv2
-import serial
 import time
 import threading
 
+import camera_discovery
+import camera_fusion
+import display
+import replay
+
 # ==========================
 # CONFIG
 # ==========================
 ARDUINO_PORT = "COM5"   # GANTI sesuai port Arduino kamu
 BAUD_RATE = 9600
 
-CAM_INDEX = 0           # GANTI kalau pakai kamera lain (0 / 1 / 2)
-CAM_BACKEND = cv2.CAP_MSMF   # Sama seperti yang berhasil di test_cam.py
+CAM_INDEX = None        # None = cari otomatis (camera_discovery.py), atau 0 / 1 / 2
+CAM_BACKEND = None      # None = otomatis, atau cv2.CAP_MSMF seperti di test_cam.py
+CAMERAS = [CAM_INDEX]   # lebih dari satu kamera, mis. [0, 1] -> mode fusion (camera_fusion.py):
+                        # semua kamera dibaca paralel, muka di salah satu kamera sudah cukup
 
 # (opsional) untuk kalkulasi status gate di terminal
 GATE_THRESHOLD_CM = 10   # samakan dengan THRESHOLD_CM di Arduino
@@ -19,7 +25,7 @@ GATE_THRESHOLD_CM = 10   # samakan dengan THRESHOLD_CM di Arduino
 # CONNECT TO ARDUINO
 # ==========================
 print(f"Connecting to Arduino on {ARDUINO_PORT}...")
-ser = serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
+ser = replay.open_serial(ARDUINO_PORT, BAUD_RATE, timeout=1)
 time.sleep(2)
 print("Connected to Arduino ✅")
 
@@ -56,10 +62,13 @@ threading.Thread(target=read_arduino, daemon=True).start()
 # ==========================
 # OPEN CAMERA
 # ==========================
-cap = cv2.VideoCapture(CAM_INDEX, CAM_BACKEND)
+caps = [camera_discovery.open_camera(index, CAM_BACKEND) for index in CAMERAS]
+cap = caps[0]
 
-if not cap.isOpened():
+if not all(c.isOpened() for c in caps):
     print("❌ Cannot open camera")
+    for c in caps:
+        c.release()
     ser.close()
     exit()
 
@@ -78,70 +87,125 @@ cam_owner = False      # status owner versi kamera (stabil)
 
 last_gate_status = None   # supaya [STATUS] tidak spam
 
-print("Camera ready. Press 'q' to quit.")
+# window / --headless / --stream [PORT], Ctrl+C keluar (display.py)
+view = display.open_view("Camera (press q to quit)")
+
+print("Camera ready. Press 'q' or Ctrl+C to quit.")
 
 # ==========================
-# MAIN LOOP
+# HELPERS
 # ==========================
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        print("❌ Can't receive camera frame")
-        break
-
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-    # --- update counter on/off ---
-    if len(faces) > 0:
-        face_on_count += 1
-        face_off_count = 0
-    else:
-        face_off_count += 1
-        face_on_count = 0
-
-    # --- NO -> YES (stabil) ---
-    if (not cam_owner) and face_on_count >= FACE_ON_FRAMES:
-        cam_owner = True
-        ser.write(b'1')
-        print("[CAM] Owner: YES (stable)")
-
-    # --- YES -> NO (stabil) ---
-    if cam_owner and face_off_count >= FACE_OFF_FRAMES:
-        cam_owner = False
-        ser.write(b'0')
-        print("[CAM] Owner: NO (stable)")
+def set_owner(owner):
+    # owner berubah (stabil) -> kirim ke Arduino
+    global cam_owner
+    cam_owner = owner
+    ser.write(b'1' if owner else b'0')
+    print(f"[CAM] Owner: {'YES' if owner else 'NO'} (stable)")
 
-    # gambar kotak di wajah (debug)
-    for (x, y, w, h) in faces:
-        cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 255), 2)
-
-    cv2.imshow("Camera (press q to quit)", frame)
 
+def print_status():
     # ---- STATUS di terminal (tidak spam) ----
-    if arduino_distance is not None:
-        try:
-            dist_val = float(arduino_distance)
-        except ValueError:
-            dist_val = None
+    global last_gate_status
+    if arduino_distance is None:
+        return
+    try:
+        dist_val = float(arduino_distance)
+    except ValueError:
+        return
+
+    gate_open = cam_owner and (dist_val <= GATE_THRESHOLD_CM)
+    gate_status = "OPEN" if gate_open else "CLOSED"
+    status_str = f"Distance={dist_val} cm | Owner={'YES' if cam_owner else 'NO'} | Gate={gate_status}"
 
-        if dist_val is not None:
-            gate_open = cam_owner and (dist_val <= GATE_THRESHOLD_CM)
-            gate_status = "OPEN" if gate_open else "CLOSED"
-            status_str = f"Distance={dist_val} cm | Owner={'YES' if cam_owner else 'NO'} | Gate={gate_status}"
+    if status_str != last_gate_status:
+        print(f"[STATUS] {status_str}")
+        last_gate_status = status_str
 
-            if status_str != last_gate_status:
-                print(f"[STATUS] {status_str}")
-                last_gate_status = status_str
 
-    # keluar kalau tekan 'q'
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
+def draw_faces(frame, faces):
+    # gambar kotak di wajah (debug)
+    frame = display.drawable(frame)
+    for (x, y, w, h) in faces:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 255), 2)
+    return frame
+
+
+# ==========================
+# MAIN LOOP
+# ==========================
+if len(caps) == 1:
+    # satu kamera: baca -> deteksi -> counter, frame per frame
+    while not view.should_quit():
+        ret, frame = cap.read()
+        if not ret:
+            print("❌ Can't receive camera frame")
+            break
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+
+        # --- update counter on/off ---
+        if len(faces) > 0:
+            face_on_count += 1
+            face_off_count = 0
+        else:
+            face_off_count += 1
+            face_on_count = 0
+
+        # --- NO -> YES (stabil) ---
+        if (not cam_owner) and face_on_count >= FACE_ON_FRAMES:
+            set_owner(True)
+
+        # --- YES -> NO (stabil) ---
+        if cam_owner and face_off_count >= FACE_OFF_FRAMES:
+            set_owner(False)
+
+        # gambar kotak di wajah (debug), hanya kalau ada yang lihat
+        if view.wants_frame():
+            view.show(draw_faces(frame, faces))
+
+        print_status()
+else:
+    # fusion: satu thread per kamera, deteksi digabung per slot waktu
+    # (camera_fusion.py), counter on/off yang sama di atas slot gabungan
+    rep = replay.active_replay()
+    clock = rep.now if rep is not None else time.time
+    fusion = camera_fusion.OwnerFusion(CAMERAS, FACE_ON_FRAMES, FACE_OFF_FRAMES)
+    readers = [camera_fusion.CameraReader(index, c, fusion, clock).start()
+               for index, c in zip(CAMERAS, caps)]
+    lost = set()
+    while not view.should_quit():
+        fusion.wait(0.05)
+        for _, owner in fusion.update(clock()):
+            set_owner(owner)
+
+        for r in readers:
+            if r.failed and r.name not in lost:
+                lost.add(r.name)
+                print(f"⚠️ camera {r.name}: can't receive frame, continuing without it")
+        if len(lost) == len(readers):
+            print("❌ Can't receive camera frame")
+            break
+
+        if view.wants_frame():
+            tiles = [draw_faces(*r.latest) for r in readers if r.latest is not None]
+            if tiles:
+                h = tiles[0].shape[0]
+                tiles = [t if t.shape[0] == h else
+                         cv2.resize(t, (t.shape[1] * h // t.shape[0], h)) for t in tiles]
+                view.show(cv2.hconcat(tiles))
+
+        print_status()
+
+    for r in readers:
+        r.stop()
+        print(f"[CAM] camera {r.name}: {r.frames} frames, {r.fps():.1f} fps")
 
 # ==========================
 # CLEANUP
 # ==========================
-cap.release()
+for c in caps:
+    c.release()
 ser.close()
-cv2.destroyAllWindows()
+view.close()
 print("Closed.")
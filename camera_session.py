@@ -0,0 +1,193 @@
+import threading
+import time
+
+# Camera that is only powered while a PIR session needs it.
+#
+#   sleep()  session over -> reads block (capture thread idles, no CPU), the
+#            device is released after release_after seconds without a new
+#            session (0 = right away). Keeping it open a little longer makes
+#            a quick re-trigger cheap, releasing it stops the driver from
+#            streaming/decoding frames nobody looks at.
+#   wake()   PIR edge -> a background thread opens the device if needed
+#            (pre-warm, the gateway keeps handling serial meanwhile), then
+#            throws away the frames the driver buffered while nobody was
+#            reading, so the first frame handed out is a fresh one.
+#
+# Use it as the `cam` of VisionPipeline: read() waits until the device is
+# ready and drops the dark frames webcams deliver while auto-exposure
+# settles. The time from wake() to the first valid frame is kept in
+# wake_ms (last) and wake_history.
+#
+# Stale-buffer flush: grab() returns immediately while the driver still
+# has old frames queued, and blocks for about one frame period once the
+# queue is empty. So grab until one call took FRESH_GRAB_S or longer.
+
+RELEASE_AFTER = 30.0   # seconds without a session before the device is released
+FLUSH_MAX = 10         # grabs at most when flushing the driver buffer
+FRESH_GRAB_S = 0.010   # a grab this slow waited for a new frame
+DARK_LEVEL = 10        # mean gray below this = warm-up frame (lens still dark)
+WARMUP_MAX = 15        # accept dark frames after this many (it is just night)
+
+
+class CameraSession:
+    def __init__(self, open_fn, release_after=RELEASE_AFTER, flush_max=FLUSH_MAX,
+                 dark_level=DARK_LEVEL, warmup_max=WARMUP_MAX, cam=None):
+        self.open_fn = open_fn          # () -> opened cv2.VideoCapture-like
+        self.release_after = release_after
+        self.flush_max = flush_max
+        self.dark_level = dark_level
+        self.warmup_max = warmup_max
+
+        self.cam = cam                  # already opened device (startup check)
+        self.awake = False
+        self.opens = 0
+        self.open_failed = 0
+        self.flushed = 0                # stale frames thrown away
+        self.dark_dropped = 0
+        self.open_ms = None             # last device open time
+        self.wake_ms = None             # last wake() -> first valid frame
+        self.wake_history = []
+        self.stamp = None               # capture time of the last frame, if the device has one
+
+        self._wake_t = None             # perf_counter of the pending wake()
+        self._warmup = 0
+        self._idle_since = time.monotonic()
+        self._ready = threading.Event()
+        self._cond = threading.Condition()
+        self._io = threading.Lock()     # cam.read()/grab() vs release()
+        self._stop = False
+        self._thread = None
+
+    # ---------- control ----------
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        with self._cond:
+            if self.awake:
+                return
+            self.awake = True
+            self._wake_t = time.perf_counter()
+            self._warmup = 0
+            self._cond.notify()
+
+    def sleep(self):
+        with self._cond:
+            if not self.awake:
+                return
+            self.awake = False
+            self._ready.clear()
+            self._idle_since = time.monotonic()
+            self._cond.notify()
+
+    def release(self):
+        # stop for good (gateway exit)
+        with self._cond:
+            self._stop = True
+            self.awake = False
+            self._ready.clear()
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._close()
+
+    def isOpened(self):
+        return not self._stop
+
+    def counters(self):
+        return {
+            "open": self.cam is not None,
+            "awake": self.awake,
+            "opens": self.opens,
+            "open_failed": self.open_failed,
+            "open_ms": self.open_ms,
+            "flushed": self.flushed,
+            "dark_dropped": self.dark_dropped,
+            "wake_ms": self.wake_ms,
+        }
+
+    # ---------- capture side ----------
+    def read(self):
+        if not self._ready.wait(0.2):
+            return False, None
+        with self._io:
+            if self.cam is None or not self._ready.is_set():
+                return False, None
+            ret, frame = self.cam.read()
+            self.stamp = getattr(self.cam, "stamp", None)
+        if not ret:
+            return False, None
+
+        if self._wake_t is not None:
+            if self._warmup < self.warmup_max and \
+                    frame[::8, ::8].mean() < self.dark_level:
+                self._warmup += 1
+                self.dark_dropped += 1
+                return False, None
+            self.wake_ms = 1000.0 * (time.perf_counter() - self._wake_t)
+            self.wake_history.append(self.wake_ms)
+            self._wake_t = None
+        return True, frame
+
+    # ---------- device thread ----------
+    def _close(self):
+        with self._io:
+            if self.cam is not None:
+                self.cam.release()
+                self.cam = None
+
+    def _open(self):
+        t0 = time.perf_counter()
+        try:
+            cam = self.open_fn()
+        except Exception as e:        # driver errors differ per backend
+            print(f"❌ Camera open failed: {e!r}")
+            cam = None
+        if cam is None or not cam.isOpened():
+            self.open_failed += 1
+            return False
+        self.open_ms = 1000.0 * (time.perf_counter() - t0)
+        self.opens += 1
+        with self._io:
+            self.cam = cam
+        return True
+
+    def _flush(self):
+        with self._io:
+            for _ in range(self.flush_max):
+                t0 = time.perf_counter()
+                if not self.cam.grab():
+                    break
+                if time.perf_counter() - t0 >= FRESH_GRAB_S:
+                    break
+                self.flushed += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop:
+                    if self.awake and not self._ready.is_set():
+                        break
+                    if not self.awake and self.cam is not None:
+                        left = self._idle_since + self.release_after - time.monotonic()
+                        if left <= 0:
+                            break
+                        self._cond.wait(left)
+                    else:
+                        self._cond.wait()
+                if self._stop:
+                    return
+                awake = self.awake
+
+            if not awake:
+                self._close()
+                continue
+            if self.cam is None and not self._open():
+                time.sleep(1.0)          # retry while the session lasts
+                continue
+            self._flush()
+            with self._cond:
+                if self.awake:
+                    self._ready.set()
@@ -1,27 +1,223 @@
-import cv2
+import argparse
 import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import display
+import face_engine
+import replay
+from recognition_cache import face_hash
+
+# Enrollment: faces of one resident -> dataset/<resident>/ for train_model.py
+#
+#   python capture_dataset.py --resident aria --count 100
+#   python capture_dataset.py --resident aria --pack
+#
+# Every detected face is
+#   1. cropped and resized to face_engine.FACE_SIZE (what recognition
+#      predicts on)
+#   2. checked: sharp enough (variance of the Laplacian >= BLUR_MIN), not
+#      too dark / bright (mean inside EXPOSURE, at most CLIPPED_MAX of the
+#      pixels crushed to black or white)
+#   3. compared with the last DUP_WINDOW faces kept: a dHash within
+#      DUP_BITS bits (recognition_cache.face_hash) is the same pose and
+#      light again -> dropped, so standing still does not fill the dataset
+#   4. handed to WRITERS background threads (cv2.imwrite), the camera loop
+#      never waits for the disk
+# until --count faces were kept.
+#
+# --pack turns dataset/<resident>/*.jpg (and an older pack) into one
+# dataset/<resident>/faces.npy stack (N x 200 x 200 uint8) that
+# train_model.py memory-maps instead of decoding every JPEG. Bigger than
+# the JPEGs, but nothing to decode; the JPEGs are removed once the stack
+# is on disk, later captures are packed into it again.
+#
+# GATE_FRAME_BUS=gate_cam -> frames from the frame bus (frame_bus.py), so
+# the gateway can keep running while the dataset is captured
+
+DATASET_DIR = "dataset"
+RESIDENT = "aria"
+TARGET = 100             # faces kept (after the filters)
+BLUR_MIN = 15.0          # Laplacian variance of the 200x200 crop (dataset: 30..60)
+EXPOSURE = (40, 215)     # mean gray level
+CLIPPED_MAX = 0.25       # share of pixels <= 5 or >= 250
+DUP_BITS = 2             # dHash distance (of 64 bits) that counts as a duplicate
+DUP_WINDOW = 5           # compared with this many faces kept last
+WRITERS = 2
+JPEG_QUALITY = 95
+PACK_NAME = "faces.npy"
+
+
+def normalize(img):
+    if img.shape[::-1] != face_engine.FACE_SIZE:
+        img = cv2.resize(img, face_engine.FACE_SIZE)
+    return img
+
+
+def quality(face):
+    # -> None if the face is usable, else why not
+    if cv2.Laplacian(face, cv2.CV_64F).var() < BLUR_MIN:
+        return "blur"
+    if not EXPOSURE[0] <= face.mean() <= EXPOSURE[1]:
+        return "exposure"
+    if np.count_nonzero((face <= 5) | (face >= 250)) > CLIPPED_MAX * face.size:
+        return "exposure"
+    return None
+
+
+class Dedup:
+    def __init__(self, max_bits=DUP_BITS, window=DUP_WINDOW):
+        self.max_bits = max_bits
+        self.window = window
+        self.recent = []             # hashes of the faces kept last
+
+    def seen(self, face):
+        # True = near-duplicate; otherwise the face counts as kept
+        h = face_hash(face, (0, 0, face.shape[1], face.shape[0]))
+        if any((h ^ k).bit_count() <= self.max_bits for k in self.recent):
+            return True
+        self.recent = (self.recent + [h])[-self.window:]
+        return False
+
+
+def image_files(folder):
+    names = [f for f in os.listdir(folder) if f.endswith(".jpg")] if os.path.isdir(folder) else []
+    return sorted(names, key=lambda f: (len(f), f))
+
+
+class DatasetWriter:
+    # cv2.imwrite on background threads (it releases the GIL)
+    def __init__(self, folder, workers=WRITERS, quality=JPEG_QUALITY):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+        stems = [int(f[:-4]) for f in image_files(folder) if f[:-4].isdigit()]
+        self.next = max(stems, default=0) + 1
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=64)
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, daemon=True)
+                         for _ in range(workers)]
+        for t in self._threads:
+            t.start()
+
+    def put(self, face):
+        path = os.path.join(self.folder, f"{self.next}.jpg")
+        self.next += 1
+        self._queue.put((path, face))
+        return path
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, face = item
+            ok = cv2.imwrite(path, face, self.params)
+            with self._lock:
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+
+    def close(self):
+        # waits until everything queued is on disk
+        for _ in self._threads:
+            self._queue.put(None)
+        for t in self._threads:
+            t.join()
+
+
+def load_folder(folder):
+    # -> faces already enrolled (pack + JPEGs), normalized
+    faces = []
+    pack = os.path.join(folder, PACK_NAME)
+    if os.path.exists(pack):
+        faces.extend(np.load(pack))
+    for name in image_files(folder):
+        img = cv2.imread(os.path.join(folder, name), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            faces.append(normalize(img))
+    return faces
+
+
+def pack_folder(folder):
+    # dataset/<resident>/*.jpg + an older pack -> one faces.npy stack
+    jpgs = image_files(folder)
+    faces = load_folder(folder)
+    if not faces:
+        return 0
+    pack = os.path.join(folder, PACK_NAME)
+    tmp = pack + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.stack(faces))
+    os.replace(tmp, pack)
+    for name in jpgs:
+        os.remove(os.path.join(folder, name))
+    return len(faces)
+
 
-cam = cv2.VideoCapture(0)
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--resident", default=RESIDENT, help="folder under dataset/")
+    ap.add_argument("--count", type=int, default=TARGET)
+    ap.add_argument("--camera", type=int, default=0)
+    ap.add_argument("--pack", action="store_true", help="only pack the folder into faces.npy")
+    args, _ = ap.parse_known_args()     # --headless / --stream go to display.py
+    folder = os.path.join(DATASET_DIR, args.resident)
 
-os.makedirs("dataset/aria", exist_ok=True)
+    if args.pack:
+        n = pack_folder(folder)
+        print(f"✅ {n} faces packed into {os.path.join(folder, PACK_NAME)}")
+        return
 
-count = 0
-while True:
-    ret, frame = cam.read()
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+    cam = replay.open_camera(args.camera)
+    face_cascade = face_engine.load_cascade()
+    writer = DatasetWriter(folder)
+    dedup = Dedup()
+    for face in load_folder(folder)[-DUP_WINDOW:]:
+        dedup.seen(face)
+    rejected = {"blur": 0, "exposure": 0, "duplicate": 0}
+    kept = 0
+    view = display.open_view("Capturing")
+    t0 = time.time()
+    try:
+        while kept < args.count and not view.should_quit():
+            ret, frame = cam.read()
+            if not ret:
+                break
+            gray = face_engine.to_gray(frame)
+            faces = face_engine.detect_faces(face_cascade, gray)
+            draw = view.wants_frame()
+            if draw:
+                frame = display.drawable(frame)
 
-    for (x,y,w,h) in faces:
-        count += 1
-        cv2.imwrite(f"dataset/aria/{count}.jpg", gray[y:y+h, x:x+w])
-        cv2.rectangle(frame,(x,y),(x+w,y+h),(255,255,255),2)
-        cv2.imshow("Capturing", frame)
+            for (x, y, w, h) in faces:
+                face = face_engine.crop_face(gray, (x, y, w, h))
+                reason = quality(face) or ("duplicate" if dedup.seen(face) else None)
+                if reason:
+                    rejected[reason] += 1
+                else:
+                    writer.put(face)
+                    kept += 1
+                if draw:
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 255), 2)
+                    cv2.putText(frame, reason or f"{kept}/{args.count}", (x, y-10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+            if draw:
+                view.show(frame)
+    finally:
+        cam.release()
+        writer.close()
+        view.close()
+    print(f"✅ {kept} faces kept in {time.time() - t0:.0f}s -> {folder} "
+          f"({writer.written} written, {writer.failed} failed), rejected: {rejected}")
 
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-    if count >= 100:
-        break
 
-cam.release()
-cv2.destroyAllWindows()
+if __name__ == "__main__":
+    main()
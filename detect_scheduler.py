@@ -0,0 +1,101 @@
+import threading
+
+import face_engine
+
+# Detection scheduler: full-frame Haar only on keyframes.
+#
+# Between keyframes every face of the last detection is searched only
+# inside its box grown by ROI_MARGIN on every side (one ROI per face, so
+# the face recognition picks as best is tracked too, not only the biggest
+# one). A full-frame detection is forced when
+#   - KEYFRAME_INTERVAL frames passed since the last full-frame run
+#   - there is no track yet
+#   - the ROI search of any face missed (tracking confidence dropped)
+#
+# detect(gray) has the same output as face_engine.detect_faces(), so it
+# can be passed as detect_fn to VisionPipeline. It runs on several detect
+# workers at once: the ROI search uses a cascade per thread.
+
+
+def expand_box(box, margin, width, height):
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(0, x - dx), max(0, y - dy)
+    x1, y1 = min(width, x + w + dx), min(height, y + h + dy)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class DetectScheduler:
+    def __init__(self, face_cascade, keyframe_interval=5, roi_margin=0.5,
+                 detect_fn=None):
+        self.face_cascade = face_engine.per_thread(face_cascade)
+        self.keyframe_interval = keyframe_interval
+        self.roi_margin = roi_margin
+        # full-frame detector, gray -> boxes
+        self.detect_fn = detect_fn or (
+            lambda gray: face_engine.detect_faces(self.face_cascade, gray))
+
+        self.tracks = None         # last face boxes [(x, y, w, h)]
+        self.since_key = 0
+        self.full_runs = 0
+        self.roi_runs = 0
+        self.roi_misses = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.tracks = None
+
+    def detect(self, gray):
+        with self.lock:
+            tracks = self.tracks
+            keyframe = (not tracks
+                        or self.since_key >= self.keyframe_interval - 1)
+            if keyframe:
+                self.since_key = 0
+            else:
+                self.since_key += 1
+
+        faces = self.detect_roi(gray, tracks) if not keyframe else None
+        if faces is None:
+            faces = self.detect_fn(gray)
+            with self.lock:
+                self.full_runs += 1
+                self.since_key = 0
+
+        with self.lock:
+            # track every face: which one is the resident is up to recognition
+            self.tracks = [tuple(int(v) for v in box) for box in faces] or None
+        return faces
+
+    def detect_roi(self, gray, tracks):
+        # one box per track, None = an ROI search failed -> caller falls
+        # back to full frame
+        height, width = gray.shape[:2]
+        boxes = []
+        for track in tracks:
+            rx, ry, rw, rh = expand_box(track, self.roi_margin, width, height)
+            roi = gray[ry:ry+rh, rx:rx+rw]
+
+            min_side = int(min(track[2], track[3]) * 0.6)
+            faces = self.face_cascade.detectMultiScale(
+                roi, 1.3, 5, minSize=(min_side, min_side))
+
+            with self.lock:
+                self.roi_runs += 1
+                if len(faces) == 0:
+                    self.roi_misses += 1
+                    return None
+            # ROIs of faces close together overlap: keep the one of this track
+            cx, cy = track[0] + track[2] / 2 - rx, track[1] + track[3] / 2 - ry
+            x, y, w, h = min(faces, key=lambda b: (b[0] + b[2] / 2 - cx) ** 2
+                                                  + (b[1] + b[3] / 2 - cy) ** 2)
+            boxes.append((x + rx, y + ry, w, h))
+        return boxes
+
+    def counters(self):
+        return {
+            "full_runs": self.full_runs,
+            "roi_runs": self.roi_runs,
+            "roi_misses": self.roi_misses,
+        }
@@ -0,0 +1,233 @@
+import argparse
+import os
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+# Where the annotated frames go, chosen at runtime instead of always
+# cv2.imshow() + cv2.waitKey(1):
+#
+#   window  -> cv2.imshow, 'q' quits (the old behaviour)
+#   none    -> headless: no overlays, no imshow/waitKey
+#   stream  -> MJPEG on http://127.0.0.1:PORT/ (open it in a browser or
+#              VLC); frames are drawn and JPEG-encoded only while a client
+#              is connected, at most STREAM_FPS per second
+#
+# Mode: DISPLAY_MODE in the script, overridden by GATE_DISPLAY=window|none|
+# stream[:port] or the command line (--headless, --stream [PORT]).
+# In every mode SIGINT/SIGTERM only set a flag, the loop checks
+# view.should_quit() and leaves through its normal cleanup.
+#
+#   view = display.open_view("Recognition", DISPLAY_MODE, STREAM_PORT)
+#   while not view.should_quit():
+#       ...
+#       if view.wants_frame():      # False when nobody would see it
+#           draw overlays on frame
+#           view.show(frame)
+#   view.close()
+#
+# Frames from the shared-memory frame bus (frame_bus.py) are read-only
+# views: draw on display.drawable(frame), a copy only when needed.
+
+DISPLAY_ENV = "GATE_DISPLAY"
+MODES = ("window", "none", "stream")
+STREAM_PORT = 8081
+STREAM_FPS = 5.0
+JPEG_QUALITY = 70
+
+
+def drawable(frame):
+    # frame that overlays may be drawn on (bus frames are shared, read-only)
+    return frame if frame.flags.writeable else frame.copy()
+
+
+class QuitFlag:
+    # SIGINT (Ctrl+C) / SIGTERM (service stop) -> flag instead of an exception
+    def __init__(self):
+        self.event = threading.Event()
+        self.signal = None
+
+    def install(self):
+        if threading.current_thread() is not threading.main_thread():
+            return self                 # signal handlers only in the main thread
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self._handle)
+        return self
+
+    def _handle(self, signum, frame):
+        if self.event.is_set() and signum == signal.SIGINT:
+            raise KeyboardInterrupt     # second Ctrl+C: stuck somewhere, get out
+        self.signal = signum
+        self.event.set()
+
+    def is_set(self):
+        return self.event.is_set()
+
+
+class MjpegStream:
+    # multipart/x-mixed-replace server; the newest frame is encoded once
+    # (in a client thread) no matter how many clients are watching
+    def __init__(self, port=STREAM_PORT, fps=STREAM_FPS, host="127.0.0.1",
+                 quality=JPEG_QUALITY):
+        self.fps = fps
+        self.quality = quality
+        self.clients = 0
+        self.encoded = 0
+        self._frame = None
+        self._seq = 0
+        self._jpeg = (0, None)          # (seq, bytes)
+        self._last_publish = 0.0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def wants_frame(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.clients > 0 and now - self._last_publish >= 1.0 / self.fps
+
+    def publish(self, frame):
+        # keeps a reference only; the caller must not draw on it afterwards
+        with self._cond:
+            self._frame = frame
+            self._seq += 1
+            self._last_publish = time.monotonic()
+            self._cond.notify_all()
+
+    def close(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _next_jpeg(self, seen):
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seen or self._stop.is_set(), 1.0)
+            seq, frame = self._seq, self._frame
+            if seq == seen or frame is None:
+                return seen, None
+            if self._jpeg[0] == seq:
+                return seq, self._jpeg[1]
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return seq, None
+        jpeg = buf.tobytes()
+        with self._cond:
+            if self._jpeg[0] < seq:
+                self._jpeg = (seq, jpeg)
+                self.encoded += 1
+        return seq, jpeg
+
+    def _handler(self):
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/stream"):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                with stream._cond:
+                    stream.clients += 1
+                seen = stream._seq
+                try:
+                    while not stream._stop.is_set():
+                        seen, jpeg = stream._next_jpeg(seen)
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                         b"Content-Length: %d\r\n\r\n" % len(jpeg))
+                        self.wfile.write(jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stream._cond:
+                        stream.clients -= 1
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class View:
+    def __init__(self, window, mode="window", stream=None):
+        if mode not in MODES:
+            raise ValueError(f"display mode must be one of {MODES}, not {mode!r}")
+        self.window = window
+        self.mode = mode
+        self.stream = stream
+        self.quit = QuitFlag().install()
+        self._shown = False
+
+    def wants_frame(self):
+        if self.mode == "window":
+            return True
+        if self.mode == "stream":
+            return self.stream.wants_frame()
+        return False
+
+    def show(self, frame):
+        if self.mode == "window":
+            cv2.imshow(self.window, frame)
+            self._shown = True
+        elif self.mode == "stream":
+            self.stream.publish(frame)
+
+    def hide(self):
+        if self._shown:
+            try:
+                cv2.destroyWindow(self.window)
+            except cv2.error:
+                pass
+            self._shown = False
+
+    def should_quit(self):
+        # window mode: also the 'q' key (waitKey pumps the GUI events)
+        if self.mode == "window" and cv2.waitKey(1) & 0xFF == ord("q"):
+            self.quit.event.set()
+        return self.quit.is_set()
+
+    def close(self):
+        if self.mode == "window":
+            cv2.destroyAllWindows()
+        if self.stream is not None:
+            self.stream.close()
+
+
+def parse_mode(default="window", default_port=STREAM_PORT, argv=None):
+    # (mode, port) from the command line, GATE_DISPLAY or the default
+    ap = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    ap.add_argument("--headless", action="store_true")
+    ap.add_argument("--stream", nargs="?", type=int, const=default_port)
+    args, _ = ap.parse_known_args(argv)
+    if args.headless:
+        return "none", default_port
+    if args.stream is not None:
+        return "stream", args.stream
+    env = os.environ.get(DISPLAY_ENV)
+    if env:
+        mode, _, port = env.partition(":")
+        return mode, int(port) if port else default_port
+    return default, default_port
+
+
+def open_view(window, default="window", port=STREAM_PORT, fps=STREAM_FPS, argv=None):
+    mode, port = parse_mode(default, port, argv)
+    stream = None
+    if mode == "stream":
+        stream = MjpegStream(port, fps).start()
+        print(f"📺 Debug stream on http://127.0.0.1:{stream.port}/")
+    return View(window, mode, stream)
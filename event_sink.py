@@ -0,0 +1,220 @@
+import json
+import random
+import sqlite3
+import string
+import threading
+import time
+from collections import deque
+
+import metrics
+
+# Background Firebase writer for gate_logs.
+#
+# sink.push(event) only appends to an in-memory list and returns (a few us),
+# the HTTPS round-trip happens on the worker thread:
+#   1. new events are written to the spool (SQLite, append-only table) first,
+#      so nothing is lost if the network or the process dies
+#   2. the oldest BATCH_MAX spooled events go out as ONE multi-path
+#      ref.update({push_id: event, ...}) instead of one push() per event
+#   3. rows are deleted from the spool only after update() succeeded
+# While Firebase is slow/unreachable events just pile up in the spool
+# (retry with exponential backoff) and are replayed in order later, also
+# after a restart of the gateway.
+#
+# Keys are generated locally in the Firebase push-id format (time ordered),
+# so the gate_logs children look exactly like the ones db_ref.push() made.
+#
+# ref may be None at first (Firebase still connecting at startup, see
+# startup.py): events are spooled as usual and go out once attach(ref).
+
+BATCH_MAX = 50          # events per update()
+FLUSH_INTERVAL = 0.5    # seconds the worker waits to collect a batch
+RETRY_MIN = 1.0         # backoff after a failed update(), doubled up to RETRY_MAX
+RETRY_MAX = 30.0
+SPOOL_MAX = 100000      # spooled rows kept while offline (oldest dropped)
+
+PUSH_CHARS = "-0123456789" + string.ascii_uppercase + "_" + string.ascii_lowercase
+
+UPDATE_SECONDS = metrics.histogram("gate_firebase_update_seconds", "ref.update() of one batch")
+EVENTS_SENT = metrics.counter("gate_firebase_events_total", "Events confirmed by Firebase")
+UPDATE_FAILED = metrics.counter("gate_firebase_failures_total", "Failed ref.update() calls")
+
+
+class PushIdGenerator:
+    # Same layout as Firebase push ids: 8 chars of ms timestamp + 12 random
+    # chars, random part incremented when two ids share a millisecond, so
+    # the keys sort in creation order.
+    def __init__(self):
+        self.last_ms = -1
+        self.last_rand = [0] * 12
+        self.rng = random.SystemRandom()
+
+    def __call__(self, now=None):
+        ms = int((time.time() if now is None else now) * 1000)
+        if ms == self.last_ms:
+            for i in range(11, -1, -1):
+                if self.last_rand[i] != 63:
+                    self.last_rand[i] += 1
+                    break
+                self.last_rand[i] = 0
+        else:
+            self.last_rand = [self.rng.randrange(64) for _ in range(12)]
+        self.last_ms = ms
+
+        stamp = []
+        for _ in range(8):
+            stamp.append(PUSH_CHARS[ms % 64])
+            ms //= 64
+        return "".join(reversed(stamp)) + "".join(PUSH_CHARS[i] for i in self.last_rand)
+
+
+class EventSink:
+    def __init__(self, ref, spool_path="gate_logs.spool.db",
+                 batch_max=BATCH_MAX, flush_interval=FLUSH_INTERVAL):
+        self.ref = ref                  # firebase_admin db.reference (or fake), None = later
+        self.spool_path = spool_path
+        self.batch_max = batch_max
+        self.flush_interval = flush_interval
+
+        self.pushed = 0
+        self.sent = 0
+        self.batches = 0
+        self.failed = 0                 # failed update() calls
+        self.dropped = 0                # spool overflow
+        self.pending = 0                # rows in the spool
+        self.lags = deque(maxlen=1000)  # push() -> confirmed by update(), seconds
+        self.last_error = None
+
+        self._new_id = PushIdGenerator()
+        self._incoming = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- producer side ----------
+    def push(self, event):
+        # non-blocking; returns the push id the event will be stored under
+        now = time.time()
+        with self._lock:
+            key = self._new_id(now)
+            self._incoming.append((key, now, event))
+            self.pushed += 1
+            if len(self._incoming) >= self.batch_max:
+                self._wake.set()
+        return key
+
+    def attach(self, ref):
+        # Firebase is up: send what was spooled meanwhile
+        self.ref = ref
+        self._wake.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self, timeout=5.0):
+        # try to deliver what is left; anything undelivered stays spooled
+        # and is replayed on the next start
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def counters(self):
+        lags = sorted(self.lags)
+        return {
+            "pushed": self.pushed,
+            "sent": self.sent,
+            "batches": self.batches,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "pending": self.pending,
+            "lag_p50_ms": 1000.0 * lags[len(lags) // 2] if lags else 0.0,
+            "lag_max_ms": 1000.0 * lags[-1] if lags else 0.0,
+        }
+
+    # ---------- worker ----------
+    def _open_spool(self):
+        conn = sqlite3.connect(self.spool_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS spool ("
+                     "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                     "key TEXT NOT NULL, stamp REAL NOT NULL, event TEXT NOT NULL)")
+        conn.commit()
+        return conn
+
+    def _spool_incoming(self, conn):
+        with self._lock:
+            rows, self._incoming = self._incoming, []
+        if rows:
+            conn.executemany("INSERT INTO spool (key, stamp, event) VALUES (?, ?, ?)",
+                             [(k, s, json.dumps(e)) for k, s, e in rows])
+            self.pending += len(rows)
+            if self.pending > SPOOL_MAX:
+                extra = self.pending - SPOOL_MAX
+                conn.execute("DELETE FROM spool WHERE id IN "
+                             "(SELECT id FROM spool ORDER BY id LIMIT ?)", (extra,))
+                self.pending -= extra
+                self.dropped += extra
+            conn.commit()
+
+    def _send_batch(self, conn):
+        # True if the spool may still hold events (send again right away)
+        if self.ref is None:
+            return False
+        rows = conn.execute("SELECT id, key, stamp, event FROM spool "
+                            "ORDER BY id LIMIT ?", (self.batch_max,)).fetchall()
+        if not rows:
+            return False
+        batch = {key: json.loads(event) for _, key, _, event in rows}
+        with UPDATE_SECONDS.time():
+            self.ref.update(batch)
+
+        done = time.time()
+        conn.execute("DELETE FROM spool WHERE id <= ?", (rows[-1][0],))
+        conn.commit()
+        self.pending -= len(rows)
+        self.sent += len(rows)
+        self.batches += 1
+        EVENTS_SENT.inc(len(rows))
+        self.lags.extend(done - stamp for _, _, stamp, _ in rows)
+        return len(rows) == self.batch_max
+
+    def _run(self):
+        conn = self._open_spool()
+        self.pending = conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+        retry, next_try = 0.0, 0.0
+        try:
+            while True:
+                stopping = self._stop.is_set()
+                if not stopping:
+                    self._wake.wait(self.flush_interval)
+                    self._wake.clear()
+                # spool every round, even while backing off
+                self._spool_incoming(conn)
+                if not stopping and time.time() < next_try:
+                    continue
+                try:
+                    while self._send_batch(conn):
+                        self._spool_incoming(conn)
+                    if self.last_error is not None:
+                        print(f"✅ Firebase writes resumed ({self.sent} sent)")
+                        self.last_error = None
+                    retry = 0.0
+                except Exception as e:      # network, auth, quota ... keep spooling
+                    self.failed += 1
+                    UPDATE_FAILED.inc()
+                    if repr(e) != self.last_error:
+                        print(f"⚠️ Firebase write failed ({self.pending} spooled): {e!r}")
+                    self.last_error = repr(e)
+                    retry = min(RETRY_MAX, max(RETRY_MIN, retry * 2))
+                    next_try = time.time() + retry
+                if stopping:
+                    break
+        finally:
+            self._spool_incoming(conn)
+            conn.close()
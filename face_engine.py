@@ -0,0 +1,216 @@
+import json
+import threading
+from collections import namedtuple
+
+import cv2
+
+# Shared face detection + LBPH recognition used by the gateways.
+# Same logic that used to be copy-pasted in every script:
+#   detectMultiScale(gray, 1.3, 5) -> crop -> resize 200x200 -> predict
+#   owner = enrolled resident and conf < its threshold (LBPH: smaller = better)
+
+FACE_SIZE = (200, 200)
+OWNER_LABEL = 1
+OWNER_NAME = "Aria"
+
+# Enrolled residents: label id -> {"name", "folder", "threshold"}
+# train_model.py writes it as <model>.labels.json, one dataset/<folder> per
+# resident. threshold None = use the CONF_THRESHOLD of the script.
+# Without the file: the original single-owner model (label 1 = Aria).
+DEFAULT_LABELS = {
+    OWNER_LABEL: {"name": OWNER_NAME, "folder": "aria", "threshold": None},
+}
+
+# Result for one frame
+#   owner     -> at least one face recognized as a resident
+#   best_box  -> (x, y, w, h) of the best (lowest conf) face, or None
+#   best_text -> label for the overlay, e.g. "Aria (42.1)"
+#   best_conf -> lowest confidence, or None when no face
+#   name      -> resident name of the best face, or None
+#   margin    -> evidence for owner_decision.py: largest (threshold - conf)
+#                over faces with a resident label (> 0 = owner frame), None
+#                when no face carries a resident label
+Recognition = namedtuple("Recognition",
+                         ["owner", "best_box", "best_text", "best_conf",
+                          "name", "margin"], defaults=(None,))
+
+NO_FACE = Recognition(False, None, "NO FACE", None, None)
+
+# Detection profiles
+# Haar cost grows with pixel count, so detect on a downscaled gray frame and
+# map the boxes back to full resolution before crop + predict.
+#   scale          -> resize factor for the detection image
+#   min_face/max_face -> expected face size in FULL-RES pixels (None = any)
+# "full" is the original behaviour (detectMultiScale(gray, 1.3, 5)).
+DETECT_PROFILES = {
+    "full": {"scale": 1.0, "min_face": None, "max_face": None},
+    # person standing at the gate (Arduino THRESHOLD_CM = 10): big, close face
+    "near-gate": {"scale": 0.4, "min_face": 100, "max_face": 400},
+    # camera looking down a hallway / driveway: smaller faces
+    "hallway": {"scale": 0.75, "min_face": 40, "max_face": 200},
+}
+
+
+def load_cascade(per_thread=False):
+    # per_thread -> ThreadCascade, for detectors called from several threads
+    if per_thread:
+        return ThreadCascade()
+    return cv2.CascadeClassifier(
+        cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+    )
+
+
+class ThreadCascade:
+    # CascadeClassifier stand-in with one real classifier per calling thread:
+    # detectMultiScale() on one classifier shared by several threads is not
+    # thread-safe (VisionPipeline detect workers)
+    def __init__(self):
+        self._local = threading.local()
+
+    def detectMultiScale(self, *args, **kwargs):
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = self._local.cascade = load_cascade()
+        return cascade.detectMultiScale(*args, **kwargs)
+
+
+def per_thread(face_cascade):
+    # a cascade that is safe to share between threads
+    if isinstance(face_cascade, ThreadCascade):
+        return face_cascade
+    return ThreadCascade()
+
+
+def labels_path(model_path):
+    return model_path.rsplit(".", 1)[0] + ".labels.json"
+
+
+def load_labels(model_path="face_model.yml"):
+    try:
+        with open(labels_path(model_path)) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return dict(DEFAULT_LABELS)
+    return {int(label): info for label, info in data.items()}
+
+
+def save_labels(labels, model_path="face_model.yml"):
+    with open(labels_path(model_path), "w") as f:
+        json.dump({str(k): v for k, v in sorted(labels.items())}, f, indent=2)
+
+
+def load_recognizer(path="face_model.yml", engine="numpy"):
+    # "numpy"       -> lbph_engine.LBPHEngine (batched, same decisions)
+    # "numpy-index" -> the same + the approximate PQ index (face_index.py)
+    #                  when train_model.py saved one (big households)
+    # "opencv"      -> cv2.face.LBPHFaceRecognizer
+    if engine in ("numpy", "numpy-index"):
+        from lbph_engine import LBPHEngine
+        return LBPHEngine.from_file(path, use_index=engine == "numpy-index")
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(path)
+    return recognizer
+
+
+def predict_many(recognizer, crops):
+    if hasattr(recognizer, "predict_batch"):
+        return recognizer.predict_batch(crops)
+    return [recognizer.predict(crop) for crop in crops]
+
+
+def to_gray(frame):
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def detect_faces(face_cascade, gray):
+    return face_cascade.detectMultiScale(gray, 1.3, 5)
+
+
+def detect_faces_scaled(face_cascade, gray, scale=1.0,
+                        min_face=None, max_face=None):
+    if scale == 1.0 and min_face is None and max_face is None:
+        return detect_faces(face_cascade, gray)
+
+    small = gray
+    if scale != 1.0:
+        small = cv2.resize(gray, None, fx=scale, fy=scale,
+                           interpolation=cv2.INTER_AREA)
+
+    kwargs = {}
+    if min_face:
+        side = max(24, int(min_face * scale))   # 24 = Haar window size
+        kwargs["minSize"] = (side, side)
+    if max_face:
+        side = int(max_face * scale)
+        kwargs["maxSize"] = (side, side)
+
+    faces = face_cascade.detectMultiScale(small, 1.3, 5, **kwargs)
+    if scale == 1.0:
+        return faces
+
+    # back to full-res coordinates, clipped to the frame
+    height, width = gray.shape[:2]
+    boxes = []
+    for (x, y, w, h) in faces:
+        x0, y0 = int(x / scale), int(y / scale)
+        x1 = min(width, int((x + w) / scale))
+        y1 = min(height, int((y + h) / scale))
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+    return boxes
+
+
+def make_detector(face_cascade, profile="full"):
+    # gray -> full-res boxes, for VisionPipeline / DetectScheduler detect_fn
+    params = DETECT_PROFILES[profile]
+    return lambda gray: detect_faces_scaled(face_cascade, gray, **params)
+
+
+def crop_face(gray, box):
+    x, y, w, h = box
+    return cv2.resize(gray[y:y+h, x:x+w], FACE_SIZE)
+
+
+def resident_margin(labels, label, conf, threshold):
+    # threshold - conf for a resident label (> 0 = accepted), None otherwise
+    info = labels.get(label)
+    if info is None:
+        return None
+    limit = info.get("threshold")
+    return (threshold if limit is None else limit) - conf
+
+
+def is_resident(labels, label, conf, threshold):
+    margin = resident_margin(labels, label, conf, threshold)
+    return margin is not None and margin > 0
+
+
+def recognize_faces(recognizer, gray, faces, threshold, labels=None, cache=None,
+                    now=None):
+    # cache: recognition_cache.RecognitionCache -> predict only faces whose
+    # tracked result cannot be reused, conf comes from the track's history
+    labels = labels or DEFAULT_LABELS
+    best = NO_FACE
+    owner_now = False
+    best_margin = None
+
+    if cache is not None:
+        results = cache.predict(recognizer, gray, faces, threshold, labels, now)
+    else:
+        results = predict_many(recognizer, [crop_face(gray, box) for box in faces])
+    for box, (label, conf) in zip(faces, results):
+        margin = resident_margin(labels, label, conf, threshold)
+        is_owner = margin is not None and margin > 0
+
+        if is_owner:
+            owner_now = True
+        if margin is not None and (best_margin is None or margin > best_margin):
+            best_margin = margin
+
+        # show best (lowest conf)
+        if best.best_conf is None or conf < best.best_conf:
+            name = labels[label]["name"] if is_owner else None
+            text = (name or "Unknown") + f" ({conf:.1f})"
+            best = Recognition(False, tuple(int(v) for v in box), text, conf,
+                               name)
+
+    return best._replace(owner=owner_now, margin=best_margin)
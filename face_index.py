@@ -0,0 +1,139 @@
+import hashlib
+
+import numpy as np
+
+from lbph_engine import chi2_alt
+
+# Product-quantized flat index over the LBPH histograms.
+#
+# A LBPH feature is grid_x * grid_y cell histograms and the chi-square
+# distance is a plain sum over cells, so every cell is one PQ sub-space:
+#   build  : k-means (PQ_CODES centroids) per cell, each training sample is
+#            stored as one uint8 code per cell
+#   search : table[cell, code] = chi-square(query cell, centroid), the
+#            approximate distance of every sample is a sum of table lookups,
+#            and the RERANK best candidates get the exact distance
+# So the per-sample cost is `cells` lookups instead of cells * 256 divisions,
+# and lookup time stays almost flat as residents/photos are added.
+#
+# Saved as <model>.index.npz next to face_model.yml (see index_path()),
+# with model_hash() of the histograms + labels it was built from: the
+# engine only uses an index whose hash matches the model it loaded (same
+# sample count is not enough, e.g. a photo replaced by another one).
+
+PQ_CODES = 32        # centroids per cell (<= 256, codes are uint8)
+KMEANS_ITERS = 8
+KMEANS_SAMPLE = 2000  # max samples used to fit the codebooks
+RERANK = 32
+
+
+def index_path(model_path):
+    base = model_path.rsplit(".", 1)[0]
+    return base + ".index.npz"
+
+
+def model_hash(hist, labels):
+    # what ties an index to its model: sha1 of the training histograms + labels
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(labels, dtype=np.int32))
+    h.update(np.ascontiguousarray(hist, dtype=np.float32))
+    return h.hexdigest()
+
+
+def _kmeans(points, k, iters, rng):
+    k = min(k, len(points))
+    centers = points[rng.choice(len(points), k, replace=False)].copy()
+    p2 = (points * points).sum(axis=1)[:, None]
+    for _ in range(iters):
+        d = p2 - 2.0 * points @ centers.T + (centers * centers).sum(axis=1)
+        assign = d.argmin(axis=1)
+        for c in range(k):
+            members = points[assign == c]
+            if len(members):
+                centers[c] = members.mean(axis=0)
+    return centers
+
+
+class FaceIndex:
+    def __init__(self, codebooks, codes, model=None):
+        self.codebooks = codebooks      # (cells, k, bins) float32
+        self.codes = codes              # (samples, cells) uint8
+        self.model = model              # model_hash() it was built for
+        self.cells = codebooks.shape[0]
+        self.bins = codebooks.shape[2]
+
+    @classmethod
+    def build(cls, hist, cells, seed=0, codebooks=None, labels=None, known=None):
+        # codebooks: reuse trained centroids (incremental training) and only
+        # encode the samples, k-means is most of the build time
+        # known: {row: codes} of samples already encoded with these codebooks
+        # (previous index), only the other rows are encoded
+        known = known if codebooks is not None else None
+        rng = np.random.default_rng(seed)
+        n = hist.shape[0]
+        bins = hist.shape[1] // cells
+        by_cell = hist.reshape(n, cells, bins)
+        sample = by_cell
+        if n > KMEANS_SAMPLE:
+            sample = by_cell[rng.choice(n, KMEANS_SAMPLE, replace=False)]
+
+        fit = codebooks is None
+        if fit:
+            codebooks = np.zeros((cells, min(PQ_CODES, n), bins), dtype=np.float32)
+        codes = np.zeros((n, cells), dtype=np.uint8)
+        rows = np.arange(n)
+        if known:
+            for row, row_codes in known.items():
+                codes[row] = row_codes
+            rows = np.array([row for row in range(n) if row not in known], dtype=np.intp)
+        for c in range(cells):
+            if fit:
+                codebooks[c] = _kmeans(sample[:, c, :], codebooks.shape[1],
+                                       KMEANS_ITERS, rng)
+            centers = codebooks[c]
+            # encode with the same distance used at query time
+            for start in range(0, len(rows), 512):
+                part = rows[start:start + 512]
+                codes[part, c] = chi2_alt(centers, by_cell[part, c, :]).argmin(axis=0)
+        model = model_hash(hist, labels) if labels is not None else None
+        return cls(codebooks, codes, model)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        model = str(data["model"]) if "model" in data.files else None
+        return cls(data["codebooks"], data["codes"], model)
+
+    def save(self, path):
+        np.savez(path, codebooks=self.codebooks, codes=self.codes,
+                 model=np.array(self.model or ""))
+
+    def __len__(self):
+        return len(self.codes)
+
+    # ---------- search ----------
+    def table(self, query):
+        # (cells, k): chi-square of every query cell against its centroids
+        q = query.reshape(self.cells, 1, self.bins)
+        diff = self.codebooks - q
+        diff *= diff
+        den = self.codebooks + q
+        den += np.float32(1e-30)
+        diff /= den
+        return 2.0 * diff.sum(axis=2, dtype=np.float64)
+
+    def approx(self, query):
+        table = self.table(query)
+        return table[np.arange(self.cells), self.codes].sum(axis=1)
+
+    def search(self, query, hist, rerank=RERANK):
+        # (index, exact distance) of the best sample among the candidates
+        approx = self.approx(query)
+        if len(approx) > rerank:
+            cand = np.argpartition(approx, rerank)[:rerank]
+        else:
+            cand = np.arange(len(approx))
+        cand.sort()          # ties -> lowest index, like the full scan
+        exact = chi2_alt(query[None, :], hist[cand])[0]
+        best = int(exact.argmin())
+        return int(cand[best]), float(exact[best])
@@ -0,0 +1,189 @@
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+import serial_frame
+
+# Fake Arduino on a pseudo-terminal (Linux/macOS only).
+# Behaves like sketch_jan28a.ino: prints one status line every PERIOD and
+# accepts O1/O0 and S1/S0 commands. Open fake.port with serial.Serial()
+# exactly like the real COM port.
+#
+# "late" Arduino simulation:
+#   jitter     -> extra random delay (seconds) before each line
+#   split_prob -> probability a line is sent in two halves with split_gap
+#                 between them (partial line seen by readline)
+#   baud       -> a pty has no baud rate; if set, every write in either
+#                 direction is delayed by its time on a real UART (10 bits
+#                 per byte)
+#
+# line_format=BINARY sends serial_frame status frames instead of text and
+# accepts command frames as well as the text commands.
+#
+# boot_delay -> like the reset on port open: nothing for this long, then
+# READY (frame / line), then the status lines. None = no READY at all (a
+# board that does not reset, or a sketch without the handshake).
+
+# DIST,12,PIR,1,SESSION,1,OWNER,1,GATE,1   (smart_home_gateway_modelb.py)
+FORMAT_MODELB = "DIST,{dist},PIR,{pir},SESSION,{session},OWNER,{owner},GATE,{gate}"
+# DIST,12,OWNER,1,PIR,1,GATE,1             (smart_gate_gateway.py)
+FORMAT_GATE = "DIST,{dist},OWNER,{owner},PIR,{pir},GATE,{gate}"
+
+BINARY = "binary"
+
+THRESHOLD_CM = 10
+
+
+class FakeArduino:
+    def __init__(self, line_format=FORMAT_MODELB, period=0.15,
+                 jitter=0.0, split_prob=0.0, split_gap=0.3, seed=None, baud=None,
+                 boot_delay=None):
+        self.line_format = line_format
+        self.boot_delay = boot_delay
+        self.baud = baud
+        self.status_seq = 0
+        self.period = period
+        self.jitter = jitter
+        self.split_prob = split_prob
+        self.split_gap = split_gap
+        self.rng = random.Random(seed)
+
+        # sensor values (change them from the test/benchmark)
+        self.distance = 50
+        self.pir = False
+
+        # state driven by Python commands
+        self.owner = False
+        self.session = False
+        self.gate = False
+        self.received = []   # (time, command bytes)
+
+        self.master, slave = os.openpty()
+        tty.setraw(slave)
+        self.port = os.ttyname(slave)
+        self._slave = slave
+
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for target in (self._tx_loop, self._rx_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=2)
+        for fd in (self.master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- Arduino -> Python ----------
+    def wire_time(self, nbytes):
+        return nbytes * 10.0 / self.baud if self.baud else 0.0
+
+    def status_line(self):
+        self.gate = self.session and self.owner and self.distance < THRESHOLD_CM
+        if self.line_format == BINARY:
+            self.status_seq += 1
+            return serial_frame.encode_status(
+                {"distance": self.distance, "pir": self.pir, "session": self.session,
+                 "owner": self.owner, "gate": self.gate}, self.status_seq)
+        return self.line_format.format(
+            dist=self.distance,
+            pir=int(self.pir),
+            session=int(self.session),
+            owner=int(self.owner),
+            gate=int(self.gate),
+        ) + "\r\n"
+
+    def ready_line(self):
+        if self.line_format == BINARY:
+            return serial_frame.encode_ready()
+        return b"READY\r\n"
+
+    def _tx_loop(self):
+        if self.boot_delay is not None:
+            if self._stop.wait(self.boot_delay):
+                return
+            try:
+                os.write(self.master, self.ready_line())
+            except OSError:
+                return
+        while not self._stop.is_set():
+            if self.jitter:
+                time.sleep(self.rng.uniform(0, self.jitter))
+
+            data = self.status_line()
+            if isinstance(data, str):
+                data = data.encode()
+            time.sleep(self.wire_time(len(data)))
+            try:
+                if self.split_prob and self.rng.random() < self.split_prob:
+                    half = len(data) // 2
+                    os.write(self.master, data[:half])
+                    time.sleep(self.split_gap)
+                    os.write(self.master, data[half:])
+                else:
+                    os.write(self.master, data)
+            except OSError:
+                break
+
+            time.sleep(self.period)
+
+    # ---------- Python -> Arduino ----------
+    def _rx_loop(self):
+        decoder = serial_frame.FrameDecoder()
+        pending = b""
+        while not self._stop.is_set():
+            try:
+                ready, _, _ = select.select([self.master], [], [], 0.1)
+                if not ready:
+                    continue
+                data = os.read(self.master, 64)
+            except OSError:
+                break
+            if not data:
+                continue
+            time.sleep(self.wire_time(len(data)))
+
+            if data[0] == serial_frame.SYNC or decoder.end > decoder.start:
+                for _, cmd in decoder.feed(data):
+                    self._apply(cmd)
+                continue
+
+            pending += data
+            while pending:
+                c = pending[:1]
+                if c in (b"O", b"S"):
+                    if len(pending) < 2:
+                        break
+                    cmd, pending = pending[:2], pending[2:]
+                    self._apply(cmd)
+                else:
+                    # smart_gate_gateway.py sends bare b'1' / b'0'
+                    if c in (b"0", b"1"):
+                        self.owner = c == b"1"
+                        self.received.append((time.time(), c))
+                    pending = pending[1:]
+
+    def _apply(self, cmd):
+        if cmd[:1] == b"O":
+            self.owner = cmd[1:] == b"1"
+        else:
+            self.session = cmd[1:] == b"1"
+        self.received.append((time.time(), cmd))
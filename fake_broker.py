@@ -0,0 +1,200 @@
+import socket
+import struct
+import threading
+
+# Tiny MQTT 3.1.1 broker on localhost for the benchmarks (no HiveMQ, no
+# network). Enough for paho-mqtt clients:
+#   CONNECT/CONNACK, PUBLISH (QoS 0/1, PUBACK), SUBSCRIBE/SUBACK with + and #
+#   wildcards, retained messages, PINGREQ, DISCONNECT, last will
+# Subscribers always get QoS 0. Counts what the clients send on the wire.
+#
+#   with FakeBroker() as broker:
+#       client.connect("127.0.0.1", broker.port)
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 12, 13, 14
+
+
+def topic_matches(pattern, topic):
+    p, t = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(p):
+        if part == "#":
+            return True
+        if i >= len(t) or (part != "+" and part != t[i]):
+            return False
+    return len(p) == len(t)
+
+
+def _remaining_length(n):
+    out = bytearray()
+    while True:
+        byte, n = n % 128, n // 128
+        out.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def encode_publish(topic, payload, retain=False):
+    t = topic.encode()
+    body = struct.pack("!H", len(t)) + t + payload
+    return bytes([PUBLISH << 4 | int(retain)]) + _remaining_length(len(body)) + body
+
+
+def _read_exact(sock, n):
+    data = b""
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("closed")
+        data += chunk
+    return data
+
+
+def _read_packet(sock):
+    header = _read_exact(sock, 1)[0]
+    length, shift = 0, 0
+    while True:
+        byte = _read_exact(sock, 1)[0]
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+    return header, _read_exact(sock, length) if length else b"", 1 + shift // 7 + length
+
+
+def _string(body, pos):
+    n = struct.unpack_from("!H", body, pos)[0]
+    return body[pos + 2:pos + 2 + n], pos + 2 + n
+
+
+class FakeBroker:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+        self.retained = {}          # topic -> payload
+        self.subs = {}              # socket -> [pattern]
+        self.published = []         # (topic, payload, retain) from clients
+        self.rx_bytes = 0           # everything clients sent
+        self.publish_bytes = 0      # PUBLISH packets only
+        self.lock = threading.Lock()
+        self._stop = False
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        t = threading.Thread(target=self._accept_loop, daemon=True)
+        t.start()
+        self._threads.append(t)
+        return self
+
+    def close(self):
+        self._stop = True
+        self.server.close()
+        with self.lock:
+            for sock in list(self.subs):
+                sock.close()
+
+    def reset_counters(self):
+        with self.lock:
+            self.published = []
+            self.rx_bytes = 0
+            self.publish_bytes = 0
+
+    def _accept_loop(self):
+        while not self._stop:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            t = threading.Thread(target=self._client_loop, args=(sock,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _route(self, topic, payload, retain):
+        with self.lock:
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            targets = [s for s, pats in self.subs.items()
+                       if any(topic_matches(p, topic) for p in pats)]
+        packet = encode_publish(topic, payload)
+        for sock in targets:
+            try:
+                sock.sendall(packet)
+            except OSError:
+                pass
+
+    def _client_loop(self, sock):
+        will = None
+        with self.lock:
+            self.subs[sock] = []
+        try:
+            while True:
+                header, body, size = _read_packet(sock)
+                kind = header >> 4
+                with self.lock:
+                    self.rx_bytes += size
+                if kind == CONNECT:
+                    will = self._parse_will(body)
+                    sock.sendall(bytes([CONNACK << 4, 2, 0, 0]))
+                elif kind == PUBLISH:
+                    qos, retain = header >> 1 & 3, bool(header & 1)
+                    topic, pos = _string(body, 0)
+                    if qos:
+                        packet_id = body[pos:pos + 2]
+                        pos += 2
+                        sock.sendall(bytes([PUBACK << 4, 2]) + packet_id)
+                    with self.lock:
+                        self.publish_bytes += size
+                        self.published.append((topic.decode(), body[pos:], retain))
+                    self._route(topic.decode(), body[pos:], retain)
+                elif kind == SUBSCRIBE:
+                    packet_id, pos, granted = body[:2], 2, []
+                    patterns = []
+                    while pos < len(body):
+                        topic, pos = _string(body, pos)
+                        pos += 1                    # requested QoS
+                        patterns.append(topic.decode())
+                        granted.append(0)
+                    with self.lock:
+                        self.subs[sock] += patterns
+                        retained = [(t, p) for t, p in self.retained.items()
+                                    if any(topic_matches(pat, t) for pat in patterns)]
+                    sock.sendall(bytes([SUBACK << 4, 2 + len(granted)]) +
+                                 packet_id + bytes(granted))
+                    for topic, payload in retained:
+                        sock.sendall(encode_publish(topic, payload, retain=True))
+                elif kind == PINGREQ:
+                    sock.sendall(bytes([PINGRESP << 4, 0]))
+                elif kind == DISCONNECT:
+                    will = None
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self.lock:
+                self.subs.pop(sock, None)
+            sock.close()
+            if will is not None and not self._stop:
+                self._route(*will)
+
+    @staticmethod
+    def _parse_will(body):
+        # -> (topic, payload, retain) or None
+        _, pos = _string(body, 0)           # protocol name
+        flags = body[pos + 1]
+        pos += 4                            # level, flags, keepalive
+        if not flags & 0x04:
+            return None
+        _, pos = _string(body, pos)         # client id
+        topic, pos = _string(body, pos)
+        payload, pos = _string(body, pos)
+        return topic.decode(), payload, bool(flags & 0x20)
@@ -0,0 +1,247 @@
+import glob
+import os
+import random
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Synthetic camera for benchmarks (no webcam needed).
+# Pastes the dataset face crops onto generated backgrounds and serves them
+# through the same read()/isOpened()/release() API as cv2.VideoCapture.
+# truth[i] is the face box pasted into frame i (or None).
+# DeviceCamera adds what a real webcam does: slow open, a driver buffer
+# that fills up while nobody reads, dark warm-up frames.
+
+
+def load_faces(face_dir="dataset/aria"):
+    faces = []
+    for path in sorted(glob.glob(os.path.join(face_dir, "*.jpg"))):
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            faces.append(img)
+    return faces
+
+
+def make_background(rng, size=(640, 480)):
+    w, h = size
+    # smooth random blobs + a bit of noise, looks enough like a room for Haar
+    small = rng.integers(40, 200, (h // 32 + 1, w // 32 + 1), dtype=np.uint8)
+    bg = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+    noise = rng.normal(0, 6, (h, w))
+    return np.clip(bg + noise, 0, 255).astype(np.uint8)
+
+
+def composite(bg, face, box):
+    x, y, w, h = box
+    out = bg.copy()
+    out[y:y+h, x:x+w] = cv2.resize(face, (w, h))
+    return cv2.cvtColor(out, cv2.COLOR_GRAY2BGR)
+
+
+def make_frames(count=60, size=(640, 480), face_dir="dataset/aria",
+                face_prob=0.8, face_px=(140, 260), seed=0, faces=None):
+    rng = np.random.default_rng(seed)
+    pick = random.Random(seed)
+    if faces is None:
+        faces = load_faces(face_dir)
+    backgrounds = [make_background(rng, size) for _ in range(4)]
+
+    frames, truth = [], []
+    w, h = size
+    # the face drifts a little between frames like a person at the gate
+    fx, fy, fs = w // 2, h // 2, (face_px[0] + face_px[1]) // 2
+    for i in range(count):
+        bg = backgrounds[(i // 20) % len(backgrounds)]
+        if faces and pick.random() < face_prob:
+            fs = int(np.clip(fs + pick.randint(-8, 8), *face_px))
+            fx = int(np.clip(fx + pick.randint(-12, 12), fs // 2, w - fs // 2))
+            fy = int(np.clip(fy + pick.randint(-8, 8), fs // 2, h - fs // 2))
+            box = (fx - fs // 2, fy - fs // 2, fs, fs)
+            frames.append(composite(bg, faces[i % len(faces)], box))
+            truth.append(box)
+        else:
+            frames.append(cv2.cvtColor(bg, cv2.COLOR_GRAY2BGR))
+            truth.append(None)
+    return frames, truth
+
+
+class SyntheticCamera:
+    def __init__(self, frames=None, truth=None, fps=30.0, realtime=True,
+                 loop=True, **make_kwargs):
+        if frames is None:
+            frames, truth = make_frames(**make_kwargs)
+        self.frames = frames
+        self.truth = truth or [None] * len(frames)
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self.index = -1
+        self.opened = True
+        self._next = time.perf_counter()
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        if self.realtime:
+            now = time.perf_counter()
+            if now < self._next:
+                time.sleep(self._next - now)
+            self._next = max(self._next + 1.0 / self.fps, now)
+
+        self.index += 1
+        if self.index >= len(self.frames):
+            if not self.loop:
+                return False, None
+            self.index = 0
+        return True, self.frames[self.index].copy()
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0.0
+
+    def release(self):
+        self.opened = False
+
+
+class DeviceCamera:
+    # Behaves like a real webcam behind cv2.VideoCapture:
+    #   open_delay  -> opening the device takes this long (MSMF: ~0.5-2 s)
+    #   driver      -> a thread captures at `fps` into a small buffer
+    #                  (oldest dropped) whether anyone reads or not, and
+    #                  JPEG-decodes every frame like an MJPEG webcam (CPU)
+    #   warmup_dark -> the first frames after open are black (auto exposure)
+    # read()/grab() take the OLDEST buffered frame and block for the next
+    # one when the buffer is empty, so a reader that pauses gets stale
+    # frames first. stamp = capture time of the last frame returned.
+    def __init__(self, frames, fps=30.0, buffer=4, open_delay=0.8,
+                 warmup_dark=3):
+        time.sleep(open_delay)
+        self.jpegs = [cv2.imencode(".jpg", f)[1] for f in frames]
+        self.period = 1.0 / fps
+        self.buffer = buffer
+        self.warmup_dark = warmup_dark
+        self.stamp = None
+        self.captured = 0
+        self._frames = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._driver, daemon=True)
+        self._thread.start()
+
+    def _driver(self):
+        next_t = time.perf_counter()
+        while not self._stop.is_set():
+            next_t += self.period
+            delay = next_t - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            frame = cv2.imdecode(self.jpegs[self.captured % len(self.jpegs)],
+                                 cv2.IMREAD_COLOR)
+            if self.captured < self.warmup_dark:
+                frame[:] = 0
+            self.captured += 1
+            with self._cond:
+                self._frames.append((time.time(), frame))
+                if len(self._frames) > self.buffer:
+                    self._frames.pop(0)
+                self._cond.notify()
+
+    def isOpened(self):
+        return not self._stop.is_set()
+
+    def grab(self):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames or self._stop.is_set(), 2):
+                return False
+            if not self._frames:
+                return False
+            self.stamp, self._last = self._frames.pop(0)
+            return True
+
+    def retrieve(self):
+        return True, self._last
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return True, self._last
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout=1)
+
+
+class ProbeCamera:
+    # cv2.VideoCapture stand-in for camera discovery (camera_discovery.py):
+    # opening a missing device blocks fail_delay (MSMF / DSHOW can take
+    # seconds), a present one open_delay; set() snaps to the nearest mode
+    # the device supports, read() takes one frame period of the mode.
+    def __init__(self, modes, open_delay=0.3, fail_delay=1.0):
+        self.modes = modes or []
+        time.sleep(open_delay if self.modes else fail_delay)
+        self.mode = self.modes[0] if self.modes else None
+        self.want = list(self.mode[:2]) if self.mode else [0, 0]
+
+    def isOpened(self):
+        return self.mode is not None
+
+    def read(self):
+        if self.mode is None:
+            return False, None
+        w, h, fps = self.mode
+        time.sleep(1.0 / fps)
+        return True, np.zeros((h, w, 3), np.uint8)
+
+    def set(self, prop, value):
+        if self.mode is None:
+            return False
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self.want[0] = int(value)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.want[1] = int(value)
+        else:
+            return False
+        self.mode = min(self.modes, key=lambda m: abs(m[0] - self.want[0]) + abs(m[1] - self.want[1]))
+        return True
+
+    def get(self, prop):
+        if self.mode is None:
+            return 0.0
+        return {cv2.CAP_PROP_FRAME_WIDTH: self.mode[0], cv2.CAP_PROP_FRAME_HEIGHT: self.mode[1],
+                cv2.CAP_PROP_FPS: self.mode[2]}.get(prop, 0.0)
+
+    def release(self):
+        self.mode = None
+
+
+class ProbeDevices:
+    # opener(index, backend) for camera_discovery, devices = {(index, backend):
+    # [(w, h, fps), ...]}; names = {index: name} for the device identity
+    def __init__(self, devices, names=None, open_delay=0.3, fail_delay=1.0):
+        self.devices = devices
+        self.names = names or {}
+        self.open_delay = open_delay
+        self.fail_delay = fail_delay
+        self.opens = 0
+
+    def __call__(self, index, backend):
+        self.opens += 1
+        return ProbeCamera(self.devices.get((index, backend)), self.open_delay, self.fail_delay)
+
+    def identity(self, index):
+        name = self.names.get(index)
+        return f"{index}:{name}" if name else str(index)
@@ -0,0 +1,77 @@
+import random
+import threading
+import time
+
+from event_sink import PushIdGenerator
+
+# In-memory stand-in for firebase_admin.db.reference(), for the benchmarks
+# (no service account, no network). Only what the gateways use:
+# push(), update(), get(), child().
+#
+# Every call sleeps like an HTTPS round-trip:
+#   latency -> base delay (seconds)
+#   jitter  -> extra random delay 0..jitter
+#   online  -> set to False to make every call raise (outage)
+# Calls are serialized like requests on one connection.
+
+
+class FakeFirebaseError(Exception):
+    pass
+
+
+class FakeDatabase:
+    def __init__(self, latency=0.15, jitter=0.1, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.online = True
+        self.data = {}
+        self.calls = 0
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.new_id = PushIdGenerator()
+
+    def reference(self, path="/"):
+        return FakeReference(self, path.strip("/"))
+
+    def round_trip(self):
+        with self.lock:
+            self.calls += 1
+            time.sleep(self.latency + self.rng.uniform(0, self.jitter))
+            if not self.online:
+                raise FakeFirebaseError("backend unreachable")
+
+    def node(self, path, create=False):
+        node = self.data
+        for part in filter(None, path.split("/")):
+            if part not in node:
+                if not create:
+                    return None
+                node[part] = {}
+            node = node[part]
+        return node
+
+
+class FakeReference:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def child(self, path):
+        return FakeReference(self.db, f"{self.path}/{path.strip('/')}")
+
+    def get(self):
+        self.db.round_trip()
+        return self.db.node(self.path)
+
+    def push(self, value):
+        self.db.round_trip()
+        key = self.db.new_id()
+        self.db.node(self.path, create=True)[key] = value
+        return self.child(key)
+
+    def update(self, value):
+        # multi-path update: {"a/b": 1, "key": {...}} applied all at once
+        self.db.round_trip()
+        for path, item in value.items():
+            parent, _, name = f"{self.path}/{path}".rpartition("/")
+            self.db.node(parent, create=True)[name] = item
@@ -0,0 +1,342 @@
+import argparse
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+import metrics
+
+# One process owns the camera and puts every frame into a shared-memory
+# ring; recognition, dataset capture and a debug viewer read it from there
+# as NumPy views (no copy, no JPEG/MJPEG decode per consumer). With MSMF
+# only one process can open the device, so without this they take turns.
+#
+#   python frame_bus.py serve --camera 0 --backend msmf     # producer
+#   GATE_FRAME_BUS=gate_cam python run_recognation.py       # consumers:
+#   GATE_FRAME_BUS=gate_cam python capture_dataset.py       # replay.open_camera()
+#   python frame_bus.py view --stream 8082                  # debug viewer
+#
+# Segment layout (name = BUS_NAME):
+#
+#   header  16 x int64   MAGIC, VERSION, slots, height, width, channels,
+#                        latest seq, producer pid, fps x1000, closed
+#   meta    slots x 2 x int64   per slot: seq (-1 while being written),
+#                               time.time_ns() of the capture
+#   data    slots x height x width x channels uint8, 64-byte aligned
+#
+# Producer: slot seq := -1, pixels, stamp, slot seq := n, latest := n.
+# Consumer: latest -> slot n % slots, take it only if the slot still says
+# n. read() hands out a read-only view of the slot: it stays valid until
+# the producer comes around again, `slots` frames later (8 slots at 30 fps
+# = ~260 ms). Keep longer-lived frames as a copy (the gray image made
+# right after read() already is one); check with valid(seq) if unsure.
+# Drawing overlays needs a writable copy, see display.drawable().
+#
+# Consumers wait by polling `latest` (sleeping until about when the next
+# frame is due), so nothing has to be shared between the processes besides
+# the segment: consumers can start/stop at any time, in any order after
+# the producer.
+
+BUS_ENV = "GATE_FRAME_BUS"
+BUS_NAME = "gate_cam"
+SLOTS = 8
+POLL_S = 0.0005         # poll interval once the next frame is due
+
+MAGIC = 0x47415445_42555331     # "GATEBUS1"
+VERSION = 1
+HEADER_WORDS = 16
+H_MAGIC, H_VERSION, H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS, H_LATEST, \
+    H_PID, H_FPS, H_CLOSED = range(10)
+
+WRITE_SECONDS = metrics.histogram("gate_bus_write_seconds", "Frame copy into the bus slot")
+SKIPPED = metrics.counter("gate_bus_skipped_total",
+                          "Frames a bus consumer never saw (it was slower than the camera)")
+
+
+def _layout(slots, height, width, channels):
+    meta_at = HEADER_WORDS * 8
+    data_at = meta_at + slots * 2 * 8
+    data_at = (data_at + 63) // 64 * 64
+    size = data_at + slots * height * width * channels
+    return meta_at, data_at, size
+
+
+def _close(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass        # a frame view is still alive, the mapping goes with it
+
+
+def _views(buf, slots, height, width, channels):
+    meta_at, data_at, _ = _layout(slots, height, width, channels)
+    header = np.ndarray((HEADER_WORDS,), np.int64, buf, 0)
+    meta = np.ndarray((slots, 2), np.int64, buf, meta_at)
+    shape = (slots, height, width) + ((channels,) if channels > 1 else ())
+    data = np.ndarray(shape, np.uint8, buf, data_at)
+    return header, meta, data
+
+
+class FrameBus:
+    # producer side: creates the segment (replacing a stale one left by a
+    # crashed producer) and writes frames into the ring
+    def __init__(self, shape, name=BUS_NAME, slots=SLOTS, fps=0.0):
+        height, width = shape[:2]
+        channels = shape[2] if len(shape) > 2 else 1
+        size = _layout(slots, height, width, channels)[2]
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.name = name
+        self.slots = slots
+        self.header, self.meta, self.data = _views(self.shm.buf, slots, height, width, channels)
+        self.meta[:, 0] = -1
+        self.header[:] = 0
+        self.header[[H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS]] = (slots, height, width, channels)
+        self.header[H_PID] = os.getpid()
+        self.header[H_FPS] = int(fps * 1000)
+        self.header[H_VERSION] = VERSION
+        self.header[H_MAGIC] = MAGIC        # last: consumers check it first
+        self.seq = 0
+
+    def slot(self, seq):
+        return self.data[seq % self.slots]
+
+    def begin(self):
+        # -> (seq, writable slot view) for a producer that fills it in place
+        # (cv2.VideoCapture.read(out)); finish with commit(seq)
+        seq = self.seq + 1
+        self.meta[seq % self.slots, 0] = -1
+        return seq, self.slot(seq)
+
+    def commit(self, seq, stamp=None):
+        i = seq % self.slots
+        self.meta[i, 1] = int((time.time() if stamp is None else stamp) * 1e9)
+        self.meta[i, 0] = seq
+        self.header[H_LATEST] = seq
+        self.seq = seq
+
+    def write(self, frame, stamp=None):
+        with WRITE_SECONDS.time():
+            seq, slot = self.begin()
+            if frame.shape[:2] != slot.shape[:2]:
+                cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot)
+            else:
+                np.copyto(slot, frame.reshape(slot.shape))
+            self.commit(seq, stamp)
+        return seq
+
+    def close(self):
+        self.header[H_CLOSED] = 1
+        self.header = self.meta = self.data = None
+        _close(self.shm)
+        self.shm.unlink()
+
+
+class BusCamera:
+    # consumer side, a cv2.VideoCapture stand-in (CameraSession,
+    # VisionPipeline and the scripts use it like a camera)
+    def __init__(self, name=BUS_NAME):
+        self.name = name
+        self.shm = None
+        self.seq = 0            # last frame handed out
+        self.stamp = None       # its capture time (time.time())
+        self.frames = 0
+        self.skipped = 0
+        self.latencies = []     # capture -> read() returned, seconds (last 1000)
+        try:
+            self.shm = shared_memory.SharedMemory(name)
+        except FileNotFoundError:
+            return
+        # Python < 3.13 registers attached segments too and would unlink
+        # the producer's segment when this process exits
+        try:
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        except Exception:
+            pass
+        header = np.ndarray((HEADER_WORDS,), np.int64, self.shm.buf, 0)
+        if header[H_MAGIC] != MAGIC or header[H_VERSION] != VERSION:
+            self._detach()
+            return
+        slots, height, width, channels = (int(v) for v in header[H_SLOTS:H_CHANNELS + 1])
+        self.header, self.meta, self.data = _views(self.shm.buf, slots, height, width, channels)
+        self.data.flags.writeable = False
+        self.slots = slots
+        fps = header[H_FPS] / 1000.0
+        self.period = 1.0 / fps if fps > 0 else 0.0
+        self.seq = int(self.header[H_LATEST])   # start with the next frame
+
+    def _detach(self):
+        self.header = self.meta = self.data = None
+        _close(self.shm)
+        self.shm = None
+
+    def isOpened(self):
+        return self.shm is not None and not self.header[H_CLOSED]
+
+    def valid(self, seq):
+        # the view handed out for `seq` still holds that frame
+        return self.shm is not None and self.meta[seq % self.slots, 0] == seq
+
+    def _wait(self, timeout):
+        # newest seq after self.seq, or None
+        t_end = time.monotonic() + timeout
+        while True:
+            latest = int(self.header[H_LATEST])
+            if latest > self.seq:
+                return latest
+            if self.header[H_CLOSED]:
+                return None
+            now = time.monotonic()
+            if now >= t_end:
+                return None
+            sleep = POLL_S
+            if self.period and self.stamp is not None:
+                # most of the frame period: sleep until shortly before it is due
+                due = self.stamp + self.period - time.time()
+                sleep = max(POLL_S, due - 0.002)
+            time.sleep(min(sleep, t_end - now))
+
+    def read(self, timeout=1.0):
+        if not self.isOpened():
+            return False, None
+        while True:
+            latest = self._wait(timeout)
+            if latest is None:
+                return False, None
+            i = latest % self.slots
+            frame = self.data[i]
+            stamp = self.meta[i, 1] / 1e9
+            if self.meta[i, 0] != latest:
+                continue            # overwritten while we looked, take the next one
+            if self.seq and latest > self.seq + 1:
+                missed = latest - self.seq - 1
+                self.skipped += missed
+                SKIPPED.inc(missed)
+            self.seq, self.stamp = latest, stamp
+            self.frames += 1
+            self.latencies.append(time.time() - stamp)
+            if len(self.latencies) > 1000:
+                del self.latencies[:500]
+            return True, frame
+
+    def grab(self):
+        self._grabbed = self.read()
+        return self._grabbed[0]
+
+    def retrieve(self):
+        return self._grabbed
+
+    def set(self, prop, value):
+        return False                # the producer owns the device settings
+
+    def get(self, prop):
+        if not self.isOpened():
+            return 0.0
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.header[H_WIDTH])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.header[H_HEIGHT])
+        if prop == cv2.CAP_PROP_FPS:
+            return self.header[H_FPS] / 1000.0
+        return 0.0
+
+    def release(self):
+        if self.shm is not None:
+            self._detach()
+
+
+# ================= producer service =================
+def serve(name=BUS_NAME, camera=0, backend=None, width=640, height=480, slots=SLOTS,
+          stop=None):
+    import display
+    import replay
+    # Ctrl+C / SIGTERM: leave the loop so the segment is unlinked
+    stop = stop or display.QuitFlag().install()
+    os.environ.pop(BUS_ENV, None)       # the producer opens the real device (or a replay)
+    cam = replay.open_camera(camera, backend)
+    cam.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cam.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    ret, frame = cam.read()
+    if not ret:
+        cam.release()
+        raise RuntimeError("❌ Cannot open camera")
+    bus = FrameBus(frame.shape, name, slots, cam.get(cv2.CAP_PROP_FPS) or 0.0)
+    bus.write(frame)
+    print(f"✅ Frame bus '{name}': {frame.shape[1]}x{frame.shape[0]}, {slots} slots")
+
+    # VideoCapture decodes straight into the slot
+    in_place = isinstance(cam, cv2.VideoCapture)
+    try:
+        while not stop.is_set():
+            if in_place:
+                seq, slot = bus.begin()
+                ret, frame = cam.read(slot)
+                if not ret:
+                    break
+                if frame is not slot and not np.shares_memory(frame, slot):
+                    bus.write(frame)        # other size/format than the slot
+                else:
+                    bus.commit(seq)
+            else:
+                ret, frame = cam.read()
+                if not ret:
+                    break
+                bus.write(frame)
+    finally:
+        cam.release()
+        bus.close()
+    print(f"Frame bus stopped after {bus.seq} frames")
+
+
+def view(name=BUS_NAME, argv=None):
+    # debug viewer: window / --headless / --stream [PORT] (display.py)
+    import display
+    cam = BusCamera(name)
+    if not cam.isOpened():
+        raise RuntimeError(f"❌ No frame bus '{name}' (start: python frame_bus.py serve)")
+    v = display.open_view(f"bus {name}", argv=argv)
+    try:
+        while not v.should_quit():
+            ret, frame = cam.read()
+            if not ret:
+                break
+            if v.wants_frame():
+                frame = display.drawable(frame)
+                lat = 1000 * cam.latencies[-1]
+                cv2.putText(frame, f"#{cam.seq} {lat:.1f} ms skipped {cam.skipped}",
+                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                v.show(frame)
+    finally:
+        cam.release()
+        v.close()
+
+
+BACKENDS = {"any": None, "msmf": cv2.CAP_MSMF, "dshow": cv2.CAP_DSHOW, "v4l2": cv2.CAP_V4L2}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("command", choices=("serve", "view"))
+    ap.add_argument("--name", default=os.environ.get(BUS_ENV) or BUS_NAME)
+    ap.add_argument("--camera", type=int, default=0)
+    ap.add_argument("--backend", choices=sorted(BACKENDS), default="any")
+    ap.add_argument("--width", type=int, default=640)
+    ap.add_argument("--height", type=int, default=480)
+    ap.add_argument("--slots", type=int, default=SLOTS)
+    args, rest = ap.parse_known_args()
+    if args.command == "serve":
+        serve(args.name, args.camera, BACKENDS[args.backend], args.width, args.height,
+              args.slots)
+    else:
+        view(args.name, rest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+import argparse
+import json
+import os
+import struct
+
+import cv2
+import numpy as np
+
+# NumPy LBPH recognizer, drop-in for cv2.face.LBPHFaceRecognizer.predict.
+#
+# Loads the training histograms from face_model.yml into one contiguous
+# float32 matrix and scores a whole batch of face crops with vectorized
+# chi-square passes (same HISTCMP_CHISQR_ALT distance OpenCV uses), so the
+# (label, confidence) results and CONF_THRESHOLD = 70 mean the same thing.
+#
+# Only the best match is needed, so the exact distance is computed lazily.
+# Coarse histograms keep, in each grid cell, the K bins with the most
+# training mass and merge all other bins into one (LBP mass sits mostly in
+# a few uniform patterns, so little is lost). chi-square ALT is an
+# f-divergence and merging bins can only make it smaller, so the coarse
+# distance is a lower bound. Samples are visited in order of the cheapest
+# bound (KEEP_BINS[0], computed for all), refined with the next level for
+# the current block, and only the survivors get the exact distance. A sample
+# whose bound is already above the best exact distance can't win, so the
+# result is the same as the full scan.
+#
+# LBP + spatial histogram follow OpenCV's lbph_faces.cpp:
+#   circular LBP with bilinear interpolation, radius/neighbors from model
+#   grid_x * grid_y cells, 2^neighbors bins each, normalized by cell size
+#
+# Binary model (<model>.lbph next to face_model.yml, see binary_path()):
+# the YAML is text, every histogram bin a decimal number, and each process
+# parses it into its own copy. The .lbph file is
+#   8 bytes  BINARY_MAGIC
+#   4 bytes  <I length of the JSON header
+#   JSON     version, LBPH params, label map (resident names / thresholds),
+#            size + mtime of the YAML it belongs to, and name -> dtype,
+#            shape, offset of every array
+#   arrays   each at a multiple of ALIGN: hist (float32 samples x bins),
+#            labels (int32), and the bound levels (keep indices + merged
+#            histograms), so loading computes nothing either
+# from_binary() maps the arrays read-only with np.memmap: no parsing, and
+# processes that load the same file share its pages (page cache) instead
+# of each holding a copy. from_file() uses the .lbph only if it was made
+# from the current YAML (size + mtime match), otherwise it reads the YAML.
+# train_model.py writes it after training; for an existing model:
+#   python lbph_engine.py face_model.yml --verify 200
+
+
+KEEP_BINS = (4, 24, 58)     # bins per cell kept separate, per bound level
+BLOCK = 32          # exact distances computed per step
+TINY = np.float32(1e-30)
+# from this many training samples on, train_model.py also saves a PQ index
+# (face_index.py). It is approximate, the scan above is exact, so it is only
+# used when asked for: from_file(use_index=True), i.e. load_recognizer(...,
+# "numpy-index") / RECOGNIZER_ENGINE = "numpy-index"
+INDEX_MIN_SAMPLES = 300
+
+BINARY_EXT = ".lbph"
+BINARY_MAGIC = b"LBPHBIN\x00"
+BINARY_VERSION = 1
+ALIGN = 64
+LENGTH = struct.Struct("<I")
+
+
+def chi2_alt(queries, hist):
+    # (b, k) x (n, k) -> (b, n) float64, 2 * sum (q-h)^2 / (q+h)
+    q = queries[:, None, :]
+    h = hist[None, :, :]
+    diff = h - q
+    diff *= diff
+    # + TINY: bins empty in both give 0/TINY = 0 instead of 0/0; for any
+    # real bin (>= 1/cell_size) it is far below float32 resolution
+    den = h + q
+    den += TINY
+    diff /= den
+    return 2.0 * diff.sum(axis=2, dtype=np.float64)
+
+
+def write_model(path, hist, labels, radius=1, neighbors=8, grid_x=8, grid_y=8):
+    # same YAML layout as LBPHFaceRecognizer.save(), so cv2 can read it
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_WRITE)
+    fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+    fs.write("threshold", float(np.finfo(np.float64).max))
+    fs.write("radius", radius)
+    fs.write("neighbors", neighbors)
+    fs.write("grid_x", grid_x)
+    fs.write("grid_y", grid_y)
+    fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+    for row in hist:
+        fs.write("", np.asarray(row, dtype=np.float32).reshape(1, -1))
+    fs.endWriteStruct()
+    fs.write("labels", np.asarray(labels, dtype=np.int32).reshape(-1, 1))
+    fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+    fs.endWriteStruct()
+    fs.endWriteStruct()
+    fs.release()
+
+
+def binary_path(model_path):
+    return model_path.rsplit(".", 1)[0] + BINARY_EXT
+
+
+def source_stamp(model_path):
+    # what ties a .lbph to its YAML; None if the YAML is not there
+    try:
+        st = os.stat(model_path)
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def write_binary(path, engine, residents=None, source=None):
+    arrays = {"hist": engine.hist, "labels": engine.labels}
+    for k, keep, coarse in engine.levels:
+        arrays[f"keep{k}"] = keep.astype(np.int32)
+        arrays[f"coarse{k}"] = coarse
+    table, offset = {}, 0
+    for name, arr in arrays.items():
+        table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+    header = json.dumps({
+        "version": BINARY_VERSION,
+        "params": {"radius": engine.radius, "neighbors": engine.neighbors,
+                   "grid_x": engine.grid_x, "grid_y": engine.grid_y},
+        "keep_bins": [k for k, _, _ in engine.levels],
+        "residents": {str(k): v for k, v in (residents or {}).items()},
+        "source": source,
+        "arrays": table,
+    }).encode()
+    start = -(-(len(BINARY_MAGIC) + LENGTH.size + len(header)) // ALIGN) * ALIGN
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(BINARY_MAGIC + LENGTH.pack(len(header)) + header)
+        for name, arr in arrays.items():
+            f.seek(start + table[name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(start + offset)
+    os.replace(tmp, path)
+
+
+def binary_current(model_path):
+    # True if <model>.lbph exists and was made from this YAML
+    try:
+        header, _ = read_binary(binary_path(model_path))
+    except (OSError, ValueError):
+        return False
+    return header["source"] == source_stamp(model_path)
+
+
+def read_binary(path):
+    # -> (header dict, name -> read-only array backed by the file)
+    with open(path, "rb") as f:
+        head = f.read(len(BINARY_MAGIC) + LENGTH.size)
+        if head[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError(f"{path}: not a binary LBPH model")
+        (size,) = LENGTH.unpack_from(head, len(BINARY_MAGIC))
+        header = json.loads(f.read(size))
+    if header.get("version") != BINARY_VERSION:
+        raise ValueError(f"{path}: binary model version {header.get('version')}")
+    start = -(-(len(head) + size) // ALIGN) * ALIGN
+    buf = np.memmap(path, dtype=np.uint8, mode="r").view(np.ndarray)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        at = start + spec["offset"]
+        arrays[name] = buf[at:at + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+    return header, arrays
+
+
+def _sample_weights(radius, neighbors):
+    pts = []
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / float(neighbors)))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / float(neighbors)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = np.float32(x - fx), np.float32(y - fy)
+        one = np.float32(1)
+        w = ((one - tx) * (one - ty), tx * (one - ty),
+             (one - tx) * ty, tx * ty)
+        pts.append((fx, fy, cx, cy, w))
+    return pts
+
+
+class LBPHEngine:
+    def __init__(self, histograms, labels, radius=1, neighbors=8,
+                 grid_x=8, grid_y=8, levels=None):
+        self.hist = np.ascontiguousarray(histograms, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32).ravel()
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.bins = 2 ** neighbors
+        self._points = _sample_weights(radius, neighbors)
+        self.index = None           # optional face_index.FaceIndex
+        self.residents = None       # label map, when loaded from a .lbph
+        # levels: [(k, keep, merged hist)] already computed (from_binary)
+        self.levels = levels if levels is not None else []
+        for k in (KEEP_BINS if self.hist.size and levels is None else ()):
+            keep = self._pick_bins(k)
+            self.levels.append((k, keep, self.merge_bins(self.hist, k, keep)))
+
+    @classmethod
+    def from_recognizer(cls, recognizer):
+        hists = recognizer.getHistograms()
+        matrix = np.vstack([h.reshape(1, -1) for h in hists]) if hists else \
+            np.zeros((0, 0), dtype=np.float32)
+        return cls(matrix, recognizer.getLabels(),
+                   recognizer.getRadius(), recognizer.getNeighbors(),
+                   recognizer.getGridX(), recognizer.getGridY())
+
+    @classmethod
+    def from_binary(cls, path, source=None):
+        # source = the YAML it must belong to (ValueError if it is stale)
+        header, arrays = read_binary(path)
+        if source is not None:
+            stamp = source_stamp(source)
+            if stamp is not None and stamp != header["source"]:
+                raise ValueError(f"{path} is older than {source}")
+        levels = [(k, arrays[f"keep{k}"], arrays[f"coarse{k}"]) for k in header["keep_bins"]]
+        engine = cls(arrays["hist"], arrays["labels"], levels=levels, **header["params"])
+        engine.residents = {int(k): v for k, v in header["residents"].items()}
+        return engine
+
+    def save_binary(self, path, residents=None, source=None):
+        write_binary(path, self, residents, source)
+
+    @classmethod
+    def from_file(cls, path="face_model.yml", use_index=False, use_binary=True):
+        engine = None
+        if use_binary:
+            try:
+                engine = cls.from_binary(binary_path(path), source=path)
+            except (OSError, KeyError, ValueError):
+                engine = None
+        if engine is None:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(path)
+            engine = cls.from_recognizer(recognizer)
+        if use_index:
+            engine.load_index(path)
+        return engine
+
+    def load_index(self, model_path):
+        # <model>.index.npz from train_model.py; ignored if missing, too
+        # small to pay off, or built for another model (hash mismatch)
+        from face_index import FaceIndex, index_path, model_hash
+        try:
+            index = FaceIndex.load(index_path(model_path))
+        except (OSError, KeyError, ValueError):
+            return False
+        if len(index) != len(self.labels) or len(index) < INDEX_MIN_SAMPLES:
+            return False
+        if index.model != model_hash(self.hist, self.labels):
+            return False
+        self.index = index
+        return True
+
+    # ---------- features ----------
+    def lbp(self, gray):
+        r = self.radius
+        src = gray.astype(np.float32)
+        rows, cols = src.shape
+        center = src[r:rows - r, r:cols - r]
+        out = np.zeros(center.shape, dtype=np.int32)
+
+        def at(dy, dx):
+            return src[r + dy:rows - r + dy, r + dx:cols - r + dx]
+
+        eps = np.finfo(np.float32).eps
+        for n, (fx, fy, cx, cy, (w1, w2, w3, w4)) in enumerate(self._points):
+            t = w1 * at(fy, fx) + w2 * at(fy, cx)
+            t = t + w3 * at(cy, fx)
+            t = t + w4 * at(cy, cx)
+            bit = (t > center) | (np.abs(t - center) < eps)
+            out |= bit.astype(np.int32) << n
+        return out
+
+    def histogram(self, gray):
+        codes = self.lbp(gray)
+        ch = codes.shape[0] // self.grid_y
+        cw = codes.shape[1] // self.grid_x
+        cells = codes[:ch * self.grid_y, :cw * self.grid_x]
+        # (grid_y, ch, grid_x, cw) -> (cells, ch*cw)
+        cells = cells.reshape(self.grid_y, ch, self.grid_x, cw)
+        cells = cells.transpose(0, 2, 1, 3).reshape(-1, ch * cw)
+
+        offsets = np.arange(cells.shape[0])[:, None] * self.bins
+        counts = np.bincount((cells + offsets).ravel(),
+                             minlength=cells.shape[0] * self.bins)
+        return (counts / np.float32(ch * cw)).astype(np.float32)
+
+    # ---------- matching ----------
+    def _pick_bins(self, k):
+        # column index of the k heaviest bins of every cell
+        cells = self.grid_x * self.grid_y
+        if self.hist.size == 0:
+            return np.arange(0)
+        mass = self.hist.sum(axis=0).reshape(cells, self.bins)
+        top = np.argsort(-mass, axis=1, kind="stable")[:, :k]
+        top.sort(axis=1)
+        return (top + np.arange(cells)[:, None] * self.bins).ravel()
+
+    @staticmethod
+    def merge_bins(hist, k, keep):
+        # kept bins + one "rest" bin per cell (cells sum to 1 -> rest = 1 - kept)
+        kept = hist[:, keep]
+        cell_sum = kept.reshape(hist.shape[0], -1, k).sum(axis=2)
+        rest = np.maximum(np.float32(1) - cell_sum, 0).astype(np.float32)
+        return np.ascontiguousarray(np.hstack([kept, rest]))
+
+    def distances(self, queries):
+        # exact distance to every sample (no pruning), (b, n)
+        return chi2_alt(np.atleast_2d(queries), self.hist)
+
+    def best_match(self, query, coarse_queries, first):
+        # exact (index, distance) of the nearest sample
+        # coarse_queries[i] = query merged like self.levels[i]
+        # first = level 0 bound of the query against every sample
+        order = np.argsort(first, kind="stable")
+        best_i, best_d = -1, np.inf
+
+        for start in range(0, len(order), BLOCK):
+            idx = order[start:start + BLOCK]
+            bound = first[idx]
+            # tiny slack so float rounding in a bound never prunes a tie
+            if bound[0] * (1 - 1e-6) > best_d:
+                break
+
+            for (_, _, coarse), cq in zip(self.levels[1:], coarse_queries[1:]):
+                idx = idx[bound * (1 - 1e-6) <= best_d]
+                if len(idx) == 0:
+                    break
+                bound = chi2_alt(cq[None, :], coarse[idx])[0]
+            if len(idx):
+                idx = idx[bound * (1 - 1e-6) <= best_d]
+            if len(idx) == 0:
+                continue
+
+            dist = chi2_alt(query[None, :], self.hist[idx])[0]
+            for i, d in zip(idx, dist):
+                if d < best_d or (d == best_d and i < best_i):
+                    best_i, best_d = int(i), float(d)
+        return best_i, best_d
+
+    def predict_batch(self, faces):
+        if len(faces) == 0:
+            return []
+        if len(self.labels) == 0:
+            return [(-1, float("inf")) for _ in faces]
+        queries = np.vstack([self.histogram(face) for face in faces])
+        if self.index is not None:
+            results = []
+            for query in queries:
+                i, d = self.index.search(query, self.hist)
+                results.append((int(self.labels[i]), d))
+            return results
+
+        coarse = [self.merge_bins(queries, k, keep)
+                  for k, keep, _ in self.levels]
+        # cheapest bound for the whole batch in one vectorized pass
+        first = chi2_alt(coarse[0], self.levels[0][2])
+        results = []
+        for row, query in enumerate(queries):
+            i, d = self.best_match(query, [c[row] for c in coarse], first[row])
+            results.append((int(self.labels[i]), d))
+        return results
+
+    def predict(self, face):
+        return self.predict_batch([face])[0]
+
+
+def compare(recognizer, engine, faces, threshold=70):
+    # OpenCV predict vs engine.predict_batch on the same crops
+    ours = engine.predict_batch(faces)
+    labels = decisions = 0
+    max_diff = 0.0
+    for face, (label, conf) in zip(faces, ours):
+        cv_label, cv_conf = recognizer.predict(face)
+        labels += cv_label != label
+        decisions += (cv_conf < threshold) != (conf < threshold)
+        max_diff = max(max_diff, abs(cv_conf - conf))
+    return {"faces": len(faces), "label_mismatch": labels,
+            "decision_mismatch": decisions, "max_conf_diff": max_diff}
+
+
+def dataset_faces(dataset_dir="dataset", count=200, size=(200, 200)):
+    # count crops from dataset/<resident>/*.jpg + their mirror images
+    paths = sorted(os.path.join(dataset_dir, d, f)
+                   for d in os.listdir(dataset_dir) if os.path.isdir(os.path.join(dataset_dir, d))
+                   for f in os.listdir(os.path.join(dataset_dir, d)) if f.endswith(".jpg"))
+    faces = []
+    for path in paths[:max(1, count // 2)]:
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            img = cv2.resize(img, size)
+            faces += [img, cv2.flip(img, 1)]
+    return faces[:count]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="face_model.yml -> <model>.lbph (binary, memory-mapped)")
+    ap.add_argument("model", nargs="?", default="face_model.yml")
+    ap.add_argument("--verify", type=int, default=0, metavar="N",
+                    help="compare N dataset faces with OpenCV on the written file")
+    ap.add_argument("--dataset", default="dataset")
+    args = ap.parse_args()
+
+    from face_engine import load_labels
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(args.model)
+    out = binary_path(args.model)
+    LBPHEngine.from_recognizer(recognizer).save_binary(
+        out, load_labels(args.model), source_stamp(args.model))
+    print(f"✅ {args.model} ({os.path.getsize(args.model) / 2**20:.1f} MB) -> "
+          f"{out} ({os.path.getsize(out) / 2**20:.1f} MB)")
+
+    if args.verify:
+        engine = LBPHEngine.from_binary(out, source=args.model)
+        result = compare(recognizer, engine, dataset_faces(args.dataset, args.verify))
+        ok = not result["label_mismatch"] and not result["decision_mismatch"]
+        print(f"{'✅' if ok else '❌'} vs OpenCV: {result}")
+        if not ok:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
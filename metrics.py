@@ -0,0 +1,251 @@
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Low-overhead metrics for the hot paths + a Prometheus /metrics endpoint.
+#
+#   DETECT = metrics.histogram("gate_detect_seconds", "Haar detection")
+#   with DETECT.time():
+#       faces = detect(gray)
+#   FRAMES_DROPPED = metrics.counter("gate_frames_dropped_total", "...")
+#   FRAMES_DROPPED.inc()
+#   metrics.serve(9108)        # http://localhost:9108/metrics
+#
+# Histograms have fixed buckets (0.1 ms .. 10 s, x2.5 steps) and only do a
+# bisect + two adds under a lock per observation, well below 1 us; see
+# bench_metrics.py. Labels are fixed per metric object (one object per
+# label set), so observe() never builds strings.
+#
+# EventLog replaces the per-iteration print()s: logfmt lines through the
+# logging module, each event kind at most once per `every` seconds
+# (the skipped count is added to the next line), state changes always.
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Gauge:
+    # set() from the code, or fn() evaluated at scrape time
+    kind = "gauge"
+
+    def __init__(self, name, labels=None, fn=None):
+        self.name = name
+        self.labels = labels or {}
+        self.fn = fn
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        yield self.name, self.labels, self.fn() if self.fn else self.value
+
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, labels=None, buckets=BUCKETS):
+        self.name = name
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)     # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        # upper bucket bound holding the q-quantile (for logs/benchmarks)
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank, seen = q * total, 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        with self._lock:
+            counts, total, s = list(self.counts), self.count, self.sum
+        seen = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            seen += n
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield self.name + "_bucket", dict(self.labels, le=le), seen
+        yield self.name + "_sum", self.labels, s
+        yield self.name + "_count", self.labels, total
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}           # (name, labels) -> metric
+        self.help = {}              # name -> help text
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = cls(name, labels, **kwargs)
+                self.metrics[key] = metric
+                self.help.setdefault(name, help)
+            return metric
+
+    def counter(self, name, help="", labels=None):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", labels=None, fn=None):
+        gauge = self._get(Gauge, name, help, labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help="", labels=None, buckets=BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def render(self):
+        # Prometheus text exposition format 0.0.4
+        with self._lock:
+            metrics = sorted(self.metrics.items())
+        lines, typed = [], set()
+        for (name, _), metric in metrics:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            for sample, labels, value in metric.samples():
+                lines.append(f"{sample}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help="", labels=None):
+    return REGISTRY.counter(name, help, labels)
+
+
+def gauge(name, help="", labels=None, fn=None):
+    return REGISTRY.gauge(name, help, labels, fn)
+
+
+def histogram(name, help="", labels=None, buckets=BUCKETS):
+    return REGISTRY.histogram(name, help, labels, buckets)
+
+
+# ================= HTTP endpoint =================
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    # /metrics on a daemon thread; returns the server (server.shutdown())
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass                    # no access log on the console
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ================= logging =================
+def setup_logging(level=logging.INFO):
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+
+def logfmt(kind, fields):
+    parts = [kind]
+    for k, v in fields.items():
+        v = str(v)
+        parts.append(f'{k}="{v}"' if " " in v or not v else f"{k}={v}")
+    return " ".join(parts)
+
+
+class EventLog:
+    def __init__(self, name, every=1.0):
+        self.logger = logging.getLogger(name)
+        self.every = every
+        self._last = {}             # kind -> time of last line
+        self._skipped = {}          # kind -> lines not written since
+
+    def info(self, kind, every=None, **fields):
+        # at most once per `every` seconds per kind
+        every = self.every if every is None else every
+        now = time.monotonic()
+        if now - self._last.get(kind, -1e9) < every:
+            self._skipped[kind] = self._skipped.get(kind, 0) + 1
+            return
+        self._last[kind] = now
+        skipped = self._skipped.pop(kind, 0)
+        if skipped:
+            fields["skipped"] = skipped
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(logfmt(kind, fields))
+
+    def change(self, kind, **fields):
+        # state transitions, never rate limited
+        self.logger.info(logfmt(kind, fields))
+
+    def warning(self, kind, **fields):
+        self.logger.warning(logfmt(kind, fields))
@@ -1,10 +1,54 @@
+import json
+import sys
 import time
+import uuid
 import paho.mqtt.client as mqtt
 
+import remote_commands
+
 MQTT_HOST = "broker.hivemq.com"
 MQTT_BASE = "aiu/gate/aria"
 
+# python mqtt_test.py                  -> publishes "hello N" every second
+# python mqtt_test.py open 10          -> remote command to the gateway
+# python mqtt_test.py threshold 65        (remote_commands.py), waits for the ack;
+#                                         signed with $GATE_COMMAND_SECRET
+
 client = mqtt.Client()
+
+if len(sys.argv) > 1:
+    name = sys.argv[1]
+    value = sys.argv[2] if len(sys.argv) > 2 else None
+    cmd_id = uuid.uuid4().hex[:8]
+    acked = []
+
+    def on_ack(c, userdata, msg):
+        ack = json.loads(msg.payload)
+        if ack.get("id") == cmd_id:
+            acked.append((time.time(), ack))
+
+    def on_connect(c, userdata, flags, rc):
+        c.subscribe(f"{MQTT_BASE}/ack", qos=1)
+
+    client.message_callback_add(f"{MQTT_BASE}/ack", on_ack)
+    client.on_connect = on_connect
+    client.connect(MQTT_HOST, 1883, 60)
+    client.loop_start()
+    time.sleep(1)                      # subscribed before the command goes out
+    sent = time.time()
+    client.publish(f"{MQTT_BASE}/cmd/{name}",
+                   remote_commands.sign(None, name, value, cmd_id, sent), qos=1)
+    while not acked and time.time() - sent < 5:
+        time.sleep(0.01)
+    if acked:
+        t, ack = acked[0]
+        print(f"ack after {1000 * (t - sent):.0f} ms: {ack}")
+    else:
+        print("no ack in 5 s (gateway offline?)")
+    client.loop_stop()
+    client.disconnect()
+    sys.exit(0)
+
 client.connect(MQTT_HOST, 1883, 60)
 client.loop_start()
 
@@ -0,0 +1,504 @@
+import asyncio
+import json
+import os
+import queue
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+
+import face_engine
+import metrics
+import replay
+import serial_frame
+from camera_session import CameraSession
+from detect_scheduler import DetectScheduler
+from owner_decision import OwnerDecision
+from recognition_cache import RecognitionCache
+from serial_link import LineDecoder
+from state_publisher import StatePublisher
+from telemetry_store import TelemetryStore
+
+# Several gates (camera + Arduino each) in one process, see
+# multi_gate_gateway.py for the script and gates.json for the gate list:
+#
+#   {"gates": [{"id": "front", "camera": 0, "backend": "msmf",
+#               "serial": "COM5", "baud": 115200, "protocol": "binary"},
+#              {"id": "garage", "camera": 1, "serial": "COM6"}]}
+#
+# (keys left out take GATE_DEFAULTS; "replay": "recordings/front" reads that
+# recording instead of the devices, replay.py)
+#
+#   asyncio loop     serial reads of every gate (add_reader on the port
+#                    fd, a reader thread where there is none, e.g.
+#                    Windows), the session/debounce logic and MQTT/Firebase
+#                    calls
+#   writer threads   ser.write() of the S/O commands, one per gate
+#   thread pool      cam.read() + cvtColor (blocking driver calls)
+#   process pool     detection + LBPH for all gates; every worker loads the
+#                    cascade and model once (init_worker)
+#   one MQTT client  per gate topics under MQTT_BASE/<gate_id>/..., the
+#                    gateway's last will on MQTT_BASE/online
+#   one EventSink    gate_logs events carry "gate_id"
+#   telemetry_dir    every sample of a gate in telemetry_dir/<gate id>
+#                    (TelemetryStore, one writer per gate)
+#
+# Per gate the logic is the one of smart_home_gateway_modelb.py: PIR starts
+# a SESSION_SECONDS session, the camera is only read during sessions (at
+# most GATE_FPS frames/s, one frame in flight), owner decided over time
+# (OwnerDecision, OWNER_OPEN_S / OWNER_HOLD_S), S1/S0 + O1/O0 sent on
+# change. Keyframe/ROI
+# detection state (DetectScheduler) stays in the gateway process, so any
+# worker can take any gate's frame; each worker keeps a RecognitionCache
+# per gate (its entries are checked against box and appearance, so a
+# worker that missed some frames of a gate stays correct).
+
+GATE_FPS = 5.0
+SESSION_SECONDS = 20
+OWNER_OPEN_S = 0.2
+OWNER_HOLD_S = 0.4
+KEYFRAME_INTERVAL = 5
+ROI_MARGIN = 0.5
+RECOGNITION_CACHE_TTL = 1.0
+FIREBASE_INTERVAL = 1.5
+CAM_RELEASE_AFTER = 30
+LOG_INTERVAL = 2.0
+
+GATE_DEFAULTS = {"camera": 0, "backend": None, "serial": None, "baud": 115200,
+                 "protocol": "binary", "replay": None}
+BACKENDS = {"any": cv2.CAP_ANY, "msmf": cv2.CAP_MSMF, "dshow": cv2.CAP_DSHOW,
+            "v4l2": cv2.CAP_V4L2}
+
+NUMBERS = ("distance_cm",)
+FLAGS = ("pir_motion", "session_active", "owner", "gate_open", "lamp_on")
+
+# DIST,12,PIR,1,SESSION,1,OWNER,0,GATE,0 (protocol "csv")
+CSV_PATTERN = r"^DIST,(\d+),PIR,([01]),SESSION,([01]),OWNER,([01]),GATE,([01])$"
+CSV_NAMES = serial_frame.STATUS_FIELDS
+
+
+def load_gates(path):
+    with open(path) as f:
+        config = json.load(f)
+    gates, seen = [], set()
+    for entry in config["gates"]:
+        gate = dict(GATE_DEFAULTS, **entry)
+        gate_id = gate.get("id")
+        if not gate_id or "/" in gate_id or gate_id in seen:
+            raise ValueError(f"{path}: gate id missing, duplicate or with '/': {gate_id!r}")
+        if gate["protocol"] not in ("binary", "csv"):
+            raise ValueError(f"{path}: gate {gate_id}: protocol must be binary or csv")
+        if gate["serial"] is None and gate["replay"] is None:
+            raise ValueError(f"{path}: gate {gate_id}: no serial port")
+        seen.add(gate_id)
+        gates.append(gate)
+    return gates
+
+
+# ================= vision worker (process pool) =================
+_worker = None
+
+
+def init_worker(model_path, engine, profile, threshold, cache_ttl=RECOGNITION_CACHE_TTL):
+    global _worker
+    cv2.setNumThreads(1)            # the pool is the parallelism
+    cascade = face_engine.load_cascade()
+    detect = face_engine.make_detector(cascade, profile)
+    _worker = {
+        "scheduler": DetectScheduler(cascade, KEYFRAME_INTERVAL, ROI_MARGIN, detect),
+        "detect": detect,
+        "recognizer": face_engine.load_recognizer(model_path, engine),
+        "labels": face_engine.load_labels(model_path),
+        "threshold": threshold,
+        "cache_ttl": cache_ttl,
+        "caches": {},           # gate id -> RecognitionCache
+    }
+
+
+def analyze(gray, tracks, keyframe, gate_id=None, now=None):
+    # -> (boxes, Recognition, full_frame); ROI around every box of `tracks`
+    # unless keyframe
+    w = _worker
+    faces = None
+    if tracks and not keyframe:
+        faces = w["scheduler"].detect_roi(gray, tracks)
+    full = faces is None
+    if full:
+        faces = w["detect"](gray)
+    faces = [tuple(int(v) for v in box) for box in faces]
+    cache = None
+    if w["cache_ttl"]:
+        cache = w["caches"].get(gate_id)
+        if cache is None:
+            cache = w["caches"][gate_id] = RecognitionCache(w["cache_ttl"])
+    rec = face_engine.recognize_faces(w["recognizer"], gray, faces, w["threshold"],
+                                      w["labels"], cache, now)
+    return faces, rec, full
+
+
+def read_gray(cam):
+    # runs on the I/O thread pool
+    ret, frame = cam.read()
+    if not ret:
+        return False, None
+    return True, face_engine.to_gray(frame)
+
+
+# ================= serial =================
+class GateSerial:
+    # serial port on the asyncio loop: on_sample(fields) is called on the
+    # loop for every status sample. A READY (the Arduino restarted and
+    # forgot S/O) is counted and reported with on_ready() on the loop.
+    # send() only queues: a writer thread per gate does ser.write(), so a
+    # slow or stuck port never blocks the loop (and the other gates); a
+    # failed write is counted and reported with on_write_failed() on the
+    # loop, the gate then sends its state again.
+    def __init__(self, ser, protocol, on_sample, on_ready=None, on_write_failed=None):
+        self.ser = ser
+        if protocol == "binary":
+            self.decoder = serial_frame.FrameDecoder()
+            self.encode = serial_frame.encode_command
+        else:
+            self.decoder = LineDecoder(re.compile(CSV_PATTERN), CSV_NAMES)
+            self.encode = None
+        self.on_sample = on_sample
+        self.on_ready = on_ready
+        self.on_write_failed = on_write_failed
+        self.samples = 0
+        self.readies = 0
+        self.write_failures = 0
+        self._loop = None
+        self._fd = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._tx = queue.Queue()
+        self._writer = None
+
+    def _port_fd(self):
+        # only a real pyserial port (POSIX) has a pollable fd; recordings
+        # and replays go through their wrappers' read()
+        if isinstance(self.ser, (replay.RecordingSerial, replay.ReplaySerial)):
+            return None
+        return getattr(self.ser, "fd", None)
+
+    def start(self, loop):
+        self._loop = loop
+        self._fd = self._port_fd()
+        if self._fd is not None:
+            loop.add_reader(self._fd, self._readable)
+        else:
+            self._thread = threading.Thread(target=self._read_thread, daemon=True)
+            self._thread.start()
+        self._writer = threading.Thread(target=self._write_thread, daemon=True)
+        self._writer.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._tx.put(None)
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+        for t in (self._thread, self._writer):
+            if t is not None:
+                t.join(timeout=2)
+        self.ser.close()
+
+    def send(self, cmd):
+        self._tx.put(cmd)
+
+    def _write_thread(self):
+        while not self._stop.is_set():
+            cmd = self._tx.get()
+            if cmd is None:
+                break
+            try:
+                self.ser.write(self.encode(cmd) if self.encode else cmd)
+            except Exception:
+                if self._stop.is_set():
+                    break
+                self.write_failures += 1
+                if self.on_write_failed is not None:
+                    self._loop.call_soon_threadsafe(self.on_write_failed, cmd)
+
+    def _readable(self):
+        try:
+            chunk = os.read(self._fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        self._feed(chunk)
+
+    def _read_thread(self):
+        while not self._stop.is_set():
+            try:
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+            except Exception:
+                if self._stop.is_set():
+                    break
+                time.sleep(0.05)
+                continue
+            if chunk:
+                self._loop.call_soon_threadsafe(self._feed, chunk)
+
+    def _feed(self, chunk):
+        for ftype, fields in self.decoder.feed(chunk):
+            if ftype == serial_frame.TYPE_STATUS:
+                self.samples += 1
+                self.on_sample(fields)
+            elif ftype == serial_frame.TYPE_READY:
+                self.readies += 1
+                if self.on_ready is not None:
+                    self.on_ready()
+
+
+# ================= one gate =================
+class Gate:
+    def __init__(self, config, gateway):
+        self.id = config["id"]
+        self.config = config
+        self.gw = gateway
+        self.log = metrics.EventLog(f"gate.{self.id}", LOG_INTERVAL)
+        self.publisher = StatePublisher(gateway.client, f"{gateway.base}/{self.id}",
+                                        NUMBERS, FLAGS, heartbeat=gateway.heartbeat,
+                                        deadband=gateway.deadband)
+        self.frame_seconds = metrics.histogram(
+            "gate_multi_frame_seconds", "Frame read + detect + recognize per gate",
+            {"gate": self.id})
+        help_ = "Debounced owner state changes"
+        self.owner_yes = metrics.counter("gate_owner_transitions_total", help_,
+                                         {"gate": self.id, "to": "yes"})
+        self.owner_no = metrics.counter("gate_owner_transitions_total", help_,
+                                        {"gate": self.id, "to": "no"})
+
+        self.cam = None
+        self.serial = None
+        self.telemetry = None
+
+        # from the Arduino
+        self.distance_cm = None
+        self.pir_motion = False
+        self.gate_open = False
+        # session / owner decision
+        self.session_active = False
+        self.session_until = 0.0
+        self.session_event = asyncio.Event()
+        self.stable_owner = False
+        self.decision = OwnerDecision(OWNER_OPEN_S, OWNER_HOLD_S)
+        self.last_cmd = {}
+        self.last_fb = 0.0
+        # keyframe / ROI state (see DetectScheduler)
+        self.tracks = None
+        self.since_key = 0
+
+        self.frames = 0
+        self.full_runs = 0
+
+    # ---------- devices ----------
+    def open(self, loop):
+        cfg = self.config
+        if cfg["replay"]:
+            rep = self.gw.replay_for(cfg["replay"])
+            open_cam = lambda: replay.ReplayCamera(rep)
+            ser = replay.ReplaySerial(rep, timeout=0.1)
+        else:
+            backend = BACKENDS.get(cfg["backend"], cfg["backend"])
+            open_cam = lambda: replay.open_camera(cfg["camera"], backend)
+            ser = replay.open_serial(cfg["serial"], cfg["baud"], timeout=0.1)
+        if self.gw.telemetry_dir:
+            self.telemetry = TelemetryStore(os.path.join(self.gw.telemetry_dir, self.id))
+        self.cam = CameraSession(open_cam, CAM_RELEASE_AFTER).start()
+        self.serial = GateSerial(ser, cfg["protocol"], self.on_sample,
+                                 self.on_ready, self.on_write_failed).start(loop)
+
+    def close(self):
+        if self.serial is not None:
+            self.serial.close()
+        if self.cam is not None:
+            self.cam.release()
+        if self.telemetry is not None:
+            self.telemetry.close()
+
+    # ---------- logic (on the loop) ----------
+    def send(self, kind, on):
+        cmd = kind + (b"1" if on else b"0")
+        if self.last_cmd.get(kind) != cmd:
+            self.serial.send(cmd)
+            self.last_cmd[kind] = cmd
+            self.log.change("send", gate=self.id, cmd=cmd.decode())
+
+    def tick(self, now):
+        if self.session_active and now > self.session_until:
+            self.session_active = False
+            self.session_event.clear()
+            self.cam.sleep()
+            self.tracks = None
+            self.stable_owner = False
+            self.decision.reset()
+        self.send(b"S", self.session_active)
+        self.send(b"O", self.stable_owner)
+
+    def on_ready(self):
+        # Arduino reset: it forgot session/owner, send both again
+        self.log.change("arduino_ready", gate=self.id, readies=self.serial.readies)
+        self.last_cmd.clear()
+        self.tick(time.time())
+
+    def on_write_failed(self, cmd):
+        # the command never reached the Arduino: forget what was sent, the
+        # next tick sends the current state again
+        self.log.info("serial_write_failed", gate=self.id, cmd=cmd.decode(),
+                      failures=self.serial.write_failures)
+        self.last_cmd.clear()
+
+    def on_sample(self, fields):
+        now = time.time()
+        self.distance_cm = fields["distance"]
+        self.pir_motion = bool(fields["pir"])
+        self.gate_open = bool(fields["gate"])
+        if self.pir_motion:
+            if not self.session_active:
+                self.cam.wake()
+                self.session_event.set()
+            self.session_active = True
+            self.session_until = now + SESSION_SECONDS
+        self.tick(now)
+
+        event = {
+            "timestamp": int(now),
+            "distance_cm": self.distance_cm,
+            "pir_motion": self.pir_motion,
+            "session_active": self.session_active,
+            "owner": self.stable_owner,
+            "gate_open": self.gate_open,
+            "lamp_on": self.gate_open,
+        }
+        self.log.info("data", gate=self.id, **event)
+        self.publisher.update(event, event, now)
+        if self.telemetry is not None:
+            self.telemetry.append(event, now)
+        if now - self.last_fb >= FIREBASE_INTERVAL:
+            self.gw.sink.push(dict(event, gate_id=self.id))
+            self.last_fb = now
+
+    def on_result(self, faces, rec, stamp):
+        self.tracks = list(faces) or None
+        was_owner = self.stable_owner
+        self.stable_owner = self.decision.update(rec.margin, stamp)
+        if self.stable_owner and not was_owner:
+            self.owner_yes.inc()
+        if was_owner and not self.stable_owner:
+            self.owner_no.inc()
+        self.tick(time.time())
+
+    async def run_vision(self):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.gw.fps
+        while not self.gw.stopping.is_set():
+            if not self.session_active:
+                try:
+                    await asyncio.wait_for(self.session_event.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    pass
+                self.tick(time.time())
+                continue
+
+            t0 = time.perf_counter()
+            ok, gray = await loop.run_in_executor(self.gw.io_pool, read_gray, self.cam)
+            stamp = self.cam.stamp or time.time()
+            if not ok or not self.session_active:
+                self.tick(time.time())
+                continue
+            keyframe = not self.tracks or self.since_key >= KEYFRAME_INTERVAL - 1
+            faces, rec, full = await loop.run_in_executor(
+                self.gw.vision_pool, analyze, gray, self.tracks, keyframe, self.id,
+                stamp)
+            self.since_key = 0 if full else self.since_key + 1
+            self.full_runs += full
+            self.frames += 1
+            if self.session_active:
+                self.on_result(faces, rec, stamp)
+            took = time.perf_counter() - t0
+            self.frame_seconds.observe(took)
+            if took < period:
+                await asyncio.sleep(period - took)
+
+
+# ================= gateway =================
+class MultiGateway:
+    def __init__(self, gates, client, base, sink, model_path="face_model.yml",
+                 engine="numpy", profile="near-gate", threshold=70, workers=None,
+                 fps=GATE_FPS, heartbeat=10.0, deadband=1, replay_mode="realtime",
+                 cache_ttl=RECOGNITION_CACHE_TTL, telemetry_dir=None):
+        self.client = client            # paho client, shared by all gates
+        self.base = base
+        self.sink = sink
+        self.fps = fps
+        self.heartbeat = heartbeat
+        self.deadband = deadband
+        self.replay_mode = replay_mode
+        self.telemetry_dir = telemetry_dir
+        self.workers = workers or os.cpu_count() or 1
+        self.model = (model_path, engine, profile, threshold, cache_ttl)
+        self.gates = [Gate(g, self) for g in gates]
+        self.stopping = None
+        self.vision_pool = None
+        self.io_pool = None
+        self._replays = {}
+
+    def replay_for(self, path):
+        if path not in self._replays:
+            self._replays[path] = replay.Replay(path, self.replay_mode)
+        return self._replays[path]
+
+    def announce(self):
+        # MQTT (re)connect: online flag + schema of every gate
+        for gate in self.gates:
+            gate.publisher.announce()
+
+    def start_pools(self):
+        # before the cameras: workers forked while the process is still small
+        self.vision_pool = ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                               initargs=self.model)
+        # warm up: every worker loads the model now, not on the first PIR
+        list(self.vision_pool.map(time.sleep, [0.05] * self.workers))
+        self.io_pool = ThreadPoolExecutor(max(2, len(self.gates)),
+                                          thread_name_prefix="gate-io")
+
+    async def run(self, stop=None):
+        loop = asyncio.get_running_loop()
+        self.stopping = stop or asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass                    # Windows: Ctrl+C -> KeyboardInterrupt
+        if self.vision_pool is None:
+            self.start_pools()
+        for gate in self.gates:
+            gate.session_event = asyncio.Event()
+            gate.open(loop)
+        tasks = [asyncio.create_task(g.run_vision()) for g in self.gates]
+        try:
+            await self.stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for gate in self.gates:
+                gate.close()
+            for gate in self.gates:
+                gate.publisher.offline()
+
+    def close(self):
+        if self.io_pool is not None:
+            self.io_pool.shutdown(wait=False)
+        if self.vision_pool is not None:
+            self.vision_pool.shutdown()
+
+    def counters(self):
+        return {g.id: {"frames": g.frames, "full_runs": g.full_runs,
+                       "samples": g.serial.samples if g.serial else 0,
+                       "owner": g.stable_owner, "session": g.session_active}
+                for g in self.gates}
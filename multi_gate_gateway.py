@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+
+import paho.mqtt.client as mqtt
+import firebase_admin
+from firebase_admin import credentials, db
+
+import metrics
+import multi_gate
+from event_sink import EventSink
+from state_publisher import set_will, wait_published
+
+# Several gates from one process (multi_gate.py): one camera + Arduino per
+# entry of the config file, one MQTT connection, one Firebase sink and one
+# pool of vision workers for all of them. Headless (no window / stream).
+#
+#   python multi_gate_gateway.py --config gates.json
+#
+# MQTT: MQTT_BASE/<gate_id>/... per gate (same topics as the single gate
+# gateways under MQTT_BASE), MQTT_BASE/online = the gateway itself.
+
+# ================= CONFIG =================
+GATES_CONFIG = "gates.json"
+
+CONF_THRESHOLD = 70  # LBPH confidence threshold (smaller = better match)
+RECOGNIZER_ENGINE = "numpy"   # or "opencv", "numpy-index" (approximate PQ index)
+DETECT_PROFILE = "near-gate"
+
+# vision worker processes shared by all gates (None = one per CPU core)
+VISION_WORKERS = None
+# frames/s per gate while its session is active
+GATE_FPS = 5.0
+
+MQTT_HEARTBEAT = 10.0
+MQTT_DEADBAND_CM = 1
+FIREBASE_SPOOL = "gate_logs.spool.db"
+# every Arduino sample per gate, in TELEMETRY_DIR/<gate id> (telemetry_store.py)
+TELEMETRY_DIR = "gate_telemetry"
+METRICS_PORT = 9108
+
+MQTT_HOST = "broker.hivemq.com"
+MQTT_PORT = 1883
+MQTT_BASE = "aiu/gate/aria"
+
+SERVICE_ACCOUNT = "serviceaccountkey.json"
+FIREBASE_DB_URL = "https://iotproj-767e8-default-rtdb.asia-southeast1.firebasedatabase.app/"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default=GATES_CONFIG)
+    args = ap.parse_args()
+
+    gates = multi_gate.load_gates(args.config)
+    print(f"✅ {len(gates)} gates: {', '.join(g['id'] for g in gates)}")
+
+    metrics.setup_logging()
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+        print(f"✅ Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+
+    # ================= FIREBASE =================
+    cred = credentials.Certificate(SERVICE_ACCOUNT)
+    firebase_admin.initialize_app(cred, {"databaseURL": FIREBASE_DB_URL})
+    sink = EventSink(db.reference("gate_logs"), FIREBASE_SPOOL).start()
+
+    # ================= MQTT =================
+    client = mqtt.Client()
+    gw = multi_gate.MultiGateway(gates, client, MQTT_BASE, sink,
+                                 "face_model.yml", RECOGNIZER_ENGINE, DETECT_PROFILE,
+                                 CONF_THRESHOLD, VISION_WORKERS, GATE_FPS,
+                                 MQTT_HEARTBEAT, MQTT_DEADBAND_CM,
+                                 telemetry_dir=TELEMETRY_DIR)
+    # vision workers start before the cameras / MQTT threads exist
+    gw.start_pools()
+    print(f"✅ {gw.workers} vision workers ready")
+
+    set_will(client, MQTT_BASE)
+
+    def on_connect(c, userdata, flags, rc):
+        c.publish(f"{MQTT_BASE}/online", "1", qos=1, retain=True)
+        gw.announce()
+
+    client.on_connect = on_connect
+    client.connect(MQTT_HOST, MQTT_PORT, 60)
+    client.loop_start()
+    print("✅ MQTT connected")
+
+    print("System running. Ctrl+C to exit")
+    try:
+        asyncio.run(gw.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gw.close()
+        sink.close()
+        wait_published(client.publish(f"{MQTT_BASE}/online", "0", qos=1, retain=True))
+        client.loop_stop()
+        client.disconnect()
+        print("Stopped.")
+
+
+if __name__ == "__main__":
+    main()
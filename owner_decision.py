@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+
+# Owner decision over time from the LBPH confidences, instead of
+# "ON_FRAMES frames with conf < threshold in a row" / "OFF_FRAMES without".
+#
+# Every recognized frame gives a margin (face_engine.Recognition.margin =
+# threshold - conf of the best resident face; None = no resident face or
+# no face). The margin becomes an evidence rate in [-1, 1] per second:
+#
+#   rate = clip(margin / FULL_MARGIN, -1, 1)   (None -> -1)
+#
+# and the evidence is its time integral over the time between two frames
+# (capped at MAX_DT). A frame against the owner (rate < 0) is charged once,
+# for the time before it; the time after it up to the next owner frame
+# counts nothing, and between two owner frames the weaker rate counts, so
+# the owner is only taken as seen in between if both frames saw them.
+# (Charging the worse rate of both neighbours paid a single missed frame
+# twice: at 5 fps that closed a confirmed owner for a frame.) Kept in
+# [0, HOLD_S]:
+#
+#   closed -> open   evidence >= OPEN_S
+#   open -> closed   evidence back at 0
+#
+# So a clear match (conf 10 at threshold 70) opens after OPEN_S seconds,
+# a borderline one (69) needs FULL_MARGIN times longer, and an open gate
+# survives flicker: once the owner was seen for a while it closes only
+# after HOLD_S seconds without owner evidence. A CUSUM / one-sided
+# sequential test: the floor at 0 means a look-alike in front of the
+# camera does not pile up debt the owner would have to pay back. Being
+# time-based, 5 or 30 fps give the same decision times (bench_decision.py).
+
+OPEN_S = 0.2            # seconds of full evidence to open
+HOLD_S = 0.4            # seconds of full counter-evidence to close again
+FULL_MARGIN = 20.0      # margin (LBPH distance below threshold) = full evidence
+MAX_DT = 0.5            # a frame counts for at most this long (stalls, gaps)
+
+
+def evidence_rate(margin, full_margin=FULL_MARGIN):
+    # margin(s) -> rate(s) in [-1, 1]; works on scalars and arrays,
+    # None / NaN = no resident face = -1
+    m = np.asarray(margin, dtype=float)
+    rate = np.clip(m / full_margin, -1.0, 1.0)
+    rate = np.where(np.isnan(rate), -1.0, rate)
+    return float(rate) if rate.ndim == 0 else rate
+
+
+class OwnerDecision:
+    def __init__(self, open_s=OPEN_S, hold_s=HOLD_S, full_margin=FULL_MARGIN,
+                 max_dt=MAX_DT):
+        if hold_s < open_s:
+            raise ValueError("hold_s must be >= open_s")
+        self.open_s = open_s
+        self.hold_s = hold_s
+        self.full_margin = full_margin
+        self.max_dt = max_dt
+        self.reset()
+
+    def reset(self):
+        self.owner = False
+        self.evidence = 0.0
+        self.last = None            # time of the previous update
+        self.rate = None            # its evidence rate
+        self.changed_at = None
+
+    def update(self, margin, now=None):
+        # margin of one frame (None = no resident face) -> debounced owner
+        now = time.time() if now is None else now
+        rate = -1.0 if margin is None else evidence_rate(margin, self.full_margin)
+        if self.last is not None:
+            dt = min(self.max_dt, max(0.0, now - self.last))
+            if rate < 0:
+                step = rate * dt                    # the bad frame, charged once
+            elif self.rate < 0:
+                step = 0.0                          # already charged above
+            else:
+                step = min(self.rate, rate) * dt
+            self.evidence = min(self.hold_s, max(0.0, self.evidence + step))
+        self.last, self.rate = now, rate
+        if not self.owner and self.evidence >= self.open_s - 1e-9:
+            self.owner = True
+            self.changed_at = now
+        elif self.owner and self.evidence <= 0.0:
+            self.owner = False
+            self.changed_at = now
+        return self.owner
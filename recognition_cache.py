@@ -0,0 +1,182 @@
+import time
+
+import cv2
+import numpy as np
+
+import face_engine
+import metrics
+
+# Per-track recognition cache: LBPH predict only when something changed.
+#
+# Every detected face box is matched to a track (IoU with the box of the
+# last frame >= IOU_MIN). A track remembers what predict said about it and
+# keeps the result while
+#   - the face was confidently identified: CONFIRM_FRAMES predictions with
+#     the same label and a fused distance at least CONFIDENT_MARGIN away
+#     from that label's threshold (clearly owner or clearly not),
+#   - the last predict is younger than CACHE_TTL seconds,
+#   - the face still looks the same: 64-bit difference hash of the box
+#     within HASH_MAX_BITS of the one taken at the last predict.
+# Otherwise the face is predicted again. A box that jumped gets a new
+# track; a changed hash (someone else stepped into the same spot) resets
+# the track's history before the new prediction is fused in.
+#
+# Fusion: the track keeps an EWMA (FUSE_ALPHA) of its LBPH distances with
+# the same label. What face_engine.is_resident() gets is the worse of that
+# and the newest prediction, so a face is only taken as the owner while
+# both its history and the current frame say so: one lucky frame of a
+# look-alike (fused still above the threshold) is rejected, and a
+# look-alike hovering at the threshold cannot ride on the smoothed value.
+#
+# predict() runs on one thread only (VisionPipeline's recognize stage).
+# reset() (session ended, threshold changed) comes from the gateway's main
+# loop: it only raises a flag, the next predict() drops the tracks on the
+# recognize thread, so the two threads never touch the tracks together.
+
+CACHE_TTL = 1.0          # seconds a confident result is reused
+IOU_MIN = 0.5            # box overlap to stay the same track
+HASH_MAX_BITS = 12       # dHash bits that may differ (of 64)
+FUSE_ALPHA = 0.5         # weight of the newest prediction
+CONFIRM_FRAMES = 2       # predictions before a result may be reused
+CONFIDENT_MARGIN = 10.0  # fused distance this far from the threshold
+TRACK_LOST = 0.5         # seconds unseen before a track is dropped
+
+CACHE_HELP = "Faces answered from the recognition cache (hit) or predicted (miss)"
+CACHE_HITS = metrics.counter("gate_recognition_cache_total", CACHE_HELP, {"result": "hit"})
+CACHE_MISSES = metrics.counter("gate_recognition_cache_total", CACHE_HELP, {"result": "miss"})
+
+
+def face_hash(gray, box):
+    # difference hash: 9x8 area-averaged thumbnail, bit = left < right
+    x, y, w, h = box
+    small = cv2.resize(gray[y:y+h, x:x+w], (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def label_limit(labels, label, threshold):
+    info = labels.get(label) if labels else None
+    limit = info.get("threshold") if info else None
+    return threshold if limit is None else limit
+
+
+class Track:
+    def __init__(self, box, now):
+        self.box = box
+        self.seen = now
+        self.hash = None
+        self.label = None
+        self.conf = None        # newest prediction
+        self.fused = None       # EWMA of the LBPH distance (same label)
+        self.n = 0              # predictions fused
+        self.stamp = 0.0        # last predict
+        self.hits = 0
+
+    def fuse(self, label, conf, alpha):
+        self.conf = conf
+        if label != self.label or self.fused is None:
+            self.label, self.fused, self.n = label, conf, 1
+        else:
+            self.fused = alpha * conf + (1 - alpha) * self.fused
+            self.n += 1
+
+
+class RecognitionCache:
+    def __init__(self, ttl=CACHE_TTL, iou_min=IOU_MIN, hash_max=HASH_MAX_BITS,
+                 alpha=FUSE_ALPHA, confirm=CONFIRM_FRAMES, margin=CONFIDENT_MARGIN,
+                 lost_after=TRACK_LOST):
+        self.ttl = ttl
+        self.iou_min = iou_min
+        self.hash_max = hash_max
+        self.alpha = alpha
+        self.confirm = confirm
+        self.margin = margin
+        self.lost_after = lost_after
+
+        self.tracks = []
+        self.hits = 0
+        self.predicts = 0
+        self.misses = {"new": 0, "unconfirmed": 0, "ttl": 0, "hash": 0}
+        self._reset = False         # set by reset(), applied by predict()
+
+    def reset(self):
+        # safe from any thread: applied at the start of the next predict()
+        self._reset = True
+
+    def counters(self):
+        total = self.hits + self.predicts
+        return {"hits": self.hits, "predicts": self.predicts,
+                "hit_rate": self.hits / total if total else 0.0,
+                "tracks": len(self.tracks), **{f"miss_{k}": v for k, v in self.misses.items()}}
+
+    def _match(self, faces, now):
+        # greedy: best overlapping free track per box, new track otherwise
+        self.tracks = [t for t in self.tracks if now - t.seen <= self.lost_after]
+        free = list(self.tracks)
+        out = []
+        for box in faces:
+            best, best_iou = None, self.iou_min
+            for track in free:
+                overlap = iou(box, track.box)
+                if overlap >= best_iou:
+                    best, best_iou = track, overlap
+            if best is None:
+                best = Track(box, now)
+                self.tracks.append(best)
+            else:
+                free.remove(best)
+            out.append(best)
+        return out
+
+    def _confident(self, track, limit):
+        return track.n >= self.confirm and abs(limit - track.fused) >= self.margin
+
+    def predict(self, recognizer, gray, faces, threshold, labels, now=None):
+        # -> [(label, conf)] per box like face_engine.predict_many, conf =
+        # max(newest, fused)
+        now = time.time() if now is None else now
+        if self._reset:
+            self._reset = False
+            self.tracks = []
+        faces = [tuple(int(v) for v in box) for box in faces]
+        tracks = self._match(faces, now)
+        todo = []
+        for i, (box, track) in enumerate(zip(faces, tracks)):
+            h = face_hash(gray, box)
+            track.box, track.seen = box, now
+            if track.label is None:
+                reason = "new"
+            elif track.hash is not None and (h ^ track.hash).bit_count() > self.hash_max:
+                reason = "hash"
+                track.fused = None          # another face: start over
+            elif not self._confident(track, label_limit(labels, track.label, threshold)):
+                reason = "unconfirmed"
+            elif now - track.stamp > self.ttl:
+                reason = "ttl"
+            else:
+                track.hits += 1
+                self.hits += 1
+                CACHE_HITS.inc()
+                continue
+            self.misses[reason] += 1
+            todo.append((i, h))
+
+        if todo:
+            crops = [face_engine.crop_face(gray, faces[i]) for i, _ in todo]
+            for (i, h), (label, conf) in zip(todo, face_engine.predict_many(recognizer, crops)):
+                track = tracks[i]
+                track.fuse(label, conf, self.alpha)
+                track.hash, track.stamp = h, now
+            self.predicts += len(todo)
+            CACHE_MISSES.inc(len(todo))
+        return [(t.label, max(t.conf, t.fused)) for t in tracks]
@@ -0,0 +1,192 @@
+import hashlib
+import hmac
+import json
+import math
+import os
+import queue
+import time
+import uuid
+from collections import deque, namedtuple
+
+import metrics
+
+# Remote control of a gateway over MQTT (open the gate, start a session,
+# change CONF_THRESHOLD) without restarting it.
+#
+#   MQTT_BASE/cmd/<name>   JSON {"id": "a1", "value": 15, "sent": unix s,
+#                                "sig": hex HMAC-SHA256}, value null = default
+#   MQTT_BASE/ack          JSON {"id", "cmd", "ok", "detail", "latency_ms"}
+#
+#   GATE_COMMAND_SECRET=... python mqtt_test.py open 10   # signs, waits for the ack
+#
+# The broker is public, so every command is signed with a secret shared by
+# the sender and the gateway ($GATE_COMMAND_SECRET): sig = HMAC-SHA256 over
+# [id, name, value, sent] as compact JSON (sign()). Unsigned commands, a
+# wrong signature and commands sent more than MAX_AGE_S ago (or that far in
+# the future: clocks must be roughly in sync) are rejected, so a recorded
+# command cannot be replayed later either.
+#
+# paho's network thread only checks and parses the message and puts a
+# Command on a queue; names the gateway does not handle are rejected
+# (acked) right there, retained messages are ignored (they would run again
+# on every reconnect) and a repeated id (QoS 1 redelivery) runs once. The gate loop
+# takes the commands with poll() between frames (never blocks) and applies
+# them like any other input; what the Arduino has to know goes out through
+# SerialLink.send(), i.e. the serial writer thread, so neither the vision
+# threads nor the loop wait on the UART. on_command is called for every
+# queued command, e.g. SerialLink.wake() / VisionPipeline.wake() so a loop
+# sleeping until the next Arduino sample or frame picks it up at once.
+#
+# latency_ms in the ack = received by the gateway -> applied; with "sent"
+# in the payload (and clocks in sync) sender -> applied as "e2e_ms".
+
+Command = namedtuple("Command", ["name", "value", "id", "received", "sent"])
+
+SECRET_ENV = "GATE_COMMAND_SECRET"
+MAX_AGE_S = 30.0        # a command older (or newer) than this is rejected
+
+COMMANDS_HELP = "MQTT commands received"
+APPLY_SECONDS = metrics.histogram("gate_command_seconds", "MQTT command received -> applied")
+
+
+def load_secret(secret=None):
+    # explicit secret, else $GATE_COMMAND_SECRET; None if neither is set
+    if secret is None:
+        secret = os.environ.get(SECRET_ENV)
+    if isinstance(secret, str):
+        secret = secret.encode()
+    return secret or None
+
+
+def signature(secret, cmd_id, name, value, sent):
+    msg = json.dumps([cmd_id, name, value, sent], separators=(",", ":"))
+    return hmac.new(secret, msg.encode(), hashlib.sha256).hexdigest()
+
+
+def sign(secret, name, value=None, cmd_id=None, sent=None):
+    # -> payload for MQTT_BASE/cmd/<name> (sender side)
+    secret = load_secret(secret)
+    if secret is None:
+        raise ValueError(f"no command secret (set {SECRET_ENV})")
+    sent = time.time() if sent is None else sent
+    cmd_id = uuid.uuid4().hex[:8] if cmd_id is None else cmd_id
+    return json.dumps({"id": cmd_id, "value": value, "sent": sent,
+                       "sig": signature(secret, cmd_id, name, value, sent)})
+
+
+def parse_command(payload):
+    # -> dict of the JSON payload, None if it is not a JSON object
+    try:
+        data = json.loads(payload.decode(errors="replace"))
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def check_signature(secret, name, data, now, max_age=MAX_AGE_S):
+    # -> None if the command may run, else why not
+    sig, sent = data.get("sig"), data.get("sent")
+    if not isinstance(sig, str) or data.get("id") is None:
+        return "unsigned command"
+    if isinstance(sent, bool) or not isinstance(sent, (int, float)) or not math.isfinite(sent):
+        return "no send time"
+    expected = signature(secret, data["id"], name, data.get("value"), sent)
+    if not hmac.compare_digest(sig, expected):
+        return "bad signature"
+    if abs(now - sent) > max_age:
+        return "stale command"
+    return None
+
+
+class CommandInbox:
+    def __init__(self, client, base, names, on_command=None, qos=1, secret=None,
+                 max_age=MAX_AGE_S):
+        self.secret = load_secret(secret)
+        if self.secret is None:
+            raise ValueError(f"remote commands need a secret (set {SECRET_ENV})")
+        self.client = client
+        self.base = base
+        self.names = tuple(names)       # commands this gateway handles
+        self.on_command = on_command
+        self.qos = qos
+        self.max_age = max_age
+        self.received = 0
+        self.rejected = 0
+        self._queue = queue.SimpleQueue()
+        self._seen = deque(maxlen=256)  # recent ids (QoS 1 redelivery, replays)
+        client.message_callback_add(f"{base}/cmd/#", self._on_message)
+
+    def subscribe(self):
+        # in on_connect: the broker forgets subscriptions on reconnect
+        self.client.subscribe(f"{self.base}/cmd/#", qos=self.qos)
+
+    def _on_message(self, client, userdata, msg):
+        if msg.retain:
+            return
+        received = time.time()
+        name = msg.topic[len(self.base) + len("/cmd/"):]
+        data = parse_command(msg.payload) or {}
+        cmd = Command(name, data.get("value"), data.get("id"), received, data.get("sent"))
+        problem = check_signature(self.secret, name, data, received, self.max_age)
+        if problem is not None:
+            self.received += 1
+            self.rejected += 1
+            self.ack(cmd, False, problem)
+            return
+        if cmd.id in self._seen:
+            return
+        self._seen.append(cmd.id)
+        self.received += 1
+        if name not in self.names:
+            self.rejected += 1
+            self.ack(cmd, False, f"unknown command, expected one of {', '.join(self.names)}")
+            return
+        self._queue.put(cmd)
+        if self.on_command is not None:
+            self.on_command()
+
+    def pending(self):
+        return not self._queue.empty()
+
+    def poll(self):
+        # -> commands received since the last poll, oldest first
+        out = []
+        while True:
+            try:
+                out.append(self._queue.get_nowait())
+            except queue.Empty:
+                return out
+
+    def ack(self, cmd, ok=True, detail=None):
+        now = time.time()
+        body = {"id": cmd.id, "cmd": cmd.name, "ok": ok, "detail": detail,
+                "latency_ms": round(1000 * (now - cmd.received), 1)}
+        if isinstance(cmd.sent, (int, float)):
+            body["e2e_ms"] = round(1000 * (now - cmd.sent), 1)
+        if ok:
+            APPLY_SECONDS.observe(now - cmd.received)
+        result = "ok" if ok else "failed"
+        metrics.counter("gate_mqtt_commands_total", COMMANDS_HELP,
+                        {"cmd": cmd.name if cmd.name in self.names else "unknown",
+                         "result": result}).inc()
+        self.client.publish(f"{self.base}/ack", json.dumps(body), qos=self.qos)
+        return body
+
+
+def number(cmd, default=None, low=None, high=None):
+    # cmd.value as a float (default if none given); ValueError if not usable
+    if cmd.value is None or cmd.value == "":
+        if default is None:
+            raise ValueError(f"{cmd.name} needs a value")
+        return float(default)
+    if isinstance(cmd.value, bool):         # JSON true/false, float() takes it as 1/0
+        raise ValueError(f"{cmd.name}: not a number: {cmd.value!r}")
+    try:
+        value = float(cmd.value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{cmd.name}: not a number: {cmd.value!r}") from None
+    if not math.isfinite(value):            # "nan" passes both range checks
+        raise ValueError(f"{cmd.name}: not a finite number: {cmd.value!r}")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ValueError(f"{cmd.name}: {value:g} outside {low}..{high}")
+    return value
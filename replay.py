@@ -0,0 +1,568 @@
+import atexit
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import frame_bus
+
+# Record / replay of camera + serial sessions, so the gate scripts can be
+# run and measured without the webcam and the Arduino.
+#
+# The scripts open their devices with open_camera()/open_serial() instead
+# of cv2.VideoCapture()/serial.Serial(). Normally that is exactly the same
+# thing; two environment variables switch it:
+#
+#   GATE_RECORD=recordings/evening   record everything the script reads
+#                                    (and the commands it writes)
+#   GATE_REPLAY=recordings/evening   read from the recording instead of
+#                                    the devices
+#   GATE_REPLAY_MODE=realtime|fast   realtime (default): frames/lines come
+#                                    at the recorded pace, a slow script
+#                                    skips frames like with a live camera;
+#                                    fast: every frame in order, no waiting
+#   GATE_FRAME_BUS=gate_cam          camera frames from the shared-memory
+#                                    frame bus (frame_bus.py) instead of
+#                                    opening the device
+#
+# Recording directory:
+#   meta.json   start time, devices, jpeg quality
+#   frames.bin  per frame: <d t><I len> + JPEG
+#   frames.1.bin, frames.2.bin ...  the same for further cameras (camera_gate
+#               fusion): one stream per camera index, in the order they
+#               were opened (meta "cameras"); replaying, open_camera(index)
+#               gets the stream recorded for that index
+#   serial.bin  per chunk: <d t><c 'r'|'w'><I len> + bytes, as read/written
+#               (raw bytes, so line splitting / partial lines replay too)
+#
+# Replay clock: realtime -> recording time = wall time since the replay
+# started. fast -> the time of the last frame served; while nobody reads
+# the camera (e.g. no session) serial reads move it to the next chunk.
+# "Nobody" = every open camera has been read before and not for
+# CAMERA_IDLE_S (paused) or was opened CAMERA_START_S ago and never read (a
+# startup check kept open for later), or all cameras were released again.
+# A camera that was just opened and is about to be read - or is still being
+# opened at startup - holds serial back, else serial would run the clock
+# to the end and the first read would skip every frame. Serial moves the
+# clock one chunk per SERIAL_STEP_S, so a loop that only looks at the
+# latest Arduino sample still sees every one (e.g. the PIR edge).
+# Replay.stats() has frames served/skipped and every write with its
+# recording time, used by bench_replay.py.
+
+RECORD_ENV = "GATE_RECORD"
+REPLAY_ENV = "GATE_REPLAY"
+MODE_ENV = "GATE_REPLAY_MODE"
+JPEG_QUALITY = 90
+CAMERA_IDLE_S = 0.05    # fast mode: camera not read for this long -> serial drives the clock
+CAMERA_START_S = 2.0    # fast mode: camera open this long without a read -> serial drives too
+SERIAL_STEP_S = 0.01    # fast mode: serial driving the clock moves it one chunk per this
+
+FRAME_HEAD = struct.Struct("<dI")
+SERIAL_HEAD = struct.Struct("<dcI")
+
+
+# ================= recording =================
+class Recorder:
+    # one per directory; frames are JPEG-encoded on a writer thread so
+    # recording does not slow the script down
+    def __init__(self, path, quality=JPEG_QUALITY):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.quality = quality
+        self.started = time.time()
+        self.meta = {"version": 1, "started": self.started, "jpeg_quality": quality}
+        self.frames = 0
+        self._serial = open(os.path.join(path, "serial.bin"), "wb")
+        self._frames = [open(frames_file(path, 0), "wb")]
+        self._serial_lock = threading.Lock()
+        self._q = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_frames, daemon=True)
+        self._thread.start()
+        self.save_meta()
+
+    def save_meta(self):
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self.meta, f, indent=1)
+
+    def stream_for(self, index, backend=None):
+        # camera index -> frame stream, new indices get the next one
+        cams = self.meta.setdefault("cameras", [])
+        for stream, cam in enumerate(cams):
+            if cam["index"] == index:
+                return stream
+        cams.append({"index": index, "backend": backend})
+        if len(cams) > len(self._frames):
+            self._frames.append(open(frames_file(self.path, len(cams) - 1), "wb"))
+        self.save_meta()
+        return len(cams) - 1
+
+    def frame(self, t, frame, stream=0):
+        self.frames += 1
+        self._q.put((t, frame, stream))
+
+    def serial(self, t, kind, data):
+        with self._serial_lock:
+            self._serial.write(SERIAL_HEAD.pack(t, kind, len(data)) + data)
+            self._serial.flush()
+
+    def _write_frames(self):
+        while True:
+            item = self._q.get()
+            if item is None:
+                break
+            t, frame, stream = item
+            ok, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ok:
+                self._frames[stream].write(FRAME_HEAD.pack(t, len(jpg)) + jpg.tobytes())
+
+    def close(self):
+        self._q.put(None)
+        self._thread.join()
+        for f in self._frames:
+            f.close()
+        with self._serial_lock:
+            self._serial.close()
+        self.save_meta()
+
+
+class RecordingCamera:
+    def __init__(self, cam, recorder, stream=0):
+        self.cam = cam
+        self.recorder = recorder
+        self.stream = stream
+
+    def read(self):
+        ret, frame = self.cam.read()
+        if ret:
+            self.recorder.frame(time.time(), frame, self.stream)
+        return ret, frame
+
+    def __getattr__(self, name):
+        return getattr(self.cam, name)
+
+
+class RecordingSerial:
+    def __init__(self, ser, recorder):
+        self.ser = ser
+        self.recorder = recorder
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        if data:
+            self.recorder.serial(time.time(), b"r", data)
+        return data
+
+    def readline(self):
+        data = self.ser.readline()
+        if data:
+            self.recorder.serial(time.time(), b"r", data)
+        return data
+
+    def write(self, data):
+        self.recorder.serial(time.time(), b"w", bytes(data))
+        return self.ser.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+
+# ================= replay =================
+def frames_file(path, stream=0):
+    return os.path.join(path, "frames.bin" if stream == 0 else f"frames.{stream}.bin")
+
+
+def load_frames(path, stream=0):
+    # -> [(t, jpeg bytes)]
+    out = []
+    with open(frames_file(path, stream), "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + FRAME_HEAD.size <= len(data):
+        t, n = FRAME_HEAD.unpack_from(data, pos)
+        pos += FRAME_HEAD.size
+        out.append((t, data[pos:pos + n]))
+        pos += n
+    return out
+
+
+def load_serial(path):
+    # -> reads [(t, bytes)], writes [(t, bytes)]
+    reads, writes = [], []
+    file = os.path.join(path, "serial.bin")
+    if not os.path.exists(file):
+        return reads, writes
+    with open(file, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos + SERIAL_HEAD.size <= len(data):
+        t, kind, n = SERIAL_HEAD.unpack_from(data, pos)
+        pos += SERIAL_HEAD.size
+        (reads if kind == b"r" else writes).append((t, data[pos:pos + n]))
+        pos += n
+    return reads, writes
+
+
+class Replay:
+    # shared clock + cursors of one recording (all cameras/serial ports
+    # opened on it read the same stream)
+    def __init__(self, path, mode="realtime"):
+        if mode not in ("realtime", "fast"):
+            raise ValueError(f"unknown replay mode {mode!r}")
+        self.path = path
+        self.mode = mode
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        # one list of frames per camera stream, frames = the first one
+        self.streams = [load_frames(path)]
+        while os.path.exists(frames_file(path, len(self.streams))):
+            self.streams.append(load_frames(path, len(self.streams)))
+        self.frames = self.streams[0]
+        self.reads, self.recorded_writes = load_serial(path)
+        stamps = [t for t, _ in self.reads[:1] + self.recorded_writes[:1]]
+        stamps += [frames[0][0] for frames in self.streams if frames]
+        self.t0 = min(stamps + [self.meta["started"]])
+
+        self.positions = [0] * len(self.streams)
+        self.read_pos = 0
+        self.read_buf = b""
+        # (wall, recording t) per frame handed out, per stream
+        self.served_streams = [[] for _ in self.streams]
+        self.served = self.served_streams[0]
+        self.skipped_streams = [0] * len(self.streams)
+        self.skipped = 0            # realtime: frames the script was too slow for
+        self.writes = []            # (wall, recording t, bytes) written by the script
+        self.started_wall = None
+        self.clock = self.t0        # fast mode
+        self.cameras = []           # open ReplayCameras
+        self.camera_opened = False  # any camera opened since the start
+        self.serial_step_at = 0.0   # fast mode: wall time serial may move the clock again
+        self.cond = threading.Condition()
+
+    # ---------- clock ----------
+    def start(self):
+        with self.cond:
+            if self.started_wall is None:
+                self.started_wall = time.time()
+
+    def now(self):
+        if self.mode == "realtime":
+            return self.t0 + (time.time() - self.started_wall)
+        return self.clock
+
+    @property
+    def frame_pos(self):
+        return self.positions[0]
+
+    def frames_done(self):
+        return all(pos >= len(frames) for pos, frames in zip(self.positions, self.streams))
+
+    def stream_for(self, index):
+        # camera index -> stream recorded for it (old recordings: stream 0)
+        for stream, cam in enumerate(self.meta.get("cameras", [])):
+            if cam["index"] == index and stream < len(self.streams):
+                return stream
+        if isinstance(index, int) and 0 < index < len(self.streams) and "cameras" not in self.meta:
+            return index
+        return 0
+
+    def serial_done(self):
+        return self.read_pos >= len(self.reads) and not self.read_buf
+
+    def finished(self):
+        # nothing left to read, or left only in frames nobody will read:
+        # realtime past the last frame, fast with the camera idle
+        if not self.serial_done():
+            return False
+        with self.cond:
+            if self.frames_done():
+                return True
+            if self.mode == "fast":
+                return self._camera_idle()
+            return all(not frames or self.now() >= frames[-1][0] for frames in self.streams)
+
+    # ---------- camera ----------
+    def next_frame(self, stream=0):
+        # -> (t, jpeg) or None at the end
+        frames = self.streams[stream]
+        with self.cond:
+            pos = self.positions[stream]
+            if pos >= len(frames):
+                return None
+            skipped = 0
+            if self.mode == "fast":
+                now = self.clock
+                # frames recorded while the camera was not read are gone
+                while pos + 1 < len(frames) and frames[pos + 1][0] <= now:
+                    pos += 1
+                    skipped += 1
+                t, jpg = frames[pos]
+                self.clock = max(self.clock, t)
+                self.cond.notify_all()
+            else:
+                t = frames[pos][0]
+                while t > self.now():
+                    self.cond.wait(t - self.now())
+                now = self.now()
+                # live camera: a slow reader gets the newest frame
+                pos = self.positions[stream]
+                if pos >= len(frames):          # another reader of this stream
+                    return None
+                while pos + 1 < len(frames) and frames[pos + 1][0] <= now:
+                    pos += 1
+                    skipped += 1
+                t, jpg = frames[pos]
+            self.positions[stream] = pos + 1
+            self.skipped += skipped
+            self.skipped_streams[stream] += skipped
+            self.served_streams[stream].append((time.time(), t))
+            return t, jpg
+
+    # ---------- serial ----------
+    def _available(self):
+        # move chunks that are due into read_buf
+        now = self.now()
+        while self.read_pos < len(self.reads) and self.reads[self.read_pos][0] <= now:
+            self.read_buf += self.reads[self.read_pos][1]
+            self.read_pos += 1
+
+    def attach(self, cam):
+        with self.cond:
+            self.cameras.append(cam)
+            self.camera_opened = True
+
+    def detach(self, cam):
+        with self.cond:
+            if cam in self.cameras:
+                self.cameras.remove(cam)
+            self.cond.notify_all()
+
+    def _camera_idle(self):
+        if self.frames_done():
+            return True
+        now = time.time()
+        if not self.cameras:
+            # startup: the script may still be opening its camera
+            return self.camera_opened or now - self.started_wall > CAMERA_START_S
+        for cam in self.cameras:
+            if cam.last_read is None:
+                if now - cam.opened_at <= CAMERA_START_S:
+                    return False        # about to be read
+            elif now - cam.last_read <= CAMERA_IDLE_S:
+                return False
+        return True
+
+    def read(self, size, timeout, line=False):
+        t_end = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while True:
+                self._available()
+                if line and b"\n" in self.read_buf:
+                    size = self.read_buf.index(b"\n") + 1
+                    break
+                if not line and self.read_buf:
+                    break
+                if self.read_pos >= len(self.reads):
+                    break
+                step = None
+                if self.mode == "fast" and self._camera_idle():
+                    step = self.serial_step_at - time.time()
+                    if step <= 0:
+                        # nobody drives the clock -> jump to the next chunk
+                        self.clock = max(self.clock, self.reads[self.read_pos][0])
+                        self.serial_step_at = time.time() + SERIAL_STEP_S
+                        continue
+                left = None if t_end is None else t_end - time.time()
+                if left is not None and left <= 0:
+                    break
+                if self.mode == "realtime":
+                    due = self.reads[self.read_pos][0] - self.now()
+                    left = due if left is None else min(left, due)
+                elif step is not None:
+                    left = step if left is None else min(left, step)
+                self.cond.wait(max(0.001, left) if left is not None else CAMERA_IDLE_S)
+            if line and b"\n" not in self.read_buf:
+                size = len(self.read_buf)       # timeout: partial line like pyserial
+            data, self.read_buf = self.read_buf[:size], self.read_buf[size:]
+        if not data and self.serial_done() and timeout:
+            time.sleep(min(timeout, 0.1))       # EOF: don't let reader loops spin
+        return data
+
+    def in_waiting(self):
+        with self.cond:
+            self._available()
+            return len(self.read_buf)
+
+    def write(self, data):
+        with self.cond:
+            self.writes.append((time.time(), self.now(), bytes(data)))
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "frames": len(self.frames),
+            "served": list(self.served),
+            "skipped": self.skipped,
+            "streams": [{"frames": len(frames), "served": list(served), "skipped": skipped}
+                        for frames, served, skipped in zip(self.streams, self.served_streams,
+                                                           self.skipped_streams)],
+            "writes": list(self.writes),
+            "recorded_writes": list(self.recorded_writes),
+            "t0": self.t0,
+        }
+
+
+class ReplayCamera:
+    # cv2.VideoCapture stand-in reading one stream of a Replay
+    def __init__(self, replay, stream=0):
+        self.replay = replay
+        self.stream = stream
+        self.opened = True
+        self.stamp = None           # recording time of the last frame
+        self.opened_at = time.time()
+        self.last_read = None       # wall time of the last read() (fast mode clock)
+        replay.start()
+        replay.attach(self)
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        self.last_read = time.time()
+        item = self.replay.next_frame(self.stream)
+        if item is None:
+            return False, None
+        self.stamp, jpg = item
+        frame = cv2.imdecode(np.frombuffer(jpg, np.uint8), cv2.IMREAD_COLOR)
+        return frame is not None, frame
+
+    def grab(self):
+        self._grabbed = self.read()
+        return self._grabbed[0]
+
+    def retrieve(self):
+        return self._grabbed
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        frames = self.replay.streams[self.stream]
+        if prop == cv2.CAP_PROP_FPS and len(frames) > 1:
+            span = frames[-1][0] - frames[0][0]
+            return (len(frames) - 1) / span if span > 0 else 0.0
+        return 0.0
+
+    def release(self):
+        self.opened = False
+        self.replay.detach(self)
+
+
+class ReplaySerial:
+    # serial.Serial stand-in reading from a Replay
+    def __init__(self, replay, timeout=None):
+        self.replay = replay
+        self.timeout = timeout
+        self.is_open = True
+        replay.start()
+
+    @property
+    def in_waiting(self):
+        return self.replay.in_waiting()
+
+    def read(self, size=1):
+        return self.replay.read(size, self.timeout)
+
+    def readline(self):
+        return self.replay.read(None, self.timeout, line=True)
+
+    def write(self, data):
+        self.replay.write(data)
+        return len(data)
+
+    def reset_input_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+# ================= entry points for the scripts =================
+_replays = {}
+_recorders = {}
+
+
+def active_replay():
+    path = os.environ.get(REPLAY_ENV)
+    if not path:
+        return None
+    if path not in _replays:
+        _replays[path] = Replay(path, os.environ.get(MODE_ENV, "realtime"))
+    return _replays[path]
+
+
+def now():
+    # clock of the frame stamps (ReplayCamera.stamp): recording time while
+    # replaying, wall time otherwise
+    rep = active_replay()
+    if rep is None or rep.started_wall is None:
+        return time.time()
+    return rep.now()
+
+
+def _recorder():
+    path = os.environ.get(RECORD_ENV)
+    if not path:
+        return None
+    if path not in _recorders:
+        if not _recorders:
+            atexit.register(close_recordings)
+        _recorders[path] = Recorder(path)
+    return _recorders[path]
+
+
+def open_camera(index=0, backend=None):
+    replay = active_replay()
+    if replay is not None:
+        return ReplayCamera(replay, replay.stream_for(index))
+    bus = os.environ.get(frame_bus.BUS_ENV)
+    if bus:
+        return frame_bus.BusCamera(bus)
+    cam = cv2.VideoCapture(index) if backend is None else cv2.VideoCapture(index, backend)
+    rec = _recorder()
+    if rec is None:
+        return cam
+    stream = rec.stream_for(index, backend)
+    if stream == 0:
+        rec.meta["camera"] = {"index": index, "backend": backend}
+        rec.save_meta()
+    return RecordingCamera(cam, rec, stream)
+
+
+def open_serial(port, baud=9600, timeout=None):
+    replay = active_replay()
+    if replay is not None:
+        return ReplaySerial(replay, timeout)
+    import serial
+    ser = serial.Serial(port, baud, timeout=timeout)
+    rec = _recorder()
+    if rec is None:
+        return ser
+    rec.meta["serial"] = {"port": port, "baud": baud}
+    rec.save_meta()
+    return RecordingSerial(ser, rec)
+
+
+def close_recordings():
+    for rec in _recorders.values():
+        rec.close()
+    _recorders.clear()
@@ -1,22 +1,23 @@
-import cv2
+import camera_discovery
 
-backends = [
-    ("ANY",  cv2.CAP_ANY),
-    ("DSHOW", cv2.CAP_DSHOW),
-    ("MSMF", cv2.CAP_MSMF)
-]
+# Every camera index x backend, probed in parallel (camera_discovery.py).
+# Prints what works with the sizes / fps it delivers and refreshes
+# camera_cache.json, so the gateways start with the device found here.
 
-for name, backend in backends:
-    print(f"\n=== Testing backend: {name} ===")
-    for idx in range(0, 4):   # try camera index 0..3
-        print(f"  Trying index {idx}...", end=" ")
-        cap = cv2.VideoCapture(idx, backend)
-        if not cap.isOpened():
-            print("❌ fail")
-        else:
-            ret, frame = cap.read()
-            if ret:
-                print("✅ success")
-            else:
-                print("⚠️ opened but no frame")
-            cap.release()
+devices, log = camera_discovery.discover()
+
+for index, name, status, ms in log:
+    mark = {"ok": "✅", "fail": "❌", "timeout": "⏱️"}.get(status, "⚠️")
+    print(f"  index {index} {name:<6} {mark} {status} ({ms:.0f} ms)")
+
+if not devices:
+    print("\n❌ no camera found")
+else:
+    print()
+    for index, device in devices.items():
+        modes = ", ".join(f"{w}x{h}@{fps:g}" for w, h, fps in device["modes"])
+        print(f"📷 {device['identity']} via {device['backend_name']}: {modes}")
+    # same devices as printed above, no second round of probes
+    choice = camera_discovery.resolve(devices=devices)
+    print(f"\n✅ gateways will use camera {choice['index']} ({choice['backend_name']}) "
+          f"{choice['width']}x{choice['height']} -> {camera_discovery.CACHE_PATH}")
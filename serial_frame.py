@@ -0,0 +1,205 @@
+import struct
+
+# Binary framing for the Arduino link (sketch_jan28a.ino with
+# BINARY_PROTOCOL), instead of "DIST,12,PIR,1,..." lines + regex.
+#
+#   offset  size
+#   0       1     SYNC (0xA5)
+#   1       1     LEN = bytes from VERSION to the end of the payload
+#   2       1     VERSION (frames of another version are skipped)
+#   3       1     TYPE
+#   4       N     payload, little endian, layout by TYPE
+#   4+N     1     CRC-8 (poly 0x07, init 0) over LEN..payload
+#
+#   TYPE_STATUS  Arduino -> Python  <HBB  distance cm (999 = no echo),
+#                                         flags (bit0 pir, bit1 session,
+#                                         bit2 owner, bit3 gate), seq (+1 per
+#                                         frame, gaps = lost frames)
+#   TYPE_COMMAND Python -> Arduino  <BB   'O' / 'S', 0 / 1  (same meaning as
+#                                         the old O1/S0 bytes)
+#   TYPE_READY   Arduino -> Python  -     no payload, sent once at the end of
+#                                         setup() (after the reset that opening
+#                                         the port causes), see
+#                                         SerialLink.wait_ready()
+#
+# A status frame is 9 bytes (the CSV line is ~40). FrameDecoder parses
+# with struct.unpack_from straight out of its receive buffer (no slicing
+# per field). On a bad CRC/length it drops one byte and searches for the
+# next SYNC, so a corrupted or half frame costs at most that frame.
+
+SYNC = 0xA5
+VERSION = 1
+TYPE_STATUS = 0x01
+TYPE_COMMAND = 0x02
+TYPE_READY = 0x03
+
+STATUS = struct.Struct("<HBB")
+COMMAND = struct.Struct("<BB")
+READY = struct.Struct("<")
+LAYOUTS = {TYPE_STATUS: STATUS, TYPE_COMMAND: COMMAND, TYPE_READY: READY}
+
+HEADER = 4                      # SYNC LEN VERSION TYPE
+MAX_LEN = 2 + max(s.size for s in LAYOUTS.values())
+STATUS_FLAGS = ("pir", "session", "owner", "gate")
+STATUS_FIELDS = ("distance",) + STATUS_FLAGS
+
+
+def _crc8_table(poly=0x07):
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+CRC8_TABLE = _crc8_table()
+
+# the 16 possible flag bytes, decoded once
+FLAG_FIELDS = [{name: (flags >> bit) & 1 for bit, name in enumerate(STATUS_FLAGS)}
+               for flags in range(16)]
+
+
+def crc8(data, start=0, end=None):
+    crc = 0
+    table = CRC8_TABLE
+    for i in range(start, len(data) if end is None else end):
+        crc = table[crc ^ data[i]]
+    return crc
+
+
+def encode(ftype, payload, version=VERSION):
+    body = bytes((len(payload) + 2, version, ftype)) + payload
+    return bytes((SYNC,)) + body + bytes((crc8(body),))
+
+
+def encode_status(fields, seq=0):
+    flags = 0
+    for bit, name in enumerate(STATUS_FLAGS):
+        if fields.get(name):
+            flags |= 1 << bit
+    return encode(TYPE_STATUS, STATUS.pack(min(int(fields["distance"]), 0xFFFF),
+                                           flags, seq & 0xFF))
+
+
+def encode_ready():
+    return encode(TYPE_READY, b"")
+
+
+def encode_command(cmd):
+    # b"O1" / b"S0" -> command frame (SerialLink encode= hook)
+    return encode(TYPE_COMMAND, COMMAND.pack(cmd[0], cmd[1:2] == b"1"))
+
+
+class FrameDecoder:
+    # feed(bytes) -> [(TYPE_STATUS, fields dict) | (TYPE_COMMAND, b"O1") |
+    #                 (TYPE_READY, None), ...]
+    #
+    # Receive buffer: fixed bytearray, parsed in place from `start`; the
+    # unparsed tail is moved to the front only when new data would not fit
+    # behind it (with 9-byte frames that is a few bytes, rarely).
+
+    def __init__(self, capacity=4096):
+        self.buf = bytearray(capacity)
+        self.start = 0
+        self.end = 0
+
+        self.frames = 0
+        self.crc_errors = 0
+        self.skipped = 0        # bytes thrown away while searching SYNC
+        self.unsupported = 0    # valid frames of another version/type
+        self.lost = 0           # status seq gaps
+        self.overflow = 0       # bytes dropped because the buffer was full
+        self._last_seq = None
+
+    @property
+    def errors(self):
+        return self.crc_errors + self.unsupported
+
+    def counters(self):
+        return {"frames": self.frames, "crc_errors": self.crc_errors,
+                "skipped": self.skipped, "unsupported": self.unsupported,
+                "lost": self.lost, "overflow": self.overflow}
+
+    def _append(self, data):
+        n = len(data)
+        cap = len(self.buf)
+        if n > cap:
+            self.overflow += n - cap
+            data, n = data[-cap:], cap
+        if self.end + n > cap:
+            rest = self.end - self.start
+            if rest + n > cap:
+                # no room even after compacting: keep the newest bytes
+                self.overflow += rest
+                rest = 0
+            else:
+                self.buf[:rest] = self.buf[self.start:self.end]
+            self.start, self.end = 0, rest
+        self.buf[self.end:self.end + n] = data
+        self.end += n
+
+    def _status(self, distance, flags, seq):
+        if self._last_seq is not None:
+            self.lost += (seq - self._last_seq - 1) & 0xFF
+        self._last_seq = seq
+        fields = {"distance": distance}
+        fields.update(FLAG_FIELDS[flags & 0x0F])
+        return fields
+
+    def feed(self, data):
+        if data:
+            self._append(data)
+        buf = self.buf
+        table = CRC8_TABLE
+        out = []
+        while self.end - self.start >= HEADER + 1:
+            start = self.start
+            if buf[start] != SYNC:
+                nxt = buf.find(SYNC, start + 1, self.end)
+                nxt = self.end if nxt < 0 else nxt
+                self.skipped += nxt - start
+                self.start = nxt
+                continue
+
+            length = buf[start + 1]
+            if not 2 <= length <= MAX_LEN:
+                self.crc_errors += 1
+                self.skipped += 1
+                self.start += 1
+                continue
+            total = length + 3
+            if self.end - start < total:
+                break               # rest of the frame not here yet
+
+            crc_at = start + 2 + length
+            crc = 0
+            for i in range(start + 1, crc_at):
+                crc = table[crc ^ buf[i]]
+            if crc != buf[crc_at]:
+                self.crc_errors += 1
+                self.skipped += 1
+                self.start += 1     # resync on the next SYNC byte
+                continue
+            self.start += total
+
+            ftype = buf[start + 3]
+            layout = LAYOUTS.get(ftype)
+            if buf[start + 2] != VERSION or layout is None or layout.size != length - 2:
+                self.unsupported += 1
+                continue
+
+            self.frames += 1
+            if ftype == TYPE_STATUS:
+                out.append((ftype, self._status(*STATUS.unpack_from(buf, start + HEADER))))
+            elif ftype == TYPE_READY:
+                self._last_seq = None       # the Arduino restarted its seq
+                out.append((ftype, None))
+            else:
+                code, value = COMMAND.unpack_from(buf, start + HEADER)
+                out.append((ftype, bytes((code, 0x31 if value else 0x30))))
+
+        if self.start == self.end:
+            self.start = self.end = 0
+        return out
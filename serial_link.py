@@ -0,0 +1,239 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+import serial_frame
+
+# Latest parsed Arduino sample.
+# The whole tuple is swapped in one assignment, so the vision loop always
+# sees a consistent record without taking a lock.
+#   seq    -> increments on every good line (compare to know if it is new)
+#   stamp  -> time.time() when the line was received
+#   fields -> dict name -> int, in the order of the regex groups
+#             (binary frames: serial_frame.STATUS_FIELDS)
+ArduinoState = namedtuple("ArduinoState", ["seq", "stamp", "fields"])
+
+EMPTY_STATE = ArduinoState(0, 0.0, None)
+
+# read = split + parse + publish of one read() worth of data (not the wait
+# for bytes), write = ser.write() of one command
+READ_SECONDS = metrics.histogram("gate_serial_read_seconds", "Handling of received Arduino data")
+WRITE_SECONDS = metrics.histogram("gate_serial_write_seconds", "ser.write() of one command")
+LINES_HELP = "Arduino lines received"
+LINES_OK = metrics.counter("gate_serial_lines_total", LINES_HELP, {"result": "ok"})
+LINES_BAD = metrics.counter("gate_serial_lines_total", LINES_HELP, {"result": "bad"})
+ERRORS_HELP = "Serial read()/write() calls that raised"
+READ_ERRORS = metrics.counter("gate_serial_errors_total", ERRORS_HELP, {"op": "read"})
+WRITE_ERRORS = metrics.counter("gate_serial_errors_total", ERRORS_HELP, {"op": "write"})
+READY_LINE = "READY"     # text protocol: printed once at the end of setup()
+
+
+def parse_line(pattern, names, line):
+    m = pattern.match(line)
+    if not m:
+        return None
+    return {name: int(value) for name, value in zip(names, m.groups())}
+
+
+class LineDecoder:
+    # Text lines -> the same feed() output as serial_frame.FrameDecoder:
+    # splits on newline (partial lines are kept until the rest arrives),
+    # matches each line with `pattern`.
+    def __init__(self, pattern, names, on_line=None):
+        self.pattern = pattern
+        self.names = tuple(names)
+        self.on_line = on_line      # optional callback(raw_line) for logging
+        self.buf = bytearray()
+        self.errors = 0             # lines that did not match
+
+    def feed(self, data):
+        self.buf += data
+        out = []
+        while True:
+            nl = self.buf.find(b"\n")
+            if nl < 0:
+                break
+            raw = bytes(self.buf[:nl])
+            del self.buf[:nl + 1]
+            line = raw.decode(errors="ignore").strip()
+            if not line:
+                continue
+            if self.on_line is not None:
+                self.on_line(line)
+            if line == READY_LINE:
+                out.append((serial_frame.TYPE_READY, None))
+                continue
+            fields = parse_line(self.pattern, self.names, line)
+            if fields is None:
+                self.errors += 1
+            else:
+                out.append((serial_frame.TYPE_STATUS, fields))
+
+        # garbage without newline (wrong baud, noise) -> don't grow forever
+        if len(self.buf) > 256:
+            self.buf.clear()
+        return out
+
+
+class SerialLink:
+    # Background reader/writer for the Arduino serial port.
+    #
+    # Reader thread: reads whatever bytes are available, hands them to the
+    # decoder (LineDecoder for the CSV lines) and publishes the newest
+    # sample as an ArduinoState.
+    # Writer thread: drains a queue of command bytes (b"O1", b"S0", ...) so
+    # ser.write() never runs on the camera thread.
+    #
+    # Binary protocol: pass decoder=serial_frame.FrameDecoder() and
+    # encode=serial_frame.encode_command instead of pattern/names; the
+    # callers keep sending b"O1" and reading the same fields.
+    #
+    # Opening the port resets an Uno; commands sent during its ~1.5 s in
+    # the bootloader are lost. The sketch announces the end of setup()
+    # with READY (frame or line), wait_ready() blocks until then instead
+    # of a fixed sleep. `readies` counts them: a READY later on means the
+    # Arduino restarted and forgot the O/S commands, so send them again.
+    #
+    # A failed ser.write() is not retried here (the port may be gone, the
+    # command stale by the time it is back): `write_failures` counts them,
+    # the callers treat a change like a new READY and send their current
+    # state again. Errors are logged once per run of failures.
+
+    def __init__(self, ser, pattern=None, names=(), on_line=None,
+                 decoder=None, encode=None):
+        self.ser = ser
+        # feed(bytes) -> [(type, fields), ...]
+        self.decoder = decoder or LineDecoder(pattern, names, on_line)
+        self.encode = encode        # command bytes -> bytes on the wire
+
+        self.state = EMPTY_STATE
+        self.lines_ok = 0
+        self.lines_bad = 0
+        self.readies = 0
+        self.read_failures = 0
+        self.write_failures = 0
+        self._wakes = 0
+        self.log = metrics.EventLog("serial")
+
+        self._tx = queue.Queue()
+        self._new = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for target in (self._read_loop, self._write_loop):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def snapshot(self):
+        return self.state
+
+    def wait(self, seq, timeout=None):
+        # block until a sample newer than seq arrives (or timeout);
+        # only for loops that have nothing else to do (e.g. no session)
+        wakes = self._wakes
+        with self._new:
+            self._new.wait_for(lambda: self.state.seq != seq or self._wakes != wakes, timeout)
+        return self.state
+
+    def wake(self):
+        # let wait() return now (something else to do, e.g. a remote command)
+        with self._new:
+            self._wakes += 1
+            self._new.notify_all()
+
+    def wait_ready(self, timeout=None):
+        # -> "ready" (READY received), "status" (samples, but no READY: the
+        # board did not reset on open, or an older sketch) or None (nothing
+        # within timeout)
+        with self._new:
+            self._new.wait_for(lambda: self.readies or self.state.seq, timeout)
+        if self.readies:
+            return "ready"
+        return "status" if self.state.seq else None
+
+    def send(self, cmd):
+        self._tx.put(cmd)
+
+    def close(self):
+        self._stop.set()
+        self._tx.put(None)
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads = []
+
+    # ---------- threads ----------
+    def _read_loop(self):
+        failing = False
+        while not self._stop.is_set():
+            try:
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                self.read_failures += 1
+                READ_ERRORS.inc()
+                if not failing:
+                    self.log.warning("serial_read_failed", error=repr(e))
+                    failing = True
+                time.sleep(0.05)
+                continue
+            if failing:
+                self.log.change("serial_read_ok", failures=self.read_failures)
+                failing = False
+            if chunk:
+                self._handle(chunk)
+
+    def _handle(self, chunk):
+        t0 = time.perf_counter()
+        errors = self.decoder.errors
+        for ftype, fields in self.decoder.feed(chunk):
+            if ftype == serial_frame.TYPE_STATUS:
+                self.lines_ok += 1
+                LINES_OK.inc()
+                self._publish(fields)
+            elif ftype == serial_frame.TYPE_READY:
+                with self._new:
+                    self.readies += 1
+                    self._new.notify_all()
+        bad = self.decoder.errors - errors
+        if bad:
+            self.lines_bad += bad
+            LINES_BAD.inc(bad)
+        READ_SECONDS.observe(time.perf_counter() - t0)
+
+    def _publish(self, fields):
+        with self._new:
+            self.state = ArduinoState(self.state.seq + 1, time.time(), fields)
+            self._new.notify_all()
+
+    def _write_loop(self):
+        failing = False
+        while not self._stop.is_set():
+            cmd = self._tx.get()
+            if cmd is None:
+                break
+            try:
+                data = self.encode(cmd) if self.encode is not None else cmd
+                with WRITE_SECONDS.time():
+                    self.ser.write(data)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                WRITE_ERRORS.inc()
+                if not failing:
+                    self.log.warning("serial_write_failed", cmd=cmd, error=repr(e))
+                    failing = True
+                # wake wait() so the caller sees the change and re-sends
+                with self._new:
+                    self.write_failures += 1
+                    self._wakes += 1
+                    self._new.notify_all()
+                continue
+            if failing:
+                self.log.change("serial_write_ok", failures=self.write_failures)
+                failing = False
@@ -1,201 +1,378 @@
 import cv2
-import serial
 import time
-import json
 import re
 
 import paho.mqtt.client as mqtt
 import firebase_admin
 from firebase_admin import credentials, db
 
+import camera_discovery
+import display
+import face_engine
+import metrics
+import replay
+from detect_scheduler import DetectScheduler
+from event_sink import EventSink
+from owner_decision import OwnerDecision
+from recognition_cache import RecognitionCache
+from remote_commands import CommandInbox, number
+from serial_link import SerialLink
+from startup import Startup
+from state_publisher import StatePublisher, set_will
+from telemetry_store import TelemetryStore
+from vision_pipeline import VisionPipeline
+
 # ================= CONFIG =================
 SERIAL_PORT = "COM5"
 BAUD = 9600
+# wait at most this long for the Arduino's READY after opening the port
+ARDUINO_READY_TIMEOUT = 5.0
 
-CAM_INDEX = 0
-CAM_BACKEND = cv2.CAP_MSMF
+# None = found by camera_discovery.py (cached in camera_cache.json)
+CAM_INDEX = None
+CAM_BACKEND = None
 
 CONF_THRESHOLD = 70   # LBPH: smaller = more confident
 
-# Debounce recognition (stabil)
-ON_FRAMES = 3
-OFF_FRAMES = 6
+# "numpy" = batched LBPH (lbph_engine.py), "opencv" = cv2.face.LBPH predict,
+# "numpy-index" = numpy + approximate PQ index (big households, face_index.py)
+RECOGNIZER_ENGINE = "numpy"
+
+# Vision pipeline: capture -> N detect threads -> recognize
+DETECT_WORKERS = 2
+PIPELINE_QUEUE = 2    # frames waiting per stage (oldest dropped)
+
+# Full-frame Haar only every KEYFRAME_INTERVAL frames, in between search
+# only around the last face (box grown by ROI_MARGIN). 1 = always full frame
+KEYFRAME_INTERVAL = 5
+ROI_MARGIN = 0.5
+
+# Haar on a downscaled frame tuned for the expected face size
+# ("full" = original, "near-gate", "hallway", see face_engine.DETECT_PROFILES)
+DETECT_PROFILE = "near-gate"
+
+# LBPH predict only when a tracked face changed (recognition_cache.py): a
+# confidently identified face is reused up to RECOGNITION_CACHE_TTL seconds
+# and its distance fused over frames. 0 = predict every face every frame
+RECOGNITION_CACHE_TTL = 1.0
+
+# "window" = cv2.imshow, "none" = headless (no overlays at all), "stream" =
+# MJPEG on http://127.0.0.1:STREAM_PORT/ only while someone watches.
+# Overridden by --headless / --stream [PORT] or GATE_DISPLAY (display.py)
+DISPLAY_MODE = "window"
+STREAM_PORT = 8081
+
+# Keputusan owner (stabil) dari confidence LBPH per waktu, bukan per frame
+# (owner_decision.py): match jelas -> buka setelah OWNER_OPEN_S detik,
+# tutup lagi setelah maks OWNER_HOLD_S detik tanpa owner
+OWNER_OPEN_S = 0.2
+OWNER_HOLD_S = 0.4
 
 # Publish rate limit (biar smooth)
-MQTT_INTERVAL = 0.5      # seconds
+# MQTT: publish a field only when it changed (distance: by more than
+# MQTT_DEADBAND_CM), everything again every MQTT_HEARTBEAT seconds
+MQTT_HEARTBEAT = 10.0
+MQTT_DEADBAND_CM = 1
 FIREBASE_INTERVAL = 1.5  # seconds
 
+# gate_logs are written by a background worker in batches; events wait in
+# this local file while Firebase is slow or offline and are sent later
+FIREBASE_SPOOL = "gate_logs.spool.db"
+
+# every Arduino sample (not only one per FIREBASE_INTERVAL) also goes into
+# a local columnar store, one folder per day (telemetry_store.py;
+# python telemetry_store.py --last 3600 to look at it). None = off
+TELEMETRY_DIR = "gate_telemetry"
+
+# Prometheus-style metrics (stage timings, drops, MQTT/Firebase/serial) on
+# http://127.0.0.1:METRICS_PORT/metrics, None = off
+METRICS_PORT = 9108
+# "data" log line at most once per LOG_INTERVAL seconds (changes always logged)
+LOG_INTERVAL = 2.0
+
 MQTT_HOST = "broker.hivemq.com"
 MQTT_PORT = 1883
 MQTT_BASE = "aiu/gate/aria"
 
+# paho reconnect backoff (seconds), doubled up to the max
+MQTT_RETRY_MIN = 1
+MQTT_RETRY_MAX = 30
+
+# Remote commands on MQTT_BASE/cmd/<name>, answered on MQTT_BASE/ack
+# (remote_commands.py): open [s] = owner for FORCE_OPEN_SECONDS (0 = cancel),
+# threshold <n> = CONF_THRESHOLD, only within THRESHOLD_RANGE of the
+# configured value. Commands must be signed with $GATE_COMMAND_SECRET.
+# False = off (default: the broker is public)
+REMOTE_COMMANDS = False
+FORCE_OPEN_SECONDS = 10
+THRESHOLD_RANGE = (CONF_THRESHOLD - 10, CONF_THRESHOLD + 5)
+
 SERVICE_ACCOUNT = "serviceAccountKey.json"
 FIREBASE_DB_URL = "https://iotproj-767e8-default-rtdb.asia-southeast1.firebasedatabase.app/"
 
+# ================= METRICS / LOG =================
+metrics.setup_logging()
+log = metrics.EventLog("gateway", LOG_INTERVAL)
+OWNER_HELP = "Debounced owner state changes"
+OWNER_YES = metrics.counter("gate_owner_transitions_total", OWNER_HELP, {"to": "yes"})
+OWNER_NO = metrics.counter("gate_owner_transitions_total", OWNER_HELP, {"to": "no"})
+if METRICS_PORT:
+    metrics.serve(METRICS_PORT)
+    print(f"✅ Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+
+# ================= STARTUP =================
+# serial, camera and face model come up at the same time (startup.py), the
+# loop starts once those three are there; Firebase and MQTT connect in the
+# background (retry with backoff)
+boot = Startup()
+
 # ================= FIREBASE =================
-cred = credentials.Certificate(SERVICE_ACCOUNT)
-firebase_admin.initialize_app(cred, {"databaseURL": FIREBASE_DB_URL})
-db_ref = db.reference("gate_logs")
+def connect_firebase():
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred = credentials.Certificate(SERVICE_ACCOUNT)
+        firebase_admin.initialize_app(cred, {"databaseURL": FIREBASE_DB_URL})
+    return db.reference("gate_logs")
+
+# spooled until Firebase is up (event_sink.py)
+sink = EventSink(None, FIREBASE_SPOOL).start()
+boot.background("firebase", connect_firebase, on_ready=sink.attach)
+telemetry = TelemetryStore(TELEMETRY_DIR) if TELEMETRY_DIR else None
 
 # ================= MQTT =================
+# retained topics: a dashboard gets the current state as soon as it
+# subscribes; MQTT_BASE/online goes to "0" if the gateway dies
 client = mqtt.Client()
-client.connect(MQTT_HOST, MQTT_PORT, 60)
+publisher = StatePublisher(client, MQTT_BASE,
+                           numbers=("distance_cm",),
+                           flags=("owner", "pir_motion", "gate_open"),
+                           heartbeat=MQTT_HEARTBEAT, deadband=MQTT_DEADBAND_CM)
+set_will(client, MQTT_BASE)
+# commands are queued by paho's thread, the loop applies them
+inbox = None
+if REMOTE_COMMANDS:
+    try:
+        inbox = CommandInbox(client, MQTT_BASE, ("open", "threshold"))
+    except ValueError as e:
+        print(f"⚠️ Remote commands off: {e}")
+
+def on_connect(c, userdata, flags, rc):
+    if rc == 0:
+        boot.mark("mqtt")
+        print("✅ MQTT connected")
+        publisher.announce()
+        if inbox is not None:
+            inbox.subscribe()
+
+client.on_connect = on_connect
+# connect + reconnects happen on paho's thread
+client.reconnect_delay_set(MQTT_RETRY_MIN, MQTT_RETRY_MAX)
+client.connect_async(MQTT_HOST, MQTT_PORT, 60)
 client.loop_start()
-print("✅ MQTT connected")
-
-def mqtt_pub(topic, payload):
-    if isinstance(payload, (dict, list)):
-        payload = json.dumps(payload)
-    client.publish(f"{MQTT_BASE}/{topic}", payload)
 
 # ================= SERIAL =================
-ser = serial.Serial(SERIAL_PORT, BAUD, timeout=1)
-time.sleep(2)
-print("✅ Serial connected (close Arduino Serial Monitor)")
+# Arduino CSV: DIST,12,OWNER,1,PIR,1,GATE,1
+csv_pat = re.compile(r"^DIST,(\d+),OWNER,([01]),PIR,([01]),GATE,([01])$")
 
-# ================= FACE MODEL =================
-recognizer = cv2.face.LBPHFaceRecognizer_create()
-recognizer.read("face_model.yml")
+def open_arduino():
+    ser = replay.open_serial(SERIAL_PORT, BAUD, timeout=1)
+    # read/write in background threads -> camera loop never waits on the UART
+    link = SerialLink(ser, csv_pat, ("distance", "owner", "pir", "gate")).start()
+    # port open resets the Arduino: READY line (or first sample) instead of sleep(2)
+    how = link.wait_ready(ARDUINO_READY_TIMEOUT)
+    if how is None:
+        print(f"⚠️ Nothing from the Arduino in {ARDUINO_READY_TIMEOUT} s, going on")
+    else:
+        print(f"✅ Serial connected ({how}, close Arduino Serial Monitor)")
+    return ser, link
 
-face_cascade = cv2.CascadeClassifier(
-    cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-)
+# ================= FACE MODEL =================
+def load_model():
+    recognizer = face_engine.load_recognizer("face_model.yml", RECOGNIZER_ENGINE)
+    labels = face_engine.load_labels("face_model.yml")   # residents + thresholds
+    # one classifier per detect worker thread (a shared one is not thread-safe)
+    return recognizer, labels, face_engine.load_cascade(per_thread=True)
 
 # ================= CAMERA =================
-cam = cv2.VideoCapture(CAM_INDEX, CAM_BACKEND)
+boot.run("serial", open_arduino)
+boot.run("model", load_model)
+boot.run("camera", camera_discovery.open_camera, CAM_INDEX, CAM_BACKEND, (640, 480))
+
+ser, link = boot.get("serial")
+recognizer, labels, face_cascade = boot.get("model")
+scheduler = DetectScheduler(
+    face_cascade, KEYFRAME_INTERVAL, ROI_MARGIN,
+    detect_fn=face_engine.make_detector(face_cascade, DETECT_PROFILE))
+cache = RecognitionCache(RECOGNITION_CACHE_TTL) if RECOGNITION_CACHE_TTL else None
+
+cam = boot.get("camera")
 if not cam.isOpened():
     print("❌ Cannot open camera")
+    boot.stop()
+    link.close()
+    sink.close()
     ser.close()
     raise SystemExit
 
-# Optional: reduce camera load
-cam.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-# Arduino CSV: DIST,12,OWNER,1,PIR,1,GATE,1
-csv_pat = re.compile(r"^DIST,(\d+),OWNER,([01]),PIR,([01]),GATE,([01])$")
+pipe = VisionPipeline(cam, face_cascade, recognizer, CONF_THRESHOLD,
+                      detect_workers=DETECT_WORKERS,
+                      queue_size=PIPELINE_QUEUE,
+                      detect_fn=scheduler.detect,
+                      labels=labels, cache=cache).start()
+last_frame_seq = 0
 
-# Debounce vars
-true_count = 0
-false_count = 0
+# Owner decision vars
+decision = OwnerDecision(OWNER_OPEN_S, OWNER_HOLD_S)
 stable_owner = False
 last_sent = None
+force_open_until = 0   # owner forced on until then (remote "open")
+
+# last Arduino sample handled (ArduinoState.seq)
+last_seq = 0
+# READYs seen (SerialLink.readies); another one = the Arduino restarted
+arduino_readies = link.readies
+# failed writes seen (SerialLink.write_failures); more = a command was lost
+write_failures = link.write_failures
 
 # Rate limit vars
-last_mqtt = 0
 last_fb = 0
 
-print("System running... Press q to exit")
+def send_owner(owner_bool):
+    global last_sent
+    to_send = b'1' if owner_bool else b'0'
+    if to_send != last_sent:
+        link.send(to_send)
+        last_sent = to_send
+        log.change("send", owner=int(owner_bool))
+
+def handle_command(cmd, now):
+    # remote command (remote_commands.py) -> state, Arduino, ack
+    global CONF_THRESHOLD, force_open_until
+    try:
+        if cmd.name == "threshold":
+            value = number(cmd, low=THRESHOLD_RANGE[0], high=THRESHOLD_RANGE[1])
+            old, CONF_THRESHOLD = CONF_THRESHOLD, value
+            pipe.threshold = value
+            if cache is not None:
+                cache.reset()           # cached verdicts used the old threshold
+            detail = f"threshold {old:g} -> {value:g}"
+        else:   # open
+            seconds = number(cmd, FORCE_OPEN_SECONDS, 0, 3600)
+            force_open_until = now + seconds if seconds else 0
+            send_owner(stable_owner or now < force_open_until)
+            detail = f"owner forced for {seconds:g} s" if seconds else "force open cancelled"
+    except ValueError as e:
+        inbox.ack(cmd, False, str(e))
+        return
+    log.change("command", cmd=cmd.name, value=cmd.value)
+    inbox.ack(cmd, True, detail)
+
+# Ctrl+C / SIGTERM (and 'q' in the window) end the loop, see display.py
+view = display.open_view("Recognition", DISPLAY_MODE, STREAM_PORT)
+
+print("System running... Press q or Ctrl+C to exit")
 
 try:
-    while True:
-        # ---------- CAMERA ----------
-        ret, frame = cam.read()
-        if not ret:
+    while not view.should_quit():
+        # ---------- CAMERA (newest processed frame from the pipeline) ----------
+        result = pipe.wait_result(last_frame_seq, timeout=2)
+        if result is None:
             print("❌ Can't read camera frame")
             break
-
-        # To reduce CPU, you can detect every 2–3 frames (optional)
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-        owner_now = False
-        best_box = None
-        best_text = "NO FACE"
-        best_conf = None
-
-        for (x, y, w, h) in faces:
-            face = gray[y:y+h, x:x+w]
-            face = cv2.resize(face, (200, 200))
-
-            label, conf = recognizer.predict(face)
-            is_owner = (label == 1 and conf < CONF_THRESHOLD)
-
-            if is_owner:
-                owner_now = True
-
-            # show best (lowest conf)
-            if best_conf is None or conf < best_conf:
-                best_conf = conf
-                best_box = (x, y, w, h)
-                best_text = ("Aria" if is_owner else "Unknown") + f" ({conf:.1f})"
-
-        # ---------- OWNER DEBOUNCE ----------
-        if owner_now:
-            true_count += 1
-            false_count = 0
-        else:
-            false_count += 1
-            true_count = 0
-
-        if (not stable_owner) and true_count >= ON_FRAMES:
-            stable_owner = True
-        if stable_owner and false_count >= OFF_FRAMES:
-            stable_owner = False
+        last_frame_seq = result.seq
+
+        frame = result.frame
+        best_box = result.rec.best_box
+        best_text = result.rec.best_text
+
+        # ---------- OWNER DECISION ----------
+        was_owner = stable_owner
+        stable_owner = decision.update(result.rec.margin, result.stamp)
+        if stable_owner and not was_owner:
+            OWNER_YES.inc()
+        if was_owner and not stable_owner:
+            OWNER_NO.inc()
+
+        # ---------- REMOTE COMMANDS (queued by the MQTT thread) ----------
+        now = time.time()
+        if inbox is not None:
+            for cmd in inbox.poll():
+                handle_command(cmd, now)
 
         # ---------- SEND OWNER TO ARDUINO ----------
-        to_send = b'1' if stable_owner else b'0'
-        if to_send != last_sent:
-            ser.write(to_send)
-            last_sent = to_send
-            print("[SEND]", "OWNER=1" if stable_owner else "OWNER=0")
-
-        # ---------- READ FROM ARDUINO ----------
-        line = ser.readline().decode(errors="ignore").strip()
-        if line:
-            m = csv_pat.match(line)
-            if m:
-                distance = int(m.group(1))
-                owner_flag = bool(int(m.group(2)))
-                pir_flag = bool(int(m.group(3)))
-                gate_flag = bool(int(m.group(4)))
-
-                event = {
-                    "timestamp": int(time.time()),
-                    "distance_cm": distance,
-                    "owner": owner_flag,
-                    "pir_motion": pir_flag,
-                    "gate_open": gate_flag
-                }
-
-                print("[DATA]", event)
-
-                now = time.time()
-
-                # ---------- MQTT (rate limited) ----------
-                if now - last_mqtt >= MQTT_INTERVAL:
-                    mqtt_pub("distance_cm", distance)
-                    mqtt_pub("owner", 1 if owner_flag else 0)
-                    mqtt_pub("pir_motion", 1 if pir_flag else 0)
-                    mqtt_pub("gate_open", 1 if gate_flag else 0)
-                    mqtt_pub("event", event)
-                    last_mqtt = now
-
-                # ---------- Firebase (rate limited) ----------
-                if now - last_fb >= FIREBASE_INTERVAL:
-                    db_ref.push(event)
-                    last_fb = now
-
-        # ---------- DISPLAY ----------
-        cv2.putText(frame, f"OWNER: {'YES' if stable_owner else 'NO'}",
-                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
-                    (255, 255, 255), 2)
-
-        if best_box is not None:
-            x, y, w, h = best_box
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 255), 2)
-            cv2.putText(frame, best_text, (x, y-10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+        if link.readies != arduino_readies:
+            # Arduino reset: it forgot the owner flag, send it again
+            arduino_readies = link.readies
+            last_sent = None
+        if link.write_failures != write_failures:
+            # the last command never reached the Arduino: send it again
+            write_failures = link.write_failures
+            last_sent = None
+        send_owner(stable_owner or now < force_open_until)
+        if not boot.done:
+            boot.finish("first decision")
+
+        # ---------- READ FROM ARDUINO (latest sample, non-blocking) ----------
+        state = link.snapshot()
+        if state.seq != last_seq:
+            last_seq = state.seq
+            distance = state.fields["distance"]
+            owner_flag = bool(state.fields["owner"])
+            pir_flag = bool(state.fields["pir"])
+            gate_flag = bool(state.fields["gate"])
+
+            event = {
+                "timestamp": int(time.time()),
+                "distance_cm": distance,
+                "owner": owner_flag,
+                "pir_motion": pir_flag,
+                "gate_open": gate_flag
+            }
+
+            log.info("data", **event)
+
+            now = time.time()
+
+            # ---------- MQTT (only changed fields + heartbeat) ----------
+            publisher.update(event, event, now)
+
+            # ---------- local history (every sample) ----------
+            if telemetry is not None:
+                telemetry.append(event, state.stamp)
+
+            # ---------- Firebase (rate limited) ----------
+            if now - last_fb >= FIREBASE_INTERVAL:
+                sink.push(event)
+                last_fb = now
+
+        # ---------- DISPLAY (only if a window/stream viewer will see it) ----------
+        if view.wants_frame():
+            frame = display.drawable(frame)
+            cv2.putText(frame, f"OWNER: {'YES' if stable_owner else 'NO'}",
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
                         (255, 255, 255), 2)
 
-        cv2.imshow("Recognition", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+            if best_box is not None:
+                x, y, w, h = best_box
+                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 255), 2)
+                cv2.putText(frame, best_text, (x, y-10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                            (255, 255, 255), 2)
+
+            view.show(frame)
 
 finally:
+    boot.stop()
+    pipe.stop()
     cam.release()
+    link.close()
+    sink.close()        # last events to Firebase, the rest stays spooled
     ser.close()
+    publisher.offline()
     client.loop_stop()
     client.disconnect()
-    cv2.destroyAllWindows()
+    if telemetry is not None:
+        telemetry.close()
+    view.close()
     print("Stopped.")
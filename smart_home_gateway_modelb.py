@@ -1,86 +1,274 @@
 import cv2
-import serial
 import time
-import json
 import re
 
 import paho.mqtt.client as mqtt
 import firebase_admin
 from firebase_admin import credentials, db
 
+import camera_discovery
+import display
+import face_engine
+import metrics
+import replay
+import serial_frame
+from camera_session import CameraSession
+from detect_scheduler import DetectScheduler
+from event_sink import EventSink
+from owner_decision import OwnerDecision
+from recognition_cache import RecognitionCache
+from remote_commands import CommandInbox, number
+from serial_link import SerialLink
+from startup import Startup
+from state_publisher import StatePublisher, set_will
+from telemetry_store import TelemetryStore
+from vision_pipeline import VisionPipeline
+
 # ================= CONFIG =================
 SERIAL_PORT = "COM5"
-BAUD = 9600
-
-CAM_INDEX = 0
-CAM_BACKEND = cv2.CAP_MSMF
+# must match BAUD / BINARY_PROTOCOL in sketch_jan28a.ino
+BAUD = 115200
+# "binary" = CRC-checked frames (serial_frame.py), "csv" = DIST,12,PIR,1,... lines
+SERIAL_PROTOCOL = "binary"
+# wait at most this long for the Arduino's READY after opening the port
+ARDUINO_READY_TIMEOUT = 5.0
+
+# None = found by camera_discovery.py (parallel probe, then cached in
+# camera_cache.json and reused on the next start); set both to pin them
+CAM_INDEX = None
+CAM_BACKEND = None
+
+# camera is released this long after a session ends (opened again on PIR);
+# a re-trigger within this time finds it still warm
+CAM_RELEASE_AFTER = 30
 
 CONF_THRESHOLD = 70  # LBPH confidence threshold (smaller = better match)
 
+# "numpy" = batched LBPH (lbph_engine.py), "opencv" = cv2.face.LBPH predict,
+# "numpy-index" = numpy + approximate PQ index (big households, face_index.py)
+RECOGNIZER_ENGINE = "numpy"
+
+# Vision pipeline: capture -> N detect threads -> recognize
+DETECT_WORKERS = 2
+PIPELINE_QUEUE = 2   # frames waiting per stage (oldest dropped)
+
+# Full-frame Haar only every KEYFRAME_INTERVAL frames, in between search
+# only around the last face (box grown by ROI_MARGIN). 1 = always full frame
+KEYFRAME_INTERVAL = 5
+ROI_MARGIN = 0.5
+
+# Haar on a downscaled frame tuned for the expected face size
+# ("full" = original, "near-gate", "hallway", see face_engine.DETECT_PROFILES)
+DETECT_PROFILE = "near-gate"
+
+# LBPH predict only when a tracked face changed (recognition_cache.py): a
+# confidently identified face is reused up to RECOGNITION_CACHE_TTL seconds
+# and its distance fused over frames. 0 = predict every face every frame
+RECOGNITION_CACHE_TTL = 1.0
+
+# "window" = cv2.imshow, "none" = headless (no overlays at all), "stream" =
+# MJPEG on http://127.0.0.1:STREAM_PORT/ only while someone watches.
+# Overridden by --headless / --stream [PORT] or GATE_DISPLAY (display.py)
+DISPLAY_MODE = "window"
+STREAM_PORT = 8081
+
 # ✅ session (after PIR motion)
 SESSION_SECONDS = 20
 
-# Owner stability (avoid True/False flicker)
-ON_FRAMES = 3
-OFF_FRAMES = 6
+# Owner stability (avoid True/False flicker), over time from the LBPH
+# confidences (owner_decision.py): a clear match opens after OWNER_OPEN_S
+# seconds, a borderline one later; closes after up to OWNER_HOLD_S seconds
+# without the owner. Same timing at any camera fps
+OWNER_OPEN_S = 0.2
+OWNER_HOLD_S = 0.4
 
 # Publish/log rate limits (smooth)
-MQTT_INTERVAL = 0.5
+# MQTT: publish a field only when it changed (distance: by more than
+# MQTT_DEADBAND_CM), everything again every MQTT_HEARTBEAT seconds
+MQTT_HEARTBEAT = 10.0
+MQTT_DEADBAND_CM = 1
 FIREBASE_INTERVAL = 1.5
 
+# gate_logs are written by a background worker in batches; events wait in
+# this local file while Firebase is slow or offline and are sent later
+FIREBASE_SPOOL = "gate_logs.spool.db"
+
+# every Arduino sample (not only one per FIREBASE_INTERVAL) also goes into
+# a local columnar store, one folder per day (telemetry_store.py;
+# python telemetry_store.py --last 3600 to look at it). None = off
+TELEMETRY_DIR = "gate_telemetry"
+
+# Prometheus-style metrics (stage timings, drops, MQTT/Firebase/serial) on
+# http://127.0.0.1:METRICS_PORT/metrics, None = off
+METRICS_PORT = 9108
+# "data" log line at most once per LOG_INTERVAL seconds (changes always logged)
+LOG_INTERVAL = 2.0
+
 MQTT_HOST = "broker.hivemq.com"
 MQTT_PORT = 1883
 MQTT_BASE = "aiu/gate/aria"
 
+# paho reconnect backoff (seconds), doubled up to the max
+MQTT_RETRY_MIN = 1
+MQTT_RETRY_MAX = 30
+
+# Remote commands on MQTT_BASE/cmd/<name>, answered on MQTT_BASE/ack
+# (remote_commands.py):
+#   open [s]        owner + session for FORCE_OPEN_SECONDS (0 = cancel); the
+#                   Arduino still opens only with someone within THRESHOLD_CM
+#   session [s]     start a session like PIR (SESSION_SECONDS)
+#   threshold <n>   CONF_THRESHOLD, only within THRESHOLD_RANGE of the
+#                   configured value (a loose cutoff lets strangers in)
+# Commands must be signed with $GATE_COMMAND_SECRET (see remote_commands.py).
+# False = no subscription (default: the broker is public)
+REMOTE_COMMANDS = False
+FORCE_OPEN_SECONDS = 10
+THRESHOLD_RANGE = (CONF_THRESHOLD - 10, CONF_THRESHOLD + 5)
+
 SERVICE_ACCOUNT = "serviceaccountkey.json"
 FIREBASE_DB_URL = "https://iotproj-767e8-default-rtdb.asia-southeast1.firebasedatabase.app/"
 
+# ================= METRICS / LOG =================
+metrics.setup_logging()
+log = metrics.EventLog("gateway", LOG_INTERVAL)
+OWNER_HELP = "Debounced owner state changes"
+OWNER_YES = metrics.counter("gate_owner_transitions_total", OWNER_HELP, {"to": "yes"})
+OWNER_NO = metrics.counter("gate_owner_transitions_total", OWNER_HELP, {"to": "no"})
+if METRICS_PORT:
+    metrics.serve(METRICS_PORT)
+    print(f"✅ Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+
+# ================= STARTUP =================
+# serial, camera and face model come up at the same time (startup.py); the
+# loop starts once those three are there. Firebase and MQTT connect in the
+# background (retry with backoff) and never hold the gate up
+boot = Startup()
+
 # ================= FIREBASE =================
-cred = credentials.Certificate(SERVICE_ACCOUNT)
-firebase_admin.initialize_app(cred, {"databaseURL": FIREBASE_DB_URL})
-db_ref = db.reference("gate_logs")
+def connect_firebase():
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred = credentials.Certificate(SERVICE_ACCOUNT)
+        firebase_admin.initialize_app(cred, {"databaseURL": FIREBASE_DB_URL})
+    return db.reference("gate_logs")
+
+# events are spooled until Firebase is up, then sent (event_sink.py)
+sink = EventSink(None, FIREBASE_SPOOL).start()
+boot.background("firebase", connect_firebase, on_ready=sink.attach)
+telemetry = TelemetryStore(TELEMETRY_DIR) if TELEMETRY_DIR else None
 
 # ================= MQTT =================
+# retained topics: a dashboard gets the current state as soon as it
+# subscribes; MQTT_BASE/online goes to "0" if the gateway dies
 client = mqtt.Client()
-client.connect(MQTT_HOST, MQTT_PORT, 60)
+publisher = StatePublisher(client, MQTT_BASE,
+                           numbers=("distance_cm",),
+                           flags=("pir_motion", "session_active", "owner",
+                                  "gate_open", "lamp_on"),
+                           heartbeat=MQTT_HEARTBEAT, deadband=MQTT_DEADBAND_CM)
+set_will(client, MQTT_BASE)
+# commands are queued by paho's thread, the loop applies them
+inbox = None
+if REMOTE_COMMANDS:
+    try:
+        inbox = CommandInbox(client, MQTT_BASE, ("open", "session", "threshold"))
+    except ValueError as e:
+        print(f"⚠️ Remote commands off: {e}")
+
+def on_connect(c, userdata, flags, rc):
+    if rc == 0:
+        boot.mark("mqtt")
+        print("✅ MQTT connected")
+        publisher.announce()
+        if inbox is not None:
+            inbox.subscribe()
+
+client.on_connect = on_connect
+# connect + reconnects on paho's thread; publishes before that are dropped,
+# announce() on connect makes the next update() send everything
+client.reconnect_delay_set(MQTT_RETRY_MIN, MQTT_RETRY_MAX)
+client.connect_async(MQTT_HOST, MQTT_PORT, 60)
 client.loop_start()
-print("✅ MQTT connected")
-
-def mqtt_pub(topic, payload):
-    if isinstance(payload, (dict, list)):
-        payload = json.dumps(payload)
-    client.publish(f"{MQTT_BASE}/{topic}", payload)
 
 # ================= SERIAL =================
-ser = serial.Serial(SERIAL_PORT, BAUD, timeout=1)
-time.sleep(2)
-print("✅ Serial connected (close Arduino Serial Monitor)")
-
 # Arduino CSV:
 # DIST,12,PIR,1,SESSION,1,OWNER,0,GATE,0
 csv_pat = re.compile(
     r"^DIST,(\d+),PIR,([01]),SESSION,([01]),OWNER,([01]),GATE,([01])$"
 )
 
-# ================= FACE MODEL =================
-recognizer = cv2.face.LBPHFaceRecognizer_create()
-recognizer.read("face_model.yml")
+def open_arduino():
+    ser = replay.open_serial(SERIAL_PORT, BAUD, timeout=1)
+    # read/write in background threads -> camera loop never waits on the UART
+    if SERIAL_PROTOCOL == "binary":
+        # same fields (serial_frame.STATUS_FIELDS), commands framed on the way out
+        link = SerialLink(ser, decoder=serial_frame.FrameDecoder(),
+                          encode=serial_frame.encode_command).start()
+    else:
+        link = SerialLink(ser, csv_pat,
+                          ("distance", "pir", "session", "owner", "gate")).start()
+    # opening the port resets the Arduino: wait for its READY, not 2 s
+    how = link.wait_ready(ARDUINO_READY_TIMEOUT)
+    if how is None:
+        print(f"⚠️ Nothing from the Arduino in {ARDUINO_READY_TIMEOUT} s, going on")
+    else:
+        print(f"✅ Serial connected ({how}, close Arduino Serial Monitor)")
+    return ser, link
 
-face_cascade = cv2.CascadeClassifier(
-    cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-)
+# ================= FACE MODEL =================
+def load_model():
+    recognizer = face_engine.load_recognizer("face_model.yml", RECOGNIZER_ENGINE)
+    labels = face_engine.load_labels("face_model.yml")   # residents + thresholds
+    # one classifier per detect worker thread (a shared one is not thread-safe)
+    return recognizer, labels, face_engine.load_cascade(per_thread=True)
 
 # ================= CAMERA =================
-cam = cv2.VideoCapture(CAM_INDEX, CAM_BACKEND)
-cam.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-if not cam.isOpened():
+def open_camera():
+    return camera_discovery.open_camera(CAM_INDEX, CAM_BACKEND, (640, 480))
+
+boot.run("serial", open_arduino)
+boot.run("model", load_model)
+boot.run("camera", open_camera)
+
+ser, link = boot.get("serial")
+recognizer, labels, face_cascade = boot.get("model")
+scheduler = DetectScheduler(
+    face_cascade, KEYFRAME_INTERVAL, ROI_MARGIN,
+    detect_fn=face_engine.make_detector(face_cascade, DETECT_PROFILE))
+cache = RecognitionCache(RECOGNITION_CACHE_TTL) if RECOGNITION_CACHE_TTL else None
+
+first_cam = boot.get("camera")
+if not first_cam.isOpened():
+    boot.stop()
+    link.close()
+    sink.close()
     ser.close()
     raise RuntimeError("❌ Cannot open camera")
 
 print("📷 Camera ready")
 
+# only open during sessions: released when idle, pre-warmed on PIR
+cam = CameraSession(open_camera, CAM_RELEASE_AFTER, cam=first_cam).start()
+
+# paused until PIR starts a session
+pipe = VisionPipeline(cam, face_cascade, recognizer, CONF_THRESHOLD,
+                      detect_workers=DETECT_WORKERS,
+                      queue_size=PIPELINE_QUEUE,
+                      detect_fn=scheduler.detect,
+                      labels=labels, cache=cache)
+pipe.pause()
+pipe.start()
+last_frame_seq = 0
+
+def wake_loop():
+    # remote command: stop waiting for the next Arduino sample / frame
+    link.wake()
+    pipe.wake()
+
+if inbox is not None:
+    inbox.on_command = wake_loop
+
 # ================= STATE =================
 # data from Arduino
 distance_cm = None
@@ -92,142 +280,211 @@ gate_open = False
 # session logic in Python
 session_active = False
 session_until = 0  # epoch time
+session_started = 0
+woke_at = None     # PIR edge still waiting for its first decision
 
-# owner debounce from camera
+# owner forced on until then (remote "open" command)
+force_open_until = 0
+
+# owner decision from camera
+decision = OwnerDecision(OWNER_OPEN_S, OWNER_HOLD_S)
 stable_owner = False
-true_count = 0
-false_count = 0
+
+# last Arduino sample handled (ArduinoState.seq)
+last_seq = 0
+# READYs seen (SerialLink.readies); another one = the Arduino restarted
+arduino_readies = link.readies
+# failed writes seen (SerialLink.write_failures); more = a command was lost
+write_failures = link.write_failures
 
 # last sent commands to Arduino
 last_owner_cmd = None
 last_session_cmd = None
 
 # rate limit
-last_mqtt = 0
 last_fb = 0
 
 def send_owner(owner_bool: bool):
     global last_owner_cmd
     cmd = b"O1" if owner_bool else b"O0"
     if cmd != last_owner_cmd:
-        ser.write(cmd)
+        link.send(cmd)
         last_owner_cmd = cmd
-        print("[SEND]", cmd.decode())
+        log.change("send", cmd=cmd.decode())
 
 def send_session(sess_bool: bool):
     global last_session_cmd
     cmd = b"S1" if sess_bool else b"S0"
     if cmd != last_session_cmd:
-        ser.write(cmd)
+        link.send(cmd)
         last_session_cmd = cmd
-        print("[SEND]", cmd.decode())
-
-print("System running (Session 20s). Press q to exit")
+        log.change("send", cmd=cmd.decode())
+
+def start_session(now, seconds=SESSION_SECONDS):
+    global session_active, session_until, session_started, woke_at
+    if not session_active:
+        # camera is opened/flushed in the background
+        cam.wake()
+        pipe.resume()
+        # same clock as the frame stamps (recording time when replaying)
+        session_started = replay.now()
+        woke_at = now
+    session_active = True
+    session_until = max(session_until, now + seconds)
+
+def handle_command(cmd, now):
+    # remote command (remote_commands.py) -> state, Arduino, ack
+    global CONF_THRESHOLD, force_open_until
+    try:
+        if cmd.name == "threshold":
+            value = number(cmd, low=THRESHOLD_RANGE[0], high=THRESHOLD_RANGE[1])
+            old, CONF_THRESHOLD = CONF_THRESHOLD, value
+            pipe.threshold = value
+            if cache is not None:
+                cache.reset()           # cached verdicts used the old threshold
+            detail = f"threshold {old:g} -> {value:g}"
+        elif cmd.name == "session":
+            seconds = number(cmd, SESSION_SECONDS, 1, 3600)
+            start_session(now, seconds)
+            send_session(True)
+            detail = f"session until +{session_until - now:.0f} s"
+        else:   # open
+            seconds = number(cmd, FORCE_OPEN_SECONDS, 0, 3600)
+            if seconds == 0:
+                force_open_until = 0
+                detail = "force open cancelled"
+            else:
+                force_open_until = now + seconds
+                start_session(now, seconds)
+                send_session(True)
+                send_owner(True)
+                detail = f"owner forced for {seconds:g} s"
+    except ValueError as e:
+        inbox.ack(cmd, False, str(e))
+        return
+    log.change("command", cmd=cmd.name, value=cmd.value)
+    inbox.ack(cmd, True, detail)
+
+# Ctrl+C / SIGTERM (and 'q' in the window) end the loop, see display.py
+view = display.open_view("Recognition", DISPLAY_MODE, STREAM_PORT)
+
+print("System running (Session 20s). Press q or Ctrl+C to exit")
 
 try:
-    while True:
-        # ---------- 1) read Arduino line ----------
-        line = ser.readline().decode(errors="ignore").strip()
-        if line:
-            m = csv_pat.match(line)
-            if m:
-                distance_cm = int(m.group(1))
-                pir_motion = bool(int(m.group(2)))
-                arduino_session = bool(int(m.group(3)))
-                arduino_owner = bool(int(m.group(4)))
-                gate_open = bool(int(m.group(5)))
+    while not view.should_quit():
+        # ---------- 1) latest Arduino sample (non-blocking) ----------
+        if session_active:
+            state = link.snapshot()
+        else:
+            # nothing to do without a session -> sleep until the next line
+            state = link.wait(last_seq, timeout=1)
+
+        if link.readies != arduino_readies:
+            # Arduino reset: it forgot session/owner, send both again
+            arduino_readies = link.readies
+            last_owner_cmd = last_session_cmd = None
+        if link.write_failures != write_failures:
+            # a command never reached the Arduino: send both again
+            write_failures = link.write_failures
+            last_owner_cmd = last_session_cmd = None
+
+        new_sample = state.seq != last_seq
+        if new_sample:
+            last_seq = state.seq
+            distance_cm = state.fields["distance"]
+            pir_motion = bool(state.fields["pir"])
+            arduino_session = bool(state.fields["session"])
+            arduino_owner = bool(state.fields["owner"])
+            gate_open = bool(state.fields["gate"])
 
         now = time.time()
 
+        # ---------- 1b) remote commands (queued by the MQTT thread) ----------
+        if inbox is not None:
+            for cmd in inbox.poll():
+                handle_command(cmd, now)
+
         # ---------- 2) PIR triggers session ----------
         if pir_motion:
-            session_active = True
-            session_until = now + SESSION_SECONDS
+            start_session(now)
 
         # session timeout
         if session_active and now > session_until:
             session_active = False
+            pipe.pause()
+            cam.sleep()
+            scheduler.reset()
+            if cache is not None:
+                cache.reset()
 
         # ---------- 3) camera recognition (only when session active) ----------
         if session_active:
-            ret, frame = cam.read()
-            if not ret:
-                print("❌ Can't read camera frame")
+            result = pipe.wait_result(last_frame_seq, timeout=1)
+            if result is not None and result.stamp < session_started:
+                # read before the last pause, still in the pipeline
+                last_frame_seq = result.seq
+                result = None
+            if result is None and woke_at is None:
+                if inbox is None or not inbox.pending():   # not woken by a command
+                    print("❌ Can't read camera frame")
                 continue
-
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-            owner_now = False
-            best_box = None
-            best_text = "NO FACE"
-            best_conf = None
-
-            for (x, y, w, h) in faces:
-                face = gray[y:y+h, x:x+w]
-                face = cv2.resize(face, (200, 200))
-
-                label, conf = recognizer.predict(face)
-                is_owner = (label == 1 and conf < CONF_THRESHOLD)
-
-                if is_owner:
-                    owner_now = True
-
-                if best_conf is None or conf < best_conf:
-                    best_conf = conf
-                    best_box = (x, y, w, h)
-                    best_text = ("Aria" if is_owner else "Unknown") + f" ({conf:.1f})"
-
-            # debounce owner
-            if owner_now:
-                true_count += 1
-                false_count = 0
-            else:
-                false_count += 1
-                true_count = 0
-
-            if (not stable_owner) and true_count >= ON_FRAMES:
-                stable_owner = True
-            if stable_owner and false_count >= OFF_FRAMES:
-                stable_owner = False
-
-            # show UI
-            remain = max(0, int(session_until - now))
-            cv2.putText(frame, f"SESSION: {remain}s",
-                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
-                        (255, 255, 255), 2)
-
-            cv2.putText(frame, f"OWNER: {'YES' if stable_owner else 'NO'}",
-                        (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
-                        (255, 255, 255), 2)
-
-            if best_box is not None:
-                x, y, w, h = best_box
-                cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 255), 2)
-                cv2.putText(frame, best_text, (x, y-10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8,
-                            (255, 255, 255), 2)
-
-            cv2.imshow("Recognition", frame)
+            if result is not None and woke_at is not None:
+                print(f"[WAKE] first decision {1000 * (result.done - woke_at):.0f} ms "
+                      f"after PIR (camera {cam.wake_ms or 0:.0f} ms)")
+                woke_at = None
+
+            if result is not None:
+                last_frame_seq = result.seq
+
+                frame = result.frame
+                best_box = result.rec.best_box
+                best_text = result.rec.best_text
+
+                # owner decision (frame time = capture time)
+                was_owner = stable_owner
+                stable_owner = decision.update(result.rec.margin, result.stamp)
+                if stable_owner and not was_owner:
+                    OWNER_YES.inc()
+                if was_owner and not stable_owner:
+                    OWNER_NO.inc()
+
+                # show UI (only if a window/stream viewer will see it)
+                if view.wants_frame():
+                    frame = display.drawable(frame)
+                    remain = max(0, int(session_until - now))
+                    cv2.putText(frame, f"SESSION: {remain}s",
+                                (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
+                                (255, 255, 255), 2)
+
+                    cv2.putText(frame, f"OWNER: {'YES' if stable_owner else 'NO'}",
+                                (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.9,
+                                (255, 255, 255), 2)
+
+                    if best_box is not None:
+                        x, y, w, h = best_box
+                        cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 255, 255), 2)
+                        cv2.putText(frame, best_text, (x, y-10),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                                    (255, 255, 255), 2)
+
+                    view.show(frame)
 
         else:
             # session off -> owner forced false (avoid open gate outside session)
+            decision.reset()
             stable_owner = False
-            true_count = 0
-            false_count = 0
 
-            # optionally hide window
-            try:
-                cv2.destroyWindow("Recognition")
-            except:
-                pass
+            # hide window
+            view.hide()
 
         # ---------- 4) send session + owner to Arduino ----------
         send_session(session_active)
-        send_owner(stable_owner)
+        send_owner(stable_owner or now < force_open_until)
+        if not boot.done:
+            boot.finish("first decision")
 
-        # ---------- 5) publish/log ----------
-        if distance_cm is not None:
+        # ---------- 5) publish/log (once per Arduino sample) ----------
+        if new_sample and distance_cm is not None:
             event = {
                 "timestamp": int(now),
                 "distance_cm": distance_cm,
@@ -239,31 +496,30 @@ try:
 
             }
 
-            # print console status
-            print("[DATA]", event)
+            # console status (rate limited, see LOG_INTERVAL)
+            log.info("data", **event)
 
-            if now - last_mqtt >= MQTT_INTERVAL:
-                mqtt_pub("distance_cm", distance_cm)
-                mqtt_pub("pir_motion", 1 if pir_motion else 0)
-                mqtt_pub("session_active", 1 if session_active else 0)
-                mqtt_pub("owner", 1 if stable_owner else 0)
-                mqtt_pub("gate_open", 1 if gate_open else 0)
-                mqtt_pub("lamp_on", int(gate_open))
-                mqtt_pub("event", event)
-                last_mqtt = now
+            # only changed fields (+ heartbeat), see state_publisher.py
+            publisher.update(event, event, now)
+
+            if telemetry is not None:
+                telemetry.append(event, state.stamp)
 
             if now - last_fb >= FIREBASE_INTERVAL:
-                db_ref.push(event)
+                sink.push(event)
                 last_fb = now
 
-        # ---------- 6) quit ----------
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
 finally:
+    boot.stop()
+    pipe.stop()
     cam.release()
+    link.close()
+    sink.close()        # last events to Firebase, the rest stays spooled
     ser.close()
+    publisher.offline()
     client.loop_stop()
     client.disconnect()
-    cv2.destroyAllWindows()
+    if telemetry is not None:
+        telemetry.close()
+    view.close()
     print("Stopped.")
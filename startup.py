@@ -0,0 +1,143 @@
+import threading
+import time
+
+import metrics
+
+# Gateway startup: the slow initializations at the same time instead of
+# one after another.
+#
+#   boot = Startup()
+#   boot.run("serial", open_arduino)        # own thread, starts right away
+#   boot.run("camera", open_camera)
+#   boot.background("firebase", connect_firebase, on_ready=sink.attach)
+#   ser, link = boot.get("serial")          # waits for this step only
+#   ...
+#   boot.finish("first decision")           # in the loop: prints the timeline
+#
+# run() is for what the gate loop cannot work without (serial, camera, face
+# model): get() waits for the step and re-raises its exception.
+# background() is for the cloud sinks: fn() is retried with exponential
+# backoff (RETRY_MIN doubling up to RETRY_MAX) until it succeeds, nobody
+# waits for it, on_ready(result) hands the result over (retried the same
+# way if it raises; the step shows why it is still retrying). Until then
+# the sinks buffer (EventSink spools, StatePublisher re-announces on
+# connect).
+#
+# Start / end of every step are kept relative to Startup(), finish() adds
+# the end point and prints them; also exported as gate_startup_seconds.
+
+RETRY_MIN = 1.0
+RETRY_MAX = 30.0
+
+STARTUP_HELP = "Seconds from gateway start until the step was done"
+
+
+class Startup:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.steps = {}             # name -> [start s, end s or None, status]
+        self.done = False           # finish() was called
+        self._results = {}
+        self._events = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def _begin(self, name):
+        with self._lock:
+            self.steps[name] = [self.elapsed(), None, "running"]
+
+    def _end(self, name, status):
+        with self._lock:
+            step = self.steps[name]
+            step[1], step[2] = self.elapsed(), status
+        metrics.gauge("gate_startup_seconds", STARTUP_HELP, {"step": name}).set(step[1])
+
+    def _status(self, name, status):
+        # still running, but e.g. retrying: shown in timeline()
+        with self._lock:
+            self.steps[name][2] = status
+
+    def run(self, name, fn, *args):
+        done = self._events[name] = threading.Event()
+        self._begin(name)
+
+        def step():
+            try:
+                self._results[name] = (fn(*args), None)
+                self._end(name, "ok")
+            except Exception as e:
+                self._results[name] = (None, e)
+                self._end(name, "failed")
+            finally:
+                done.set()
+
+        threading.Thread(target=step, daemon=True).start()
+
+    def get(self, name, timeout=None):
+        if not self._events[name].wait(timeout):
+            raise TimeoutError(f"startup step {name!r} not done after {timeout} s")
+        result, error = self._results[name]
+        if error is not None:
+            raise error
+        return result
+
+    def background(self, name, fn, on_ready=None, retry_min=RETRY_MIN, retry_max=RETRY_MAX):
+        self._begin(name)
+
+        def step():
+            retry, last_error = 0.0, None
+            result, connected = None, False
+            while not self._stop.is_set():
+                try:
+                    if not connected:
+                        result, connected = fn(), True
+                    if on_ready is not None:
+                        on_ready(result)
+                except Exception as e:      # offline, DNS, auth ... try again later
+                    # fn() is not run again once it worked (initialize_app
+                    # twice fails), a failed hand-over retries on_ready only
+                    what = "hand-over failed" if connected else "not online yet"
+                    if repr(e) != last_error:
+                        print(f"⚠️ {name} {what}: {e!r} (retrying)")
+                        self._status(name, what)
+                    last_error = repr(e)
+                    retry = min(retry_max, max(retry_min, retry * 2))
+                    self._stop.wait(retry)
+                    continue
+                self._end(name, "ok")
+                print(f"✅ {name} online ({self.elapsed():.1f} s after start)")
+                return
+
+        threading.Thread(target=step, daemon=True).start()
+
+    def mark(self, name):
+        # a point in time (e.g. MQTT connected), only the first one counts
+        with self._lock:
+            if name in self.steps:
+                return
+            now = self.elapsed()
+            self.steps[name] = [now, now, "ok"]
+        metrics.gauge("gate_startup_seconds", STARTUP_HELP, {"step": name}).set(now)
+
+    def finish(self, name="first decision"):
+        self.mark(name)
+        self.done = True
+        print(self.timeline())
+
+    def stop(self):
+        # background steps give up (shutdown)
+        self._stop.set()
+
+    def timeline(self):
+        with self._lock:
+            steps = sorted(self.steps.items(), key=lambda kv: (kv[1][1] is None, kv[1][1] or 0))
+        lines = ["⏱️ startup:"]
+        for name, (start, end, status) in steps:
+            if end is None:
+                lines.append(f"   {name:<16} {start:6.2f} s ->   ...    ({status})")
+            else:
+                lines.append(f"   {name:<16} {start:6.2f} s -> {end:6.2f} s ({status})")
+        return "\n".join(lines)
@@ -0,0 +1,155 @@
+import json
+import struct
+import time
+
+import metrics
+
+# MQTT publishing of the gateway state, instead of one mqtt_pub() per field
+# every MQTT_INTERVAL.
+#
+#   legacy topics  MQTT_BASE/distance_cm, .../owner, ... (same payloads as
+#                  before, so the Node-RED flows keep working) are published
+#                  only when their value changed, retained
+#   state topic    MQTT_BASE/state, all fields in one small binary message
+#                  (layout below), retained, only when something changed
+#   event topic    MQTT_BASE/event, the JSON event, not retained
+# Every `heartbeat` seconds everything is sent again even if nothing changed,
+# so a dashboard can tell "no change" from "gateway dead". Retained topics
+# mean a dashboard that subscribes gets the current state immediately.
+# MQTT_BASE/online is "1" while connected and "0" (last will) otherwise,
+# always at ONLINE_QOS whatever qos the state goes out with. On a clean
+# shutdown offline() publishes the "0" itself and waits up to
+# OFFLINE_TIMEOUT for the broker's PUBACK, so loop_stop() right after does
+# not drop it (publish() only queues).
+#
+# MQTT_BASE/state payload, little endian:
+#   B   version (STATE_VERSION)
+#   I   unix time (seconds)
+#   H   one per number field, in order (clamped to 0..65535)
+#   B   flags, bit i = flag field i
+# The field order is published retained as JSON on MQTT_BASE/state/schema.
+
+STATE_VERSION = 1
+OFFLINE_TIMEOUT = 2.0   # seconds offline() waits for the broker
+ONLINE_QOS = 1          # online flag + last will: acknowledged by the broker
+
+# client.publish() only queues for paho's network thread, so this is the
+# cost on the caller's side
+PUBLISH_SECONDS = metrics.histogram("gate_mqtt_publish_seconds", "client.publish() call")
+MESSAGES = metrics.counter("gate_mqtt_messages_total", "MQTT messages published")
+PAYLOAD_BYTES = metrics.counter("gate_mqtt_payload_bytes_total", "MQTT payload bytes published")
+
+
+def set_will(client, base, qos=ONLINE_QOS):
+    # call before client.connect()
+    client.will_set(f"{base}/online", "0", qos=qos, retain=True)
+
+
+def wait_published(info, timeout=OFFLINE_TIMEOUT):
+    # MQTTMessageInfo of a QoS 1 publish -> True once the broker acked it
+    # (PUBACK), False on timeout or if it could not be queued at all (not
+    # connected). At QoS 0 "published" only means written to the socket.
+    try:
+        info.wait_for_publish(timeout)
+    except (RuntimeError, ValueError):
+        return False
+    return info.is_published()
+
+
+def packed_format(numbers, flags):
+    if len(flags) > 8:
+        raise ValueError("at most 8 flag fields fit in the state byte")
+    return struct.Struct("<BI" + "H" * len(numbers) + "B")
+
+
+def pack_state(fmt, numbers, flags, state, stamp):
+    values = [max(0, min(0xFFFF, int(state[name]))) for name in numbers]
+    bits = 0
+    for i, name in enumerate(flags):
+        if state[name]:
+            bits |= 1 << i
+    return fmt.pack(STATE_VERSION, int(stamp), *values, bits)
+
+
+def unpack_state(fmt, numbers, flags, payload):
+    version, stamp, *rest = fmt.unpack(payload)
+    if version != STATE_VERSION:
+        raise ValueError(f"unknown state version {version}")
+    bits = rest.pop()
+    state = dict(zip(numbers, rest))
+    state.update({name: bool(bits >> i & 1) for i, name in enumerate(flags)})
+    state["timestamp"] = stamp
+    return state
+
+
+class StatePublisher:
+    def __init__(self, client, base, numbers, flags, heartbeat=10.0,
+                 deadband=0, legacy=True, packed=True, qos=0, retain=True):
+        self.client = client
+        self.base = base
+        self.numbers = tuple(numbers)   # e.g. ("distance_cm",)
+        self.flags = tuple(flags)       # e.g. ("pir_motion", "owner", ...)
+        self.heartbeat = heartbeat
+        self.deadband = deadband        # numbers: change must be > deadband
+        self.legacy = legacy
+        self.packed = packed
+        self.qos = qos
+        self.retain = retain
+        self.fmt = packed_format(self.numbers, self.flags)
+
+        self.last = {}                  # field -> last value sent
+        self.last_full = 0.0
+        self.messages = 0
+        self.payload_bytes = 0
+
+    def _publish(self, topic, payload, retain, qos=None):
+        qos = self.qos if qos is None else qos
+        with PUBLISH_SECONDS.time():
+            info = self.client.publish(f"{self.base}/{topic}", payload, qos=qos, retain=retain)
+        self.messages += 1
+        self.payload_bytes += len(payload)
+        MESSAGES.inc()
+        PAYLOAD_BYTES.inc(len(payload))
+        return info
+
+    def announce(self):
+        # after every (re)connect: online flag + layout of the packed state,
+        # and the next update() sends everything
+        self.last_full = 0.0
+        schema = {"version": STATE_VERSION, "format": self.fmt.format,
+                  "numbers": list(self.numbers), "flags": list(self.flags)}
+        self._publish("online", "1", True, ONLINE_QOS)
+        self._publish("state/schema", json.dumps(schema), True)
+
+    def offline(self, timeout=OFFLINE_TIMEOUT):
+        # clean shutdown (the last will only covers a dropped connection);
+        # call before client.loop_stop(), returns True if the broker has it
+        return wait_published(self._publish("online", "0", True, ONLINE_QOS), timeout)
+
+    def update(self, state, event=None, now=None):
+        # state: field -> value (numbers and flags); returns messages sent
+        now = time.time() if now is None else now
+        full = now - self.last_full >= self.heartbeat
+        if full:
+            self.last_full = now
+        sent = self.messages
+
+        changed = []
+        for name in self.numbers + self.flags:
+            value = int(state[name])
+            last = self.last.get(name)
+            band = self.deadband if name in self.numbers else 0
+            if full or last is None or abs(value - last) > band:
+                self.last[name] = value
+                changed.append(name)
+
+        if self.legacy:
+            for name in changed:
+                self._publish(name, str(self.last[name]), self.retain)
+
+        if self.packed and (changed or full):
+            self._publish("state", pack_state(self.fmt, self.numbers, self.flags,
+                                              state, now), self.retain)
+        if event is not None and (changed or full):
+            self._publish("event", json.dumps(event), False)
+        return self.messages - sent
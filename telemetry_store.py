@@ -0,0 +1,331 @@
+import argparse
+import calendar
+import os
+import time
+
+import numpy as np
+
+import metrics
+
+# Local history of every Arduino sample (~every 150 ms), next to the rate
+# limited Firebase gate_logs.
+#
+# Append-only and columnar: one directory per UTC day, one raw file per
+# column, memory-mapped with NumPy:
+#
+#   gate_telemetry/2026-10-17/timestamp   float64  receive time (time.time())
+#                             distance_cm uint16   999 = no echo
+#                             pir_motion  uint8    0/1, same for the other flags
+#                             ...
+#                             rows        int64    rows written (1 value)
+#
+# append() writes one value into every column map and then bumps `rows`,
+# so a reader (another process, python telemetry_store.py) never sees a
+# half written row. Files grow by GROW_ROWS rows at a time (remapped), so
+# appending stays O(1) however long the gateway runs; a new day is a new
+# segment. Timestamps are kept non-decreasing (a clock step back is
+# clamped), so range() is a binary search (np.searchsorted) per day plus a
+# copy of the rows in range; aggregate() bins each day with reduceat on
+# the maps directly.
+#
+# The maps are written through the page cache: a crash of the gateway
+# loses nothing, a power loss at most what the OS did not write back yet
+# (flush() at every new day and on close()).
+
+TELEMETRY_DIR = "gate_telemetry"
+COLUMNS = (("timestamp", "<f8"), ("distance_cm", "<u2"), ("pir_motion", "u1"),
+           ("session_active", "u1"), ("owner", "u1"), ("gate_open", "u1"))
+FLAG_COLUMNS = tuple(name for name, _ in COLUMNS[2:])
+DAY = 86400
+GROW_ROWS = 65536        # ~2.7 h of samples per file growth
+NO_ECHO = 999
+
+ROWS_APPENDED = metrics.counter("gate_telemetry_rows_total", "Samples appended to the local store")
+
+
+def day_name(day):
+    return time.strftime("%Y-%m-%d", time.gmtime(day * DAY))
+
+
+def parse_day(name):
+    try:
+        return calendar.timegm(time.strptime(name, "%Y-%m-%d")) // DAY
+    except ValueError:
+        return None
+
+
+class Segment:
+    # the columns of one day; writable = the segment appended to
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.writable = writable
+        if writable:
+            os.makedirs(path, exist_ok=True)
+        mode = "r+" if writable else "r"
+        rows_path = os.path.join(path, "rows")
+        if writable and not os.path.exists(rows_path):
+            np.zeros(1, np.int64).tofile(rows_path)
+        self._rows = np.memmap(rows_path, np.int64, mode, shape=(1,))
+        self.capacity = 0
+        self.cols = {}                  # name -> ndarray view of the map
+        self._maps = []
+        self._map(self.rows)
+
+    @property
+    def rows(self):
+        return int(self._rows[0])
+
+    def _map(self, need):
+        # (re)map every column with room for at least `need` rows
+        self.cols, self._maps = {}, []  # old maps go first (Windows: no resize while mapped)
+        want = max(need, self.capacity + GROW_ROWS)
+        capacity = None
+        for name, dtype in COLUMNS:
+            path = os.path.join(self.path, name)
+            size = np.dtype(dtype).itemsize
+            if self.writable:
+                with open(path, "ab") as f:
+                    if f.tell() < want * size:
+                        f.truncate(want * size)
+            n = os.path.getsize(path) // size if os.path.exists(path) else 0
+            capacity = n if capacity is None else min(capacity, n)
+        self.capacity = capacity
+        if capacity:
+            mode = "r+" if self.writable else "r"
+            for name, dtype in COLUMNS:
+                m = np.memmap(os.path.join(self.path, name), dtype, mode, shape=(capacity,))
+                self._maps.append(m)
+                # plain ndarray: slicing a np.memmap costs several us each
+                self.cols[name] = m.view(np.ndarray)
+
+    def view(self):
+        # -> rows readable now; another process' writer may have grown the files
+        n = self.rows
+        if n > self.capacity:
+            self._map(n)
+        return min(n, self.capacity)
+
+    def append(self, values):
+        n = self.rows
+        if n >= self.capacity:
+            self._map(n + 1)
+        cols = self.cols
+        for name, _ in COLUMNS:
+            cols[name][n] = values[name]
+        self._rows[0] = n + 1
+
+    def extend(self, columns, count):
+        n = self.rows
+        if n + count > self.capacity:
+            self._map(n + count)
+        for name, _ in COLUMNS:
+            self.cols[name][n:n + count] = columns[name]
+        self._rows[0] = n + count
+
+    def flush(self):
+        for m in self._maps:
+            m.flush()
+        self._rows.flush()
+
+    def close(self):
+        if self.writable:
+            self.flush()
+        self.cols, self._maps = {}, []
+        self._rows = None
+
+
+class TelemetryStore:
+    def __init__(self, root=TELEMETRY_DIR, writable=True):
+        self.root = root
+        self.writable = writable
+        if writable:
+            os.makedirs(root, exist_ok=True)
+        self.segments = {}              # day -> Segment
+        self.head = None                # day being appended to
+        self.last = float("-inf")       # newest timestamp written
+        self.appended = 0
+        self.clamped = 0                # samples older than the newest one
+        self._days = None
+        self._listed = None             # mtime of root when _days was listed
+        days = self.days()
+        if writable and days:
+            # resume after a restart
+            seg = self._segment(days[-1], True)
+            self.head = days[-1]
+            if seg.rows:
+                self.last = float(seg.cols["timestamp"][seg.rows - 1])
+
+    def days(self):
+        # the writer knows its days; a reader lists again when a day was added
+        if self._days is None or not self.writable:
+            try:
+                listed = os.stat(self.root).st_mtime_ns
+            except FileNotFoundError:
+                listed = None
+            if self._days is None or listed != self._listed:
+                names = os.listdir(self.root) if listed is not None else []
+                self._days = sorted(d for d in map(parse_day, names) if d is not None)
+                self._listed = listed
+        return self._days
+
+    def _segment(self, day, writable=False):
+        seg = self.segments.get(day)
+        if seg is None or (writable and not seg.writable):
+            seg = Segment(os.path.join(self.root, day_name(day)), writable)
+            self.segments[day] = seg
+        return seg
+
+    # ---------- writer ----------
+    def _head_for(self, day):
+        if day != self.head:
+            if self.head is not None:
+                self.segments[self.head].flush()
+            if day not in self._days:
+                self._days.append(day)
+                self._days.sort()
+            self.head = day
+        return self._segment(day, True)
+
+    def append(self, event, stamp=None):
+        # one gateway event dict (fields missing -> 0), stamp = receive time
+        stamp = time.time() if stamp is None else stamp
+        if stamp < self.last:
+            stamp = self.last
+            self.clamped += 1
+        self.last = stamp
+        seg = self._head_for(int(stamp // DAY))
+        values = {name: int(event.get(name) or 0) for name in FLAG_COLUMNS}
+        distance = event.get("distance_cm")
+        values["distance_cm"] = NO_ECHO if distance is None else distance
+        values["timestamp"] = stamp
+        seg.append(values)
+        self.appended += 1
+        ROWS_APPENDED.inc()
+
+    def extend(self, columns):
+        # bulk append (import / bench): dict of equal length arrays, timestamps sorted
+        ts = np.asarray(columns["timestamp"], dtype=float)
+        if not len(ts):
+            return
+        if ts[0] < self.last or np.any(np.diff(ts) < 0):
+            raise ValueError("timestamps must be sorted and not older than the store")
+        days = (ts // DAY).astype(np.int64)
+        bounds = np.flatnonzero(np.diff(days)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(ts)]):
+            seg = self._head_for(int(days[lo]))
+            seg.extend({name: np.asarray(columns[name])[lo:hi] for name, _ in COLUMNS},
+                       hi - lo)
+        self.last = float(ts[-1])
+        self.appended += len(ts)
+        ROWS_APPENDED.inc(len(ts))
+
+    def flush(self):
+        if self.head is not None:
+            self.segments[self.head].flush()
+
+    def close(self):
+        for seg in self.segments.values():
+            seg.close()
+        self.segments = {}
+        self.head = None
+
+    def counters(self):
+        return {"appended": self.appended, "clamped": self.clamped,
+                "days": len(self.days())}
+
+    # ---------- queries ----------
+    def _spans(self, t0, t1):
+        # -> (segment, i0, i1) of every day with rows in [t0, t1)
+        first, last = int(t0 // DAY), int(t1 // DAY)
+        for day in self.days():
+            if day < first or day > last:
+                continue
+            seg = self._segment(day)
+            n = seg.view()
+            if n:
+                i0, i1 = np.searchsorted(seg.cols["timestamp"][:n], (t0, t1))
+                if i1 > i0:
+                    yield seg, i0, i1
+
+    def range(self, t0, t1, columns=None):
+        # -> {column: array} of the samples with t0 <= timestamp < t1
+        names = columns or [name for name, _ in COLUMNS]
+        parts = {name: [] for name in names}
+        for seg, i0, i1 in self._spans(t0, t1):
+            for name in names:
+                parts[name].append(np.array(seg.cols[name][i0:i1]))
+        return {name: (np.concatenate(p) if len(p) > 1 else p[0] if p
+                       else np.empty(0, dict(COLUMNS)[name]))
+                for name, p in parts.items()}
+
+    def aggregate(self, t0, t1, step):
+        # downsampled to `step` seconds, non-empty bins only:
+        #   start, samples, distance min/mean/max (no-echo left out),
+        #   each flag as the fraction of samples it was on
+        # reduced day by day straight on the maps (no copy of the range),
+        # a bin across midnight gets both parts merged
+        nbins = max(1, int(np.ceil((t1 - t0) / step)))
+        samples = np.zeros(nbins, np.int64)
+        n_valid = np.zeros(nbins, np.int64)
+        dist_sum = np.zeros(nbins, np.int64)
+        low = np.full(nbins, NO_ECHO, np.int64)
+        high = np.zeros(nbins, np.int64)
+        flags = {name: np.zeros(nbins, np.int64) for name in FLAG_COLUMNS}
+        for seg, i0, i1 in self._spans(t0, t1):
+            bins = ((seg.cols["timestamp"][i0:i1] - t0) // step).astype(np.intp)
+            idx = np.r_[0, np.flatnonzero(np.diff(bins)) + 1]
+            ids = bins[idx]
+            samples[ids] += np.diff(np.r_[idx, len(bins)])
+
+            dist = seg.cols["distance_cm"][i0:i1]
+            valid = dist != NO_ECHO
+            n_valid[ids] += np.add.reduceat(valid, idx, dtype=np.int64)
+            dist_sum[ids] += np.add.reduceat(np.where(valid, dist, 0), idx, dtype=np.int64)
+            low[ids] = np.minimum(low[ids], np.minimum.reduceat(np.where(valid, dist, NO_ECHO), idx))
+            high[ids] = np.maximum(high[ids], np.maximum.reduceat(np.where(valid, dist, 0), idx))
+            for name in FLAG_COLUMNS:
+                flags[name][ids] += np.add.reduceat(seg.cols[name][i0:i1], idx, dtype=np.int64)
+
+        keep = np.flatnonzero(samples)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = dist_sum[keep] / n_valid[keep]
+        out = {
+            "start": t0 + step * keep,
+            "samples": samples[keep],
+            "distance_min": low[keep],
+            "distance_mean": mean,
+            "distance_max": np.where(n_valid[keep], high[keep], NO_ECHO),
+        }
+        for name in FLAG_COLUMNS:
+            out[name] = flags[name][keep] / samples[keep]
+        return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Query the local gate telemetry")
+    ap.add_argument("--dir", default=TELEMETRY_DIR)
+    ap.add_argument("--last", type=float, default=3600.0, help="seconds back from now")
+    ap.add_argument("--step", type=float, default=60.0, help="seconds per row")
+    args = ap.parse_args()
+
+    store = TelemetryStore(args.dir, writable=False)
+    t1 = time.time()
+    t0 = t1 - args.last
+    q0 = time.perf_counter()
+    agg = store.aggregate(t0, t1, args.step)
+    took = time.perf_counter() - q0
+    print(f"{'time':<19} {'samples':>7} {'dist min/avg/max':>18} "
+          + " ".join(f"{name:>14}" for name in FLAG_COLUMNS))
+    for i, start in enumerate(agg["start"]):
+        mean = agg["distance_mean"][i]
+        dist = (f"{agg['distance_min'][i]}/{mean:.0f}/{agg['distance_max'][i]}"
+                if mean == mean else "-")
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))} "
+              f"{agg['samples'][i]:>7} {dist:>18} "
+              + " ".join(f"{100 * agg[name][i]:13.0f}%" for name in FLAG_COLUMNS))
+    print(f"{int(agg['samples'].sum())} samples in {len(agg['start'])} rows, "
+          f"{1000 * took:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,257 @@
-import cv2
+import hashlib
+import json
 import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
 import numpy as np
 
-recognizer = cv2.face.LBPHFaceRecognizer_create()
-faces = []
-labels = []
+import face_engine
+import lbph_engine
+from face_index import FaceIndex, index_path
+from lbph_engine import LBPHEngine
+
+DATASET_DIR = "dataset"        # satu folder per penghuni: dataset/aria, dataset/budi, ...
+MODEL_PATH = "face_model.yml"
+MODELS_DIR = "models"          # versi model: models/v0001/, models/v0002/, ...
+CACHE_PATH = "face_cache.npz"  # histogram LBPH per foto, key = sha1 isi file
+CACHE_VERSION = 2              # bump when _features changes (old cache is dropped)
+PACK_EXT = ".npy"              # N x 200 x 200 stack from capture_dataset.py --pack
+WORKERS = os.cpu_count() or 1
+POOL_MIN_IMAGES = 32           # below this, the process pool costs more than it saves
+REFIT_GROWTH = 1.5             # refit the PQ codebooks when the dataset grew this much
+
+# LBPH parameters (OpenCV defaults, same as LBPHFaceRecognizer_create())
+RADIUS, NEIGHBORS, GRID_X, GRID_Y = 1, 8, 8, 8
+FEATURE_LEN = GRID_X * GRID_Y * 2 ** NEIGHBORS
+
+_engine = None
+
+
+def _features(data):
+    # jpg bytes or a face from a pack -> LBPH histogram (None if the file
+    # is not an image); runs in the pool workers, same histogram OpenCV's
+    # train() computes, on the FACE_SIZE crop recognition predicts on
+    global _engine
+    if _engine is None:
+        _engine = LBPHEngine(np.zeros((0, FEATURE_LEN), dtype=np.float32), [],
+                             RADIUS, NEIGHBORS, GRID_X, GRID_Y)
+    if isinstance(data, np.ndarray):
+        img = data
+    else:
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    if img.shape[::-1] != face_engine.FACE_SIZE:
+        img = cv2.resize(img, face_engine.FACE_SIZE)
+    return _engine.histogram(img)
+
+
+def load_cache(path):
+    try:
+        data = np.load(path)
+        if int(data["version"]) != CACHE_VERSION:
+            return {}, set()
+        return dict(zip(data["keys"].tolist(), data["hists"])), set(data["bad"].tolist())
+    except (OSError, KeyError, ValueError):
+        return {}, set()
+
+
+def save_cache(path, cache, bad):
+    keys = sorted(cache)
+    hists = np.vstack([cache[k] for k in keys]) if keys else \
+        np.zeros((0, FEATURE_LEN), dtype=np.float32)
+    np.savez(path, version=CACHE_VERSION, keys=np.array(keys, dtype=str), hists=hists,
+             bad=np.array(sorted(bad), dtype=str))
+
+
+def manifest_path(model_path):
+    return model_path.rsplit(".", 1)[0] + ".json"
+
+
+def load_manifest(model_path):
+    try:
+        with open(manifest_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"version": 0, "files": {}, "residents": {}}
+
+
+def scan_dataset(dataset_dir, label_map):
+    # -> residents {label: info}, images [(label, relpath, sha1, bytes)]
+    # (a pack gives one entry per face, "folder/faces.npy#i" + the face array)
+    # Label id tetap sama antar training (labels.json dipakai lagi,
+    # folder baru dapat id berikutnya).
+    by_folder = {info["folder"]: label for label, info in label_map.items()}
+    next_id = max(label_map, default=0) + 1
+    residents, images = {}, []
+
+    for folder in sorted(os.listdir(dataset_dir)):
+        path = os.path.join(dataset_dir, folder)
+        if not os.path.isdir(path):
+            continue
+        if folder in by_folder:
+            label = by_folder[folder]
+            info = label_map[label]
+        else:
+            label, next_id = next_id, next_id + 1
+            info = {"name": folder.title(), "folder": folder, "threshold": None}
+
+        for filename in sorted(os.listdir(path)):
+            if filename.endswith(PACK_EXT):
+                # memory-mapped: no JPEG decode, pages read while hashing
+                stack = np.load(os.path.join(path, filename), mmap_mode="r")
+                for i, face in enumerate(stack):
+                    face = np.ascontiguousarray(face)
+                    sha = hashlib.sha1(face.data).hexdigest()
+                    images.append((label, f"{folder}/{filename}#{i}", sha, face))
+                continue
+            with open(os.path.join(path, filename), "rb") as f:
+                data = f.read()
+            sha = hashlib.sha1(data).hexdigest()
+            images.append((label, f"{folder}/{filename}", sha, data))
+        residents[label] = info
+    return residents, images
+
+
+def _old_index(model_path, manifest, files):
+    # -> (codebooks, {row: codes}) of the current index if it is still a
+    # good fit, else (None, None): refit k-means once the dataset has grown
+    # by REFIT_GROWTH since it was fitted. Rows of the index are the
+    # manifest's files in order, so photos kept keep their codes.
+    try:
+        index = FaceIndex.load(index_path(model_path))
+    except (OSError, KeyError, ValueError):
+        return None, None
+    fitted = manifest.get("index_fitted", 0)
+    if not fitted or len(files) > fitted * REFIT_GROWTH:
+        return None, None
+    old = list(manifest["files"].values())
+    if len(old) != len(index):
+        return index.codebooks, None
+    codes = {sha: index.codes[row] for row, sha in enumerate(old)}
+    known = {row: codes[sha] for row, sha in enumerate(files.values()) if sha in codes}
+    return index.codebooks, known
+
+
+def _replace(src, dst):
+    tmp = dst + ".tmp"
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _export_binary(model_path, matrix, labels, residents):
+    # <model>.lbph for memory-mapped loading, stamped with the YAML it matches
+    engine = LBPHEngine(matrix, labels, RADIUS, NEIGHBORS, GRID_X, GRID_Y)
+    engine.save_binary(lbph_engine.binary_path(model_path), residents,
+                       lbph_engine.source_stamp(model_path))
+
+
+def train(dataset_dir=DATASET_DIR, model_path=MODEL_PATH, models_dir=MODELS_DIR,
+          cache_path=CACHE_PATH, workers=WORKERS):
+    t0 = time.perf_counter()
+    residents, images = scan_dataset(dataset_dir, face_engine.load_labels(model_path))
+    cache, bad = load_cache(cache_path)
+
+    # ---------- features only for new / changed photos ----------
+    todo = {}
+    for _, _, sha, data in images:
+        if sha not in cache and sha not in bad:
+            todo[sha] = data
+    if todo:
+        shas = list(todo)
+        # pool only for enough NEW photos (the cached ones cost nothing)
+        if workers > 1 and len(shas) >= POOL_MIN_IMAGES:
+            with ProcessPoolExecutor(workers) as pool:
+                hists = list(pool.map(_features, [todo[s] for s in shas], chunksize=8))
+        else:
+            hists = [_features(todo[s]) for s in shas]
+        for sha, hist in zip(shas, hists):
+            if hist is None:
+                bad.add(sha)
+            else:
+                cache[sha] = hist
+
+    # ---------- assemble ----------
+    hist, labels, files = [], [], {}
+    for label, rel, sha, _ in images:
+        if sha in bad:
+            print(f"  skip (not an image): {rel}")
+            continue
+        hist.append(cache[sha])
+        labels.append(label)
+        files[rel] = sha
+    counts = {label: labels.count(label) for label in residents}
+    residents = {label: info for label, info in residents.items() if counts[label]}
+
+    # drop features of photos that are gone, so the cache doesn't grow forever
+    live = set(files.values())
+    cache = {sha: h for sha, h in cache.items() if sha in live}
+    save_cache(cache_path, cache, bad & {sha for _, _, sha, _ in images})
+
+    manifest = load_manifest(model_path)
+    stats = {"images": len(labels), "new": len(todo), "version": manifest["version"]}
+    label_keys = {str(k): v for k, v in residents.items()}
+    if files == manifest["files"] and label_keys == manifest["residents"]:
+        if hist and not lbph_engine.binary_current(model_path):
+            _export_binary(model_path, np.vstack(hist).astype(np.float32), labels, residents)
+        stats["seconds"] = time.perf_counter() - t0
+        print(f"Model up to date (v{manifest['version']:04d}), nothing to train")
+        return stats
+
+    # ---------- versioned artifact ----------
+    version = manifest["version"] + 1
+    out_dir = os.path.join(models_dir, f"v{version:04d}")
+    os.makedirs(out_dir, exist_ok=True)
+    out_model = os.path.join(out_dir, os.path.basename(model_path))
+
+    matrix = np.vstack(hist).astype(np.float32)
+    lbph_engine.write_model(out_model, matrix, labels, RADIUS, NEIGHBORS, GRID_X, GRID_Y)
+    face_engine.save_labels(residents, out_model)
+    # (versioned file, current file next to the scripts)
+    artifacts = [(out_model, model_path),
+                 (face_engine.labels_path(out_model), face_engine.labels_path(model_path))]
+
+    # PQ index only pays off for big households (see lbph_engine)
+    index_fitted = 0
+    if len(labels) >= lbph_engine.INDEX_MIN_SAMPLES:
+        codebooks, known = _old_index(model_path, manifest, files)
+        index_fitted = manifest["index_fitted"] if codebooks is not None else len(labels)
+        FaceIndex.build(matrix, GRID_X * GRID_Y, codebooks=codebooks, labels=labels,
+                        known=known).save(index_path(out_model))
+        artifacts.append((index_path(out_model), index_path(model_path)))
+    elif os.path.exists(index_path(model_path)):
+        os.remove(index_path(model_path))
+
+    manifest = {
+        "version": version,
+        "created": int(time.time()),
+        "params": {"radius": RADIUS, "neighbors": NEIGHBORS,
+                   "grid_x": GRID_X, "grid_y": GRID_Y},
+        "residents": label_keys,
+        "files": files,
+        "index_fitted": index_fitted,   # samples the PQ codebooks were fitted on
+    }
+    with open(manifest_path(out_model), "w") as f:
+        json.dump(manifest, f, indent=1)
+    artifacts.append((manifest_path(out_model), manifest_path(model_path)))
 
-label_id = 1  # label untuk "Aria"
+    # manifest last = commit point (a crash before it retrains next run)
+    for src, dst in artifacts:
+        _replace(src, dst)
+    # after the commit point: a .lbph left stale by a crash is just ignored
+    _export_binary(model_path, matrix, labels, residents)
 
-for filename in os.listdir("dataset/aria"):
-    img = cv2.imread(f"dataset/aria/{filename}", cv2.IMREAD_GRAYSCALE)
-    faces.append(img)
-    labels.append(label_id)
+    for label, info in sorted(residents.items()):
+        print(f"  {info['name']:<12} label={label}  images={counts[label]}")
+    stats["version"] = version
+    stats["seconds"] = time.perf_counter() - t0
+    print(f"Training done! v{version:04d}: {len(residents)} residents, "
+          f"{len(labels)} images ({len(todo)} new) in {stats['seconds']:.1f}s")
+    return stats
 
-recognizer.train(faces, np.array(labels))
-recognizer.save("face_model.yml")
 
-print("Training done!")
+if __name__ == "__main__":
+    train()
@@ -0,0 +1,274 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import face_engine
+import metrics
+
+# Threaded capture -> detect -> recognize pipeline.
+#
+#   capture thread  : cam.read() as fast as the camera gives frames and only
+#                     keeps the newest one (old frames are dropped, never
+#                     queued behind a slow detector)
+#   detect workers  : cvtColor + detectMultiScale, N threads (OpenCV releases
+#                     the GIL, so they really run in parallel), each with
+#                     its own CascadeClassifier (not thread-safe)
+#   recognize stage : LBPH predict for every face, one thread
+#
+# Stages are joined by small DropQueue's: when a queue is full the OLDEST
+# item is thrown away, so the gate decision is always made on fresh frames.
+#
+# Stage times and drops also go to the process-wide metrics (metrics.py):
+# gate_stage_seconds{stage=capture|cvtcolor|detect|predict} and
+# gate_frames_dropped_total{where=detect_queue|recognize_queue|late}.
+
+# One processed frame
+#   seq   -> capture sequence number (increasing)
+#   stamp -> capture time: the source's `stamp` (ReplayCamera: recording
+#            time) or time.time() when the frame was captured
+#   frame -> BGR frame (for the overlay)
+#   faces -> boxes from the detector
+#   rec   -> face_engine.Recognition
+#   done  -> time.time() when recognition finished
+FrameResult = namedtuple("FrameResult",
+                         ["seq", "stamp", "frame", "faces", "rec", "done"])
+
+STAGE_HELP = "Vision pipeline stage time per frame"
+CAPTURE_SECONDS = metrics.histogram("gate_stage_seconds", STAGE_HELP, {"stage": "capture"})
+CVTCOLOR_SECONDS = metrics.histogram("gate_stage_seconds", STAGE_HELP, {"stage": "cvtcolor"})
+DETECT_SECONDS = metrics.histogram("gate_stage_seconds", STAGE_HELP, {"stage": "detect"})
+PREDICT_SECONDS = metrics.histogram("gate_stage_seconds", STAGE_HELP, {"stage": "predict"})
+
+DROP_HELP = "Frames thrown away before a decision was made on them"
+DETECT_DROPPED = metrics.counter("gate_frames_dropped_total", DROP_HELP, {"where": "detect_queue"})
+RECOGNIZE_DROPPED = metrics.counter("gate_frames_dropped_total", DROP_HELP, {"where": "recognize_queue"})
+LATE_DROPPED = metrics.counter("gate_frames_dropped_total", DROP_HELP, {"where": "late"})
+
+
+class DropQueue:
+    # Bounded queue with a "drop oldest" policy.
+    def __init__(self, maxsize, dropped_counter=None):
+        self.items = deque()
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.dropped_counter = dropped_counter   # metrics.Counter, optional
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        with self.cond:
+            if len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+                if self.dropped_counter is not None:
+                    self.dropped_counter.inc()
+            self.items.append(item)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.items, timeout):
+                return None
+            return self.items.popleft()
+
+    def wake_all(self):
+        with self.cond:
+            self.cond.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class StageStats:
+    # added to by every worker of a stage -> locked
+    def __init__(self):
+        self.count = 0
+        self.busy = 0.0        # seconds spent working
+        self.samples = deque(maxlen=2000)   # recent per-item seconds (percentiles)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.busy += seconds
+            self.samples.append(seconds)
+
+    def snapshot(self):
+        # -> (count, busy) read together
+        with self.lock:
+            return self.count, self.busy
+
+
+class VisionPipeline:
+    def __init__(self, cam, face_cascade, recognizer, threshold,
+                 detect_workers=2, queue_size=2, detect_fn=None, labels=None,
+                 cache=None):
+        self.cam = cam
+        self.face_cascade = face_cascade
+        self.recognizer = recognizer
+        self.threshold = threshold
+        self.labels = labels        # face_engine label map (None = default)
+        self.cache = cache          # recognition_cache.RecognitionCache (None = off)
+        self.detect_workers = detect_workers
+        # detect_fn(gray) -> boxes, defaults to the classic full-frame Haar.
+        # It runs on all detect workers at once: a detect_fn of the caller
+        # has to be thread-safe (face_engine.load_cascade(per_thread=True)),
+        # the default one gets a cascade per worker.
+        detect_cascade = face_engine.per_thread(face_cascade)
+        self.detect_fn = detect_fn or (
+            lambda gray: face_engine.detect_faces(detect_cascade, gray))
+
+        self.det_q = DropQueue(queue_size, DETECT_DROPPED)
+        self.rec_q = DropQueue(queue_size, RECOGNIZE_DROPPED)
+
+        self.result = None                 # newest FrameResult
+        self.result_cond = threading.Condition()
+        self._wakes = 0
+
+        self.stats = {
+            "capture": StageStats(),
+            "detect": StageStats(),
+            "recognize": StageStats(),
+        }
+        self.capture_failed = 0
+        self.late_dropped = 0      # finished out of order -> older than result
+        self.started_at = None
+
+        self._seq = 0
+        self._active = threading.Event()
+        self._active.set()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ---------- control ----------
+    def start(self):
+        self.started_at = time.time()
+        targets = [self._capture_loop, self._recognize_loop]
+        targets += [self._detect_loop] * self.detect_workers
+        for target in targets:
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def pause(self):
+        self._active.clear()
+
+    def resume(self):
+        self._active.set()
+
+    def stop(self):
+        self._stop.set()
+        self._active.set()
+        self.det_q.wake_all()
+        self.rec_q.wake_all()
+        for t in self._threads:
+            t.join(timeout=2)
+        self._threads = []
+
+    # ---------- results ----------
+    def latest(self):
+        return self.result
+
+    def wait_result(self, last_seq, timeout=None):
+        # newest result with seq > last_seq, or None on timeout / wake()
+        wakes = self._wakes
+        with self.result_cond:
+            self.result_cond.wait_for(
+                lambda: (self.result is not None and self.result.seq > last_seq)
+                or self._wakes != wakes,
+                timeout)
+            r = self.result
+        if r is None or r.seq <= last_seq:
+            return None
+        return r
+
+    def wake(self):
+        # let wait_result() return now (something else to do, e.g. a remote command)
+        with self.result_cond:
+            self._wakes += 1
+            self.result_cond.notify_all()
+
+    def counters(self):
+        elapsed = max(1e-6, time.time() - (self.started_at or time.time()))
+        out = {
+            "elapsed_s": elapsed,
+            "capture_failed": self.capture_failed,
+            "late_dropped": self.late_dropped,
+            "det_q_depth": len(self.det_q),
+            "det_q_dropped": self.det_q.dropped,
+            "rec_q_depth": len(self.rec_q),
+            "rec_q_dropped": self.rec_q.dropped,
+        }
+        for name, st in self.stats.items():
+            count, busy = st.snapshot()
+            out[f"{name}_count"] = count
+            out[f"{name}_fps"] = count / elapsed
+            out[f"{name}_ms"] = 1000.0 * busy / count if count else 0.0
+        return out
+
+    # ---------- threads ----------
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            if not self._active.is_set():
+                self._active.wait(0.2)
+                continue
+
+            t0 = time.perf_counter()
+            ret, frame = self.cam.read()
+            if not ret:
+                self.capture_failed += 1
+                time.sleep(0.01)
+                continue
+
+            self._seq += 1
+            took = time.perf_counter() - t0
+            self.stats["capture"].add(took)
+            CAPTURE_SECONDS.observe(took)
+            # recording time when replaying (ReplayCamera.stamp), as camera_fusion.py
+            stamp = getattr(self.cam, "stamp", None) or time.time()
+            self.det_q.put((self._seq, stamp, frame))
+
+    def _detect_loop(self):
+        while not self._stop.is_set():
+            item = self.det_q.get(timeout=0.2)
+            if item is None:
+                continue
+            seq, stamp, frame = item
+
+            t0 = time.perf_counter()
+            gray = face_engine.to_gray(frame)
+            t1 = time.perf_counter()
+            faces = self.detect_fn(gray)
+            t2 = time.perf_counter()
+            self.stats["detect"].add(t2 - t0)
+            CVTCOLOR_SECONDS.observe(t1 - t0)
+            DETECT_SECONDS.observe(t2 - t1)
+
+            self.rec_q.put((seq, stamp, frame, gray, faces))
+
+    def _recognize_loop(self):
+        while not self._stop.is_set():
+            item = self.rec_q.get(timeout=0.2)
+            if item is None:
+                continue
+            seq, stamp, frame, gray, faces = item
+
+            # detect workers can finish out of order -> never go back in time
+            current = self.result
+            if current is not None and seq <= current.seq:
+                self.late_dropped += 1
+                LATE_DROPPED.inc()
+                continue
+
+            t0 = time.perf_counter()
+            rec = face_engine.recognize_faces(
+                self.recognizer, gray, faces, self.threshold, self.labels,
+                self.cache, stamp)
+            took = time.perf_counter() - t0
+            self.stats["recognize"].add(took)
+            PREDICT_SECONDS.observe(took)
+
+            result = FrameResult(seq, stamp, frame, faces, rec, time.time())
+            with self.result_cond:
+                self.result = result
+                self.result_cond.notify_all()